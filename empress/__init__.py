@@ -6,6 +6,24 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from empress.core import Empress
+import sys
+import types
 
 __all__ = ['Empress']
+
+
+class _LazyModule(types.ModuleType):
+    # empress.core (and everything it depends on) is only imported once it's
+    # actually needed, so that e.g. the CLI can start up quickly. (This uses a
+    # module subclass rather than a module-level __getattr__, since the latter
+    # needs Python 3.7.)
+    def __getattr__(self, name):
+        if name == 'Empress':
+            from empress.core import Empress
+            return Empress
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(self.__name__, name)
+        )
+
+
+sys.modules[__name__].__class__ = _LazyModule
@@ -93,3 +93,63 @@ COMM_PLOT_DESC = (
 OUTPUT_DIR = (
     'Directory to create in which an EMPress visualization will be written.'
 )
+
+SIDECAR = (
+    'Write the tree, feature table, and metadata to binary files in an '
+    '"empress-data" directory next to empress.html, rather than embedding '
+    'them in empress.html. This makes large visualizations much faster to '
+    'load, but means that the visualization has to be viewed through a web '
+    'server (e.g. by running "python -m http.server" in the output '
+    'directory) rather than by opening empress.html directly.'
+)
+
+SHARED_SUPPORT_DIR = (
+    'Store the support files (JavaScript, CSS, etc.) needed to view the '
+    'visualization in this directory, rather than copying them into the '
+    'output directory. Each version of the support files is only written to '
+    'this directory once, so this saves time and disk space when creating '
+    'many visualizations. The visualization refers to the support files '
+    'using a relative path, so the output directory and this directory '
+    'should be moved or shared together.'
+)
+
+HARDLINK_SUPPORT_FILES = (
+    'Only used with --shared-support-dir. Hardlink the shared support files '
+    'into the output directory (copying them if this is not possible), so '
+    'that the output directory can be moved or shared on its own.'
+)
+
+TREE_CACHE_DIR = (
+    'Cache the parsed tree in this directory, so that later visualizations '
+    'of the same tree file (even if it is renamed or copied) don\'t need to '
+    'parse it again. This can save a lot of time for large trees. Defaults '
+    'to the value of the EMPRESS_TREE_CACHE_DIR environment variable, if '
+    'set; otherwise, the tree is not cached.'
+)
+
+CHUNKED_TABLE = (
+    'Read the feature table from disk one chunk of samples at a time, rather '
+    'than loading all of it into memory. This is slower, but makes it '
+    'possible to visualize tables that don\'t fit in memory. Only BIOM '
+    'tables in HDF5 format are supported. Combine this with --sidecar to '
+    'also avoid holding the compressed table in memory when writing the '
+    'visualization.'
+)
+
+PROFILE = (
+    'Record the wall time, CPU time, and resident memory usage of each stage '
+    'of generating the visualization, and write them as JSON to '
+    'empress-profile.json in the output directory.'
+)
+
+CPROFILE = (
+    'Also profile generating the visualization with cProfile, and write the '
+    'results to empress-profile.prof in the output directory (e.g. to view '
+    'them as a flame graph with snakeviz). Implies --profile.'
+)
+
+TRACE_PYTHON_ALLOCATIONS = (
+    'Also record the memory allocated by Python in each stage using '
+    'tracemalloc. This slows down generating the visualization, so the '
+    'recorded times will be less accurate. Implies --profile.'
+)
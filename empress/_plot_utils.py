@@ -8,18 +8,22 @@
 
 
 import os
-import pkg_resources
 
-from bp import parse_newick
 import numpy as np
 import pandas as pd
 from scipy.spatial.distance import euclidean
 
-SUPPORT_FILES = pkg_resources.resource_filename('empress', 'support_files')
+from empress.profiling import profile_stage
+from empress.table import load_presence_table
+from empress.tools import warn_dropped_features
+from empress.tree import bp_tree_tips, read_newick
+
+SUPPORT_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'support_files')
 TEMPLATES = os.path.join(SUPPORT_FILES, 'templates')
 
 
-def get_bp(newickfmt):
+def get_bp(newickfmt, cache_dir=None):
     """Loads a bp.BP tree from a QIIME 2 NewickFormat object.
 
     This function, along with save_viz(), was moved here from _plot.py so it
@@ -28,18 +32,20 @@ def get_bp(newickfmt):
     Parameters
     ----------
     newickfmt : q2_types.tree.NewickFormat
+    cache_dir : str or None
+        Directory in which to cache the parsed tree (see
+        empress.tree.read_newick()). If None, the EMPRESS_TREE_CACHE_DIR
+        environment variable is used, if set.
 
     Returns
     -------
     bp.BP
     """
-    with open(str(newickfmt)) as treefile:
-        # The file will still be closed even though we return from within the
-        # with block: see https://stackoverflow.com/a/9885287/10730311.
-        return parse_newick(treefile.readline())
+    return read_newick(str(newickfmt), cache_dir=cache_dir)
 
 
-def save_viz(viz, output_dir, q2=True):
+def save_viz(viz, output_dir, q2=True, sidecar=False,
+             shared_support_dir=None, hardlink_support_files=False):
     """Saves an Empress visualization to a filepath.
 
     Parameters
@@ -47,16 +53,49 @@ def save_viz(viz, output_dir, q2=True):
     viz : empress.Empress
     output_dir : str
     q2 : bool
+    sidecar : bool
+        If True, write the visualization's data to binary sidecar files
+        (see empress.Empress.write()).
+    shared_support_dir : str or None
+        If not None, store the support files in this directory rather than
+        copying them to output_dir (see
+        empress.Empress.use_shared_support_files()).
+    hardlink_support_files : bool
+        If True (and shared_support_dir is not None), hardlink the shared
+        support files into output_dir. This is always done if q2 is True,
+        since QIIME 2 only packages the files in output_dir into the
+        visualization.
+
+    Notes
+    -----
+    If viz has a profiler, the time and memory used by each step here are
+    recorded, and the profiler's report is written to output_dir (see
+    empress.profiling.Profiler.write()).
     """
-    with open(os.path.join(output_dir, 'empress.html'), 'w') as htmlfile:
-        htmlfile.write(str(viz))
-
-    viz.copy_support_files(output_dir)
+    profiler = viz.profiler
+    if shared_support_dir is not None:
+        # QIIME 2 only packages the files in output_dir into the
+        # visualization, so the support files have to be placed there
+        hardlink = hardlink_support_files or q2
+        with profile_stage(profiler, 'use_shared_support_files'):
+            viz.use_shared_support_files(shared_support_dir, output_dir,
+                                         hardlink=hardlink)
+
+    with profile_stage(profiler, 'write'):
+        viz.write(os.path.join(output_dir, 'empress.html'), sidecar=sidecar)
+
+    if shared_support_dir is None:
+        with profile_stage(profiler, 'copy_support_files'):
+            viz.copy_support_files(output_dir)
 
     if q2:
-        import q2templates
-        index = os.path.join(TEMPLATES, 'index.html')
-        q2templates.render(index, output_dir)
+        with profile_stage(profiler, 'q2templates'):
+            import q2templates
+            index = os.path.join(TEMPLATES, 'index.html')
+            q2templates.render(index, output_dir)
+
+    if profiler is not None:
+        profiler.write(output_dir)
 
 
 def prepare_pcoa(pcoa, number_of_features):
@@ -83,7 +122,8 @@ def prepare_pcoa(pcoa, number_of_features):
     return pcoa
 
 
-def check_and_process_files(output_dir, tree_file, feature_metadata):
+def check_and_process_files(output_dir, tree_file, feature_metadata,
+                            tree_cache_dir=None, profiler=None):
     """Initial checks and processing of files for standalone CLI plotting.
 
     Parameters
@@ -91,6 +131,10 @@ def check_and_process_files(output_dir, tree_file, feature_metadata):
     output_dir : str
     tree_file : str
     fm_file : str
+    tree_cache_dir : str or None
+        Directory in which to cache the parsed tree (see get_bp()).
+    profiler : empress.profiling.Profiler or None
+        If not None, used to record how long reading each file takes.
 
     Returns
     -------
@@ -99,9 +143,56 @@ def check_and_process_files(output_dir, tree_file, feature_metadata):
     """
     if os.path.isdir(output_dir):
         raise OSError("Output directory already exists!")
-    with open(str(tree_file), "r") as f:
-        tree_newick = parse_newick(f.readline())
+    with profile_stage(profiler, 'read_tree'):
+        tree_newick = read_newick(tree_file, cache_dir=tree_cache_dir)
     if feature_metadata is not None:
-        feature_metadata = pd.read_csv(feature_metadata, sep="\t", index_col=0)
+        with profile_stage(profiler, 'read_feature_metadata'):
+            feature_metadata = pd.read_csv(
+                feature_metadata, sep="\t", index_col=0
+            )
 
     return tree_newick, feature_metadata
+
+
+def load_table(table_file, tree, ordination=None,
+               filter_missing_features=False, filter_extra_samples=False,
+               chunked=False):
+    """Loads a feature table for standalone CLI plotting.
+
+    Features and samples that Empress would filter out of the table anyway
+    aren't loaded (see empress.table.load_presence_table()): that is,
+    features that aren't present as tips in the tree (if
+    filter_missing_features is True), and samples that aren't present in the
+    ordination (if filter_extra_samples is True).
+
+    Parameters
+    ----------
+    table_file : str
+    tree : bp.BP
+    ordination : skbio.stats.ordination.OrdinationResults or None
+    filter_missing_features : bool
+    filter_extra_samples : bool
+    chunked : bool
+        If True, return an empress.table.ChunkedTable, which reads the
+        table's data from disk when needed, rather than loading it now.
+
+    Returns
+    -------
+    empress.table.PresenceTable or empress.table.ChunkedTable
+    """
+    feature_ids = None
+    sample_ids = None
+    if filter_missing_features:
+        feature_ids = set(bp_tree_tips(tree))
+    if filter_extra_samples and ordination is not None:
+        sample_ids = set(ordination.samples.index)
+    table, (num_features, _) = load_presence_table(
+        table_file, feature_ids=feature_ids, sample_ids=sample_ids,
+        chunked=chunked
+    )
+    # Since the left-out features never make it to Empress, warn about them
+    # here. (If no features are left, Empress will raise an error instead.)
+    dropped_feature_ct = num_features - table.shape[0]
+    if dropped_feature_ct > 0 and table.shape[0] > 0:
+        warn_dropped_features(dropped_feature_ct)
+    return table
@@ -6,6 +6,13 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from empress.table import ChunkedTable, PresenceTable
+
 
 def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
     """Removes empty samples and features from the table and sample metadata.
@@ -16,7 +23,8 @@ def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
 
     Parameters
     ----------
-    table: biom.Table
+    table: biom.Table, empress.table.PresenceTable, or
+           empress.table.ChunkedTable
         Representation of a feature table.
     sample_metadata: pd.DataFrame
         Sample metadata. The index should describe sample IDs, and the columns
@@ -30,9 +38,10 @@ def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
 
     Returns
     -------
-    filtered_table: biom.Table
-        Copy of the input feature table with empty samples and features
-        removed.
+    filtered_table: biom.Table, empress.table.PresenceTable, or
+                    empress.table.ChunkedTable
+        The input feature table with empty samples and features removed.
+        (If nothing was removed, this is the input table itself.)
     filtered_sample_metadata: pd.DataFrame
         Copy of the input sample metadata with empty samples removed.
 
@@ -47,25 +56,93 @@ def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
     ----------
         - Adapted from qurro._df_utils.remove_empty_samples_and_features().
     """
-    orig_tbl_samples = set(table.ids())
-    orig_tbl_features = set(table.ids(axis='observation'))
-
-    # this code is equivalent to the PR below, we should update once that gets
-    # merged and a newer BIOM release is publicly available
-    # https://github.com/biocore/biom-format/pull/847
-    filtered_table = table.copy()
-    for ax in {'observation', 'sample'}:
-        filtered_table = filtered_table.filter(
-            table.ids(axis=ax)[table.sum(axis=ax) > 0], axis=ax,
-            inplace=False)
-    if filtered_table.is_empty():
+    feature_mask, sample_mask, filtered_sample_metadata = (
+        mask_empty_samples_and_features(table, sample_metadata, ordination)
+    )
+    return (
+        filter_table(table, feature_mask, sample_mask),
+        filtered_sample_metadata
+    )
+
+
+def mask_empty_samples_and_features(
+    table, sample_metadata, ordination=None, feature_mask=None,
+    sample_mask=None
+):
+    """Finds the non-empty samples and features in (part of) a table.
+
+    This does the work of remove_empty_samples_and_features() -- including
+    printing how many samples / features are empty, and raising the same
+    errors -- but doesn't filter the table. This way, other filtering can be
+    combined with this filtering and done in a single pass (see
+    tools.match_inputs()).
+
+    A ChunkedTable is read one chunk of samples at a time, so only one
+    chunk of it is in memory at once.
+
+    Parameters
+    ----------
+    table: biom.Table, empress.table.PresenceTable, or
+           empress.table.ChunkedTable
+        Representation of a feature table.
+    sample_metadata: pd.DataFrame
+        Sample metadata, describing exactly the samples of the table selected
+        by sample_mask.
+    ordination: skbio.OrdinationResults, optional
+        See remove_empty_samples_and_features().
+    feature_mask: np.ndarray of bool, optional
+        If this is passed, the table is treated as only containing the
+        features for which this is True. (By default, all features are used.)
+    sample_mask: np.ndarray of bool, optional
+        Analogous to feature_mask, but for the table's samples.
+
+    Returns
+    -------
+    (feature_mask, sample_mask, filtered_sample_metadata)
+        feature_mask: np.ndarray of bool
+            True for each feature of the table that's selected by the input
+            feature_mask and isn't empty.
+        sample_mask: np.ndarray of bool
+            Analogous to feature_mask, but for the table's samples.
+        filtered_sample_metadata: pd.DataFrame
+            The sample metadata, with empty samples removed.
+
+    Raises
+    ------
+    ValueError
+        See remove_empty_samples_and_features().
+    """
+    num_features, num_samples = table.shape
+    if feature_mask is None:
+        feature_mask = np.ones(num_features, dtype=bool)
+    if sample_mask is None:
+        sample_mask = np.ones(num_samples, dtype=bool)
+
+    # Each feature's / sample's sum, within the selected part of the table
+    if isinstance(table, ChunkedTable):
+        feature_sums = np.zeros(num_features)
+        sample_sums = np.zeros(num_samples)
+        for first, last, chunk in table.iter_sample_chunks():
+            # (Chunks are samples x features)
+            sample_sums[first:last] = chunk.dot(feature_mask.astype(float))
+            feature_sums += chunk.T.dot(
+                sample_mask[first:last].astype(float)
+            )
+    else:
+        matrix = table.matrix_data
+        feature_sums = matrix.dot(sample_mask.astype(float))
+        sample_sums = matrix.T.dot(feature_mask.astype(float))
+    nonempty_feature_mask = feature_mask & (feature_sums > 0)
+    nonempty_sample_mask = sample_mask & (sample_sums > 0)
+    if not nonempty_feature_mask.any():
         raise ValueError("All samples / features in matched table are empty.")
 
     # Let user know about which samples/features may have been dropped, if any.
     # Also, if we dropped any empty samples, update the sample metadata.
     filtered_sample_metadata = sample_metadata
 
-    sample_diff = orig_tbl_samples - set(filtered_table.ids())
+    sample_ids = table.ids()
+    sample_diff = set(sample_ids[sample_mask & ~nonempty_sample_mask])
     if sample_diff:
         if ordination is not None:
             empty_samples_in_ord = sample_diff & set(ordination.samples.index)
@@ -77,12 +154,12 @@ def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
                     ).format(", ".join(sorted(empty_samples_in_ord)))
                 )
         filtered_sample_metadata = filtered_sample_metadata.loc[
-            filtered_table.ids()
+            sample_ids[nonempty_sample_mask]
         ]
         print("Removed {} empty sample(s).".format(len(sample_diff)))
 
-    feature_diff = orig_tbl_features - \
-        set(filtered_table.ids(axis='observation'))
+    feature_ids = table.ids(axis='observation')
+    feature_diff = set(feature_ids[feature_mask & ~nonempty_feature_mask])
     if feature_diff:
         if ordination is not None and ordination.features is not None:
             empty_feats_in_ord = feature_diff & set(ordination.features.index)
@@ -96,17 +173,88 @@ def remove_empty_samples_and_features(table, sample_metadata, ordination=None):
                 )
         print("Removed {} empty feature(s).".format(len(feature_diff)))
 
-    return filtered_table, filtered_sample_metadata
+    return (
+        nonempty_feature_mask, nonempty_sample_mask, filtered_sample_metadata
+    )
+
+
+def filter_table(table, feature_mask, sample_mask):
+    """Filters a feature table to some of its features and samples.
+
+    Unlike calling biom.Table.filter() once per axis (which copies the entire
+    table before filtering it), this just slices the table's sparse matrix.
 
+    Parameters
+    ----------
+    table: biom.Table or empress.table.PresenceTable
+        Representation of a feature table.
+    feature_mask: np.ndarray of bool
+        True for each feature to keep.
+    sample_mask: np.ndarray of bool
+        True for each sample to keep.
+
+    Returns
+    -------
+    biom.Table, empress.table.PresenceTable, or empress.table.ChunkedTable
+        A new table containing just the selected features and samples, in
+        the same order as in the input table. If every feature and sample is
+        selected, this is the input table itself (not a copy).
+    """
+    if feature_mask.all() and sample_mask.all():
+        return table
+    if isinstance(table, (PresenceTable, ChunkedTable)):
+        return table.subset(feature_mask, sample_mask)
+
+    from biom import Table
+
+    feature_idx = np.flatnonzero(feature_mask)
+    sample_idx = np.flatnonzero(sample_mask)
+    # (biom stores tables in CSR format, so slice rows before columns)
+    matrix = table.matrix_data
+    if len(feature_idx) < len(feature_mask):
+        matrix = matrix[feature_idx]
+    if len(sample_idx) < len(sample_mask):
+        matrix = matrix[:, sample_idx]
+
+    def filter_metadata(axis, idx):
+        md = table.metadata(axis=axis)
+        return None if md is None else [md[i] for i in idx]
+
+    return Table(
+        matrix,
+        table.ids(axis='observation')[feature_idx],
+        table.ids()[sample_idx],
+        observation_metadata=filter_metadata('observation', feature_idx),
+        sample_metadata=filter_metadata('sample', sample_idx),
+        table_id=table.table_id,
+        type=table.type,
+        create_date=table.create_date,
+        generated_by=table.generated_by,
+        observation_group_metadata=table.group_metadata(axis='observation'),
+        sample_group_metadata=table.group_metadata(),
+        validate=False
+    )
 
-def compress_table(table):
+
+def compress_table(table, tree_index=None, csr=False):
     """Converts a feature table to a space-saving format.
 
     Parameters
     ----------
-    table: biom.Table
+    table: biom.Table, empress.table.PresenceTable, or
+           empress.table.ChunkedTable
         Representation of a feature table.  It is assumed that empty samples /
-        features have already been removed from the table.
+        features have already been removed from the table. A ChunkedTable is
+        compressed one chunk of samples at a time (see below).
+    tree_index: empress.tree.TreeIndex, optional
+        If this is passed, features will be identified by the postorder
+        positions of the tips in the tree they correspond to (rather than by
+        their IDs in the table). Every feature in the table must be present as
+        a tip in the tree.
+    csr: bool, optional
+        If True, compressed_table will be returned in compressed sparse row
+        (CSR) format rather than as a list of lists. This avoids creating a
+        Python int for every nonzero entry in the table.
 
     Returns
     -------
@@ -114,7 +262,9 @@ def compress_table(table):
         s_ids: list
             List of the sample IDs in the table.
         f_ids: list
-            List of the feature IDs in the table, analogous to s_ids.
+            List of the feature IDs in the table, analogous to s_ids. If
+            tree_index was passed, these will be the features' postorder
+            positions in the tree instead.
         s_ids_to_indices: dict
             Inverse of s_ids: this maps sample IDs to their indices in s_ids.
             "Indices" refers to a feature or sample's 0-based position in f_ids
@@ -122,13 +272,32 @@ def compress_table(table):
         f_ids_to_indices: dict
             Inverse of f_ids: this maps feature IDs to their indices in f_ids,
             analogous to s_ids_to_indices.
-        compressed_table: list
-            Two-dimensional list. The "outer list" is of length len(s_ids).
-            Each position i within this outer list holds an "inner list" of
-            arbitrary (but within the range [1, len(f_ids)]) length.
-            The i-th inner list contains the feature indices of the
-            features present (i.e. at any abundance > 0) within the
-            sample with index i. Each inner list is sorted in ascending order.
+        compressed_table: list or dict
+            If csr is False, this is a two-dimensional list. The "outer list"
+            is of length len(s_ids). Each position i within this outer list
+            holds an "inner list" of arbitrary (but within the range
+            [1, len(f_ids)]) length. The i-th inner list contains the feature
+            indices of the features present (i.e. at any abundance > 0) within
+            the sample with index i. Each inner list is sorted in ascending
+            order.
+
+            If csr is True, this is a dict with the keys "indptr" and
+            "indices", both of which map to np.ndarrays of uint32. The feature
+            indices of the features present within the sample with index i
+            are indices[indptr[i]:indptr[i + 1]] (sorted in ascending order,
+            as above).
+
+            If table is a ChunkedTable and csr is True, the "indices" array
+            is written to a temporary file as each chunk of the table is
+            compressed, and is returned as a read-only np.memmap of this
+            file. This way, neither the table nor its compressed
+            representation has to fit in memory.
+
+    Raises
+    ------
+    ValueError
+        If tree_index was passed and any features in the table are not
+        present in the tree.
 
     References
     ----------
@@ -137,12 +306,49 @@ def compress_table(table):
     feature_ids = table.ids(axis='observation')
     sample_ids = table.ids()
 
+    if tree_index is not None:
+        positions, idxs = tree_index.match_names(feature_ids)
+        if len(positions) != len(feature_ids):
+            raise ValueError(
+                "Some features in the table are not present in the tree."
+            )
+        feature_ids = np.empty(len(feature_ids), dtype=int)
+        feature_ids[idxs] = positions
+        feature_ids = feature_ids.tolist()
+
     f_ids_to_indices = {fid: idx for idx, fid in enumerate(feature_ids)}
     s_ids_to_indices = {sid: idx for idx, sid in enumerate(sample_ids)}
 
-    compressed_table = []
-    for vec in table.iter_data(axis='sample', dense=False):
-        compressed_table.append([int(i) for i in vec.indices])
+    if isinstance(table, ChunkedTable):
+        compressed_table = _compress_chunked_table(table)
+        if not csr:
+            indptr = compressed_table["indptr"].tolist()
+            indices = compressed_table["indices"].tolist()
+            compressed_table = [
+                indices[start:end]
+                for start, end in zip(indptr[:-1], indptr[1:])
+            ]
+        return (
+            list(sample_ids), list(feature_ids), s_ids_to_indices,
+            f_ids_to_indices, compressed_table
+        )
+
+    # The table is stored as features x samples, so its CSC representation is
+    # the CSR representation of samples x features
+    mat = table.matrix_data.tocsc()
+    if not mat.has_sorted_indices:
+        mat = mat.sorted_indices()
+    if csr:
+        compressed_table = {
+            "indptr": mat.indptr.astype(np.uint32),
+            "indices": mat.indices.astype(np.uint32)
+        }
+    else:
+        indptr = mat.indptr.tolist()
+        indices = mat.indices.tolist()
+        compressed_table = [
+            indices[start:end] for start, end in zip(indptr[:-1], indptr[1:])
+        ]
 
     return (
         list(sample_ids), list(feature_ids), s_ids_to_indices,
@@ -150,15 +356,13 @@ def compress_table(table):
     )
 
 
-def compress_sample_metadata(s_ids_to_indices, metadata):
+def compress_sample_metadata(s_ids_to_indices, metadata, categorical=False):
     """Converts a sample metadata DataFrame to a space-saving format.
 
-    We could ostensibly save more space by identifying repeated metadata
-    values and mapping *those* to integer IDs. (For example, a lot of Qiita
+    If categorical is True, we save more space by identifying repeated
+    metadata values and mapping *those* to integer codes. (A lot of Qiita
     studies' sample metadata files have lots of frequently repeated values like
-    "host_subject_id", the various empo_* fields, etc.) However, that may be
-    1) overkill and 2) not worth it until we get to really big datasets
-    (and/or datasets with lots of repeated values).
+    "host_subject_id", the various empo_* fields, etc.)
 
     Parameters
     ----------
@@ -171,19 +375,31 @@ def compress_sample_metadata(s_ids_to_indices, metadata):
         should describe sample metadata fields (e.g. "body site").
         The sample IDs in the index should match one-to-one with the keys in
         s_ids_to_indices.
+    categorical: bool, optional
+        If True, metadata_vals will be stored by column and
+        dictionary-encoded (see below) rather than as a list of rows.
 
     Returns
     -------
     (metadata_columns, metadata_vals)
         metadata_columns: list
             List of the sample metadata column names, all converted to strings.
-        metadata_vals: list
-            Two-dimensional list. The "outer list" is of length
-            len(s_ids_to_indices.keys()). Each position i within this outer
-            list holds an "inner list" of length len(metadata_columns).
-            The c-th value of the i-th inner list contains the c-th
-            sample metadata column (in metadata_columns)'s value for the
-            sample with index i, converted to a string.
+        metadata_vals: list or dict
+            If categorical is False, this is a two-dimensional list. The
+            "outer list" is of length len(s_ids_to_indices.keys()). Each
+            position i within this outer list holds an "inner list" of length
+            len(metadata_columns). The c-th value of the i-th inner list
+            contains the c-th sample metadata column (in metadata_columns)'s
+            value for the sample with index i, converted to a string.
+
+            If categorical is True, this is a dict with the keys "values" and
+            "codes", each of which maps to a list of length
+            len(metadata_columns). values[c] is a list of the unique values
+            (converted to strings) in the c-th sample metadata column, in
+            order of first appearance. codes[c] is an np.ndarray of uint32
+            with length len(s_ids_to_indices.keys()): codes[c][i] is the index
+            in values[c] of the sample with index i's value for the c-th
+            column.
 
     Raises
     ------
@@ -220,25 +436,31 @@ def compress_sample_metadata(s_ids_to_indices, metadata):
         axis="index", ascending=True
     )
 
-    # Convert all of the metadata values to strings
-    str_s_i_metadata = sorted_i_metadata.astype(str)
-
-    # Generate a 2-D list of metadata values
-    # Based on https://datatofish.com/convert-pandas-dataframe-to-list
-    sm_vals = str_s_i_metadata.values.tolist()
-
-    sm_cols = [str(c) for c in str_s_i_metadata.columns]
+    if categorical:
+        # Only each column's unique values are converted to strings
+        sm_vals = {"values": [], "codes": []}
+        for col in sorted_i_metadata.columns:
+            values, codes = _factorize_as_str([sorted_i_metadata[col]])
+            sm_vals["values"].append(values)
+            sm_vals["codes"].append(codes)
+    else:
+        # Convert all of the metadata values to strings, and generate a 2-D
+        # list of them
+        # Based on https://datatofish.com/convert-pandas-dataframe-to-list
+        sm_vals = sorted_i_metadata.astype(str).values.tolist()
+
+    sm_cols = [str(c) for c in sorted_i_metadata.columns]
 
     return sm_cols, sm_vals
 
 
-def compress_feature_metadata(tip_metadata, int_metadata):
-    """Converts tip/internal node metadata DataFrames to dicts to save space.
+def compress_feature_metadata_columnar(tip_metadata, int_metadata, tree_index):
+    """Converts tip/internal node metadata DataFrames to a columnar format.
 
-    This is a pretty early optimization -- ideally we would use 2-D lists as
-    our final metadata structure, similar to the table / sample metadata
-    compression. This should be revisited when the tree data node-name
-    revamping has been merged in.
+    Each unique row of feature metadata is stored only once (even if multiple
+    internal nodes share a name), each column's values are
+    dictionary-encoded, and nodes point to their rows using their postorder
+    positions in the tree.
 
     Parameters
     ----------
@@ -248,6 +470,8 @@ def compress_feature_metadata(tip_metadata, int_metadata):
     int_metadata: pd.DataFrame or None
         Metadata for internal nodes. If not None, the index should describe
         node names, and the columns should describe feature metadata fields.
+    tree_index: empress.tree.TreeIndex
+        Index of the tree that the feature metadata describes.
 
     Note that the columns of tip_metadata and int_metadata should be identical,
     even if the feature metadata only describes tip or internal nodes. (In that
@@ -258,20 +482,26 @@ def compress_feature_metadata(tip_metadata, int_metadata):
 
     Returns
     -------
-    (metadata_columns, compressed_tip_metadata, compressed_int_metadata)
+    (metadata_columns, compressed_metadata)
         metadata_columns: list
             List of the feature metadata column names, all converted to
-            strings. If both input DFs are None, this will be {}.
-        compressed_tip_metadata: dict
-            Maps node names in tip_metadata to a list of feature metadata
-            values, in the same order as in metadata_columns and converted to
-            strings. If tip_metadata was empty, or if both input DFs were None,
-            this will be {}.
-        compressed_int_metadata: dict
-            Maps node names in int_metadata to a list of feature metadata
-            values, in the same order as in metadata_columns and converted to
-            strings. If int_metadata was empty, or if both input DFs were None,
-            this will be {}.
+            strings. If both input DFs are None, this will be [].
+        compressed_metadata: dict
+            Has the following keys:
+                -"row_ptr": np.ndarray of uint32. For a node with postorder
+                 position i, row_ptr[i] is 0 if the node has no feature
+                 metadata, or 1 + the index of its row of feature metadata
+                 otherwise. (row_ptr[0] is always 0, since postorder positions
+                 start at 1.) If both input DFs are None, this will be empty.
+                -"num_tip_rows": int. Rows [0, num_tip_rows) describe tips,
+                 and all subsequent rows describe internal nodes.
+                -"values": list of length len(metadata_columns). values[c] is
+                 a list of the unique values (converted to strings) in the
+                 c-th feature metadata column.
+                -"codes": list of length len(metadata_columns). codes[c] is an
+                 np.ndarray of uint32 with one entry per row: codes[c][r] is
+                 the index in values[c] of the r-th row's value for the c-th
+                 column.
 
     Raises
     ------
@@ -285,10 +515,54 @@ def compress_feature_metadata(tip_metadata, int_metadata):
     ----------
         - Inspired by redbiom and Qurro's JSON data models.
     """
-    # If the user didn't pass in any feature metadata, we'll get to this block
     if tip_metadata is None and int_metadata is None:
-        return [], {}, {}
+        return [], {
+            "row_ptr": np.zeros(0, dtype=np.uint32),
+            "num_tip_rows": 0,
+            "values": [],
+            "codes": []
+        }
 
+    _check_feature_metadata(tip_metadata, int_metadata)
+
+    fm_cols = [str(c) for c in tip_metadata.columns]
+
+    # Point every node described by the metadata to its row. We check nodes'
+    # leaf statuses so that tip metadata is only assigned to tips (and
+    # internal node metadata to internal nodes).
+    row_ptr = np.zeros(len(tree_index) + 1, dtype=np.uint32)
+    row_offset = 0
+    for md, is_tip in ((tip_metadata, True), (int_metadata, False)):
+        positions, idxs = tree_index.match_names(md.index)
+        keep = tree_index.leaf_mask[positions - 1] == is_tip
+        row_ptr[positions[keep]] = idxs[keep] + row_offset + 1
+        row_offset += len(md.index)
+
+    values = []
+    codes = []
+    for col in tip_metadata.columns:
+        col_values, col_codes = _factorize_as_str(
+            [tip_metadata[col], int_metadata[col]]
+        )
+        values.append(col_values)
+        codes.append(col_codes)
+
+    return fm_cols, {
+        "row_ptr": row_ptr,
+        "num_tip_rows": len(tip_metadata.index),
+        "values": values,
+        "codes": codes
+    }
+
+
+def _check_feature_metadata(tip_metadata, int_metadata):
+    """Validates tip/internal node metadata DataFrames before compression.
+
+    Raises
+    ------
+    ValueError
+        See compress_feature_metadata_columnar().
+    """
     # *This* should never happen. If it did, it's a sign that this function is
     # being misused. (The ^ is a logical XOR; see
     # https://stackoverflow.com/a/432844/10730311.)
@@ -306,17 +580,100 @@ def compress_feature_metadata(tip_metadata, int_metadata):
     if tip_metadata.empty and int_metadata.empty:
         raise ValueError("Both tip & int. node feature metadata are empty.")
 
-    fm_cols = [str(c) for c in tip_metadata.columns]
-    # We want dicts mapping each feature ID to a list of the f.m. values for
-    # this feature ID. Since we're not mapping feature IDs to indices first,
-    # this is pretty simple to do with DataFrame.to_dict() using the
-    # orient="list" option -- however, orient="list" uses column-major order,
-    # so we transpose the metadata DFs before calling to_dict() in order to
-    # make sure our dicts are in row-major order (i.e. feature IDs are keys).
-    #
-    # (Also, while we're at it, we make sure that both DFs' values are all
-    # converted to strings.)
-    compressed_tm = tip_metadata.astype(str).T.to_dict(orient="list")
-    compressed_im = int_metadata.astype(str).T.to_dict(orient="list")
-
-    return fm_cols, compressed_tm, compressed_im
+
+def _factorize_as_str(columns):
+    """Dictionary-encodes the values of some columns, converted to strings.
+
+    This gives the same result as converting each column to strings,
+    concatenating them, and calling pd.factorize(). However, each column is
+    factorized before its values are converted, so only its unique values
+    are converted to strings. (Categorical columns, e.g. the taxonomy levels
+    created by taxonomy_utils.split_taxonomy(), are encoded using their
+    existing codes.)
+
+    Parameters
+    ----------
+    columns: list of pd.Series
+
+    Returns
+    -------
+    (values, codes): (list, np.ndarray of uint32)
+        values is a list of the unique strings, in order of first
+        appearance; codes has one entry per value in the concatenated
+        columns, which is the index of its string in values.
+    """
+    value_to_code = {}
+    all_codes = []
+    for column in columns:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            col_codes = column.cat.codes.to_numpy().astype(np.int64)
+            col_strs = column.cat.categories.astype(str).tolist()
+            # (Missing values have a code of -1, and are converted to "nan",
+            # as astype(str) would do)
+            col_codes[col_codes < 0] = len(col_strs)
+            col_strs.append(str(np.nan))
+        else:
+            col_codes, uniques = pd.factorize(column)
+            if column.dtype == object and not all(
+                isinstance(u, str) for u in uniques
+            ):
+                # Mixed-type values that are equal but differ as strings
+                # (e.g. 1, 1.0 and True) share a code, so we have to convert
+                # all of the values first
+                col_codes, col_strs = pd.factorize(column.astype(str))
+                col_strs = list(col_strs)
+            else:
+                col_strs = pd.Series(uniques).astype(str).tolist()
+                # pd.factorize() gives missing values a code of -1, so convert
+                # them separately (since e.g. None and NaN differ as strings)
+                missing = col_codes < 0
+                if missing.any():
+                    na_codes, na_strs = pd.factorize(
+                        column[missing].astype(str)
+                    )
+                    col_codes[missing] = na_codes + len(col_strs)
+                    col_strs.extend(na_strs)
+        # Map this column's codes to codes shared by all of the columns,
+        # assigning new codes in order of first appearance. (Different codes
+        # in this column can map to the same string, e.g. 1 and "1".)
+        used, first = np.unique(col_codes, return_index=True)
+        used = used[np.argsort(first)]
+        to_shared = np.zeros(len(col_strs), dtype=np.int64)
+        to_shared[used] = [
+            value_to_code.setdefault(col_strs[c], len(value_to_code))
+            for c in used
+        ]
+        all_codes.append(to_shared[col_codes])
+    return list(value_to_code), np.concatenate(all_codes).astype(np.uint32)
+
+
+def _compress_chunked_table(table):
+    """Compresses a ChunkedTable to CSR format, one chunk at a time.
+
+    Parameters
+    ----------
+    table: empress.table.ChunkedTable
+
+    Returns
+    -------
+    dict
+        As described in compress_table() (with csr=True).
+    """
+    indptr = np.zeros(table.shape[1] + 1, dtype=np.int64)
+    indices_file = tempfile.TemporaryFile()
+    for first, last, chunk in table.iter_sample_chunks():
+        if not chunk.has_sorted_indices:
+            chunk.sort_indices()
+        indptr[first + 1:last + 1] = indptr[first] + chunk.indptr[1:]
+        chunk.indices.astype(np.uint32).tofile(indices_file)
+    indices_file.flush()
+    nnz = int(indptr[-1])
+    if nnz > 0:
+        # (The memmap keeps the temporary file open, so it's deleted once
+        # the memmap is)
+        indices = np.memmap(indices_file, dtype=np.uint32, mode='r',
+                            shape=(nnz,))
+    else:
+        indices = np.zeros(0, dtype=np.uint32)
+    indices_file.close()
+    return {"indptr": indptr.astype(np.uint32), "indices": indices}
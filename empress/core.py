@@ -6,28 +6,61 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from empress.tree import validate_tree, bp_tree_tips
+from empress.profiling import profile_stage
+from empress.table import ChunkedTable, PresenceTable
+from empress.tree import TreeIndex, validate_tree
 from empress.tools import (
     match_inputs, match_tree_and_feature_metadata,
-    shifting, filter_feature_metadata_to_tree
+    pack_bits, encode_uint32, filter_feature_metadata_to_tree, iter_json
 )
 from empress.compression_utils import (
-    remove_empty_samples_and_features, compress_table,
-    compress_sample_metadata, compress_feature_metadata
+    compress_table, compress_sample_metadata,
+    compress_feature_metadata_columnar
 )
 
-import pkg_resources
+import functools
+import hashlib
+import json
 import os
+import re
+import numpy as np
 import pandas as pd
 
-from shutil import copytree
-from emperor import Emperor
-from jinja2 import Environment, FileSystemLoader
+from shutil import copy2, copytree, rmtree
+from tempfile import mkdtemp
+from markupsafe import Markup
 
-SUPPORT_FILES = pkg_resources.resource_filename('empress', 'support_files')
+SUPPORT_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'support_files')
 TEMPLATES = os.path.join(SUPPORT_FILES, 'templates')
 EMPEROR_CALLBACK_PATH = os.path.join(SUPPORT_FILES, 'js',
                                      'emperor-callbacks.js')
+# Stands in for the output of the tojson filter when streaming a plot to a
+# file; see Empress.write(). (NUL characters are always escaped in JSON, so
+# this can't be confused with actual data.)
+JSON_PLACEHOLDER = '\x00empress-json-{}\x00'
+JSON_PLACEHOLDER_RE = re.compile('\x00empress-json-([0-9]+)\x00')
+# When writing a plot's data as sidecar files (see Empress.write()), these
+# are the fields of to_dict()'s output that are written out. Arrays are
+# written as raw little-endian binary files; the fields in
+# SIDECAR_JSON_FIELDS are written as separate JSON files; everything else is
+# stored directly in the manifest.
+SIDECAR_DIR = 'empress-data'
+SIDECAR_FIELDS = [
+    'tree', 'names', 'lengths', 's_ids', 'f_ids', 's_ids_to_indices',
+    'f_ids_to_indices', 'compressed_table', 'sample_metadata_columns',
+    'compressed_sample_metadata', 'feature_metadata_columns',
+    'split_taxonomy_columns', 'compressed_feature_metadata'
+]
+SIDECAR_JSON_FIELDS = {
+    'names', 's_ids', 'f_ids', 's_ids_to_indices', 'f_ids_to_indices',
+    'compressed_sample_metadata.values', 'compressed_feature_metadata.values'
+}
+SIDECAR_DTYPES = {
+    np.dtype('uint8'): 'uint8',
+    np.dtype('uint32'): 'uint32',
+    np.dtype('float64'): 'float64'
+}
 
 
 class Empress():
@@ -35,7 +68,8 @@ class Empress():
                  feature_metadata=None, ordination=None,
                  ignore_missing_samples=False, filter_extra_samples=False,
                  filter_missing_features=False, resource_path=None,
-                 shear_to_table=True, shear_to_feature_metadata=False):
+                 shear_to_table=True, shear_to_feature_metadata=False,
+                 profiler=None):
         """Visualize a phylogenetic tree
 
         Use this object to interactively display a phylogenetic tree using the
@@ -52,8 +86,13 @@ class Empress():
         ----------
         tree: bp.BP
             The phylogenetic tree to visualize.
-        table: biom.Table, optional
-            The matrix to visualize paired with the phylogenetic tree.
+        table: biom.Table, empress.table.PresenceTable, or
+               empress.table.ChunkedTable, optional
+            The matrix to visualize paired with the phylogenetic tree. Only
+            which features are present in which samples is used, so a
+            biom.Table is immediately converted to a PresenceTable. A
+            ChunkedTable (for tables that don't fit in memory) is kept as is,
+            and is read from its file a chunk at a time.
         sample_metadata: pd.DataFrame, optional
             DataFrame object with the metadata associated to the samples in the
             ``ordination`` object, should have an index set and it should match
@@ -89,6 +128,10 @@ class Empress():
         shear_to_table: bool, optional
             If True, shears the tree to just the tips that are present as
             features in the feature table. Otherwise, the tree is not shorn.
+        profiler: empress.profiling.Profiler, optional
+            If passed, the time and memory used by each stage of processing
+            the data here (and of writing the plot, in write() and
+            to_dict()) are recorded using this.
 
 
         Attributes
@@ -105,9 +148,12 @@ class Empress():
             Ordination matrix to visualize simultaneously with the tree.
         base_url:
             Base path to the remote resources.
+        profiler:
+            The profiler passed in, or None.
         """
 
         self.tree = tree
+        self.profiler = profiler
         # Use XOR to verify that either both or neither of the table and
         # sample metadata are None. Parens needed for precedence stuff.
         if (table is None) ^ (sample_metadata is None):
@@ -124,6 +170,13 @@ class Empress():
         else:
             self.is_community_plot = False
 
+        # Only presence / absence information is used from the table, so we
+        # convert it right away rather than carrying around its values
+        if table is not None and not isinstance(
+            table, (PresenceTable, ChunkedTable)
+        ):
+            with profile_stage(profiler, 'convert_table'):
+                table = PresenceTable.from_biom(table)
         self.table = table
 
         if sample_metadata is not None:
@@ -179,11 +232,14 @@ class Empress():
                    feature_metadata.empty):
                     feature_metadata = None
 
-            self._emperor = Emperor(
-                self.ordination, mapping_file=self.samples,
-                feature_mapping_file=feature_metadata,
-                ignore_missing_samples=ignore_missing_samples,
-                remote='./emperor-resources')
+            # Emperor is only imported when needed, since importing it is slow
+            with profile_stage(profiler, 'emperor'):
+                from emperor import Emperor
+                self._emperor = Emperor(
+                    self.ordination, mapping_file=self.samples,
+                    feature_mapping_file=feature_metadata,
+                    ignore_missing_samples=ignore_missing_samples,
+                    remote='./emperor-resources')
         else:
             self._emperor = None
 
@@ -193,56 +249,76 @@ class Empress():
                                  shear_to_table,
                                  shear_to_feature_metadata):
 
+        # Information about the tree's nodes is computed once here, and then
+        # reused by each of the steps below. Whenever the tree is sheared, we
+        # replace this with a TreeIndex for the sheared tree.
+        profiler = self.profiler
+        with profile_stage(profiler, 'tree_index'):
+            self.tree_index = TreeIndex(self.tree)
+
         if self.is_community_plot:
             # Hack to unpack long tuples: https://stackoverflow.com/q/26036143
-            (
-                self.table, self.samples, self.tip_md, self.int_md,
-                self.tax_cols
-            ) = match_inputs(
-                self.tree, self.table, self.samples, self.features,
-                self.ordination, ignore_missing_samples, filter_extra_samples,
-                filter_missing_features
-            )
-            # Remove empty samples and features from the table (and remove the
-            # removed samples from the sample metadata). We also pass in the
-            # ordination, if present, to this function -- so we can throw an
-            # error if the ordination actually contains these empty
-            # samples/features.
+            with profile_stage(profiler, 'match_inputs'):
+                (
+                    self.table, self.samples, self.tip_md, self.int_md,
+                    self.tax_cols
+                ) = match_inputs(
+                    self.tree, self.table, self.samples, self.features,
+                    self.ordination, ignore_missing_samples,
+                    filter_extra_samples, filter_missing_features,
+                    self.tree_index, remove_empty=True
+                )
+            # Note that match_inputs() also removes empty samples and features
+            # from the table (and removes the removed samples from the sample
+            # metadata). We also pass in the ordination, if present, to this
+            # function -- so we can throw an error if the ordination actually
+            # contains these empty samples/features.
             #
             # We purposefully do this removal *after* matching (so we know the
             # data inputs match up) and *before* shearing (so empty features
-            # in the table are no longer included as tips in the tree).
-            self.table, self.samples = remove_empty_samples_and_features(
-                self.table, self.samples, self.ordination
-            )
+            # in the table are no longer included as tips in the tree); the
+            # table is only filtered once, though.
             # remove unobserved features from the phylogeny (shear the tree)
             if shear_to_table:
                 features = set(self.table.ids(axis='observation'))
-                self.tree = self.tree.shear(features)
+                with profile_stage(profiler, 'shear'):
+                    self.tree = self.tree.shear(features)
+                with profile_stage(profiler, 'tree_index'):
+                    self.tree_index = TreeIndex(self.tree)
                 # Remove features in the feature metadata that are no longer
                 # present in the tree, due to being shorn off
                 if self.tip_md is not None or self.int_md is not None:
                     # (Technically they should always both be None or both be
                     # DataFrames -- there's no in-between)
-                    self.tip_md, self.int_md = filter_feature_metadata_to_tree(
-                        self.tip_md, self.int_md, self.tree
-                    )
+                    with profile_stage(profiler, 'filter_feature_metadata'):
+                        self.tip_md, self.int_md = (
+                            filter_feature_metadata_to_tree(
+                                self.tip_md, self.int_md, self.tree,
+                                self.tree_index
+                            )
+                        )
 
         else:
             if shear_to_feature_metadata:
                 features = set(self.features.index)
-                all_tips = set(bp_tree_tips(self.tree))
                 # check that feature metadata contains at least 1 tip
-                if not features.intersection(all_tips):
+                if features.isdisjoint(self.tree_index.tip_names):
                     raise ValueError(
                         "Cannot shear tree to feature metadata: no tips in "
                         "the tree are present in the feature metadata."
                     )
-                self.tree = self.tree.shear(features)
-            (
-                self.tip_md, self.int_md, self.tax_cols
-            ) = match_tree_and_feature_metadata(self.tree, self.features)
-        validate_tree(self.tree)
+                with profile_stage(profiler, 'shear'):
+                    self.tree = self.tree.shear(features)
+                with profile_stage(profiler, 'tree_index'):
+                    self.tree_index = TreeIndex(self.tree)
+            with profile_stage(profiler, 'match_feature_metadata'):
+                (
+                    self.tip_md, self.int_md, self.tax_cols
+                ) = match_tree_and_feature_metadata(
+                    self.tree, self.features, self.tree_index
+                )
+        with profile_stage(profiler, 'validate_tree'):
+            validate_tree(self.tree, self.tree_index)
 
     def copy_support_files(self, target=None):
         """Copies the support files to a target directory
@@ -266,6 +342,61 @@ class Empress():
             self._emperor.copy_support_files(os.path.join(target,
                                                           'emperor-resources'))
 
+    def use_shared_support_files(self, shared_dir, target, hardlink=False):
+        """Stores the support files in a directory shared between plots
+
+        This is an alternative to ``copy_support_files`` for when many plots
+        are being created. The support files (and Emperor's support files, if
+        an ordination is included) are copied into ``shared_dir`` once, in a
+        subdirectory named after a hash of their contents (e.g.
+        ``empress-<hash>``). Later calls, including from other processes, find
+        this subdirectory already present and don't copy anything.
+
+        Parameters
+        ----------
+        shared_dir : str
+            The directory to store the support files in. This is created if
+            it doesn't already exist.
+        target : str
+            The directory the plot will be written to.
+        hardlink : bool, optional
+            If False (the default), ``self.base_url`` (and Emperor's base URL)
+            are set to point to the shared support files, using paths relative
+            to ``target``; so the plot will only work as long as it can reach
+            ``shared_dir``. If True, the shared support files are instead
+            hardlinked into ``target`` (where ``copy_support_files`` would
+            have copied them), which gives ``target`` an independent copy
+            without duplicating the files on disk. Files are copied if
+            hardlinking them fails (e.g. if ``shared_dir`` is on a different
+            filesystem than ``target``).
+
+        Notes
+        -----
+        This should be called before the plot is rendered, since it can
+        change ``self.base_url``. If ``target`` will be packaged on its own
+        (e.g. as a QIIME 2 visualization), ``hardlink`` should be True.
+        """
+        support_dirs = [
+            (_get_shared_copy(SUPPORT_FILES, shared_dir, 'empress'),
+             'support_files', self)
+        ]
+        if self._emperor is not None:
+            from emperor.util import get_emperor_support_files_dir
+            support_dirs.append(
+                (_get_shared_copy(get_emperor_support_files_dir(), shared_dir,
+                                  'emperor'),
+                 'emperor-resources', self._emperor)
+            )
+
+        for shared_copy, local_name, owner in support_dirs:
+            if hardlink:
+                copytree(shared_copy, os.path.join(target, local_name),
+                         copy_function=_link_or_copy)
+            else:
+                owner.base_url = os.path.relpath(
+                    shared_copy, target
+                ).replace(os.sep, '/')
+
     def __str__(self):
         return self.make_empress()
 
@@ -298,13 +429,101 @@ class Empress():
 
         return plot
 
-    def to_dict(self):
+    def write(self, path, chunk_size=10000, sidecar=False):
+        """Write an empress plot to a file, without building it in memory
+
+        This produces the same file as writing the output of
+        ``make_empress`` would. However, the plot is written to the file as
+        it is rendered (using Jinja's ``generate``), and each piece of data
+        in the plot is encoded as JSON in chunks (using
+        ``empress.tools.iter_json``). This way, the full plot -- and the full
+        JSON representation of any of the data in it -- is never held in
+        memory at once.
+
+        Parameters
+        ----------
+        path : str
+            The path of the HTML file to write.
+        chunk_size : int, optional
+            The maximum number of list elements to encode as JSON at once.
+        sidecar : bool, optional
+            If True, the plot's data (the tree, node names and lengths,
+            feature table, and sample / feature metadata) will not be
+            included in the HTML file. Instead, it'll be written to separate
+            "sidecar" files in a directory named ``empress-data`` next to the
+            HTML file: arrays are written as raw binary files, which the
+            browser loads directly into typed arrays, and a JSON manifest
+            describes how to put everything back together. (Since the
+            browser loads these files using ``fetch``, a plot written this
+            way needs to be viewed through a web server -- e.g. QIIME 2 View,
+            or ``python -m http.server``.)
+
+        Notes
+        -----
+        As with ``make_empress``, you will need to call
+        ``copy_support_files`` to be able to view the written plot.
+
+        See Also
+        --------
+        empress.core.Empress.make_empress
+        empress.core.Empress.copy_support_files
+        """
+        # Rather than encoding the data passed to the tojson filter all at
+        # once, we just output a placeholder for each value here -- and then
+        # replace these placeholders with the actual JSON as we write out the
+        # plot.
+        json_values = []
+
+        def json_placeholder(value):
+            json_values.append(value)
+            return Markup(JSON_PLACEHOLDER.format(len(json_values) - 1))
+
+        main_template = self._get_template(json_filter=json_placeholder)
+        if sidecar:
+            data = self.to_dict(binary_arrays=True)
+            with profile_stage(self.profiler, 'write_sidecar'):
+                data_dir = os.path.join(os.path.dirname(path), SIDECAR_DIR)
+                os.makedirs(data_dir, exist_ok=True)
+                manifest = {
+                    field: _write_sidecar(data.pop(field), field, data_dir)
+                    for field in SIDECAR_FIELDS
+                }
+                with open(os.path.join(data_dir, 'manifest.json'), 'w') as f:
+                    json.dump(manifest, f)
+            data['sidecar_manifest'] = SIDECAR_DIR + '/manifest.json'
+        else:
+            data = self.to_dict()
+
+        with profile_stage(self.profiler, 'render'), \
+                open(path, 'w') as htmlfile:
+            for text in main_template.generate(data):
+                start = 0
+                for match in JSON_PLACEHOLDER_RE.finditer(text):
+                    htmlfile.write(text[start:match.start()])
+                    value_idx = int(match.group(1))
+                    for chunk in iter_json(json_values[value_idx], chunk_size):
+                        htmlfile.write(chunk)
+                    # Let go of this value, since it's been written out
+                    json_values[value_idx] = None
+                    start = match.end()
+                htmlfile.write(text[start:])
+
+    def to_dict(self, binary_arrays=False):
         """Convert processed data into a dictionary
 
         Warning: the object returned by to_dict will contain references to
         internal variables. Exercise caution if modifying the value of objects
         returned by to_dict.
 
+        Parameters
+        ----------
+        binary_arrays : bool, optional
+            If True, the tree structure (as packed bits), node lengths,
+            feature table, and sample / feature metadata codes will be left
+            as numpy arrays (of uint8, float64, and uint32), rather than
+            being converted to base64 strings or lists. This is used when
+            writing these arrays to sidecar files; see ``write``.
+
         Returns
         -------
         dict
@@ -312,56 +531,67 @@ class Empress():
             object and the sample + feature metadata.
         """
 
+        with profile_stage(self.profiler, 'to_dict'):
+            return self._to_dict(binary_arrays)
+
+    def _to_dict(self, binary_arrays):
+        profiler = self.profiler
+        # Sidecar files store the same bytes that would otherwise be
+        # base64-encoded
+        as_base64 = not binary_arrays
+
+        def encode(arr):
+            return encode_uint32(arr, as_base64=as_base64)
+
         s_ids = f_ids = cmp_table = sm_cols = compressed_sm = None
         sid2idxs = fid2idxs = {}
         if self.is_community_plot:
-            # The fid2idxs dict we get from compress_table() is temporary --
-            # later, we'll restructure it so that the keys (feature IDs) are
-            # nodes' postorder positions in the tree rather than arbitrary
-            # unique integers. (TODO: it should be possible to speed this up by
-            # passing the tree to compress_table() so postorder positions can
-            # immediately be used as keys / feature IDs without an intermediate
-            # step.)
-            s_ids, f_ids, sid2idxs, fid2idxs_t, cmp_table = compress_table(
-                self.table
-            )
-            sm_cols, compressed_sm = compress_sample_metadata(
-                sid2idxs, self.samples
+            # Features are identified by their nodes' postorder positions in
+            # the tree, rather than by their IDs in the table. The table's
+            # CSR arrays are passed to the JS as base64-encoded bytes.
+            with profile_stage(profiler, 'compress_table'):
+                s_ids, f_ids, sid2idxs, fid2idxs, csr_table = compress_table(
+                    self.table, self.tree_index, csr=True
+                )
+                cmp_table = {
+                    "indptr": encode(csr_table["indptr"]),
+                    "indices": encode(csr_table["indices"])
+                }
+            with profile_stage(profiler, 'compress_sample_metadata'):
+                sm_cols, cat_sm = compress_sample_metadata(
+                    sid2idxs, self.samples, categorical=True
+                )
+                compressed_sm = {
+                    "values": cat_sm["values"],
+                    "codes": [encode(c) for c in cat_sm["codes"]]
+                }
+        # Feature metadata rows are stored once each (even for internal
+        # nodes with duplicate names), and nodes point to their rows by their
+        # postorder positions
+        with profile_stage(profiler, 'compress_feature_metadata'):
+            fm_cols, columnar_fm = compress_feature_metadata_columnar(
+                self.tip_md, self.int_md, self.tree_index
             )
-        fm_cols, compressed_tm_tmp, compressed_im_tmp = \
-            compress_feature_metadata(self.tip_md, self.int_md)
+            compressed_fm = {
+                "row_ptr": encode(columnar_fm["row_ptr"]),
+                "num_tip_rows": columnar_fm["num_tip_rows"],
+                "values": columnar_fm["values"],
+                "codes": [encode(c) for c in columnar_fm["codes"]]
+            }
 
-        # Use nodes' postorder positions as their "IDs" for the BIOM table and
-        # feature metadata
-        compressed_tm = {}
-        compressed_im = {}
         # bptree indices start at one, hence we pad the arrays
-        names = [-1]
-        lengths = [-1]
-        for i in range(1, len(self.tree) + 1):
-            node = self.tree.postorderselect(i)
-            name = self.tree.name(node)
-
-            names.append(name)
-            lengths.append(self.tree.length(node))
-
-            if self.is_community_plot and name in fid2idxs_t:
-                fid2idxs[i] = fid2idxs_t[name]
-                f_ids[fid2idxs[i]] = i
-
-            if name in compressed_tm_tmp:
-                compressed_tm[i] = compressed_tm_tmp[name]
-
-            # Note: for internal metadata, node names may not be unique. Thus,
-            # we duplicate the internal node metadata for each node in the
-            # metadata with the same name.
-            if name in compressed_im_tmp:
-                compressed_im[i] = compressed_im_tmp[name]
+        with profile_stage(profiler, 'compress_tree'):
+            names = [-1] + self.tree_index.names.tolist()
+            tree = pack_bits(self.tree.B, as_base64=as_base64)
+            if binary_arrays:
+                lengths = np.concatenate(([-1.0], self.tree_index.lengths))
+            else:
+                lengths = [-1] + self.tree_index.lengths.tolist()
 
         data_to_render = {
             'base_url': self.base_url,
             # tree info
-            'tree': shifting(self.tree.B),
+            'tree': tree,
             'lengths': lengths,
             'names': names,
             # Should we show sample metadata coloring / animation panels?
@@ -380,8 +610,7 @@ class Empress():
             # feature metadata
             'feature_metadata_columns': fm_cols,
             'split_taxonomy_columns': self.tax_cols,
-            'compressed_tip_metadata': compressed_tm,
-            'compressed_int_metadata': compressed_im,
+            'compressed_feature_metadata': compressed_fm,
             # Emperor integration
             'emperor_div': '',
             'emperor_require_logic': '',
@@ -391,11 +620,12 @@ class Empress():
         }
 
         if self._emperor is not None:
-            data_to_render.update(self._scavenge_emperor())
+            with profile_stage(profiler, 'emperor'):
+                data_to_render.update(self._scavenge_emperor())
 
         return data_to_render
 
-    def _get_template(self, standalone=False):
+    def _get_template(self, standalone=False, json_filter=None):
         """Get the jinja template object
 
         Parameters
@@ -403,6 +633,9 @@ class Empress():
         standalone: bool, optional
             Whether or not the generated plot will load resources locally
             (``True``), or from a specified URL (``False``).
+        json_filter: function, optional
+            If specified, this will be used as the template's tojson filter
+            (instead of Jinja's default tojson filter).
 
         Returns
         -------
@@ -410,8 +643,12 @@ class Empress():
             Template where the plot is created.
         """
 
+        from jinja2 import Environment, FileSystemLoader
+
         # based on: http://stackoverflow.com/a/6196098
         env = Environment(loader=FileSystemLoader(TEMPLATES))
+        if json_filter is not None:
+            env.filters['tojson'] = json_filter
         return env.get_template('empress-template.html')
 
     def _scavenge_emperor(self):
@@ -445,3 +682,128 @@ class Empress():
         }
 
         return emperor_data
+
+
+def _write_sidecar(value, name, data_dir):
+    """Writes (part of) a field of a plot's data to sidecar files.
+
+    Parameters
+    ----------
+    value : object
+        The value of a field in the output of Empress.to_dict(binary_arrays=
+        True), or a value nested within it.
+    name : str
+        The name of this value: e.g. "lengths", or
+        "compressed_feature_metadata.codes.0". This is used to name the
+        sidecar file(s) written.
+    data_dir : str
+        The directory to write sidecar files to.
+
+    Returns
+    -------
+    object
+        The value to store in the manifest in place of this value. Each array
+        (or field in SIDECAR_JSON_FIELDS) is replaced with an Object
+        describing the sidecar file it was written to: {"$sidecar": filename,
+        "dtype": dtype} for arrays, and {"$sidecar": filename} for JSON.
+    """
+    if isinstance(value, np.ndarray):
+        filename = name + '.bin'
+        dtype = SIDECAR_DTYPES[value.dtype]
+        value.astype(value.dtype.newbyteorder('<'), copy=False).tofile(
+            os.path.join(data_dir, filename)
+        )
+        return {'$sidecar': filename, 'dtype': dtype}
+    elif name in SIDECAR_JSON_FIELDS:
+        filename = name + '.json'
+        with open(os.path.join(data_dir, filename), 'w') as f:
+            json.dump(value, f)
+        return {'$sidecar': filename}
+    elif isinstance(value, dict):
+        return {
+            k: _write_sidecar(v, '{}.{}'.format(name, k), data_dir)
+            for k, v in value.items()
+        }
+    elif isinstance(value, list):
+        return [
+            _write_sidecar(v, '{}.{}'.format(name, i), data_dir)
+            for i, v in enumerate(value)
+        ]
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_directory(path):
+    """Computes a hash of the contents of a directory.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    str
+        The first 16 hex digits of a SHA-256 hash of the relative paths and
+        contents of all files in the directory. (This is cached, since the
+        directories we hash are the installed support files, which don't
+        change while empress is running.)
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        # os.walk() doesn't guarantee any order
+        dirs.sort()
+        for filename in sorted(files):
+            filepath = os.path.join(root, filename)
+            relpath = os.path.relpath(filepath, path).replace(os.sep, '/')
+            digest.update(relpath.encode('utf-8') + b'\0')
+            with open(filepath, 'rb') as f:
+                for block in iter(functools.partial(f.read, 1 << 20), b''):
+                    digest.update(block)
+            digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def _get_shared_copy(source, shared_dir, prefix):
+    """Ensures that a copy of a directory exists in a shared directory.
+
+    Parameters
+    ----------
+    source : str
+        The directory to copy.
+    shared_dir : str
+        The directory to store the copy in.
+    prefix : str
+        The copy is named "<prefix>-<hash of the contents of source>".
+
+    Returns
+    -------
+    str
+        The path to the copy. If this already existed, nothing is copied.
+    """
+    dest = os.path.join(shared_dir,
+                        '{}-{}'.format(prefix, _hash_directory(source)))
+    if not os.path.isdir(dest):
+        os.makedirs(shared_dir, exist_ok=True)
+        # Copy to a temporary directory and rename it into place, so that
+        # other processes never see a partial copy
+        tmp_dir = mkdtemp(dir=shared_dir, prefix='.' + prefix + '-')
+        try:
+            tmp_copy = os.path.join(tmp_dir, 'copy')
+            copytree(source, tmp_copy)
+            try:
+                os.rename(tmp_copy, dest)
+            except OSError:
+                # Another process created dest after we checked for it
+                if not os.path.isdir(dest):
+                    raise
+        finally:
+            rmtree(tmp_dir, ignore_errors=True)
+    return dest
+
+
+def _link_or_copy(src, dst):
+    """Hardlinks a file, or copies it if it can't be hardlinked."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        copy2(src, dst)
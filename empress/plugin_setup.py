@@ -18,8 +18,12 @@ from q2_types.feature_table import (
 )
 from q2_types.ordination import PCoAResults
 
-import pkg_resources
-__version__ = pkg_resources.get_distribution('empress').version  # noqa
+try:
+    from importlib.metadata import version
+except ImportError:
+    # Python < 3.8
+    from importlib_metadata import version
+__version__ = version('empress')  # noqa
 
 plugin = Plugin(
     name='empress',
@@ -0,0 +1,230 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2020, empress development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # (The resource module isn't available on Windows)
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# tracemalloc.reset_peak() was added in Python 3.9
+_CAN_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+PROFILE_JSON = 'empress-profile.json'
+PROFILE_CPROFILE = 'empress-profile.prof'
+
+
+class Profiler():
+    def __init__(self, cprofile=False, trace_python_allocations=False):
+        """Records the time and memory used by each stage of making a plot.
+
+        Stages are recorded using stage(), which can be nested: e.g. the
+        "compress_table" stage within the "to_dict" stage is recorded as
+        "to_dict/compress_table". Stages are listed in the order they
+        started in.
+
+        Parameters
+        ----------
+        cprofile : bool, optional
+            If True, everything done within a stage is also profiled using
+            cProfile, and write() also writes the cProfile stats (which can
+            be viewed as a flame graph using e.g. snakeviz).
+        trace_python_allocations : bool, optional
+            If True, the memory allocated by Python within each stage is also
+            traced using tracemalloc. This is more detailed than the resident
+            set size, but slows down allocation-heavy code considerably, so
+            the stages' times are less accurate.
+
+        Attributes
+        ----------
+        stages : list of dict
+            One dict per stage, with the keys "name", "wall_time" and
+            "cpu_time" (in seconds), and "rss_before", "rss_after" and
+            "peak_rss" (in bytes): the process's resident set size when the
+            stage started and ended, and its peak resident set size so far
+            when the stage ended. (These are None if the platform doesn't
+            support measuring them.)
+            If trace_python_allocations is True, each dict also has the keys
+            "memory_increase" and "peak_memory_increase" (in bytes), relative
+            to the memory allocated when the stage started: the former is how
+            much more is allocated when the stage ends, and the latter is how
+            much more was allocated at the stage's peak. (The latter is None
+            before Python 3.9, which added tracemalloc.reset_peak().)
+        """
+        self.stages = []
+        self._names = []
+        # The highest traced memory usage seen so far in each ongoing stage
+        self._peaks = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._trace = trace_python_allocations
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Records a stage: use this as ``with profiler.stage("name"):``.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        """
+        self._names.append(name)
+        record = {'name': '/'.join(self._names)}
+        self.stages.append(record)
+        if self._cprofile is not None and len(self._names) == 1:
+            self._cprofile.enable()
+        started_tracing = self._trace and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self._trace:
+            self._update_peaks()
+            start_memory = tracemalloc.get_traced_memory()[0]
+            self._peaks.append(start_memory)
+        record['rss_before'] = _current_rss()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record['wall_time'] = time.perf_counter() - start_wall
+            record['cpu_time'] = time.process_time() - start_cpu
+            record['rss_after'] = _current_rss()
+            record['peak_rss'] = _max_known(_peak_rss(), record['rss_after'])
+            if self._trace:
+                self._update_peaks()
+                peak_memory = self._peaks.pop()
+                record['memory_increase'] = (
+                    tracemalloc.get_traced_memory()[0] - start_memory
+                )
+                record['peak_memory_increase'] = (
+                    peak_memory - start_memory if _CAN_RESET_PEAK else None
+                )
+            if started_tracing:
+                tracemalloc.stop()
+            if self._cprofile is not None and len(self._names) == 1:
+                self._cprofile.disable()
+            self._names.pop()
+
+    def _update_peaks(self):
+        """Updates the ongoing stages' peak traced memory usage, and resets
+        tracemalloc's peak so that the next stage's peak can be measured.
+        """
+        if not _CAN_RESET_PEAK:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        self._peaks = [max(p, peak) for p in self._peaks]
+        tracemalloc.reset_peak()
+
+    def report(self):
+        """Summarizes the recorded stages.
+
+        Returns
+        -------
+        dict
+            Has the keys "stages" (see the stages attribute), "total_wall_time"
+            and "total_cpu_time" (summed over the top-level stages), and
+            "peak_rss" (the process's peak resident set size so far, in
+            bytes, or None if the platform doesn't support measuring it).
+        """
+        top_level = [s for s in self.stages if '/' not in s['name']]
+        return {
+            'stages': self.stages,
+            'total_wall_time': sum(s.get('wall_time', 0) for s in top_level),
+            'total_cpu_time': sum(s.get('cpu_time', 0) for s in top_level),
+            'peak_rss': _max_known(_peak_rss(), _current_rss())
+        }
+
+    def write(self, output_dir):
+        """Writes the report (and cProfile stats, if recorded) to a directory.
+
+        The report is written as JSON to empress-profile.json, and the
+        cProfile stats are written to empress-profile.prof.
+
+        Parameters
+        ----------
+        output_dir : str
+        """
+        with open(os.path.join(output_dir, PROFILE_JSON), 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(
+                os.path.join(output_dir, PROFILE_CPROFILE)
+            )
+
+
+def profile_stage(profiler, name):
+    """Records a stage using a Profiler, if one is given.
+
+    Parameters
+    ----------
+    profiler : Profiler or None
+    name : str
+
+    Returns
+    -------
+    context manager
+        profiler.stage(name), or a context manager that does nothing if
+        profiler is None.
+    """
+    if profiler is None:
+        return _no_stage()
+    return profiler.stage(name)
+
+
+@contextlib.contextmanager
+def _no_stage():
+    # (contextlib.nullcontext() isn't available in Python 3.6)
+    yield
+
+
+def _peak_rss():
+    """Returns the peak resident set size of this process, in bytes.
+
+    Returns None if this can't be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # (ru_maxrss is in bytes on macOS, and in kilobytes elsewhere)
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss():
+    """Returns the current resident set size of this process, in bytes.
+
+    This uses psutil if it's installed, and otherwise /proc/self/statm
+    (which is only available on Linux). Returns None if this can't be
+    measured on this platform.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _max_known(*values):
+    # (The kernel only updates the peak resident set size now and then, so it
+    # can be slightly lower than the current resident set size)
+    known = [v for v in values if v is not None]
+    return max(known) if known else None
@@ -1,13 +1,12 @@
 import os
 
-from biom import load_table
 import click
-import pandas as pd
-from skbio.stats.ordination import OrdinationResults
 
-from empress.core import Empress
 import empress._parameter_descriptions as desc
-from empress._plot_utils import save_viz, prepare_pcoa, check_and_process_files
+
+# Everything else (including empress.core) is imported within the commands
+# that need it, so that e.g. "empress --help" doesn't have to wait for
+# pandas, scikit-bio, etc. to be imported.
 
 
 @click.group()
@@ -30,22 +29,54 @@ CTXSETS = {"help_option_names": ["-h", "--help"]}
               help=desc.FM_DESC)
 @click.option("--shear-to-feature-metadata", required=False, default=False,
               help=desc.SHEAR_TO_FM, is_flag=True)
+@click.option("--sidecar", required=False, default=False,
+              help=desc.SIDECAR, is_flag=True)
+@click.option("--shared-support-dir", required=False, default=None,
+              help=desc.SHARED_SUPPORT_DIR)
+@click.option("--hardlink-support-files", required=False, default=False,
+              help=desc.HARDLINK_SUPPORT_FILES, is_flag=True)
+@click.option("--tree-cache-dir", required=False, default=None,
+              help=desc.TREE_CACHE_DIR)
+@click.option("--profile", required=False, default=False,
+              help=desc.PROFILE, is_flag=True)
+@click.option("--cprofile", required=False, default=False,
+              help=desc.CPROFILE, is_flag=True)
+@click.option("--trace-python-allocations", required=False, default=False,
+              help=desc.TRACE_PYTHON_ALLOCATIONS, is_flag=True)
 def tree_plot(
     tree: str,
     output_dir: str,
     feature_metadata: str,
     shear_to_feature_metadata: bool,
+    sidecar: bool,
+    shared_support_dir: str,
+    hardlink_support_files: bool,
+    tree_cache_dir: str,
+    profile: bool,
+    cprofile: bool,
+    trace_python_allocations: bool,
 ) -> None:
+    from empress.core import Empress
+    from empress.profiling import profile_stage
+    from empress._plot_utils import save_viz, check_and_process_files
+
+    profiler = _get_profiler(profile, cprofile, trace_python_allocations)
     tree_newick, fm = check_and_process_files(
         output_dir,
         tree,
-        feature_metadata
+        feature_metadata,
+        tree_cache_dir=tree_cache_dir,
+        profiler=profiler
     )
 
-    viz = Empress(tree_newick, feature_metadata=fm,
-                  shear_to_feature_metadata=shear_to_feature_metadata)
+    with profile_stage(profiler, 'init'):
+        viz = Empress(tree_newick, feature_metadata=fm,
+                      shear_to_feature_metadata=shear_to_feature_metadata,
+                      profiler=profiler)
     os.makedirs(output_dir)
-    save_viz(viz, output_dir, q2=False)
+    save_viz(viz, output_dir, q2=False, sidecar=sidecar,
+             shared_support_dir=shared_support_dir,
+             hardlink_support_files=hardlink_support_files)
 
 
 @empress.command(
@@ -68,6 +99,22 @@ def tree_plot(
               help=desc.NUM_FEAT)
 @click.option("--shear-to-table", required=False, default=True,
               help=desc.SHEAR_TO_TBL, is_flag=True)
+@click.option("--sidecar", required=False, default=False,
+              help=desc.SIDECAR, is_flag=True)
+@click.option("--shared-support-dir", required=False, default=None,
+              help=desc.SHARED_SUPPORT_DIR)
+@click.option("--hardlink-support-files", required=False, default=False,
+              help=desc.HARDLINK_SUPPORT_FILES, is_flag=True)
+@click.option("--tree-cache-dir", required=False, default=None,
+              help=desc.TREE_CACHE_DIR)
+@click.option("--profile", required=False, default=False,
+              help=desc.PROFILE, is_flag=True)
+@click.option("--cprofile", required=False, default=False,
+              help=desc.CPROFILE, is_flag=True)
+@click.option("--trace-python-allocations", required=False, default=False,
+              help=desc.TRACE_PYTHON_ALLOCATIONS, is_flag=True)
+@click.option("--chunked-table", required=False, default=False,
+              help=desc.CHUNKED_TABLE, is_flag=True)
 def community_plot(
     tree: str,
     table: str,
@@ -80,32 +127,78 @@ def community_plot(
     filter_missing_features: bool,
     number_of_pcoa_features: int,
     shear_to_table: bool,
+    sidecar: bool,
+    shared_support_dir: str,
+    hardlink_support_files: bool,
+    tree_cache_dir: str,
+    chunked_table: bool,
+    profile: bool,
+    cprofile: bool,
+    trace_python_allocations: bool,
 ) -> None:
+    import pandas as pd
+    from empress.core import Empress
+    from empress.profiling import profile_stage
+    from empress._plot_utils import (
+        save_viz, prepare_pcoa, check_and_process_files, load_table
+    )
+
+    profiler = _get_profiler(profile, cprofile, trace_python_allocations)
     tree_newick, fm = check_and_process_files(
         output_dir,
         tree,
-        feature_metadata
+        feature_metadata,
+        tree_cache_dir=tree_cache_dir,
+        profiler=profiler
     )
-    table = load_table(table)
-    sample_metadata = pd.read_csv(sample_metadata, sep="\t", index_col=0)
+    with profile_stage(profiler, 'read_sample_metadata'):
+        sample_metadata = pd.read_csv(sample_metadata, sep="\t", index_col=0)
 
     if pcoa is not None:
-        pcoa = OrdinationResults.read(pcoa)
-        pcoa = prepare_pcoa(pcoa, number_of_pcoa_features)
-
-    viz = Empress(
-        tree_newick,
-        table=table,
-        sample_metadata=sample_metadata,
-        feature_metadata=fm,
-        ordination=pcoa,
-        ignore_missing_samples=ignore_missing_samples,
-        filter_extra_samples=filter_extra_samples,
-        filter_missing_features=filter_missing_features,
-        shear_to_table=shear_to_table,
-    )
+        with profile_stage(profiler, 'read_ordination'):
+            from skbio.stats.ordination import OrdinationResults
+            pcoa = OrdinationResults.read(pcoa)
+            pcoa = prepare_pcoa(pcoa, number_of_pcoa_features)
+
+    # The ordination is read before the table, so that samples which would
+    # be filtered out of the table (and features not in the tree) don't
+    # have to be loaded at all
+    with profile_stage(profiler, 'read_table'):
+        table = load_table(
+            table,
+            tree_newick,
+            ordination=pcoa,
+            filter_missing_features=filter_missing_features,
+            filter_extra_samples=filter_extra_samples,
+            chunked=chunked_table,
+        )
+
+    with profile_stage(profiler, 'init'):
+        viz = Empress(
+            tree_newick,
+            table=table,
+            sample_metadata=sample_metadata,
+            feature_metadata=fm,
+            ordination=pcoa,
+            ignore_missing_samples=ignore_missing_samples,
+            filter_extra_samples=filter_extra_samples,
+            filter_missing_features=filter_missing_features,
+            shear_to_table=shear_to_table,
+            profiler=profiler,
+        )
     os.makedirs(output_dir)
-    save_viz(viz, output_dir, q2=False)
+    save_viz(viz, output_dir, q2=False, sidecar=sidecar,
+             shared_support_dir=shared_support_dir,
+             hardlink_support_files=hardlink_support_files)
+
+
+def _get_profiler(profile, cprofile, trace_python_allocations):
+    if not (profile or cprofile or trace_python_allocations):
+        return None
+    from empress.profiling import Profiler
+    return Profiler(
+        cprofile=cprofile, trace_python_allocations=trace_python_allocations
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-define(["underscore", "util"], function (_, util) {
+define(["underscore", "util", "ByteArray"], function (_, util, ByteArray) {
     /**
      * @class BIOMTable
      *
@@ -11,18 +11,43 @@ define(["underscore", "util"], function (_, util) {
      *                        their 0-based indices in sIDs.
      * @param{Object} fID2Idx Mapping of feature IDs (the values in fIDs) to
      *                        their 0-based indices in fIDs.
-     * @param{Array} tbl Two-dimensional array where the outermost layer has
-     *                   the same length as sIDs. Each position i within tbl
-     *                   contains an "inner list" of arbitrary (but in the
-     *                   range [1, fIDs.length]) length, containing the fIDs
-     *                   indices of the features present within the sample
-     *                   in sIDs at index i.
+     * @param{Array|Object} tbl Either a two-dimensional array or an Object
+     *                   describing the table in compressed sparse row (CSR)
+     *                   format.
+     *                   If this is an array, the outermost layer has the same
+     *                   length as sIDs. Each position i within tbl contains an
+     *                   "inner list" of arbitrary (but in the range
+     *                   [1, fIDs.length]) length, containing the fIDs indices
+     *                   of the features present within the sample in sIDs at
+     *                   index i.
+     *                   If this is an Object, it should have "indptr" and
+     *                   "indices" keys. These can be Uint32Arrays or
+     *                   base64-encoded strings of 32-bit unsigned integers
+     *                   (as produced by tools.encode_uint32() in the Python
+     *                   code). The fIDs indices of the features present
+     *                   within the sample in sIDs at index i are
+     *                   indices[indptr[i]] through indices[indptr[i + 1] - 1].
+     *                   Either way, the table is stored internally in CSR
+     *                   format.
      * @param{Array} smCols Array of sample metadata column names.
-     * @param{Array} sm Two-dimensional array where the outermost layer has the
+     * @param{Array|Object} sm Either a two-dimensional array or an Object
+     *                  describing the sample metadata in a dictionary-encoded
+     *                  (columnar) format.
+     *                  If this is an array, the outermost layer has the
      *                  same length as sIDs. Each position i within sm contains
      *                  an "inner list" of length smCols.length, and sm[i][c]
      *                  refers to the c-th sample metadata column (in smCols)'s
      *                  value for the i-th sample (in sIDs).
+     *                  If this is an Object, it should have "values" and
+     *                  "codes" keys, each of which maps to an Array of length
+     *                  smCols.length. values[c] is an Array of the unique
+     *                  values in the c-th sample metadata column. codes[c] is
+     *                  a Uint32Array (or a base64-encoded string of 32-bit
+     *                  unsigned integers) of length sIDs.length, where
+     *                  codes[c][i] is the index in values[c] of the i-th
+     *                  sample's value for the c-th column.
+     *                  Either way, the sample metadata is stored internally in
+     *                  the dictionary-encoded format.
      *
      * @return {BIOMTable}
      * constructs BIOMTable
@@ -37,22 +62,27 @@ define(["underscore", "util"], function (_, util) {
         // length checking) and where things have a reasonable chance of
         // getting messed up (e.g. checking that feature indices in the table
         // are sorted)
-        if (sIDs.length !== tbl.length) {
+        var csr = BIOMTable.toCSR(tbl);
+        var indptr = csr.indptr;
+        var indices = csr.indices;
+        if (sIDs.length !== indptr.length - 1) {
             throw new Error("Sample IDs and table are uneven lengths.");
-        } else if (sIDs.length !== sm.length) {
+        } else if (_.isArray(sm) && sIDs.length !== sm.length) {
             throw new Error("Sample IDs and metadata are uneven lengths.");
         } else if (sIDs.length !== _.size(sID2Idx)) {
             throw new Error("Sample IDs and ID -> index are uneven lengths.");
         } else if (fIDs.length !== _.size(fID2Idx)) {
             throw new Error("Feature IDs and ID -> index are uneven lengths.");
         }
-        _.each(tbl, function (presentFeatureIndices, sIdx) {
-            if (presentFeatureIndices.length === 0) {
+        var sIdx, j, numSampleFeatures;
+        for (sIdx = 0; sIdx < sIDs.length; sIdx++) {
+            numSampleFeatures = indptr[sIdx + 1] - indptr[sIdx];
+            if (numSampleFeatures <= 0) {
                 // Empty samples should have been removed in python
                 throw new Error(
                     'Sample at index "' + sIdx + '" has no features.'
                 );
-            } else if (presentFeatureIndices.length > fIDs.length) {
+            } else if (numSampleFeatures > fIDs.length) {
                 throw new Error(
                     'Sample at index "' +
                         sIdx +
@@ -63,29 +93,42 @@ define(["underscore", "util"], function (_, util) {
             // Verify that the entries of each sample in the table are in
             // strictly increasing order. We rely on this so that we can use
             // binary search when checking if a feature is in a sample.
-            var prev;
-            _.each(presentFeatureIndices, function (i) {
-                if (_.isUndefined(prev)) {
-                    prev = i;
-                } else {
-                    if (i <= prev) {
-                        throw new Error(
-                            'Sample at index "' +
-                                sIdx +
-                                '" has ' +
-                                "non-strictly-increasing feature indices in table."
-                        );
-                    }
+            for (j = indptr[sIdx] + 1; j < indptr[sIdx + 1]; j++) {
+                if (indices[j] <= indices[j - 1]) {
+                    throw new Error(
+                        'Sample at index "' +
+                            sIdx +
+                            '" has ' +
+                            "non-strictly-increasing feature indices in table."
+                    );
                 }
-            });
-        });
+            }
+        }
         this._sIDs = sIDs;
         this._fIDs = fIDs;
         this._sID2Idx = sID2Idx;
         this._fID2Idx = fID2Idx;
-        this._tbl = tbl;
+        this._indptr = indptr;
+        this._indices = indices;
         this._smCols = smCols;
-        this._sm = sm;
+
+        var catSM = BIOMTable.toCategoricalMetadata(sm, smCols.length);
+        _.each(catSM.codes, function (codes) {
+            if (codes.length !== sIDs.length) {
+                throw new Error("Sample IDs and metadata are uneven lengths.");
+            }
+        });
+        /**
+         * The unique values of each sample metadata column.
+         * @ type {Array}
+         */
+        this._smValues = catSM.values;
+        /**
+         * For each sample metadata column, a Uint32Array mapping each sample
+         * index to the index of its value in this._smValues.
+         * @ type {Array}
+         */
+        this._smCodes = catSM.codes;
 
         /**
          * A set of feature IDs to ignore. This will be updated whenever
@@ -96,6 +139,82 @@ define(["underscore", "util"], function (_, util) {
         this.ignorefIdx = new Set();
     }
 
+    /**
+     * Converts a table to compressed sparse row (CSR) format.
+     *
+     * @param{Array|Object} tbl Table, as described in the BIOMTable
+     *                          constructor's documentation.
+     *
+     * @return {Object} Object with "indptr" and "indices" keys, each of which
+     *                  maps to a Uint32Array.
+     */
+    BIOMTable.toCSR = function (tbl) {
+        if (!_.isArray(tbl)) {
+            var decode = function (arr) {
+                if (_.isString(arr)) {
+                    return ByteArray.decodeUint32Array(arr);
+                }
+                return arr;
+            };
+            return {
+                indptr: decode(tbl.indptr),
+                indices: decode(tbl.indices),
+            };
+        }
+        var indptr = new Uint32Array(tbl.length + 1);
+        var s;
+        for (s = 0; s < tbl.length; s++) {
+            indptr[s + 1] = indptr[s] + tbl[s].length;
+        }
+        var indices = new Uint32Array(indptr[tbl.length]);
+        for (s = 0; s < tbl.length; s++) {
+            indices.set(tbl[s], indptr[s]);
+        }
+        return { indptr: indptr, indices: indices };
+    };
+
+    /**
+     * Converts sample metadata to a dictionary-encoded (columnar) format.
+     *
+     * @param{Array|Object} sm Sample metadata, as described in the BIOMTable
+     *                         constructor's documentation.
+     * @param{Number} numCols Number of sample metadata columns.
+     *
+     * @return {Object} Object with "values" and "codes" keys. values maps to
+     *                  an Array of Arrays of unique values, and codes maps to
+     *                  an Array of Uint32Arrays.
+     */
+    BIOMTable.toCategoricalMetadata = function (sm, numCols) {
+        if (!_.isArray(sm)) {
+            return {
+                values: sm.values,
+                codes: _.map(sm.codes, function (codes) {
+                    if (_.isString(codes)) {
+                        return ByteArray.decodeUint32Array(codes);
+                    }
+                    return codes;
+                }),
+            };
+        }
+        var values = [];
+        var codes = [];
+        var c, i, valToCode, val;
+        for (c = 0; c < numCols; c++) {
+            values.push([]);
+            codes.push(new Uint32Array(sm.length));
+            valToCode = new Map();
+            for (i = 0; i < sm.length; i++) {
+                val = sm[i][c];
+                if (!valToCode.has(val)) {
+                    valToCode.set(val, values[c].length);
+                    values[c].push(val);
+                }
+                codes[c][i] = valToCode.get(val);
+            }
+        }
+        return { values: values, codes: codes };
+    };
+
     /**
      * Converts sample ID to sample index.
      *
@@ -187,24 +306,49 @@ define(["underscore", "util"], function (_, util) {
     };
 
     /**
-     * Returns true if a (sorted) numeric array contains a number.
+     * Returns the indices of the features present within a sample.
      *
-     * It's important that fIndices is sorted in ascending order, because this
-     * lets us use the "isSorted" parameter of _.indexOf(). This will use a
-     * binary search, making this check likely faster than manual iteration.
-     * See https://underscorejs.org/#indexOf.
+     * The returned array is a view on the table's data, so it shouldn't be
+     * modified.
      *
-     * @param {Array} arr Array of Numbers sorted in ascending order;
-     *                    in practice, this will be a sorted array of the
-     *                    indices of the features present within a sample
-     *                    in the BIOM table
-     * @param {Number} num Number to look for the presence of in arr; in
-     *                     practice, this will be a feature index to search for
+     * @param {Number} sIdx Sample index
      *
-     * @return {Boolean} true if num is present in arr, false otherwise
+     * @return {Uint32Array} Feature indices, sorted in ascending order
      */
-    BIOMTable.prototype._sortedArrayHasNumber = function (arr, num) {
-        return _.indexOf(arr, num, true) >= 0;
+    BIOMTable.prototype._getSampleFeatureIndices = function (sIdx) {
+        return this._indices.subarray(
+            this._indptr[sIdx],
+            this._indptr[sIdx + 1]
+        );
+    };
+
+    /**
+     * Returns true if a sample contains a feature, false otherwise.
+     *
+     * Since the feature indices of each sample are sorted in ascending order,
+     * this binary searches the sample's portion of the table directly.
+     *
+     * @param {Number} sIdx Sample index
+     * @param {Number} fIdx Feature index
+     *
+     * @return {Boolean}
+     */
+    BIOMTable.prototype._sampleHasFeature = function (sIdx, fIdx) {
+        var lo = this._indptr[sIdx];
+        var hi = this._indptr[sIdx + 1] - 1;
+        var mid, val;
+        while (lo <= hi) {
+            mid = (lo + hi) >>> 1;
+            val = this._indices[mid];
+            if (val < fIdx) {
+                lo = mid + 1;
+            } else if (val > fIdx) {
+                hi = mid - 1;
+            } else {
+                return true;
+            }
+        }
+        return false;
     };
 
     /**
@@ -259,7 +403,7 @@ define(["underscore", "util"], function (_, util) {
             // Add these indices to totalFeatureIndices (which is a set,
             // so duplicate indices are implicitly ignored)
             var sampleIdx = scope._getSampleIndexFromID(sID);
-            var featureIndices = scope._tbl[sampleIdx];
+            var featureIndices = scope._getSampleFeatureIndices(sampleIdx);
             _.each(featureIndices, function (fIdx) {
                 totalFeatureIndices.add(fIdx);
             });
@@ -282,31 +426,31 @@ define(["underscore", "util"], function (_, util) {
     BIOMTable.prototype.getObsBy = function (col) {
         var scope = this;
         var colIdx = this._getSampleMetadataColIndex(col);
-        var valueToFeatureIdxs = {};
-        var cVal;
-        var addSampleFeatures = function (sIdx, cVal) {
-            _.each(scope._tbl[sIdx], function (fIdx) {
+        var codes = this._smCodes[colIdx];
+        var values = this._smValues[colIdx];
+        // Maps each value's code to a Set of feature indices
+        var codeToFeatureIdxs = _.map(values, function () {
+            return new Set();
+        });
+        var featureIdxs;
+        // For each sample...
+        _.each(this._sIDs, function (sID, sIdx) {
+            // Record this sample's features for the sample's value
+            featureIdxs = codeToFeatureIdxs[codes[sIdx]];
+            _.each(scope._getSampleFeatureIndices(sIdx), function (fIdx) {
                 if (!scope.ignorefIdx.has(fIdx)) {
-                    valueToFeatureIdxs[cVal].add(fIdx);
+                    featureIdxs.add(fIdx);
                 }
             });
-        };
-        // For each sample...
-        _.each(this._sm, function (smRow, sIdx) {
-            // Figure out what value this sample has for the specified column
-            cVal = smRow[colIdx];
-            // Record this sample's features for the sample's value
-            if (!_.has(valueToFeatureIdxs, cVal)) {
-                valueToFeatureIdxs[cVal] = new Set();
-            }
-            addSampleFeatures(sIdx, cVal);
         });
-        // Produce a version of valueToFeatureIdxs where
-        // 1) The Sets of feature indices are converted to Arrays
-        // 2) The feature indices are replaced with IDs
-        return _.mapObject(valueToFeatureIdxs, function (fIdxSet) {
-            return scope._featureIndexSetToIDArray(fIdxSet);
+        // Produce an Object mapping values to Arrays of feature IDs
+        var valueToFeatureIDs = {};
+        _.each(codeToFeatureIdxs, function (fIdxSet, code) {
+            valueToFeatureIDs[values[code]] = scope._featureIndexSetToIDArray(
+                fIdxSet
+            );
         });
+        return valueToFeatureIDs;
     };
 
     /**
@@ -326,27 +470,23 @@ define(["underscore", "util"], function (_, util) {
         var scope = this;
         var colIdx = this._getSampleMetadataColIndex(col);
         var fIdx = this._getFeatureIndexFromID(fID);
-        var valueToCountOfSampleWithObs = {};
-        var cVal, fIdxPos;
+        var codes = this._smCodes[colIdx];
+        var values = this._smValues[colIdx];
+        // Every value in the column starts out with a count of 0
+        var codeCounts = new Uint32Array(values.length);
         // Iterate through each sample of the BIOM table
-        _.each(this._tbl, function (presentFeatureIndices, sIdx) {
-            // Figure out what metadata value this sample has at the column.
-            // If we haven't recorded it as a key in our output Object yet, do
-            // so and set it to default to 0.
-            cVal = scope._sm[sIdx][colIdx];
-            if (!_.has(valueToCountOfSampleWithObs, cVal)) {
-                valueToCountOfSampleWithObs[cVal] = 0;
-            }
-            // Now, we check if we need to update the cVal entry by 1
-            // (indicating that one more sample with cVal contains the
+        _.each(this._sIDs, function (sID, sIdx) {
+            // Check if we need to update the count of this sample's value by 1
+            // (indicating that one more sample with this value contains the
             // specified feature).
-            if (scope._sortedArrayHasNumber(presentFeatureIndices, fIdx)) {
-                // This sample actually contains the feature!
-                cVal = scope._sm[sIdx][colIdx];
-                // Update our output Object's count info accordingly.
-                valueToCountOfSampleWithObs[cVal]++;
+            if (scope._sampleHasFeature(sIdx, fIdx)) {
+                codeCounts[codes[sIdx]]++;
             }
         });
+        var valueToCountOfSampleWithObs = {};
+        _.each(values, function (cVal, code) {
+            valueToCountOfSampleWithObs[cVal] = codeCounts[code];
+        });
         return valueToCountOfSampleWithObs;
     };
 
@@ -371,11 +511,7 @@ define(["underscore", "util"], function (_, util) {
      */
     BIOMTable.prototype.getUniqueSampleValues = function (col) {
         var colIdx = this._getSampleMetadataColIndex(col);
-        var values = new Set();
-        _.each(this._sm, function (smRow) {
-            values.add(smRow[colIdx]);
-        });
-        return util.naturalSort(Array.from(values));
+        return util.naturalSort(this._smValues[colIdx]);
     };
 
     /**
@@ -404,16 +540,22 @@ define(["underscore", "util"], function (_, util) {
         var scope = this;
         var gcIdx = this._getSampleMetadataColIndex(gradCol);
         var tcIdx = this._getSampleMetadataColIndex(trajCol);
+        var gradCodes = this._smCodes[gcIdx];
+        var trajCodes = this._smCodes[tcIdx];
+        var trajValues = this._smValues[tcIdx];
+        // If gradVal isn't a value in the gradient column, this will be -1
+        // (so no samples will match it)
+        var gradCode = _.indexOf(this._smValues[gcIdx], gradVal);
         var trajValToFeatureIndexSet = {};
-        _.each(this._sm, function (smRow, sIdx) {
-            if (smRow[gcIdx] === gradVal) {
-                var tVal = smRow[tcIdx];
+        _.each(this._sIDs, function (sID, sIdx) {
+            if (gradCodes[sIdx] === gradCode) {
+                var tVal = trajValues[trajCodes[sIdx]];
                 if (!_.has(trajValToFeatureIndexSet, tVal)) {
                     trajValToFeatureIndexSet[tVal] = new Set();
                 }
                 // Add the indices of all of the features in this sample to
                 // trajValToFeatureIndexSet[tVal]
-                _.each(scope._tbl[sIdx], function (fIdx) {
+                _.each(scope._getSampleFeatureIndices(sIdx), function (fIdx) {
                     trajValToFeatureIndexSet[tVal].add(fIdx);
                 });
             }
@@ -450,19 +592,18 @@ define(["underscore", "util"], function (_, util) {
         });
 
         // Helper function: returns true if there is an intersection
-        // between a sample's present feature indices (a sorted array)
-        // and fIndices.
-        var sampleHasMatch = function (presentFeatureIndices) {
+        // between a sample's present feature indices and fIndices.
+        var sampleHasMatch = function (sIdx) {
             return _.some(fIndices, function (fIdx) {
-                return scope._sortedArrayHasNumber(presentFeatureIndices, fIdx);
+                return scope._sampleHasFeature(sIdx, fIdx);
             });
         };
 
         // Now, we can go through the table and find samples with matches
         var containingSampleIDs = [];
-        _.each(this._tbl, function (presentFeatureIndices, sIdx) {
-            if (sampleHasMatch(presentFeatureIndices)) {
-                containingSampleIDs.push(scope._sIDs[sIdx]);
+        _.each(this._sIDs, function (sID, sIdx) {
+            if (sampleHasMatch(sIdx)) {
+                containingSampleIDs.push(sID);
             }
         });
         return containingSampleIDs;
@@ -495,16 +636,23 @@ define(["underscore", "util"], function (_, util) {
     BIOMTable.prototype.getSampleValuesCount = function (samples, col) {
         var scope = this;
         var colIdx = this._getSampleMetadataColIndex(col);
-        var valueToSampleCount = {};
+        var codes = this._smCodes[colIdx];
+        var values = this._smValues[colIdx];
+        // Count samples by their values' codes, then convert these codes to
+        // the actual values
+        var codeToSampleCount = new Map();
         _.each(samples, function (sID) {
-            var sampleIdx = scope._getSampleIndexFromID(sID);
-            var cVal = scope._sm[sampleIdx][colIdx];
-            if (_.has(valueToSampleCount, cVal)) {
-                valueToSampleCount[cVal]++;
+            var code = codes[scope._getSampleIndexFromID(sID)];
+            if (codeToSampleCount.has(code)) {
+                codeToSampleCount.set(code, codeToSampleCount.get(code) + 1);
             } else {
-                valueToSampleCount[cVal] = 1;
+                codeToSampleCount.set(code, 1);
             }
         });
+        var valueToSampleCount = {};
+        codeToSampleCount.forEach(function (count, code) {
+            valueToSampleCount[values[code]] = count;
+        });
         return valueToSampleCount;
     };
 
@@ -538,18 +686,22 @@ define(["underscore", "util"], function (_, util) {
         var colIdx = this._getSampleMetadataColIndex(col);
         var fIdx2Counts = [];
         var fIdx2SampleCt = [];
-        var containingSampleCount, cVal, cValIdx;
+        var containingSampleCount, cValIdx;
 
         // Find unique (sorted) values in this sample metadata column; map
-        // sample metadata values to a consistent index. (Using an index to
-        // store this data means we can store the sample metadata values for
-        // each feature in an Array rather than in an Object for now.)
+        // sample metadata values' codes to a consistent index. (Using an index
+        // to store this data means we can store the sample metadata values
+        // for each feature in an Array rather than in an Object for now.)
         var uniqueSMVals = this.getUniqueSampleValues(col);
         var numUniqueSMVals = uniqueSMVals.length;
         var smVal2Idx = {};
         _.each(uniqueSMVals, function (smVal, c) {
             smVal2Idx[smVal] = c;
         });
+        var codes = this._smCodes[colIdx];
+        var code2Idx = _.map(this._smValues[colIdx], function (smVal) {
+            return smVal2Idx[smVal];
+        });
 
         // Assign each feature an empty counts array with all 0s. Also set
         // things up so we can keep track of the total number of samples
@@ -567,16 +719,17 @@ define(["underscore", "util"], function (_, util) {
         // Iterate through each the feature presence data for each sample in
         // the BIOM table, storing unique s.m. value counts and total sample
         // counts for each feature
-        _.each(this._tbl, function (presentFeatureIndices, sIdx) {
+        var j, fIdx;
+        _.each(this._sIDs, function (sID, sIdx) {
             // Figure out what metadata value this sample has at the column.
-            cVal = scope._sm[sIdx][colIdx];
-            cValIdx = smVal2Idx[cVal];
+            cValIdx = code2Idx[codes[sIdx]];
             // Increment s.m. value counts for each feature present in this
             // sample
-            _.each(presentFeatureIndices, function (fIdx) {
+            for (j = scope._indptr[sIdx]; j < scope._indptr[sIdx + 1]; j++) {
+                fIdx = scope._indices[j];
                 fIdx2Counts[fIdx][cValIdx]++;
                 fIdx2SampleCt[fIdx]++;
-            });
+            }
         });
 
         // Convert counts to frequencies
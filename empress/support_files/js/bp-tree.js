@@ -1,21 +1,115 @@
 define(["ByteArray", "underscore"], function (ByteArray, _) {
+    /**
+     * @type {Number}
+     * The number of bits in each block of the rank directory. The number of
+     * 1s before each block is stored, so rank() only needs to count the 1s
+     * in (at most) this many bits.
+     */
+    var RANK_BLOCK_SHIFT = 6;
+    var RANK_BLOCK_BITS = 1 << RANK_BLOCK_SHIFT;
+
+    /**
+     * @type {Number}
+     * The select directories store the block containing every
+     * SELECT_SAMPLE-th 0 and 1, so select() only needs to search the rank
+     * directory between two samples.
+     */
+    var SELECT_SAMPLE = 256;
+
+    /**
+     * @type {Number}
+     * The number of bits in each leaf of the range min-max tree. fwdsearch()
+     * and bwdsearch() scan (at most) two leaves' worth of bits, and walk the
+     * tree to find the leaf to scan.
+     */
+    var RMM_BLOCK_BITS = 256;
+
+    /**
+     * @type {Uint8Array}
+     * POPCOUNT[x] is the number of 1s in the byte x.
+     */
+    var POPCOUNT = new Uint8Array(256);
+    for (var x = 1; x < 256; x++) {
+        POPCOUNT[x] = (x & 1) + POPCOUNT[x >>> 1];
+    }
+
+    /**
+     * @type {Uint8Array}
+     * SELECT_IN_BYTE[(r - 1) * 256 + x] is the position (counting from the
+     * most significant bit) of the rth 1 in the byte x.
+     */
+    var SELECT_IN_BYTE = new Uint8Array(8 * 256);
+    for (x = 0; x < 256; x++) {
+        var r = 0;
+        for (var pos = 0; pos < 8; pos++) {
+            if ((x >>> (7 - pos)) & 1) {
+                SELECT_IN_BYTE[r * 256 + x] = pos;
+                r++;
+            }
+        }
+    }
+
+    /**
+     * @type {Int8Array}
+     * For the byte x (read most significant bit first, with 1 as +1 and 0 as
+     * -1), EXCESS_TOTAL[x] is the change in excess over the byte, and
+     * EXCESS_MIN[x] and EXCESS_MAX[x] are the minimum and maximum change in
+     * excess after each of its bits.
+     */
+    var EXCESS_TOTAL = new Int8Array(256);
+    var EXCESS_MIN = new Int8Array(256);
+    var EXCESS_MAX = new Int8Array(256);
+    for (x = 0; x < 256; x++) {
+        var e = 0;
+        EXCESS_MIN[x] = 8;
+        EXCESS_MAX[x] = -8;
+        for (pos = 0; pos < 8; pos++) {
+            e += (x >>> (7 - pos)) & 1 ? 1 : -1;
+            EXCESS_MIN[x] = Math.min(EXCESS_MIN[x], e);
+            EXCESS_MAX[x] = Math.max(EXCESS_MAX[x], e);
+        }
+        EXCESS_TOTAL[x] = e;
+    }
+
     /**
      *
      * @class BPTree
      *
      * Initialzes a new BP tree.
      *
-     * @param {Array} b The array that represents the tree structure
+     * The balanced parentheses are stored as packed bits (eight per byte),
+     * along with small directories that let rank() and select() run in
+     * constant time without caching their result for every position.
+     *
+     * @param {Array or String or Uint8Array} b The array that represents the
+     *                             tree structure. If this is a String, it's
+     *                             treated as the base64-encoded packed bits
+     *                             produced by tools.pack_bits() in the Python
+     *                             code (and coding is ignored).
      * @param {Array} names The names of each node stored in preorder
-     * @param {Array} lengths The lengths of each node stored in preorder
-     * @param {Number} coding The number of 1/0s coded in the tree, null not
-     *                        coded
+     * @param {Array or Float64Array} lengths The lengths of each node stored
+     *                                        in preorder
+     * @param {Number or String} coding The number of 1/0s coded in the tree,
+     *                                  null not coded. If this is "packed",
+     *                                  b is a Uint8Array of the packed bits
+     *                                  produced by tools.pack_bits().
      *
      * @return {BPTree}
      * @constructs BPTree
      */
     function BPTree(b, names = null, lengths = null, coding = 51) {
-        if (coding !== null) {
+        var bits, numBits;
+        if (typeof b === "string" || coding === "packed") {
+            bits = typeof b === "string" ? ByteArray.decodeBytes(b) : b;
+            // The last byte is padded with 0s, so we can't just use every
+            // bit. However, a balanced parentheses sequence contains exactly
+            // as many 0s as 1s -- so the sequence is twice as long as the
+            // number of 1s in the packed bits.
+            numBits = 0;
+            for (var byteIdx = 0; byteIdx < bits.length; byteIdx++) {
+                numBits += 2 * POPCOUNT[bits[byteIdx]];
+            }
+        } else if (coding !== null) {
             var b_len = b.length - 1;
             var decoded_b = [];
 
@@ -46,21 +140,34 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
                 }
             });
 
-            b = decoded_b;
+            bits = ByteArray.packBits(decoded_b);
+            numBits = decoded_b.length;
+        } else {
+            bits = ByteArray.packBits(b);
+            numBits = b.length;
         }
 
         /**
-         * @type {Array}
-         * Used to store the structure of the tree
+         * @type {Uint8Array}
          * @private
+         * The balanced parentheses, packed eight to a byte (most significant
+         * bit first, as with numpy.packbits()). Use bit() to read them.
          */
-        this.b_ = b;
+        this._bits = bits;
+
+        /**
+         * @type {Number}
+         * @private
+         * The number of parentheses in the tree (i.e. the number of bits in
+         * this._bits that are actually used).
+         */
+        this._numBits = numBits;
 
         /**
          * @type {Number}
          * Number of nodes in tree
          */
-        this.size = this.b_.length / 2;
+        this.size = numBits / 2;
 
         /**
          * @type {Array}
@@ -73,14 +180,14 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         this.names_ = names ? names : null;
 
         /**
-         * @type {Array}
+         * @type {Uint32Array}
          * @private
          * caches the number of tips under each node. Stores nodes in their
          * postorder position. Postorder positions start at index 1 thus index
          * 0 is considered "undefined".
          * Note: leaf nodes have 1 tips
          */
-        this._numTips = new Array(this.size + 1).fill(0);
+        this._numTips = new Uint32Array(this.size + 1);
 
         /**
          * @type {Array}
@@ -90,135 +197,357 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
          */
         this.lengths_ = lengths ? lengths : null;
 
+        this._buildRankSelectDirectories();
+
+        this._buildRangeMinMaxTree();
+
         /**
-         * @type {Uint32Array}
+         * @type{Array}
          * @private
-         * r0Cache[i] represents rank(0,i) in this.b
-         * Note: rank(0,i) = number of 0's between indices [0,i] in this.b
-         * TODO: implement a rmM tree and calculate this on the fly
+         *
+         * Stores the order of nodes in an in-order traversal. Elements in this
+         * array are node ids
+         *
+         * Note: In-order is stored because bp-tree doesn't have
+         *       an efficient way of convert a nodes in-order position to tree
+         *       index and vice versa like it does with post order through
+         *       the use of postorderselect() and postorder(). So it is more
+         *       efficient to cache an in-order tree traversal.
          */
-        this.r0Cache_ = ByteArray.sumVal(this.b_, Uint32Array, 0);
+        this._inorder = null;
 
         /**
-         * @type {Uint32Array}
+         * @type{Array}
          * @private
-         * r1Cache[i] represents rank(1,i) in this.b
-         * TODO: implement a rmM tree and calculate this on the fly
+         *
+         * Stores the order of nodes in ascending and descending-leaf-sorted
+         * postorder traversals. Elements in this array are node IDs.
          */
-        this.r1Cache_ = ByteArray.sumVal(this.b_, Uint32Array, 1);
+        this._ascendingLeafSorted = null;
+        this._descendingLeafSorted = null;
 
         /**
-         * @type {Uint32Array}
+         * @type {Object}
          * @private
-         * s0Cache[i] represents select(0,i) in this.b
-         * Note: select(0,i) = the index of the ith 0 in this.b
-         * TODO: implement a rmM tree and calculate this on the fly
+         * This object is used to cache name look ups. Keys are node names and
+         * values are an array of all nodes (defined by the postorder position)
+         * that have the same name.
          */
-        this.s0Cache_ = ByteArray.seqUniqueIndx(this.r0Cache_, Uint32Array);
+        this._nameToNodes = {};
+    }
+
+    /**
+     * Builds the directories used by rank() and select().
+     *
+     * _rankDir[j] is the number of 1s before block j (i.e. before bit
+     * j * RANK_BLOCK_BITS). _select0Dir[s] and _select1Dir[s] are the blocks
+     * containing the (s * SELECT_SAMPLE + 1)-th 0 and 1.
+     *
+     * Together, these use a few bits per RANK_BLOCK_BITS parentheses, rather
+     * than the 32 bits per parenthesis that caching rank() and select() for
+     * every position would use.
+     *
+     * @private
+     */
+    BPTree.prototype._buildRankSelectDirectories = function () {
+        var numBlocks = Math.ceil(this._numBits / RANK_BLOCK_BITS);
+        var bytesPerBlock = RANK_BLOCK_BITS / 8;
+        var numBytes = Math.ceil(this._numBits / 8);
+        var numOnes = 0;
+        var j, k;
 
         /**
          * @type {Uint32Array}
          * @private
-         * s1Cache[i] represents select(1,i) in this.b
-         * TODO: implement a rmM tree and calculate this on the fly
          */
-        this.s1Cache_ = ByteArray.seqUniqueIndx(this.r1Cache_, Uint32Array);
+        this._rankDir = new Uint32Array(numBlocks + 1);
+        for (j = 0; j < numBlocks; j++) {
+            this._rankDir[j] = numOnes;
+            var end = Math.min((j + 1) * bytesPerBlock, numBytes);
+            for (k = j * bytesPerBlock; k < end; k++) {
+                numOnes += POPCOUNT[this._bits[k]];
+            }
+        }
+        this._rankDir[numBlocks] = numOnes;
 
         /**
          * @type {Uint32Array}
          * @private
-         * excess is used frequently so we can cache it to get a slight
-         * performance boost
          */
-        var eCache = [];
-        var i;
-        for (i = 0; i < this.b_.length; i++) {
-            eCache.push(2 * this.r1Cache_[i] - i - 1);
-        }
-        this.eCache_ = new Uint32Array(eCache);
+        this._select1Dir = new Uint32Array(
+            Math.ceil(numOnes / SELECT_SAMPLE) + 1
+        );
 
         /**
-         *
          * @type {Uint32Array}
          * @private
-         * open/close cache to boost performance but at cost of memory. This can
-         * be optimized with use of rrm-tre
          */
-        this.ocCache_ = new Uint32Array(this.b_.length);
-        var openInx = 0;
-        var oc = [];
-        // We don't declare "var i" since it was already declared above
-        for (i = 0; i < this.b_.length; i++) {
-            if (this.b_[i]) {
-                oc.push(i);
-            } else {
-                openInx = oc.pop();
-                this.ocCache_[openInx] = i;
-                this.ocCache_[i] = openInx;
+        this._select0Dir = new Uint32Array(
+            Math.ceil((this._numBits - numOnes) / SELECT_SAMPLE) + 1
+        );
+
+        // The next 1 and 0 whose blocks need to be stored (0-indexed)
+        var nextOne = 0;
+        var nextZero = 0;
+        for (j = 0; j < numBlocks; j++) {
+            var onesAfter = this._rankDir[j + 1];
+            var zerosAfter =
+                Math.min((j + 1) * RANK_BLOCK_BITS, this._numBits) -
+                onesAfter;
+            while (nextOne < onesAfter) {
+                this._select1Dir[nextOne / SELECT_SAMPLE] = j;
+                nextOne += SELECT_SAMPLE;
+            }
+            while (nextZero < zerosAfter) {
+                this._select0Dir[nextZero / SELECT_SAMPLE] = j;
+                nextZero += SELECT_SAMPLE;
             }
         }
+        this._select1Dir[this._select1Dir.length - 1] = numBlocks;
+        this._select0Dir[this._select0Dir.length - 1] = numBlocks;
+    };
 
-        /**
-         * @type{Array}
-         * @private
-         *
-         * Stores the order of nodes in an in-order traversal. Elements in this
-         * array are node ids
-         *
-         * Note: In-order is stored because bp-tree doesn't have
-         *       an efficient way of convert a nodes in-order position to tree
-         *       index and vice versa like it does with post order through
-         *       the use of postorderselect() and postorder(). So it is more
-         *       efficient to cache an in-order tree traversal.
-         */
-        this._inorder = null;
+    /**
+     * Builds the range min-max tree used by fwdsearch() and bwdsearch().
+     *
+     * This is a complete binary tree stored as an array (the children of
+     * node k are nodes 2k and 2k + 1, and the root is node 1). Its leaves
+     * are blocks of RMM_BLOCK_BITS parentheses, and each node stores the
+     * minimum and maximum excess within the parentheses it covers.
+     *
+     * Since excess changes by 1 from one parenthesis to the next, the first
+     * block after a position whose range of excess includes some value must
+     * contain the first position after it with that excess. So searches
+     * only need to scan the bits of two blocks, and walk up and down the
+     * tree in between.
+     *
+     * References
+     * ----------
+     * Navarro G, Sadakane K. 2014. Fully functional static and dynamic
+     * succinct trees. ACM Transactions on Algorithms 10(3):16.
+     *
+     * @private
+     */
+    BPTree.prototype._buildRangeMinMaxTree = function () {
+        var numBlocks = Math.ceil(this._numBits / RMM_BLOCK_BITS);
 
         /**
-         * @type{Array}
+         * @type {Number}
          * @private
-         *
-         * Stores the order of nodes in ascending and descending-leaf-sorted
-         * postorder traversals. Elements in this array are node IDs.
+         * The number of leaves in the range min-max tree (the number of
+         * blocks, rounded up to a power of 2). Leaf j is node
+         * this._rmmNumLeaves + j.
          */
-        this._ascendingLeafSorted = null;
-        this._descendingLeafSorted = null;
+        this._rmmNumLeaves = 1;
+        while (this._rmmNumLeaves < numBlocks) {
+            this._rmmNumLeaves *= 2;
+        }
 
         /**
-         * @type {Object}
+         * @type {Int32Array}
          * @private
-         * This object is used to cache name look ups. Keys are node names and
-         * values are an array of all nodes (defined by the postorder position)
-         * that have the same name.
          */
-        this._nameToNodes = {};
+        this._rmmMin = new Int32Array(2 * this._rmmNumLeaves).fill(
+            2147483647
+        );
 
         /**
-         * @type {Array}
+         * @type {Int32Array}
          * @private
-         * Cache Parent nodes. This will help speed up a lot of methods that
-         * make calls to parent.
          */
-        this._pCache = [];
-        var pStack = [];
-        for (i = 0; i < this.b_.length - 1; i++) {
-            if (this.b_[i] === 1) {
-                if (pStack.length === 0) {
-                    pStack.push(i);
-                    this._pCache[i] = 0;
-                } else if (this.b_[i + 1] === 1) {
-                    this._pCache[i] = pStack[pStack.length - 1];
-                    pStack.push(i);
-                } else if (this.b_[i + 1] === 0) {
-                    this._pCache[i] = pStack[pStack.length - 1];
-                }
-            } else if (this.b_[i] === 0) {
-                this._pCache[i] = pStack[pStack.length - 1];
-                if (this.b_[i + 1] === 0) {
-                    pStack.pop();
-                }
+        this._rmmMax = new Int32Array(2 * this._rmmNumLeaves).fill(
+            -2147483648
+        );
+
+        var e = 0;
+        var i = 0;
+        var j, node, end, byteVal;
+        for (j = 0; j < numBlocks; j++) {
+            node = this._rmmNumLeaves + j;
+            end = Math.min((j + 1) * RMM_BLOCK_BITS, this._numBits);
+            for (; i + 8 <= end; i += 8) {
+                byteVal = this._bits[i >>> 3];
+                this._rmmMin[node] = Math.min(
+                    this._rmmMin[node],
+                    e + EXCESS_MIN[byteVal]
+                );
+                this._rmmMax[node] = Math.max(
+                    this._rmmMax[node],
+                    e + EXCESS_MAX[byteVal]
+                );
+                e += EXCESS_TOTAL[byteVal];
+            }
+            for (; i < end; i++) {
+                e += this.bit(i) ? 1 : -1;
+                this._rmmMin[node] = Math.min(this._rmmMin[node], e);
+                this._rmmMax[node] = Math.max(this._rmmMax[node], e);
             }
         }
-    }
+        for (node = this._rmmNumLeaves - 1; node > 0; node--) {
+            this._rmmMin[node] = Math.min(
+                this._rmmMin[2 * node],
+                this._rmmMin[2 * node + 1]
+            );
+            this._rmmMax[node] = Math.max(
+                this._rmmMax[2 * node],
+                this._rmmMax[2 * node + 1]
+            );
+        }
+    };
+
+    /**
+     * Returns the first position in [from, to) with an excess of target.
+     *
+     * @param {Number} from The first position to check
+     * @param {Number} to The position to stop before
+     * @param {Number} e The excess at position from - 1
+     * @param {Number} target The excess to search for
+     *
+     * @return {Number} The position, or -1 if there isn't one
+     * @private
+     */
+    BPTree.prototype._scanForward = function (from, to, e, target) {
+        var j = from;
+        var byteVal;
+        // Check bits one at a time until reaching the start of a byte...
+        for (; j < to && (j & 7) !== 0; j++) {
+            e += this.bit(j) ? 1 : -1;
+            if (e === target) {
+                return j;
+            }
+        }
+        // ...then skip whole bytes that can't contain the target...
+        for (; j + 8 <= to; j += 8) {
+            byteVal = this._bits[j >>> 3];
+            if (
+                target >= e + EXCESS_MIN[byteVal] &&
+                target <= e + EXCESS_MAX[byteVal]
+            ) {
+                break;
+            }
+            e += EXCESS_TOTAL[byteVal];
+        }
+        // ...and check the remaining bits one at a time
+        for (; j < to; j++) {
+            e += this.bit(j) ? 1 : -1;
+            if (e === target) {
+                return j;
+            }
+        }
+        return -1;
+    };
+
+    /**
+     * Returns the last position in [to, from] with an excess of target.
+     *
+     * @param {Number} from The first position to check (scanning backwards)
+     * @param {Number} to The last position to check
+     * @param {Number} e The excess at position from
+     * @param {Number} target The excess to search for
+     *
+     * @return {Number} The position, or -1 if there isn't one
+     * @private
+     */
+    BPTree.prototype._scanBackward = function (from, to, e, target) {
+        var j = from;
+        var byteVal, eBefore;
+        // Check bits one at a time until reaching the end of a byte...
+        for (; j >= to && ((j + 1) & 7) !== 0; j--) {
+            if (e === target) {
+                return j;
+            }
+            e -= this.bit(j) ? 1 : -1;
+        }
+        // ...then skip whole bytes that can't contain the target...
+        for (; j - 7 >= to; j -= 8) {
+            byteVal = this._bits[(j - 7) >>> 3];
+            eBefore = e - EXCESS_TOTAL[byteVal];
+            if (
+                target >= eBefore + EXCESS_MIN[byteVal] &&
+                target <= eBefore + EXCESS_MAX[byteVal]
+            ) {
+                break;
+            }
+            e = eBefore;
+        }
+        // ...and check the remaining bits one at a time
+        for (; j >= to; j--) {
+            if (e === target) {
+                return j;
+            }
+            e -= this.bit(j) ? 1 : -1;
+        }
+        return -1;
+    };
+
+    /**
+     * Returns true if the excess of target is within the range of excess
+     * covered by a node of the range min-max tree.
+     *
+     * @param {Number} node The node of the range min-max tree
+     * @param {Number} target The excess
+     *
+     * @return {Boolean}
+     * @private
+     */
+    BPTree.prototype._rmmContains = function (node, target) {
+        return this._rmmMin[node] <= target && target <= this._rmmMax[node];
+    };
+
+    /**
+     * Returns the ith parenthesis in the tree.
+     *
+     * @param {Number} i The position of the parenthesis
+     *
+     * @return {Number} 1 if this is an open parenthesis, 0 if it's a close
+     *                  parenthesis.
+     */
+    BPTree.prototype.bit = function (i) {
+        return (this._bits[i >>> 3] >>> (7 - (i & 7))) & 1;
+    };
+
+    /**
+     * Returns the balanced parentheses of the tree.
+     *
+     * @return {Array} The balanced parentheses, as 0s and 1s.
+     */
+    BPTree.prototype.toArray = function () {
+        return ByteArray.unpackBits(this._bits, this._numBits);
+    };
+
+    /**
+     * Returns a copy of the packed bits of the tree's balanced parentheses.
+     *
+     * This can be passed to fromPackedBits() to recreate the tree's
+     * structure (e.g. in a Web Worker, which the copy can be transferred to).
+     *
+     * @return {Uint8Array}
+     */
+    BPTree.prototype.toPackedBits = function () {
+        return this._bits.slice(0, Math.ceil(this._numBits / 8));
+    };
+
+    /**
+     * Creates a BPTree from the packed bits of its balanced parentheses
+     * sequence.
+     *
+     * The packed bits are used as the tree's backing store as is, so they
+     * don't need to be unpacked.
+     *
+     * @param {String or Uint8Array} packed The packed bits produced by
+     *                                      tools.pack_bits() in the Python
+     *                                      code, either base64-encoded or as
+     *                                      the bytes themselves (e.g. as
+     *                                      loaded from a sidecar file).
+     * @param {Array} names The names of each node stored in postorder
+     * @param {Array or Float64Array} lengths The lengths of each node stored
+     *                                        in postorder
+     *
+     * @return {BPTree}
+     */
+    BPTree.fromPackedBits = function (packed, names = null, lengths = null) {
+        return new BPTree(packed, names, lengths, "packed");
+    };
 
     /**
      * Returns an Object describing the minimum, maximum, and average of all
@@ -272,8 +601,21 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return{Number}
      */
     BPTree.prototype.rank = function (t, i) {
-        var rCache = t ? this.r1Cache_ : this.r0Cache_;
-        return rCache[i];
+        // Count the 1s in [0, i]: look up how many come before i's block,
+        // then count the ones in the block up to i
+        var end = i + 1;
+        var block = end >>> RANK_BLOCK_SHIFT;
+        var byteIdx = block << (RANK_BLOCK_SHIFT - 3);
+        var endByte = end >>> 3;
+        var ones = this._rankDir[block];
+        for (; byteIdx < endByte; byteIdx++) {
+            ones += POPCOUNT[this._bits[byteIdx]];
+        }
+        var remainder = end & 7;
+        if (remainder > 0) {
+            ones += POPCOUNT[this._bits[endByte] >>> (8 - remainder)];
+        }
+        return t ? ones : end - ones;
     };
 
     /**
@@ -287,8 +629,56 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return{Number}
      */
     BPTree.prototype.select = function (t, k) {
-        var sCache = t ? this.s1Cache_ : this.s0Cache_;
-        return sCache[k - 1];
+        // Find the block containing the kth t: the select directory gives
+        // the blocks containing the samples before and after it, and the
+        // rank directory is binary searched between those
+        var bit = t ? 1 : 0;
+        var sample = ((k - 1) / SELECT_SAMPLE) | 0;
+        var sDir = t ? this._select1Dir : this._select0Dir;
+        var lo = sDir[sample];
+        var hi = Math.min(sDir[sample + 1], this._rankDir.length - 2);
+        var mid;
+        while (lo < hi) {
+            mid = (lo + hi + 1) >>> 1;
+            if (this._countBefore(t, mid) < k) {
+                lo = mid;
+            } else {
+                hi = mid - 1;
+            }
+        }
+
+        // Then, find the byte containing it...
+        var remaining = k - this._countBefore(t, lo);
+        var byteIdx = lo << (RANK_BLOCK_SHIFT - 3);
+        var byteVal;
+        while (true) {
+            // (Looking for 0s is the same as looking for 1s in the
+            // complement of each byte)
+            byteVal = bit ? this._bits[byteIdx] : ~this._bits[byteIdx] & 0xff;
+            if (POPCOUNT[byteVal] >= remaining) {
+                break;
+            }
+            remaining -= POPCOUNT[byteVal];
+            byteIdx++;
+        }
+
+        // ...and finally, the bit
+        return (byteIdx << 3) + SELECT_IN_BYTE[(remaining - 1) * 256 + byteVal];
+    };
+
+    /**
+     * Returns the number of times bit t occurs before a block of the rank
+     * directory.
+     *
+     * @param{Number} t Bit value
+     * @param{Number} block Index of the block
+     *
+     * @return{Number}
+     * @private
+     */
+    BPTree.prototype._countBefore = function (t, block) {
+        var ones = this._rankDir[block];
+        return t ? ones : block * RANK_BLOCK_BITS - ones;
     };
 
     /**
@@ -304,7 +694,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
     BPTree.prototype.excess_ = function (i) {
         // need to subtract 1 since i starts at 0
         // Note: rank(1,i) - rank(0,i) = (2*(rank(1,i)) - i
-        return 2 * this.r1Cache_[i] - i - 1;
+        return 2 * this.rank(1, i) - i - 1;
     };
 
     /**
@@ -317,7 +707,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      */
     BPTree.prototype.depth = function (i) {
         //depth is same as excess
-        return this.eCache_[i];
+        return this.excess_(i);
     };
 
     /**
@@ -351,7 +741,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      */
     BPTree.prototype.numleaves = function () {
         var total = 0;
-        for (var i = 0; i < this.b_.length - 1; i++) {
+        for (var i = 0; i < this._numBits - 1; i++) {
             total = this.isleaf(i) ? total + 1 : total;
         }
         return total;
@@ -380,9 +770,11 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number}
      */
     BPTree.prototype.fwdsearchNaive = function (i, d) {
-        var b = this.eCache_[i] + d;
-        for (var j = i + 1; i < this.b_.length; j++) {
-            if (this.eCache_[j] === b) {
+        var e = this.excess_(i);
+        var b = e + d;
+        for (var j = i + 1; j < this._numBits; j++) {
+            e += this.bit(j) ? 1 : -1;
+            if (e === b) {
                 return j;
             }
         }
@@ -392,10 +784,61 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
     };
 
     /**
-     * Currently this is just place holder
+     * Forward search finds the next jth index that has d more excess than i
+     *
+     * This uses the range min-max tree, so it takes O(log n) time.
+     *
+     * @param {Number} i The index to start the search
+     *                 Note: i is the absolue index into this.b and does not
+     *                 represent a nodes position unlike other function.
+     * @param {Number} d Returns the jth index with d more excess than i
+     *
+     * @return {Number}
      */
     BPTree.prototype.fwdsearch = function (i, d) {
-        return this.fwdsearchNaive(i, d);
+        var e = this.excess_(i);
+        var target = e + d;
+
+        // Check the rest of i's block
+        var block = Math.floor(i / RMM_BLOCK_BITS);
+        var j = this._scanForward(
+            i + 1,
+            Math.min((block + 1) * RMM_BLOCK_BITS, this._numBits),
+            e,
+            target
+        );
+        if (j !== -1) {
+            return j;
+        }
+
+        // Go up the tree until there's a right sibling containing the
+        // target...
+        var node = this._rmmNumLeaves + block;
+        while (true) {
+            if (node === 1) {
+                // an index could not be found that satisfies the conditions
+                return -1;
+            }
+            if ((node & 1) === 0 && this._rmmContains(node + 1, target)) {
+                node++;
+                break;
+            }
+            node >>>= 1;
+        }
+        // ...then go down to the leftmost block containing it
+        while (node < this._rmmNumLeaves) {
+            node *= 2;
+            if (!this._rmmContains(node, target)) {
+                node++;
+            }
+        }
+        var start = (node - this._rmmNumLeaves) * RMM_BLOCK_BITS;
+        return this._scanForward(
+            start,
+            Math.min(start + RMM_BLOCK_BITS, this._numBits),
+            this.excess_(start - 1),
+            target
+        );
     };
 
     /**
@@ -409,9 +852,13 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number}
      */
     BPTree.prototype.bwdsearchNaive = function (i, d) {
-        var b = this.eCache_[i] + d;
+        var e = this.excess_(i);
+        var b = e + d;
         for (var j = i - 1; j >= 0; j--) {
-            if (this.eCache_[j] === b) {
+            // excess(j) = excess(j + 1) - 1 if b[j + 1] is an open
+            // parenthesis, and excess(j + 1) + 1 if it's a close parenthesis
+            e += this.bit(j + 1) ? -1 : 1;
+            if (e === b) {
                 return j;
             }
         }
@@ -421,10 +868,57 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
     };
 
     /**
-     * Currently this is just a place holder
+     * Backward search find the previous jth index with d more excess than i
+     *
+     * This uses the range min-max tree, so it takes O(log n) time.
+     *
+     * @param {Number} i The index to start the search
+     *                 Note: i is the absolue index into this.b and does not
+     *                 represent a nodes position unlike other function.
+     * @param {Number} d Returns the jth index with d more excess than i
+     *
+     * @return {Number}
      */
     BPTree.prototype.bwdsearch = function (i, d) {
-        return this.bwdsearchNaive(i, d);
+        var e = this.excess_(i);
+        var target = e + d;
+
+        // Check the rest of i's block
+        var block = Math.floor(i / RMM_BLOCK_BITS);
+        var j = this._scanBackward(
+            i - 1,
+            block * RMM_BLOCK_BITS,
+            e - (this.bit(i) ? 1 : -1),
+            target
+        );
+        if (j !== -1) {
+            return j;
+        }
+
+        // Go up the tree until there's a left sibling containing the
+        // target...
+        var node = this._rmmNumLeaves + block;
+        while (true) {
+            if (node === 1) {
+                // an index could not be found
+                return -1;
+            }
+            if ((node & 1) === 1 && this._rmmContains(node - 1, target)) {
+                node--;
+                break;
+            }
+            node >>>= 1;
+        }
+        // ...then go down to the rightmost block containing it
+        while (node < this._rmmNumLeaves) {
+            node = 2 * node + 1;
+            if (!this._rmmContains(node, target)) {
+                node--;
+            }
+        }
+        var start = (node - this._rmmNumLeaves) * RMM_BLOCK_BITS;
+        var end = Math.min(start + RMM_BLOCK_BITS, this._numBits) - 1;
+        return this._scanBackward(end, start, this.excess_(end), target);
     };
 
     /**
@@ -436,7 +930,11 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number}
      */
     BPTree.prototype.open = function (i) {
-        return this.b_[i] ? i : this.ocCache_[i];
+        if (this.bit(i)) {
+            return i;
+        }
+        // (Most close parentheses belong to tips, so check that first)
+        return this.bit(i - 1) ? i - 1 : this.bwdsearch(i, 0) + 1;
     };
 
     /**
@@ -448,7 +946,11 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number}
      */
     BPTree.prototype.close = function (i) {
-        return this.b_[i] ? this.ocCache_[i] : i;
+        if (!this.bit(i)) {
+            return i;
+        }
+        // (Most open parentheses belong to tips, so check that first)
+        return this.bit(i + 1) ? this.fwdsearch(i, -1) : i + 1;
     };
 
     /**
@@ -461,7 +963,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      */
     BPTree.prototype.enclose = function (i) {
         // i is an open paren
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             return this.bwdsearch(i, -2) + 1;
         }
 
@@ -480,11 +982,11 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      */
     BPTree.prototype.parent = function (i) {
         // i represents the root node
-        if (i === this.root() || i === this.b_.length - 1) {
+        if (i === this.root() || i === this._numBits - 1) {
             return -1;
         }
 
-        return this._pCache[i];
+        return this.enclose(i);
     };
 
     /**
@@ -502,7 +1004,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Boolean}
      */
     BPTree.prototype.isleaf = function (i) {
-        return this.b_[i] && !this.b_[i + 1];
+        return this.bit(i) === 1 && this.bit(i + 1) === 0;
     };
 
     /**
@@ -518,7 +1020,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
             return 0;
         }
 
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             return i + 1;
         } else {
             return this.fchild(this.open(i));
@@ -537,7 +1039,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
             return 0;
         }
 
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             return this.open(this.close(i) - 1);
         } else {
             return this.lchild(this.open(i));
@@ -554,15 +1056,15 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      */
     BPTree.prototype.nsibling = function (i) {
         // i is a close parenthesis
-        if (!this.b_[i]) {
+        if (!this.bit(i)) {
             return this.nsibling(this.open(i));
         }
 
         var pos = this.close(i) + 1;
-        if (pos >= this.b_.length) {
+        if (pos >= this._numBits) {
             // i is the root node
             return 0;
-        } else if (this.b_[pos]) {
+        } else if (this.bit(pos)) {
             return pos;
         }
 
@@ -587,14 +1089,14 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         }
 
         // i is close paren
-        if (!this.b_[i]) {
+        if (!this.bit(i)) {
             return this.psibling(this.open(i));
         }
 
         // check to see if i open paren
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             // i is fchild
-            if (this.b_[i - 1]) {
+            if (this.bit(i - 1)) {
                 return 0;
             }
 
@@ -603,7 +1105,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
 
         if (pos < 0) {
             return 0;
-        } else if (this.b_[pos]) {
+        } else if (this.bit(pos)) {
             return pos;
         }
 
@@ -619,7 +1121,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number} The postorder rank of node i
      */
     BPTree.prototype.postorder = function (i) {
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             return this.rank(0, this.close(i));
         } else {
             return this.rank(0, i);
@@ -646,7 +1148,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
      * @return {Number} The preorder rank of node i
      */
     BPTree.prototype.preorder = function (i) {
-        if (this.b_[i]) {
+        if (this.bit(i)) {
             return this.rank(1, i);
         } else {
             return this.preorder(this.open(i));
@@ -776,7 +1278,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         var close = this.close(open);
         var numTips = 0;
         for (var i = open + 1; i < close; i++) {
-            if (this.b_[i] === 1 && this.b_[i + 1] === 0) {
+            if (this.bit(i) === 1 && this.bit(i + 1) === 0) {
                 numTips += 1;
             }
         }
@@ -1021,16 +1523,19 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         // closure
         var scope = this;
 
-        // create new bit array
-        var mask = _.clone(this.b_);
+        // create new bit array (removed parentheses are marked with -1)
+        var mask = new Int8Array(this._numBits);
 
         var i, node;
+        for (i = 0; i < this._numBits; i++) {
+            mask[i] = this.bit(i);
+        }
 
         // remove tips
         for (i of removeTips) {
             node = this.postorderselect(i);
-            mask[node] = undefined;
-            mask[node + 1] = undefined;
+            mask[node] = -1;
+            mask[node + 1] = -1;
         }
 
         // remove internal
@@ -1045,7 +1550,7 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
                     // close parentheses represents non-removed tip
                     // thus we mark it as false so it is not removed
                     nodeStack.push([i, false]);
-                } else if (mask[i - 1] === undefined) {
+                } else if (mask[i - 1] === -1) {
                     // close parentheses represents an internal node
                     // with at least one removed tip so we temporarly mark it
                     // as true to remove
@@ -1056,8 +1561,8 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
                 node = nodeStack.pop();
                 if (node[1] === true) {
                     // remove internal node
-                    mask[i] = undefined;
-                    mask[node[0]] = undefined;
+                    mask[i] = -1;
+                    mask[node[0]] = -1;
                 } else if (node[1] === false) {
                     // need explicitly check false since it can be null
                     // if node[1] is false that means it contains a tip and thus
@@ -1073,7 +1578,8 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
             }
         }
 
-        var newBitArray = [];
+        var newBitArray = new Uint8Array(mask.length);
+        var newBitArrayLength = 0;
         var shearedToFull = new Map();
         var fullToSheared = new Map();
         var postorderPos = 1;
@@ -1081,8 +1587,8 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         var names = [null];
         var lengths = [null];
         for (i = 0; i < mask.length; i++) {
-            if (mask[i] !== undefined) {
-                newBitArray.push(mask[i]);
+            if (mask[i] !== -1) {
+                newBitArray[newBitArrayLength++] = mask[i];
             }
 
             // get name and length of node
@@ -1099,7 +1605,12 @@ define(["ByteArray", "underscore"], function (ByteArray, _) {
         return {
             shearedToFull: shearedToFull,
             fullToSheared: fullToSheared,
-            tree: new BPTree(newBitArray, names, lengths, null),
+            tree: new BPTree(
+                newBitArray.subarray(0, newBitArrayLength),
+                names,
+                lengths,
+                null
+            ),
         };
     };
 
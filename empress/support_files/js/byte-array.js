@@ -8,47 +8,102 @@ define([], function () {
     var ByteArray = {};
 
     /**
-     * Creates a new array whose ith index is the number of times val appears
-     * up to the ith index of arr
+     * Decodes a base64 string of packed bits into an array of 0s and 1s.
      *
-     * @param {ArrayBuffer} arr Any ArrayBuffer object
-     * @param {ArrayBuffer} ArrayType The constructor for the new array
-     * @param {Number} val The val to count
+     * This is the inverse of tools.pack_bits() in the Python code: each byte
+     * holds eight bits, most significant bit first (this is what
+     * numpy.packbits() does by default).
      *
-     * @return {ArrayBuffer}
+     * @param {String or Uint8Array} encoded Base64-encoded bytes, or the
+     *                                       bytes themselves (e.g. as loaded
+     *                                       from a sidecar file)
+     * @param {Number} numBits The number of bits to decode. If this is not
+     *                         specified, then every bit in encoded (including
+     *                         any zeros used to pad the last byte) will be
+     *                         decoded.
+     *
+     * @return {Array}
      */
-    ByteArray.sumVal = function (arr, ArrayType, val) {
-        var l = arr.length;
-        var sumArr = new ArrayType(arr);
-        var total = 0;
-        for (var i = 0; i < l; i++) {
-            total = arr[i] === val ? total + 1 : total;
-            sumArr[i] = total;
+    ByteArray.unpackBits = function (encoded, numBits) {
+        var getByte, numBytes;
+        if (encoded instanceof Uint8Array) {
+            numBytes = encoded.length;
+            getByte = function (b) {
+                return encoded[b];
+            };
+        } else {
+            var bytes = atob(encoded);
+            numBytes = bytes.length;
+            getByte = function (b) {
+                return bytes.charCodeAt(b);
+            };
+        }
+        if (numBits === undefined) {
+            numBits = numBytes * 8;
         }
-        return sumArr;
+        var bits = new Array(numBits);
+        var byteVal;
+        for (var i = 0; i < numBits; i++) {
+            if (i % 8 === 0) {
+                byteVal = getByte(i / 8);
+            }
+            bits[i] = (byteVal >> (7 - (i % 8))) & 1;
+        }
+        return bits;
     };
 
     /**
-     * Creates a new array whose ith index is the index of the first element in
-     * arr that equals startVal + i
+     * Decodes a base64 string of 32-bit unsigned integers into a Uint32Array.
+     *
+     * This is the inverse of tools.encode_uint32() in the Python code. The
+     * returned array is a view on the decoded bytes, so no per-element
+     * parsing is done. (Note that this relies on the integers being stored
+     * in the same byte order as the browser uses; tools.encode_uint32()
+     * writes them as little-endian, which is what essentially every browser
+     * uses.)
+     *
+     * @param {String} encoded Base64-encoded bytes
+     *
+     * @return {Uint32Array}
+     */
+    ByteArray.decodeUint32Array = function (encoded) {
+        return new Uint32Array(ByteArray.decodeBytes(encoded).buffer);
+    };
+
+    /**
+     * Decodes a base64 string into a Uint8Array of the bytes it encodes.
+     *
+     * @param {String} encoded Base64-encoded bytes
+     *
+     * @return {Uint8Array}
+     */
+    ByteArray.decodeBytes = function (encoded) {
+        var bytes = atob(encoded);
+        var buffer = new Uint8Array(bytes.length);
+        for (var i = 0; i < bytes.length; i++) {
+            buffer[i] = bytes.charCodeAt(i);
+        }
+        return buffer;
+    };
+
+    /**
+     * Packs an array of 0s and 1s into a Uint8Array.
+     *
+     * This is the inverse of unpackBits(): each byte holds eight bits, most
+     * significant bit first, and the last byte is padded with 0s.
      *
-     * @param {ArrayBuffer} arr Any ArrayBuffer object
-     * @param {ArrayBuffer} ArrayType The constructor for the new array
-     * @param {Number} startVal The value to start at
+     * @param {Array or TypedArray} bits Array of 0s and 1s
      *
-     * @return {ArrayBuffer}
+     * @return {Uint8Array}
      */
-    ByteArray.seqUniqueIndx = function (arr, ArrayType, startVal = 1) {
-        var l = arr.length;
-        var unqArr = [];
-        var currentVal = startVal;
-        for (var i = 0; i < l; i++) {
-            if (arr[i] === currentVal) {
-                unqArr.push(i);
-                currentVal += 1;
+    ByteArray.packBits = function (bits) {
+        var packed = new Uint8Array(Math.ceil(bits.length / 8));
+        for (var i = 0; i < bits.length; i++) {
+            if (bits[i]) {
+                packed[i >>> 3] |= 0x80 >>> (i & 7);
             }
         }
-        return new ArrayType(unqArr);
+        return packed;
     };
 
     return ByteArray;
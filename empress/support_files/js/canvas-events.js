@@ -164,12 +164,14 @@ define(["underscore", "glMatrix", "SelectedNodeMenu"], function (
 
                 // Go through all the nodes in the tree and find the node
                 // closest to the (x, y) point that was clicked
+                var visible = empress.getNodeInfoColumn("visible");
+                var coordColumns = empress.getCoordColumns();
                 for (var node of empress._tree.postorderTraversal(
                     (includeRoot = true)
                 )) {
-                    if (!empress.getNodeInfo(node, "visible")) continue;
-                    var nodeX = empress.getX(node);
-                    var nodeY = empress.getY(node);
+                    if (!visible[node]) continue;
+                    var nodeX = coordColumns.x[node];
+                    var nodeY = coordColumns.y[node];
                     xDist = x - nodeX;
                     yDist = y - nodeY;
                     var squareDist = xDist * xDist + yDist * yDist;
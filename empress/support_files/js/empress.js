@@ -9,9 +9,11 @@ define([
     "Legend",
     "util",
     "chroma",
-    "LayoutsUtil",
     "ExportUtil",
     "TreeController",
+    "FeatureMetadata",
+    "LayoutComputer",
+    "LayoutCache",
 ], function (
     _,
     Camera,
@@ -23,10 +25,100 @@ define([
     Legend,
     util,
     chroma,
-    LayoutsUtil,
     ExportUtil,
-    TreeController
+    TreeController,
+    FeatureMetadata,
+    LayoutComputer,
+    LayoutCache
 ) {
+    /**
+     * @type {Object}
+     * Maps each attribute stored for the nodes of the tree to the type of
+     * typed array it's stored in. Boolean attributes are stored as 0s and 1s.
+     * Float attributes that haven't been set for a node are NaN (e.g. tips'
+     * lowestchildyr / highestchildyr).
+     */
+    var NODE_ATTR_TYPES = {
+        // all nodes (non-layout attributes)
+        color: Float32Array,
+        isColored: Uint8Array,
+        visible: Uint8Array,
+        // unrooted layout
+        x2: Float32Array,
+        y2: Float32Array,
+        // rectangular layout
+        xr: Float32Array,
+        yr: Float32Array,
+        highestchildyr: Float32Array,
+        lowestchildyr: Float32Array,
+        // circular layout
+        xc0: Float32Array,
+        yc0: Float32Array,
+        xc1: Float32Array,
+        yc1: Float32Array,
+        angle: Float32Array,
+        arcx0: Float32Array,
+        arcy0: Float32Array,
+        arcstartangle: Float32Array,
+        arcendangle: Float32Array,
+    };
+
+    /**
+     * @type {Array}
+     * The node attributes that are only defined for a certain layout. Only
+     * the current layout's attributes are stored.
+     */
+    var LAYOUT_ATTRS = [
+        "x2",
+        "y2",
+        "xr",
+        "yr",
+        "highestchildyr",
+        "lowestchildyr",
+        "xc0",
+        "yc0",
+        "xc1",
+        "yc1",
+        "angle",
+        "arcx0",
+        "arcy0",
+        "arcstartangle",
+        "arcendangle",
+    ];
+
+    /**
+     * @type {Object}
+     * Maps each layout to an Object mapping the properties of its data (see
+     * LayoutsUtil.computeLayout()) to the node attributes they're stored as.
+     */
+    var LAYOUT_DATA_TO_ATTRS = {
+        Rectangular: {
+            xCoord: "xr",
+            yCoord: "yr",
+            highestChildYr: "highestchildyr",
+            lowestChildYr: "lowestchildyr",
+        },
+        Circular: {
+            x0: "xc0",
+            y0: "yc0",
+            x1: "xc1",
+            y1: "yc1",
+            angle: "angle",
+            arcx0: "arcx0",
+            arcy0: "arcy0",
+            arcStartAngle: "arcstartangle",
+            arcEndAngle: "arcendangle",
+        },
+        Unrooted: { xCoord: "x2", yCoord: "y2" },
+    };
+
+    /**
+     * @type {Number}
+     * The maximum number of bytes used by the layouts that Empress caches
+     * (see Empress._layoutCache).
+     */
+    var LAYOUT_CACHE_MAX_BYTES = 128 * 1024 * 1024;
+
     /**
      * @class EmpressTree
      *
@@ -37,11 +129,10 @@ define([
      *                                 tree-plot), this should be null.
      * @param {Array} featureMetadataColumns Columns of the feature metadata.
      *                Note: The order of this array should match the order of
-     *                      the arrays which are the values of tipMetadata and
-     *                      intMetadata. If no feature metadata was provided
-     *                      when generating an Empress visualization, this
-     *                      parameter should be [] (and tipMetadata and
-     *                      intMetadata should be {}s).
+     *                      the columns in tipMetadata (and intMetadata). If
+     *                      no feature metadata was provided when generating
+     *                      an Empress visualization, this parameter should
+     *                      be [].
      * @param {Array} splitTaxonomyColumns Columns of the feature metadata
      *                                     corresponding to explicitly
      *                                     specified levels of a taxonomy, if
@@ -49,13 +140,19 @@ define([
      *                                     applicable. Every value in this
      *                                     Array must also be present in
      *                                     featureMetadataColumns.
-     * @param {Object} tipMetadata Feature metadata for tips in the tree.
-     *                 Note: This should map tip names to an array of feature
-     *                       metadata values. Each array should have the same
-     *                       length as featureMetadataColumns.
-     * @param {Object} intMetadata Feature metadata for internal nodes in tree.
+     * @param {FeatureMetadata or Object} tipMetadata Feature metadata for the
+     *                 nodes in the tree. This can be either a FeatureMetadata
+     *                 object, or the compressed feature metadata produced by
+     *                 the Python code (i.e. an Object with the keys "row_ptr",
+     *                 "num_tip_rows", "values", and "codes") -- in both of
+     *                 these cases, intMetadata is ignored. For convenience,
+     *                 this can also be an Object mapping tips' postorder
+     *                 positions to arrays of feature metadata values (each of
+     *                 the same length as featureMetadataColumns).
+     * @param {Object or null} intMetadata Feature metadata for internal nodes
+     *                 in the tree, only used if tipMetadata is an Object
+     *                 mapping postorder positions to arrays of values.
      *                 Note: Should be formatted analogously to tipMetadata.
-     *                       Note that internal node names can be non-unique.
      * @param {Canvas} canvas The HTML canvas that the tree will be drawn on.
      */
     function Empress(
@@ -99,64 +196,24 @@ define([
         this._tree = new TreeController(tree);
 
         /**
-         * Used to index into _treeData
          * @type {Object}
-         * @private
-         */
-        this._tdToInd = {
-            // all nodes (non-layout parameters)
-            color: 0,
-            isColored: 1,
-            visible: 2,
-            // unrooted layout
-            x2: 3,
-            y2: 4,
-            // rectangular layout
-            xr: 3,
-            yr: 4,
-            highestchildyr: 5,
-            lowestchildyr: 6,
-            // circular layout
-            xc0: 3,
-            yc0: 4,
-            xc1: 5,
-            yc1: 6,
-            angle: 7,
-            arcx0: 8,
-            arcy0: 9,
-            arcstartangle: 10,
-            arcendangle: 11,
-        };
-
-        /**
-         * The number of non layout parameters in _treeData.
-         * @type {Number}
-         * @private
-         */
-        this._numOfNonLayoutParams = 3;
-
-        /**
-         * @type {Array}
-         * The metadata associated with the tree branches
+         * The data associated with each node in the tree. Maps each node
+         * attribute (see NODE_ATTR_TYPES) to a typed array with one element
+         * per node, indexed by the node's postorder position. (Since
+         * postorder positions start at 1, element 0 is unused.)
          * Note: postorder positions are used as indices because internal node
          *       names are not assumed to be unique.
+         * Use getNodeInfo() / setNodeInfo() to access single nodes, and
+         * getNodeInfoColumn() / setNodeInfoForNodes() / fillNodeInfo() to
+         * access many nodes at once.
          * @private
          */
-        this._treeData = new Array(this._tree.size + 1);
+        this._treeData = {};
 
         // set default color/visible status for each node
-        // Note: currently empress tree uses 1-based index since the bp-tree
-        //       bp-tree.js is based off of used 1-based index.
-        for (var i = 1; i <= this._tree.size; i++) {
-            this._treeData[i] = new Array(this._tdToInd.length);
-            this._treeData[i].splice(
-                this._tdToInd.color,
-                0,
-                this.DEFAULT_COLOR
-            );
-            this._treeData[i].splice(this._tdToInd.isColored, 0, false);
-            this._treeData[i].splice(this._tdToInd.visible, 0, true);
-        }
+        this.fillNodeInfo("color", this.DEFAULT_COLOR);
+        this.fillNodeInfo("isColored", false);
+        this.fillNodeInfo("visible", true);
 
         /**
          * @type {Legend}
@@ -194,15 +251,25 @@ define([
         this._splitTaxonomyColumns = splitTaxonomyColumns;
 
         /**
-         * @type{Object}
-         * Feature metadata: keys are tree node names, and values are arrays
-         * of length equal to this._featureMetadataColumns.length.
-         * For the sake of simplicity, we split this up into tip and internal
-         * node feature metadata objects.
+         * @type{FeatureMetadata}
+         * Feature metadata for the nodes in the tree, stored in a columnar
+         * format: each column is stored as an array of its unique values plus
+         * an array of codes (one per row of feature metadata) into this array.
          * @private
          */
-        this._tipMetadata = tipMetadata;
-        this._intMetadata = intMetadata;
+        if (tipMetadata instanceof FeatureMetadata) {
+            this._featureMetadata = tipMetadata;
+        } else if (_.has(tipMetadata, "row_ptr")) {
+            this._featureMetadata = FeatureMetadata.fromCompressed(
+                tipMetadata
+            );
+        } else {
+            this._featureMetadata = FeatureMetadata.fromObjects(
+                tipMetadata || {},
+                intMetadata || {},
+                featureMetadataColumns.length
+            );
+        }
 
         /**
          * @type{Object}
@@ -245,6 +312,33 @@ define([
          */
         this._yrscf = null;
 
+        /**
+         * @type {LayoutComputer}
+         * Computes the layouts. By default layouts are computed on the main
+         * thread: see useLayoutWorker().
+         * @private
+         */
+        this._layoutComputer = new LayoutComputer();
+
+        /**
+         * @type {LayoutCache}
+         * Stores the layouts that have already been computed, so that
+         * switching back to them is instant. Maps the keys returned by
+         * _getLayoutCacheKey() to Objects with two keys: "columns" (mapping
+         * the layout's node attributes to their columns in _treeData) and
+         * "yScalingFactor".
+         * @private
+         */
+        this._layoutCache = new LayoutCache(LAYOUT_CACHE_MAX_BYTES);
+
+        /**
+         * @type {String}
+         * Describes the current shear state (see shear()). Used in the keys
+         * of this._layoutCache.
+         * @private
+         */
+        this._shearKey = JSON.stringify([]);
+
         /**
          * @type {Number}
          * For the rectangular layout, this is the rightmost x-coordinate;
@@ -393,148 +487,210 @@ define([
      * Computes the current tree layout and fills _treeData.
      *
      * Also updates this._maxDisplacement.
+     *
+     * Computed layouts are cached (see _getLayoutCacheKey()), so if this
+     * layout has been computed before, it's reused. Otherwise, if a layout
+     * worker is being used (see useLayoutWorker()), the layout is computed in
+     * the background and the loading screen shows its progress; if not, it's
+     * computed before this function returns. If this is called again before
+     * the worker has finished, then only the newest layout is used (and only
+     * the newest callback is called).
+     *
+     * @param {Function} callback Optional; called (with no arguments) once
+     *                            the layout has been stored.
      */
-    Empress.prototype.getLayoutInfo = function () {
-        var data,
-            i,
-            j = 1;
-        // set up length getter
-        var branchMethod = this.branchMethod;
-        var checkLengthsChange = LayoutsUtil.shouldCheckBranchLengthsChanged(
-            branchMethod
-        );
-        var lengthGetter = LayoutsUtil.getLengthMethod(
-            branchMethod,
-            this._tree.getTree()
-        );
-        var dataForOnlyRoot = function (coordKeys) {
-            var rootCoordData = {};
-            _.each(coordKeys, function (key) {
-                rootCoordData[key] = [null, 0];
-            });
-            return rootCoordData;
-        };
-        // Rectangular
-        if (this._currentLayout === "Rectangular") {
-            // tree is just root
-            if (this._tree.currentSize == 1) {
-                data = dataForOnlyRoot([
-                    "xCoord",
-                    "yCoord",
-                    "highestChildYr",
-                    "lowestChildYr",
-                    "yScalingFactor",
-                ]);
-            } else {
-                data = LayoutsUtil.rectangularLayout(
-                    this._tree.getTree(),
-                    4020,
-                    4020,
-                    // since lengths for "ignoreLengths" are set by `lengthGetter`,
-                    // we don't need (and should likely deprecate) the ignoreLengths
-                    // option for the Layout functions since the layout function only
-                    // needs to know lengths in order to layout a tree, it doesn't
-                    // really need encapsulate all of the logic for determining
-                    // what lengths it should lay out.
-                    this.leafSorting,
-                    undefined,
-                    lengthGetter,
-                    checkLengthsChange
-                );
-            }
-            this._yrscf = data.yScalingFactor;
-            for (i of this._tree.postorderTraversal((includeRoot = true))) {
-                // remove old layout information
-                this._treeData[i].length = this._numOfNonLayoutParams;
-
-                // store new layout information
-                this._treeData[i][this._tdToInd.xr] = data.xCoord[j];
-                this._treeData[i][this._tdToInd.yr] = data.yCoord[j];
-                this._treeData[i][this._tdToInd.highestchildyr] =
-                    data.highestChildYr[j];
-                this._treeData[i][this._tdToInd.lowestchildyr] =
-                    data.lowestChildYr[j];
-                j += 1;
-            }
-        } else if (this._currentLayout === "Circular") {
-            if (this._tree.currentSize == 1) {
-                data = dataForOnlyRoot([
-                    "x0",
-                    "y0",
-                    "x1",
-                    "y1",
-                    "angle",
-                    "arcx0",
-                    "arcy0",
-                    "arcStartAngle",
-                    "arcEndAngle",
-                ]);
-            } else {
-                data = LayoutsUtil.circularLayout(
-                    this._tree.getTree(),
-                    4020,
-                    4020,
-                    this.leafSorting,
-                    undefined,
-                    lengthGetter,
-                    checkLengthsChange
-                );
-            }
-            for (i of this._tree.postorderTraversal((includeRoot = true))) {
-                // remove old layout information
-                this._treeData[i].length = this._numOfNonLayoutParams;
-
-                // store new layout information
-                this._treeData[i][this._tdToInd.xc0] = data.x0[j];
-                this._treeData[i][this._tdToInd.yc0] = data.y0[j];
-                this._treeData[i][this._tdToInd.xc1] = data.x1[j];
-                this._treeData[i][this._tdToInd.yc1] = data.y1[j];
-                this._treeData[i][this._tdToInd.angle] = data.angle[j];
-                this._treeData[i][this._tdToInd.arcx0] = data.arcx0[j];
-                this._treeData[i][this._tdToInd.arcy0] = data.arcy0[j];
-                this._treeData[i][this._tdToInd.arcstartangle] =
-                    data.arcStartAngle[j];
-                this._treeData[i][this._tdToInd.arcendangle] =
-                    data.arcEndAngle[j];
-                j += 1;
+    Empress.prototype.getLayoutInfo = function (callback) {
+        var scope = this;
+        var layout = this._currentLayout;
+        var usesWorker = this._layoutComputer.usesWorker();
+        var cacheKey = this._getLayoutCacheKey();
+        var finish = function () {
+            scope._drawer.loadTreeCoordsBuff(scope.getTreeCoords());
+            scope._computeMaxDisplacement();
+            if (!_.isUndefined(callback)) {
+                callback();
             }
-        } else {
-            if (this._tree.currentSize == 1) {
-                data = dataForOnlyRoot(["xCoord", "yCoord"]);
-            } else {
-                data = LayoutsUtil.unrootedLayout(
-                    this._tree.getTree(),
-                    4020,
-                    4020,
-                    undefined,
-                    lengthGetter,
-                    checkLengthsChange
-                );
+        };
+
+        var cached = this._layoutCache.get(cacheKey);
+        if (!_.isUndefined(cached)) {
+            // Any layout that's still being computed is now out of date
+            this._layoutComputer.cancel();
+            if (usesWorker) {
+                this._hideLoadingScreen();
             }
-            for (i of this._tree.postorderTraversal((includeRoot = true))) {
-                // remove old layout information
-                this._treeData[i].length = this._numOfNonLayoutParams;
-
-                // store new layout information
-                this._treeData[i][this._tdToInd.x2] = data.xCoord[j];
-                this._treeData[i][this._tdToInd.y2] = data.yCoord[j];
-                j += 1;
+            _.each(LAYOUT_ATTRS, function (attr) {
+                delete scope._treeData[attr];
+            });
+            _.extend(this._treeData, cached.columns);
+            this._yrscf = cached.yScalingFactor;
+            finish();
+            return;
+        }
+
+        this._layoutComputer.compute(
+            this._tree.getTree(),
+            layout,
+            {
+                width: 4020,
+                height: 4020,
+                leafSorting: this.leafSorting,
+                branchMethod: this.branchMethod,
+            },
+            function (data) {
+                if (layout === "Rectangular") {
+                    scope._yrscf = data.yScalingFactor;
+                }
+                var layoutInfo = {};
+                _.each(LAYOUT_DATA_TO_ATTRS[layout], function (attr, key) {
+                    layoutInfo[attr] = data[key];
+                });
+                scope._setLayoutInfo(layoutInfo);
+                scope._cacheLayout(cacheKey, _.keys(layoutInfo));
+                if (usesWorker) {
+                    scope._hideLoadingScreen();
+                }
+                finish();
+            },
+            function (message) {
+                scope._showLoadingScreen(message);
             }
+        );
+    };
+
+    /**
+     * Returns the key of the current layout in this._layoutCache.
+     *
+     * Layouts are identified by the layout's name, the branch length method,
+     * the leaf sorting method (which the unrooted layout doesn't use), and
+     * the shear state.
+     *
+     * @return {String}
+     * @private
+     */
+    Empress.prototype._getLayoutCacheKey = function () {
+        var leafSorting =
+            this._currentLayout === "Unrooted" ? null : this.leafSorting;
+        return JSON.stringify([
+            this._currentLayout,
+            this.branchMethod,
+            leafSorting,
+            this._shearKey,
+        ]);
+    };
+
+    /**
+     * Stores the current layout's columns in this._layoutCache.
+     *
+     * (The columns themselves are stored, not copies: this is fine since
+     * _setLayoutInfo() creates new columns rather than modifying them.)
+     *
+     * @param {String} cacheKey See _getLayoutCacheKey().
+     * @param {Array} attrs The layout's node attributes.
+     * @private
+     */
+    Empress.prototype._cacheLayout = function (cacheKey, attrs) {
+        var scope = this;
+        var columns = {};
+        var numBytes = 0;
+        _.each(attrs, function (attr) {
+            columns[attr] = scope._treeData[attr];
+            numBytes += columns[attr].byteLength;
+        });
+        this._layoutCache.set(
+            cacheKey,
+            { columns: columns, yScalingFactor: this._yrscf },
+            numBytes
+        );
+    };
+
+    /**
+     * Computes layouts in a Web Worker from now on, so that the page stays
+     * responsive while they're computed (see LayoutComputer).
+     *
+     * If the worker can't be started, layouts are still computed on the main
+     * thread.
+     *
+     * @param {String} workerURL URL of layout-worker.js.
+     */
+    Empress.prototype.useLayoutWorker = function (workerURL) {
+        this._layoutComputer = new LayoutComputer(workerURL);
+    };
+
+    /**
+     * Shows the loading screen over the tree, if the page has one.
+     *
+     * @param {String} message Text to show on the loading screen.
+     * @private
+     */
+    Empress.prototype._showLoadingScreen = function (message) {
+        var loadingScreen = document.getElementById("loading-screen");
+        if (loadingScreen !== null) {
+            document.getElementById("loading-text").textContent = message;
+            loadingScreen.classList.remove("hidden");
         }
-        this._drawer.loadTreeCoordsBuff(this.getTreeCoords());
-        this._computeMaxDisplacement();
+    };
+
+    /**
+     * Hides the loading screen, if the page has one.
+     *
+     * @private
+     */
+    Empress.prototype._hideLoadingScreen = function () {
+        var loadingScreen = document.getElementById("loading-screen");
+        if (loadingScreen !== null) {
+            loadingScreen.classList.add("hidden");
+        }
+    };
+
+    /**
+     * Stores the coordinates of the current layout in _treeData, replacing
+     * those of the previous layout.
+     *
+     * @param {Object} layoutInfo Maps layout attributes (e.g. "xr") to arrays
+     *                            of their values for each node in the
+     *                            (sheared) tree, in postorder. As with the
+     *                            output of the LayoutsUtil functions, these
+     *                            arrays are 1-indexed.
+     * @private
+     */
+    Empress.prototype._setLayoutInfo = function (layoutInfo) {
+        var scope = this;
+        // remove old layout information
+        _.each(LAYOUT_ATTRS, function (attr) {
+            delete scope._treeData[attr];
+        });
+
+        // store new layout information
+        var nodes = Array.from(
+            this._tree.postorderTraversal((includeRoot = true))
+        );
+        _.each(layoutInfo, function (values, attr) {
+            var column = scope.getNodeInfoColumn(attr);
+            for (var j = 0; j < nodes.length; j++) {
+                column[nodes[j]] = values[j + 1];
+            }
+        });
     };
 
     /**
      * Initializes WebGL and then draws the tree
+     *
+     * @param {Function} callback Optional; called once the tree has been
+     *                            drawn (see getLayoutInfo()).
      */
-    Empress.prototype.initialize = function () {
+    Empress.prototype.initialize = function (callback) {
+        var scope = this;
         this._drawer.initialize();
         this._events.setMouseEvents();
         this.setAutoCompleteNames();
 
-        this.getLayoutInfo();
-        this.centerLayoutAvgPoint();
+        this.getLayoutInfo(function () {
+            scope.centerLayoutAvgPoint();
+            if (!_.isUndefined(callback)) {
+                callback();
+            }
+        });
     };
 
     /**
@@ -550,7 +706,14 @@ define([
         if (attr === "name") {
             return this._tree.name(this._tree.postorderselect(node));
         }
-        return this._treeData[node][this._tdToInd[attr]];
+        var column = this._treeData[attr];
+        if (column === undefined) {
+            return undefined;
+        }
+        if (column instanceof Uint8Array) {
+            return column[node] === 1;
+        }
+        return isNaN(column[node]) ? undefined : column[node];
     };
 
     /**
@@ -565,7 +728,63 @@ define([
      *                      node.
      */
     Empress.prototype.setNodeInfo = function (node, attr, value) {
-        this._treeData[node][this._tdToInd[attr]] = value;
+        this.getNodeInfoColumn(attr)[node] = value;
+    };
+
+    /**
+     * Sets an attribute of many nodes to the same value.
+     *
+     * @param{Iterable} nodes Post-order positions of nodes.
+     * @param{String} attr The attribute to set for the nodes.
+     * @param{Object} value The value to set for the given attribute for the
+     *                      nodes.
+     */
+    Empress.prototype.setNodeInfoForNodes = function (nodes, attr, value) {
+        var column = this.getNodeInfoColumn(attr);
+        for (var node of nodes) {
+            column[node] = value;
+        }
+    };
+
+    /**
+     * Sets an attribute of every node in the tree to the same value.
+     *
+     * @param{String} attr The attribute to set for the nodes.
+     * @param{Object} value The value to set for the given attribute for the
+     *                      nodes.
+     */
+    Empress.prototype.fillNodeInfo = function (attr, value) {
+        this.getNodeInfoColumn(attr).fill(value);
+    };
+
+    /**
+     * Retrieves an attribute of every node in the tree.
+     *
+     * This is much faster than calling getNodeInfo() for many nodes. Note that
+     * the returned array is used to store the attribute, so it shouldn't be
+     * modified (use setNodeInfo() etc. instead).
+     *
+     * @param{String} attr The attribute to retrieve.
+     *
+     * @return {TypedArray} The attribute's value for each node, indexed by
+     *                      postorder position (see this._treeData for
+     *                      details). If attr hasn't been set (e.g. it's an
+     *                      attribute of another layout), then its values will
+     *                      be NaN.
+     * @throws {Error} If attr is not a node attribute.
+     */
+    Empress.prototype.getNodeInfoColumn = function (attr) {
+        if (!this._treeData.hasOwnProperty(attr)) {
+            if (!NODE_ATTR_TYPES.hasOwnProperty(attr)) {
+                throw new Error("Unrecognized node attribute: " + attr);
+            }
+            var column = new NODE_ATTR_TYPES[attr](this._tree.size + 1);
+            if (column instanceof Float32Array) {
+                column.fill(NaN);
+            }
+            this._treeData[attr] = column;
+        }
+        return this._treeData[attr];
     };
 
     /**
@@ -628,6 +847,26 @@ define([
      * @return {Array}
      */
     Empress.prototype.getTreeCoords = function () {
+        var td = this._treeData;
+        // Only retrieve the current layout's attributes, so that we don't
+        // create arrays for the other layouts' attributes (see
+        // getNodeInfoColumn())
+        var lowestChildYr, highestChildYr;
+        var xc0, yc0, arcEndAngle, arcStartAngle, arcx0, arcy0;
+        if (this._currentLayout === "Rectangular") {
+            lowestChildYr = this.getNodeInfoColumn("lowestchildyr");
+            highestChildYr = this.getNodeInfoColumn("highestchildyr");
+        } else if (this._currentLayout === "Circular") {
+            xc0 = this.getNodeInfoColumn("xc0");
+            yc0 = this.getNodeInfoColumn("yc0");
+            arcEndAngle = this.getNodeInfoColumn("arcendangle");
+            arcStartAngle = this.getNodeInfoColumn("arcstartangle");
+            arcx0 = this.getNodeInfoColumn("arcx0");
+            arcy0 = this.getNodeInfoColumn("arcy0");
+        }
+        var coordColumns = this.getCoordColumns();
+        var xs = coordColumns.x;
+        var ys = coordColumns.y;
         var tree = this._tree;
         var coords = [];
 
@@ -645,14 +884,8 @@ define([
          * root be the ONLY node in the tree. So this behavior is ok.)
          */
         if (this._currentLayout === "Rectangular") {
-            addPoint(
-                this.getX(tree.size),
-                this.getNodeInfo(tree.size, "lowestchildyr")
-            );
-            addPoint(
-                this.getX(tree.size),
-                this.getNodeInfo(tree.size, "highestchildyr")
-            );
+            addPoint(xs[tree.size], lowestChildYr[tree.size]);
+            addPoint(xs[tree.size], highestChildYr[tree.size]);
         }
         // iterate through the tree in postorder, skip root
         for (var node of this._tree.postorderTraversal()) {
@@ -663,7 +896,7 @@ define([
             );
             // parent = this._treeData[parent];
 
-            if (!this.getNodeInfo(node, "visible")) {
+            if (!td.visible[node]) {
                 continue;
             }
 
@@ -684,20 +917,14 @@ define([
                  * vertical line.
                  */
                 // 1. Draw horizontal line (we're already skipping the root)
-                addPoint(this.getX(parent), this.getY(node));
-                addPoint(this.getX(node), this.getY(node));
+                addPoint(xs[parent], ys[node]);
+                addPoint(xs[node], ys[node]);
                 // 2. Draw vertical line, if this is an internal node
-                if (this.getNodeInfo(node, "lowestchildyr") !== undefined) {
+                if (!isNaN(lowestChildYr[node])) {
                     // skip if node is root of collapsed clade
                     if (this._collapsedClades.hasOwnProperty(node)) continue;
-                    addPoint(
-                        this.getX(node),
-                        this.getNodeInfo(node, "highestchildyr")
-                    );
-                    addPoint(
-                        this.getX(node),
-                        this.getNodeInfo(node, "lowestchildyr")
-                    );
+                    addPoint(xs[node], highestChildYr[node]);
+                    addPoint(xs[node], lowestChildYr[node]);
                 }
             } else if (this._currentLayout === "Circular") {
                 /* Same deal as above, except instead of a "vertical line" this
@@ -711,11 +938,8 @@ define([
                 // point. The *c1 coordinates are explicitly associated with
                 // the circular layout so we can just use this.getX() /
                 // this.getY() for these coordinates.
-                addPoint(
-                    this.getNodeInfo(node, "xc0"),
-                    this.getNodeInfo(node, "yc0")
-                );
-                addPoint(this.getX(node), this.getY(node));
+                addPoint(xc0[node], yc0[node]);
+                addPoint(xs[node], ys[node]);
                 // 2. Draw arc, if this is an internal node (note again that
                 // we're skipping the root)
                 if (
@@ -728,13 +952,11 @@ define([
                     // arcendangle - arcstartangle radians. This will create an
                     // arc that starts at each internal node's rightmost child
                     // and ends on the leftmost child.
-                    var arcDeltaAngle =
-                        this.getNodeInfo(node, "arcendangle") -
-                        this.getNodeInfo(node, "arcstartangle");
+                    var arcDeltaAngle = arcEndAngle[node] - arcStartAngle[node];
                     var numSamples = this._numSampToApproximate(arcDeltaAngle);
                     var sampleAngle = arcDeltaAngle / numSamples;
-                    var sX = this.getNodeInfo(node, "arcx0");
-                    var sY = this.getNodeInfo(node, "arcy0");
+                    var sX = arcx0[node];
+                    var sY = arcy0[node];
                     for (var line = 0; line < numSamples; line++) {
                         var x =
                             sX * Math.cos(line * sampleAngle) -
@@ -754,14 +976,24 @@ define([
                     }
                 }
             } else {
-                addPoint(this.getX(parent), this.getY(parent));
-                addPoint(this.getX(node), this.getY(node));
+                addPoint(xs[parent], ys[parent]);
+                addPoint(xs[node], ys[node]);
             }
         }
         return new Float32Array(coords);
     };
 
     Empress.prototype.getTreeColor = function () {
+        var td = this._treeData;
+        // (As in getTreeCoords(), only retrieve the current layout's
+        // attributes)
+        var lowestChildYr, arcEndAngle, arcStartAngle;
+        if (this._currentLayout === "Rectangular") {
+            lowestChildYr = this.getNodeInfoColumn("lowestchildyr");
+        } else if (this._currentLayout === "Circular") {
+            arcEndAngle = this.getNodeInfoColumn("arcendangle");
+            arcStartAngle = this.getNodeInfoColumn("arcstartangle");
+        }
         var tree = this._tree;
 
         var coords = [];
@@ -780,17 +1012,17 @@ define([
          * root be the ONLY node in the tree. So this behavior is ok.)
          */
         if (this._currentLayout === "Rectangular") {
-            color = this.getNodeInfo(tree.size, "color");
+            color = td.color[tree.size];
             addPoint();
         }
         // iterate through the tree in postorder, skip root
         for (var node of this._tree.postorderTraversal()) {
-            if (!this.getNodeInfo(node, "visible")) {
+            if (!td.visible[node]) {
                 continue;
             }
 
             // branch color
-            color = this.getNodeInfo(node, "color");
+            color = td.color[node];
 
             if (this._currentLayout === "Rectangular") {
                 /* Nodes in the rectangular layout can have up to two "parts":
@@ -811,7 +1043,7 @@ define([
                 // 1. Draw horizontal line (we're already skipping the root)
                 addPoint();
                 // 2. Draw vertical line, if this is an internal node
-                if (this.getNodeInfo(node, "lowestchildyr") !== undefined) {
+                if (!isNaN(lowestChildYr[node])) {
                     // skip if node is root of collapsed clade
                     if (this._collapsedClades.hasOwnProperty(node)) continue;
                     addPoint();
@@ -841,9 +1073,7 @@ define([
                     // arcendangle - arcstartangle radians. This will create an
                     // arc that starts at each internal node's rightmost child
                     // and ends on the leftmost child.
-                    var arcDeltaAngle =
-                        this.getNodeInfo(node, "arcendangle") -
-                        this.getNodeInfo(node, "arcstartangle");
+                    var arcDeltaAngle = arcEndAngle[node] - arcStartAngle[node];
                     var numSamples = this._numSampToApproximate(arcDeltaAngle);
                     for (var line = 0; line < numSamples; line++) {
                         addPoint();
@@ -905,6 +1135,24 @@ define([
         return this.getNodeInfo(node, yname);
     };
 
+    /**
+     * Retrieves the x and y coordinates of every node in the current layout.
+     *
+     * This is much faster than calling getX() / getY() for many nodes (see
+     * getNodeInfoColumn()).
+     *
+     * @return {Object} Contains two keys, "x" and "y", mapping to the x and y
+     *                  coordinates of each node (indexed by postorder
+     *                  position).
+     */
+    Empress.prototype.getCoordColumns = function () {
+        var suffix = this._layoutToCoordSuffix[this._currentLayout];
+        return {
+            x: this.getNodeInfoColumn("x" + suffix),
+            y: this.getNodeInfoColumn("y" + suffix),
+        };
+    };
+
     /**
      * Retrieves the node coordinate info (for drawing node circles).
      *
@@ -912,11 +1160,14 @@ define([
      *                 for every node circle to be drawn.
      */
     Empress.prototype.getNodeCoords = function () {
+        var td = this._treeData;
+        var coordColumns = this.getCoordColumns();
+        var xs = coordColumns.x;
+        var ys = coordColumns.y;
         var tree = this._tree;
         var coords = [];
-        var scope = this;
         var visible = function (node) {
-            return scope.getNodeInfo(node, "visible");
+            return td.visible[node];
         };
         var comp;
 
@@ -957,11 +1208,7 @@ define([
             // In the past, we only drew circles for nodes with an assigned
             // name (i.e. where the name of a node was not null). Now, we
             // just draw circles for all nodes.
-            coords.push(
-                this.getX(node),
-                this.getY(node),
-                this.getNodeInfo(node, "color")
-            );
+            coords.push(xs[node], ys[node], td.color[node]);
         }
         return new Float32Array(coords);
     };
@@ -1212,25 +1459,19 @@ define([
         node,
         lwScaled
     ) {
+        var td = this._treeData;
+        var highestChildYr = this.getNodeInfoColumn("highestchildyr");
+        var lowestChildYr = this.getNodeInfoColumn("lowestchildyr");
+        var coordColumns = this.getCoordColumns();
+        var xs = coordColumns.x;
+        var ys = coordColumns.y;
         var corners = {
-            tL: [
-                this.getX(node) - lwScaled,
-                this.getNodeInfo(node, "highestchildyr"),
-            ],
-            tR: [
-                this.getX(node) + lwScaled,
-                this.getNodeInfo(node, "highestchildyr"),
-            ],
-            bL: [
-                this.getX(node) - lwScaled,
-                this.getNodeInfo(node, "lowestchildyr"),
-            ],
-            bR: [
-                this.getX(node) + lwScaled,
-                this.getNodeInfo(node, "lowestchildyr"),
-            ],
+            tL: [xs[node] - lwScaled, highestChildYr[node]],
+            tR: [xs[node] + lwScaled, highestChildYr[node]],
+            bL: [xs[node] - lwScaled, lowestChildYr[node]],
+            bR: [xs[node] + lwScaled, lowestChildYr[node]],
         };
-        var color = this.getNodeInfo(node, "color");
+        var color = td.color[node];
         this._addTriangleCoords(coords, corners, color);
     };
 
@@ -1246,6 +1487,24 @@ define([
      *                    util.parseAndValidateNum().)
      */
     Empress.prototype.thickenColoredNodes = function (lw) {
+        var td = this._treeData;
+        // (As in getTreeCoords(), only retrieve the current layout's
+        // attributes)
+        var lowestChildYr;
+        var xc0, yc0, arcEndAngle, arcStartAngle, arcx0, arcy0;
+        if (this._currentLayout === "Rectangular") {
+            lowestChildYr = this.getNodeInfoColumn("lowestchildyr");
+        } else if (this._currentLayout === "Circular") {
+            xc0 = this.getNodeInfoColumn("xc0");
+            yc0 = this.getNodeInfoColumn("yc0");
+            arcEndAngle = this.getNodeInfoColumn("arcendangle");
+            arcStartAngle = this.getNodeInfoColumn("arcstartangle");
+            arcx0 = this.getNodeInfoColumn("arcx0");
+            arcy0 = this.getNodeInfoColumn("arcy0");
+        }
+        var coordColumns = this.getCoordColumns();
+        var xs = coordColumns.x;
+        var ys = coordColumns.y;
         // If lw isn't > 0, then we don't thicken colored lines at all --
         // we just leave them at their default width.
         if (lw < 0) {
@@ -1284,10 +1543,7 @@ define([
         // In the corner case where the root node (located at index tree.size)
         // has an assigned color, thicken the root's drawn vertical line when
         // drawing the tree in Rectangular layout mode
-        if (
-            this._currentLayout === "Rectangular" &&
-            this.getNodeInfo(tree.size, "isColored")
-        ) {
+        if (this._currentLayout === "Rectangular" && td.isColored[tree.size]) {
             this._addThickVerticalLineCoords(coords, tree.size, lwScaled);
         }
         // iterate through the tree in postorder, skip root
@@ -1299,16 +1555,16 @@ define([
 
             if (
                 this._collapsedClades.hasOwnProperty(node) ||
-                !this.getNodeInfo(node, "visible") ||
-                !this.getNodeInfo(node, "isColored")
+                !td.visible[node] ||
+                !td.isColored[node]
             ) {
                 continue;
             }
 
-            var color = this.getNodeInfo(node, "color");
+            var color = td.color[node];
             if (this._currentLayout === "Rectangular") {
                 // Draw a thick vertical line for this node, if it isn't a tip
-                if (this.getNodeInfo(node, "lowestchildyr") !== undefined) {
+                if (!isNaN(lowestChildYr[node])) {
                     this._addThickVerticalLineCoords(coords, node, lwScaled);
                 }
                 /* Draw a horizontal thick line for this node -- we can safely
@@ -1320,10 +1576,10 @@ define([
                  * bL   bR---
                  */
                 corners = {
-                    tL: [this.getX(parent), this.getY(node) + lwScaled],
-                    tR: [this.getX(node), this.getY(node) + lwScaled],
-                    bL: [this.getX(parent), this.getY(node) - lwScaled],
-                    bR: [this.getX(node), this.getY(node) - lwScaled],
+                    tL: [xs[parent], ys[node] + lwScaled],
+                    tR: [xs[node], ys[node] + lwScaled],
+                    bL: [xs[parent], ys[node] - lwScaled],
+                    bR: [xs[node], ys[node] - lwScaled],
                 };
                 this._addTriangleCoords(coords, corners, color);
             } else if (this._currentLayout === "Circular") {
@@ -1333,13 +1589,11 @@ define([
                 if (!this._tree.isleaf(this._tree.postorderselect(node))) {
                     // An arc will be created for all internal nodes.
                     // See getCoords() for details on how arcs are drawn.
-                    var arcDeltaAngle =
-                        this.getNodeInfo(node, "arcendangle") -
-                        this.getNodeInfo(node, "arcstartangle");
+                    var arcDeltaAngle = arcEndAngle[node] - arcStartAngle[node];
                     var numSamples = this._numSampToApproximate(arcDeltaAngle);
                     var sampleAngle = arcDeltaAngle / numSamples;
-                    var sX = this.getNodeInfo(node, "arcx0");
-                    var sY = this.getNodeInfo(node, "arcy0");
+                    var sX = arcx0[node];
+                    var sY = arcy0[node];
                     for (var line = 0; line < numSamples; line++) {
                         x1 =
                             sX * Math.cos(line * sampleAngle) -
@@ -1373,17 +1627,17 @@ define([
                 }
                 // Thicken the actual "node" portion, extending from the center
                 // of the layout
-                x1 = this.getNodeInfo(node, "xc0");
-                y1 = this.getNodeInfo(node, "yc0");
-                x2 = this.getX(node);
-                y2 = this.getY(node);
+                x1 = xc0[node];
+                y1 = yc0[node];
+                x2 = xs[node];
+                y2 = ys[node];
                 corners = VectorOps.computeBoxCorners(x1, y1, x2, y2, lwScaled);
                 this._addTriangleCoords(coords, corners, color);
             } else {
-                x1 = this.getX(parent);
-                y1 = this.getY(parent);
-                x2 = this.getX(node);
-                y2 = this.getY(node);
+                x1 = xs[parent];
+                y1 = ys[parent];
+                x2 = xs[node];
+                y2 = ys[node];
                 corners = VectorOps.computeBoxCorners(x1, y1, x2, y2, lwScaled);
                 this._addTriangleCoords(coords, corners, color);
             }
@@ -2013,7 +2267,7 @@ define([
         for (var node of this._tree.postorderTraversal()) {
             if (this._tree.isleaf(this._tree.postorderselect(node))) {
                 var name = this.getNodeInfo(node, "name");
-                var fm;
+                var fm, fmRow;
                 // Assign this tip's bar a color
                 var color;
                 if (layer.colorByFM) {
@@ -2024,8 +2278,9 @@ define([
                         layer.colorByFMField
                     );
 
-                    if (_.has(this._tipMetadata, node)) {
-                        fm = getValFromColorFM(this._tipMetadata[node]);
+                    fmRow = this._featureMetadata.getRow(node, "tip");
+                    if (fmRow !== null) {
+                        fm = getValFromColorFM(fmRow);
                         if (_.has(fm2color, fm)) {
                             color = fm2color[fm];
                         } else {
@@ -2059,8 +2314,9 @@ define([
                     var getValFromLengthFM = this._getFMValRetrievalFunction(
                         layer.scaleLengthByFMField
                     );
-                    if (_.has(this._tipMetadata, node)) {
-                        fm = getValFromLengthFM(this._tipMetadata[node]);
+                    fmRow = this._featureMetadata.getRow(node, "tip");
+                    if (fmRow !== null) {
+                        fm = getValFromLengthFM(fmRow);
                         if (_.has(fm2length, fm)) {
                             length = fm2length[fm];
                         } else {
@@ -2220,9 +2476,7 @@ define([
             // convert hex string to rgb number
             var rgb = Colorer.hex2RGB(group);
 
-            for (var i = 0; i < obs.length; i++) {
-                this.setNodeInfo(obs[i], "color", rgb);
-            }
+            this.setNodeInfoForNodes(obs, "color", rgb);
         }
 
         this.drawTree();
@@ -2334,11 +2588,44 @@ define([
      * @throws {Error} If fmCol is not present in this._featureMetadataColumns.
      */
     Empress.prototype._getFMValRetrievalFunction = function (fmCol) {
-        var getValFromFM;
+        var fmIndices = this._getFMColumnIndices(fmCol);
+        if (fmIndices.length === 1) {
+            var fmIdx = fmIndices[0];
+            return function (fmRow) {
+                return fmRow[fmIdx];
+            };
+        } else {
+            return function (fmRow) {
+                return Empress._joinTaxonomyLevels(
+                    _.map(fmIndices, function (ancestorFMIdx) {
+                        return fmRow[ancestorFMIdx];
+                    })
+                );
+            };
+        }
+    };
+
+    /**
+     * Returns the indices of the feature metadata column(s) that are used to
+     * determine the "value" of a feature metadata column.
+     *
+     * See _getFMValRetrievalFunction() for details; the value for fmCol in a
+     * given row of feature metadata is obtained by combining this row's
+     * values for the columns at the returned indices (in order).
+     *
+     * @param {String} fmCol Column in the feature metadata.
+     * @return {Array} Indices in this._featureMetadataColumns.
+     * @throws {Error} If fmCol is not present in this._featureMetadataColumns.
+     */
+    Empress.prototype._getFMColumnIndices = function (fmCol) {
         var taxIdx = _.indexOf(this._splitTaxonomyColumns, fmCol);
         var fmIdx = _.indexOf(this._featureMetadataColumns, fmCol);
         if (fmIdx < 0) {
-            throw 'Feature metadata column "' + cat + '" not present in data.';
+            throw (
+                'Feature metadata column "' +
+                fmCol +
+                '" not present in data.'
+            );
         }
         if (taxIdx <= 0) {
             // If this feature metadata column is not in the "split taxonomy
@@ -2347,46 +2634,46 @@ define([
             // (e.g. "Kingdom" -- in this case taxIdx will be 0), then, when
             // extracting feature metadata from a given row, we can just get
             // this column's single value in that row.
-            return function (fmRow) {
-                return fmRow[fmIdx];
-            };
-        } else {
-            // If this feature metadata column corresponds to a taxonomy level
-            // below the highest one (e.g. phylum, or class, ...) then we want
-            // to handle it specially -- see #473 on GitHub. We'll do this by
-            // recording all the "indices" of the feature metadata columns
-            // corresponding to the ancestors above this feature metadata
-            // column (and then this column itself). This makes it easier to
-            // identify all the ancestral information for a given taxonomy
-            // entry.
-            var ancestorFMIndices = [];
-            // We can use a basic for loop starting at 0 because
-            // this._splitTaxonomyColumns are in order
-            for (var i = 0; i < taxIdx; i++) {
-                var currTaxCol = this._splitTaxonomyColumns[i];
-                var currTaxColFMIdx = _.indexOf(
-                    this._featureMetadataColumns,
-                    currTaxCol
-                );
-                ancestorFMIndices.push(currTaxColFMIdx);
-            }
-            // We already know the index of the column we end at, so just put
-            // it here at the end manually. (Saving this extra work probably
-            // won't make an appreciable time difference, but it feels nice :)
-            ancestorFMIndices.push(fmIdx);
-            return function (fmRow) {
-                var totalFMVal = "";
-                _.each(ancestorFMIndices, function (ancestorFMIdx, ii) {
-                    // Separate adjacent levels in the resulting f.m. value
-                    // shown: e.g. "k__Bacteria; p__Cyanobacteria"
-                    if (ii > 0) {
-                        totalFMVal += "; ";
-                    }
-                    totalFMVal += fmRow[ancestorFMIdx];
-                });
-                return totalFMVal;
-            };
+            return [fmIdx];
+        }
+        // If this feature metadata column corresponds to a taxonomy level
+        // below the highest one (e.g. phylum, or class, ...) then we want
+        // to handle it specially -- see #473 on GitHub. We'll do this by
+        // recording all the "indices" of the feature metadata columns
+        // corresponding to the ancestors above this feature metadata
+        // column (and then this column itself). This makes it easier to
+        // identify all the ancestral information for a given taxonomy
+        // entry.
+        var ancestorFMIndices = [];
+        // We can use a basic for loop starting at 0 because
+        // this._splitTaxonomyColumns are in order
+        for (var i = 0; i < taxIdx; i++) {
+            var currTaxCol = this._splitTaxonomyColumns[i];
+            var currTaxColFMIdx = _.indexOf(
+                this._featureMetadataColumns,
+                currTaxCol
+            );
+            ancestorFMIndices.push(currTaxColFMIdx);
         }
+        // We already know the index of the column we end at, so just put
+        // it here at the end manually. (Saving this extra work probably
+        // won't make an appreciable time difference, but it feels nice :)
+        ancestorFMIndices.push(fmIdx);
+        return ancestorFMIndices;
+    };
+
+    /**
+     * Combines the values of multiple taxonomy levels into a single string.
+     *
+     * Adjacent levels are separated by "; ": e.g.
+     * ["k__Bacteria", "p__Cyanobacteria"] becomes
+     * "k__Bacteria; p__Cyanobacteria".
+     *
+     * @param {Array} levelValues Values for each taxonomy level, in order.
+     * @return {String}
+     */
+    Empress._joinTaxonomyLevels = function (levelValues) {
+        return levelValues.join("; ");
     };
 
     /**
@@ -2414,50 +2701,36 @@ define([
         // get nodes in tree
         var nodes = new Set([...this._tree.postorderTraversal()]);
 
-        // In order to access feature metadata for a given node, we need to
-        // find the 0-based index in this._featureMetadataColumns that the
-        // specified f.m. column corresponds to. (We *could* get around this by
-        // generating a mapping of f.m. column name -> index in Python, but I
-        // don't expect that f.m. columns will be very large and this is only
-        // done once per coloring operation so this shouldn't be a bottleneck.)
-        var fmIdx = _.indexOf(this._featureMetadataColumns, cat);
-        if (fmIdx < 0) {
-            throw 'Feature metadata column "' + cat + '" not present in data.';
-        }
+        // Figure out which feature metadata column(s) determine the values of
+        // this column (this also validates cat).
+        var fmIndices = this._getFMColumnIndices(cat);
 
         // The coloring method influences how much of the feature metadata
         // we'll look at. (While we're at it, validate the coloring method.)
-        var fmObjs;
+        var tipsOnly;
         if (method === "tip") {
-            fmObjs = [this._tipMetadata];
+            tipsOnly = true;
         } else if (method === "all") {
-            fmObjs = [this._tipMetadata, this._intMetadata];
+            tipsOnly = false;
         } else {
             throw 'F. metadata coloring method "' + method + '" unrecognized.';
         }
 
-        // Define how we're going to extract feature metadata for a given "row"
-        // (i.e. for each entry in the feature metadata).
-        var getValFromFM = this._getFMValRetrievalFunction(cat);
-
         // Produce a mapping of unique values in this feature metadata
-        // column to an array of the node name(s) with each value.
-        var uniqueValueToFeatures = {};
-        _.each(fmObjs, function (mObj) {
-            _.mapObject(mObj, function (fmRow, node) {
-                var fmVal = getValFromFM(fmRow);
-                if (!_.has(uniqueValueToFeatures, fmVal)) {
-                    uniqueValueToFeatures[fmVal] = [];
-                }
-
-                // need to convert to integer
-                node = parseInt(node);
+        // column to an array of the node(s) with each value. This is done by
+        // scanning the columns' codes, so each distinct value is only
+        // "assembled" once (rather than once per node).
+        var uniqueValueToFeatures = this._featureMetadata.groupNodesByValue(
+            fmIndices,
+            Empress._joinTaxonomyLevels,
+            tipsOnly
+        );
 
-                // ignore nodes that have been sheared
-                if (!nodes.has(node)) {
-                    return;
-                }
-                uniqueValueToFeatures[fmVal].push(node);
+        // ignore nodes that have been sheared (we still keep their values,
+        // though)
+        _.each(uniqueValueToFeatures, function (fmNodes, fmVal) {
+            uniqueValueToFeatures[fmVal] = _.filter(fmNodes, function (node) {
+                return nodes.has(node);
             });
         });
 
@@ -2645,13 +2918,8 @@ define([
         // color tree
         for (var i = 0; i < categories.length; i++) {
             category = categories[i];
-            var keys = [...obs[category]];
-
-            for (var j = 0; j < keys.length; j++) {
-                var node = keys[j];
-                this.setNodeInfo(node, "color", cm[category]);
-                this.setNodeInfo(node, "isColored", true);
-            }
+            this.setNodeInfoForNodes(obs[category], "color", cm[category]);
+            this.setNodeInfoForNodes(obs[category], "isColored", true);
         }
     };
 
@@ -2659,11 +2927,9 @@ define([
      * Sets the color of the tree back to default
      */
     Empress.prototype.resetTree = function () {
-        for (var node = 1; node <= this._tree.size; node++) {
-            this.setNodeInfo(node, "color", this.DEFAULT_COLOR);
-            this.setNodeInfo(node, "isColored", false);
-            this.setNodeInfo(node, "visible", true);
-        }
+        this.fillNodeInfo("color", this.DEFAULT_COLOR);
+        this.fillNodeInfo("isColored", false);
+        this.fillNodeInfo("visible", true);
         this._collapsedClades = {};
         this._dontCollapse = new Set();
         this._collapsedCladeBuffer = [];
@@ -2739,25 +3005,29 @@ define([
     /**
      * Redraws the tree, using the current layout and any layout parameters
      * that may have changed in the interim.
+     *
+     * (If a layout worker is being used, this finishes after this function
+     * returns: see getLayoutInfo().)
      */
     Empress.prototype.reLayout = function () {
-        this.getLayoutInfo();
-
-        // recollapse clades
-        if (Object.keys(this._collapsedClades).length != 0) {
-            this._collapsedCladeBuffer = [];
-            this.collapseClades();
-        }
+        var scope = this;
+        this.getLayoutInfo(function () {
+            // recollapse clades
+            if (Object.keys(scope._collapsedClades).length != 0) {
+                scope._collapsedCladeBuffer = [];
+                scope.collapseClades();
+            }
 
-        // Adjust the thick-line stuff before calling drawTree() --
-        // this will get the buffer set up before it's actually drawn
-        // in drawTree(). Doing these calls out of order (draw tree,
-        // then call thickenColoredNodes()) causes the thick-line
-        // stuff to only change whenever the tree is redrawn.
-        this.thickenColoredNodes(this._currentLineWidth);
+            // Adjust the thick-line stuff before calling drawTree() --
+            // this will get the buffer set up before it's actually drawn
+            // in drawTree(). Doing these calls out of order (draw tree,
+            // then call thickenColoredNodes()) causes the thick-line
+            // stuff to only change whenever the tree is redrawn.
+            scope.thickenColoredNodes(scope._currentLineWidth);
 
-        this.redrawBarPlotsToMatchLayout();
-        this.centerLayoutAvgPoint();
+            scope.redrawBarPlotsToMatchLayout();
+            scope.centerLayoutAvgPoint();
+        });
     };
 
     /**
@@ -2897,6 +3167,9 @@ define([
      *                 return this is to make testing this easier.
      */
     Empress.prototype.centerLayoutAvgPoint = function () {
+        var coordColumns = this.getCoordColumns();
+        var xs = coordColumns.x;
+        var ys = coordColumns.y;
         var layoutAvgPoint = [];
         // Add up x and y coordinates of all nodes in the tree (using
         // current layout).
@@ -2905,12 +3178,12 @@ define([
             zoomAmount = 0;
         for (var node of this._tree.postorderTraversal((includeRoot = true))) {
             // node = this._treeData[node];
-            x += this.getX(node);
-            y += this.getY(node);
+            x += xs[node];
+            y += ys[node];
             zoomAmount = Math.max(
                 zoomAmount,
-                Math.abs(this.getX(node)),
-                Math.abs(this.getY(node))
+                Math.abs(xs[node]),
+                Math.abs(ys[node])
             );
         }
 
@@ -2994,9 +3267,11 @@ define([
         this._collapsedClades = {};
         // Note: currently collapseClades is the only method that set
         // the node visibility property.
-        for (var i of this._tree.postorderTraversal((includeRoot = true))) {
-            this.setNodeInfo(i, "visible", true);
-        }
+        this.setNodeInfoForNodes(
+            this._tree.postorderTraversal((includeRoot = true)),
+            "visible",
+            true
+        );
 
         this._collapsedCladeBuffer = [];
         this.collapseClades();
@@ -3539,7 +3814,6 @@ define([
     Empress.prototype.getRootNodeForPointInClade = function (point) {
         for (var clade in this._collapsedClades) {
             if (this._isPointInClade(clade, point)) {
-                var cladeNode = this._treeData[clade];
                 return parseInt(clade);
             }
         }
@@ -3549,14 +3823,14 @@ define([
     /**
      * Returns the name of node
      *
-     * @param {Number} node The node key in this._treeData. An error will be
-     *                      thrown if it is not a key in this._treeData
+     * @param {Number} node The postorder position of a node. An error will be
+     *                      thrown if this is not a node in the tree
      *
      * @return {String} The name of the node
      */
     Empress.prototype.getName = function (node) {
-        if (!this._treeData.hasOwnProperty(node)) {
-            throw node + " is not a key in _treeData";
+        if (!(node >= 1 && node <= this._tree.size && node % 1 === 0)) {
+            throw node + " is not a node in the tree";
         }
         return this.getNodeInfo(node, "name");
     };
@@ -3763,8 +4037,14 @@ define([
 
     /**
      * This will shear/unshear
+     *
+     * @param {Map} shearMap Maps feature metadata columns to the values whose
+     *                       tips should be removed from the tree.
+     * @param {Function} callback Optional; called once the sheared tree's
+     *                            layout has been computed (see
+     *                            getLayoutInfo()).
      */
-    Empress.prototype.shear = function (shearMap) {
+    Empress.prototype.shear = function (shearMap, callback) {
         this._tree.unshear();
         var scope = this;
         var removeNodes = new Set();
@@ -3785,11 +4065,24 @@ define([
 
         this._tree.shear(removeNodes);
 
-        this.setAutoCompleteNames();
+        // Describe the shear state by the values that were removed, so that
+        // layouts of the same sheared tree can be reused
+        var shearKey = [];
+        shearMap.forEach(function (values, cat) {
+            if (values.length > 0) {
+                shearKey.push([cat, _.map(values, String).sort()]);
+            }
+        });
+        this._shearKey = JSON.stringify(_.sortBy(shearKey, _.first));
 
-        this.getLayoutInfo();
+        this.setAutoCompleteNames();
 
-        this.redrawBarPlotsToMatchLayout();
+        this.getLayoutInfo(function () {
+            scope.redrawBarPlotsToMatchLayout();
+            if (!_.isUndefined(callback)) {
+                callback();
+            }
+        });
     };
 
     return Empress;
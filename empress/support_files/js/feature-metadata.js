@@ -0,0 +1,257 @@
+define(["underscore", "ByteArray"], function (_, ByteArray) {
+    /**
+     * @class FeatureMetadata
+     *
+     * Stores feature metadata for the nodes in a tree in a columnar,
+     * dictionary-encoded format.
+     *
+     * Each distinct row of feature metadata is stored only once (even if
+     * multiple internal nodes share a name, and thus share a row), and each
+     * column's values are stored as an array of unique values plus an array
+     * of integer codes (one per row) pointing into this array.
+     *
+     * @param {Uint32Array} rowPtr For a node with postorder position i,
+     *                             rowPtr[i] is 0 if the node has no feature
+     *                             metadata, or 1 + the index of its row
+     *                             otherwise. Postorder positions past the end
+     *                             of this array are treated as having no
+     *                             feature metadata.
+     * @param {Number} numTipRows Rows [0, numTipRows) describe tips; all
+     *                            subsequent rows describe internal nodes.
+     * @param {Array} values values[c] is an Array of the unique values in the
+     *                       c-th feature metadata column.
+     * @param {Array} codes codes[c] is a Uint32Array with one entry per row:
+     *                      codes[c][r] is the index in values[c] of the r-th
+     *                      row's value for the c-th column.
+     *
+     * @return {FeatureMetadata}
+     * constructs FeatureMetadata
+     */
+    function FeatureMetadata(rowPtr, numTipRows, values, codes) {
+        if (values.length !== codes.length) {
+            throw new Error("Feature metadata values and codes are uneven.");
+        }
+        this._rowPtr = rowPtr;
+        this._numTipRows = numTipRows;
+        this._values = values;
+        this._codes = codes;
+    }
+
+    /**
+     * Creates a FeatureMetadata object from the compressed feature metadata
+     * produced by the Python code.
+     *
+     * @param {Object} compressed Has the keys "row_ptr", "num_tip_rows",
+     *                            "values", and "codes", as described in
+     *                            compression_utils.
+     *                            compress_feature_metadata_columnar().
+     *                            "row_ptr" and each of the "codes" should be
+     *                            Uint32Arrays, or base64-encoded strings of
+     *                            32-bit unsigned integers.
+     *
+     * @return {FeatureMetadata}
+     */
+    FeatureMetadata.fromCompressed = function (compressed) {
+        var toUint32Array = function (arr) {
+            if (_.isString(arr)) {
+                return ByteArray.decodeUint32Array(arr);
+            }
+            return arr;
+        };
+        return new FeatureMetadata(
+            toUint32Array(compressed.row_ptr),
+            compressed.num_tip_rows,
+            compressed.values,
+            _.map(compressed.codes, toUint32Array)
+        );
+    };
+
+    /**
+     * Creates a FeatureMetadata object from tip and internal node metadata
+     * Objects.
+     *
+     * @param {Object} tipMetadata Maps tips' postorder positions to Arrays of
+     *                             feature metadata values. Each Array should
+     *                             have length numCols.
+     * @param {Object} intMetadata Maps internal nodes' postorder positions to
+     *                             Arrays of feature metadata values, formatted
+     *                             analogously to tipMetadata.
+     * @param {Number} numCols Number of feature metadata columns.
+     *
+     * @return {FeatureMetadata}
+     */
+    FeatureMetadata.fromObjects = function (tipMetadata, intMetadata, numCols) {
+        var tipNodes = _.map(_.keys(tipMetadata), _.partial(parseInt, _, 10));
+        var intNodes = _.map(_.keys(intMetadata), _.partial(parseInt, _, 10));
+        var maxNode = _.max(tipNodes.concat(intNodes, [0]));
+        var rowPtr = new Uint32Array(maxNode + 1);
+        var numRows = tipNodes.length + intNodes.length;
+        var values = [];
+        var codes = [];
+        var valToCode = [];
+        var c;
+        for (c = 0; c < numCols; c++) {
+            values.push([]);
+            codes.push(new Uint32Array(numRows));
+            valToCode.push(new Map());
+        }
+        var row = 0;
+        var addRows = function (nodes, mdObj) {
+            _.each(nodes, function (node) {
+                var fmRow = mdObj[node];
+                for (c = 0; c < numCols; c++) {
+                    if (!valToCode[c].has(fmRow[c])) {
+                        valToCode[c].set(fmRow[c], values[c].length);
+                        values[c].push(fmRow[c]);
+                    }
+                    codes[c][row] = valToCode[c].get(fmRow[c]);
+                }
+                row++;
+                rowPtr[node] = row;
+            });
+        };
+        addRows(tipNodes, tipMetadata);
+        addRows(intNodes, intMetadata);
+        return new FeatureMetadata(rowPtr, tipNodes.length, values, codes);
+    };
+
+    /**
+     * Returns the index of a node's row of feature metadata.
+     *
+     * @param {Number} node Postorder position of a node in the tree
+     * @param {String} tipOrInt "tip" to only consider tip metadata, "int" to
+     *                          only consider internal node metadata, or
+     *                          "all" to consider both.
+     *
+     * @return {Number} Index of the node's row, or -1 if the node doesn't
+     *                  have feature metadata (of the requested type).
+     *
+     * @throws {Error} If tipOrInt is not "tip", "int", or "all".
+     */
+    FeatureMetadata.prototype.getRowIndex = function (node, tipOrInt) {
+        var rowPlusOne = this._rowPtr[node];
+        if (_.isUndefined(rowPlusOne) || rowPlusOne === 0) {
+            return -1;
+        }
+        var row = rowPlusOne - 1;
+        var isTipRow = row < this._numTipRows;
+        if (tipOrInt === "tip") {
+            return isTipRow ? row : -1;
+        } else if (tipOrInt === "int") {
+            return isTipRow ? -1 : row;
+        } else if (tipOrInt === "all") {
+            return row;
+        }
+        throw new Error("Invalid tipOrInt value: " + tipOrInt);
+    };
+
+    /**
+     * Returns a node's feature metadata values.
+     *
+     * @param {Number} node Postorder position of a node in the tree
+     * @param {String} tipOrInt See getRowIndex().
+     *
+     * @return {Array|null} The node's value for each feature metadata column,
+     *                      or null if the node doesn't have feature metadata
+     *                      (of the requested type).
+     */
+    FeatureMetadata.prototype.getRow = function (node, tipOrInt) {
+        var row = this.getRowIndex(node, tipOrInt);
+        if (row < 0) {
+            return null;
+        }
+        var scope = this;
+        return _.map(this._values, function (colValues, c) {
+            return colValues[scope._codes[c][row]];
+        });
+    };
+
+    /**
+     * Groups nodes by their (possibly combined) values for some columns.
+     *
+     * This works directly on the columns' codes: if multiple columns are
+     * specified, each distinct combination of codes is assigned a new code
+     * (so combineValues() is only called once per distinct combination).
+     *
+     * @param {Array} colIndices Indices of the columns to use.
+     * @param {Function} combineValues Takes as input an Array of values (one
+     *                                 for each column in colIndices) and
+     *                                 returns the value to group by. If only
+     *                                 one column is specified, this is not
+     *                                 called.
+     * @param {Boolean} tipsOnly If true, only tip metadata will be used;
+     *                           otherwise, both tip and internal node metadata
+     *                           will be used.
+     *
+     * @return {Object} Maps each value to an Array of the postorder positions
+     *                  of the nodes with this value. Tips are listed first,
+     *                  then internal nodes; each in ascending order.
+     */
+    FeatureMetadata.prototype.groupNodesByValue = function (
+        colIndices,
+        combineValues,
+        tipsOnly
+    ) {
+        var scope = this;
+        var numRows = _.isEmpty(this._codes) ? 0 : this._codes[0].length;
+        var rowCodes, codeValues;
+        if (colIndices.length === 1) {
+            rowCodes = this._codes[colIndices[0]];
+            codeValues = this._values[colIndices[0]];
+        } else {
+            rowCodes = new Uint32Array(numRows);
+            codeValues = [];
+            var keyToCode = new Map();
+            var valueToCode = new Map();
+            var r, key, val;
+            for (r = 0; r < numRows; r++) {
+                key = _.map(colIndices, function (c) {
+                    return scope._codes[c][r];
+                }).join(",");
+                if (!keyToCode.has(key)) {
+                    val = combineValues(
+                        _.map(colIndices, function (c) {
+                            return scope._values[c][scope._codes[c][r]];
+                        })
+                    );
+                    // Different combinations of codes could be combined
+                    // into the same value, so we assign codes by value
+                    if (!valueToCode.has(val)) {
+                        valueToCode.set(val, codeValues.length);
+                        codeValues.push(val);
+                    }
+                    keyToCode.set(key, valueToCode.get(val));
+                }
+                rowCodes[r] = keyToCode.get(key);
+            }
+        }
+
+        // Gather nodes by code: tips first, then internal nodes (if needed)
+        var codeToNodes = new Map();
+        var addNodes = function (minRow, maxRow) {
+            var node, row, code;
+            for (node = 1; node < scope._rowPtr.length; node++) {
+                row = scope._rowPtr[node] - 1;
+                if (row >= minRow && row < maxRow) {
+                    code = rowCodes[row];
+                    if (!codeToNodes.has(code)) {
+                        codeToNodes.set(code, []);
+                    }
+                    codeToNodes.get(code).push(node);
+                }
+            }
+        };
+        addNodes(0, this._numTipRows);
+        if (!tipsOnly) {
+            addNodes(this._numTipRows, numRows);
+        }
+
+        var valueToNodes = {};
+        codeToNodes.forEach(function (nodes, code) {
+            valueToNodes[codeValues[code]] = nodes;
+        });
+        return valueToNodes;
+    };
+
+    return FeatureMetadata;
+});
@@ -0,0 +1,104 @@
+define([], function () {
+    /**
+     * @class LayoutCache
+     *
+     * Stores computed layouts, so that switching back to a layout (or length
+     * method, etc.) that has already been computed doesn't require computing
+     * it again.
+     *
+     * The cache is bounded by the memory used by the layouts it stores: when
+     * storing a layout would exceed maxBytes, the least recently used layouts
+     * are evicted.
+     *
+     * @param {Number} maxBytes The maximum number of bytes that the stored
+     *                          layouts can use. Layouts that are larger than
+     *                          this on their own aren't stored.
+     *
+     * @return {LayoutCache}
+     * @constructs LayoutCache
+     */
+    function LayoutCache(maxBytes) {
+        /**
+         * @type {Number}
+         * The maximum number of bytes that the stored layouts can use.
+         */
+        this.maxBytes = maxBytes;
+
+        /**
+         * @type {Number}
+         * The number of bytes used by the stored layouts.
+         */
+        this.numBytes = 0;
+
+        /**
+         * @type {Map}
+         * Maps keys to Objects with the keys "layout" and "numBytes". Maps
+         * iterate in insertion order, and entries are re-inserted whenever
+         * they're used -- so the first entry is the least recently used one.
+         * @private
+         */
+        this._entries = new Map();
+    }
+
+    /**
+     * Returns a stored layout, marking it as the most recently used one.
+     *
+     * @param {String} key
+     *
+     * @return {Object} The layout, or undefined if no layout is stored for
+     *                  key.
+     */
+    LayoutCache.prototype.get = function (key) {
+        var entry = this._entries.get(key);
+        if (entry === undefined) {
+            return undefined;
+        }
+        this._entries.delete(key);
+        this._entries.set(key, entry);
+        return entry.layout;
+    };
+
+    /**
+     * Stores a layout, evicting the least recently used layouts if needed.
+     *
+     * @param {String} key
+     * @param {Object} layout
+     * @param {Number} numBytes The number of bytes used by layout.
+     */
+    LayoutCache.prototype.set = function (key, layout, numBytes) {
+        this.delete(key);
+        if (numBytes > this.maxBytes) {
+            return;
+        }
+        this._entries.set(key, { layout: layout, numBytes: numBytes });
+        this.numBytes += numBytes;
+        while (this.numBytes > this.maxBytes) {
+            this.delete(this._entries.keys().next().value);
+        }
+    };
+
+    /**
+     * Removes a stored layout, if there is one.
+     *
+     * @param {String} key
+     */
+    LayoutCache.prototype.delete = function (key) {
+        var entry = this._entries.get(key);
+        if (entry !== undefined) {
+            this._entries.delete(key);
+            this.numBytes -= entry.numBytes;
+        }
+    };
+
+    /**
+     * Returns the keys of the stored layouts, from least to most recently
+     * used.
+     *
+     * @return {Array}
+     */
+    LayoutCache.prototype.keys = function () {
+        return Array.from(this._entries.keys());
+    };
+
+    return LayoutCache;
+});
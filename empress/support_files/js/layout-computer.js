@@ -0,0 +1,258 @@
+define(["underscore", "LayoutsUtil", "util"], function (_, LayoutsUtil, util) {
+    /**
+     * @class LayoutComputer
+     *
+     * Computes tree layouts using LayoutsUtil.computeLayout().
+     *
+     * If possible, layouts are computed in a Web Worker (see
+     * layout-worker.js), so that the page stays responsive while large trees
+     * are laid out. The worker is sent the tree's balanced parentheses and
+     * lengths as typed arrays (whose buffers are transferred rather than
+     * copied), and sends back the layout's coordinates as Float64Arrays.
+     *
+     * If the worker can't be used -- e.g. no workerURL was given, or the
+     * browser doesn't let pages opened from file:// URLs start workers --
+     * layouts are computed on the main thread instead. In this case, compute()
+     * calls its callback before returning.
+     *
+     * @param {String} workerURL URL of layout-worker.js. If this is null,
+     *                           layouts will always be computed on the main
+     *                           thread.
+     *
+     * @return {LayoutComputer}
+     * @constructs LayoutComputer
+     */
+    function LayoutComputer(workerURL = null) {
+        /**
+         * @type {Worker}
+         * The worker that computes layouts, or null if layouts are computed
+         * on the main thread.
+         * @private
+         */
+        this._worker = null;
+
+        /**
+         * @type {Boolean}
+         * Whether or not the worker is ready to receive requests. (Requests
+         * made before then are sent once it is.)
+         * @private
+         */
+        this._workerReady = false;
+
+        /**
+         * @type {Object}
+         * Maps the IDs of requests that the worker hasn't finished yet to
+         * Objects describing them (see compute()).
+         * @private
+         */
+        this._pending = {};
+
+        /**
+         * @type {Number}
+         * ID of the most recent request.
+         * @private
+         */
+        this._latestRequestID = 0;
+
+        if (workerURL !== null && typeof Worker !== "undefined") {
+            try {
+                this._worker = new Worker(workerURL);
+            } catch (err) {
+                this._worker = null;
+            }
+        }
+        if (this._worker !== null) {
+            var scope = this;
+            this._worker.onmessage = function (event) {
+                scope._onMessage(event.data);
+            };
+            this._worker.onerror = function (event) {
+                event.preventDefault();
+                scope._stopWorker();
+            };
+        }
+    }
+
+    /**
+     * Returns true if layouts are computed in a Web Worker.
+     *
+     * @return {Boolean}
+     */
+    LayoutComputer.prototype.usesWorker = function () {
+        return this._worker !== null;
+    };
+
+    /**
+     * Computes a layout of a tree.
+     *
+     * Only the most recent request's callback is called: if compute() is
+     * called again before the worker finishes computing a layout, then that
+     * layout is discarded (since it's presumably out of date). If the layout
+     * is computed on the main thread, its callback is called before compute()
+     * returns, so it can't be superseded.
+     *
+     * @param {BPTree} tree The tree to lay out.
+     * @param {String} layout The name of the layout.
+     * @param {Object} params The other parameters of
+     *                        LayoutsUtil.computeLayout(): should have the keys
+     *                        "width", "height", "leafSorting", and
+     *                        "branchMethod".
+     * @param {Function} callback Called with the output of
+     *                            LayoutsUtil.computeLayout() once the layout
+     *                            has been computed.
+     * @param {Function} onProgress Optional; called with a message describing
+     *                              what the worker is doing (e.g. "Computing
+     *                              Circular layout...") as it computes the
+     *                              layout.
+     */
+    LayoutComputer.prototype.compute = function (
+        tree,
+        layout,
+        params,
+        callback,
+        onProgress = null
+    ) {
+        var id = ++this._latestRequestID;
+        var request = {
+            id: id,
+            tree: tree,
+            layout: layout,
+            params: params,
+            callback: callback,
+            onProgress: onProgress,
+        };
+        if (this._worker === null) {
+            this._computeHere(request);
+            return;
+        }
+        // Older requests are now out of date
+        this._pending = {};
+        this._pending[id] = request;
+        if (this._workerReady) {
+            this._send(request);
+        }
+    };
+
+    /**
+     * Discards any layouts that the worker is still computing, so that their
+     * callbacks won't be called.
+     */
+    LayoutComputer.prototype.cancel = function () {
+        this._pending = {};
+    };
+
+    /**
+     * Sends a request to the worker.
+     *
+     * @param {Object} request See compute().
+     * @private
+     */
+    LayoutComputer.prototype._send = function (request) {
+        // The tree's lengths might be stored in an Array, so we copy them
+        // into a Float64Array. (This also means the tree keeps its own
+        // buffers, since transferring a buffer detaches it.)
+        var bits = request.tree.toPackedBits();
+        var lengths =
+            request.tree.lengths_ === null
+                ? null
+                : Float64Array.from(request.tree.lengths_);
+        var buffers = [bits.buffer];
+        if (lengths !== null) {
+            buffers.push(lengths.buffer);
+        }
+        this._worker.postMessage(
+            {
+                id: request.id,
+                bits: bits,
+                lengths: lengths,
+                layout: request.layout,
+                width: request.params.width,
+                height: request.params.height,
+                leafSorting: request.params.leafSorting,
+                branchMethod: request.params.branchMethod,
+            },
+            buffers
+        );
+    };
+
+    /**
+     * Computes a layout on the main thread.
+     *
+     * @param {Object} request See compute().
+     * @private
+     */
+    LayoutComputer.prototype._computeHere = function (request) {
+        var data = LayoutsUtil.computeLayout(
+            request.tree,
+            request.layout,
+            request.params.width,
+            request.params.height,
+            request.params.leafSorting,
+            request.params.branchMethod
+        );
+        request.callback(data);
+    };
+
+    /**
+     * Handles a message from the worker.
+     *
+     * @param {Object} message Has a "type" key, which is one of:
+     *                         -"ready": the worker can now receive requests.
+     *                         -"progress": the worker is working on the
+     *                          request with ID "id", and is currently doing
+     *                          what "message" describes.
+     *                         -"toast": LayoutsUtil wants to show a toast;
+     *                          "args" are the arguments of util.toastMsg().
+     *                         -"done": the worker finished the request with
+     *                          ID "id": "data" is the layout.
+     *                         -"error": the worker couldn't finish the request
+     *                          with ID "id".
+     * @private
+     */
+    LayoutComputer.prototype._onMessage = function (message) {
+        if (message.type === "ready") {
+            this._workerReady = true;
+            _.each(this._pending, this._send, this);
+            return;
+        } else if (message.type === "toast") {
+            util.toastMsg.apply(util, message.args);
+            return;
+        }
+
+        var request = this._pending[message.id];
+        if (_.isUndefined(request)) {
+            // This request was superseded by a newer one
+            return;
+        }
+        if (message.type === "progress") {
+            if (request.onProgress !== null) {
+                request.onProgress(message.message);
+            }
+        } else {
+            delete this._pending[message.id];
+            if (message.type === "done") {
+                request.callback(message.data);
+            } else {
+                // Compute the layout here instead, so that the error is
+                // raised just like it would be if we weren't using a worker
+                this._computeHere(request);
+            }
+        }
+    };
+
+    /**
+     * Stops using the worker (e.g. because it failed to load), and computes
+     * any layouts it was working on on the main thread instead.
+     *
+     * @private
+     */
+    LayoutComputer.prototype._stopWorker = function () {
+        this._worker.terminate();
+        this._worker = null;
+        var pending = _.values(this._pending);
+        this._pending = {};
+        _.each(pending, this._computeHere, this);
+    };
+
+    return LayoutComputer;
+});
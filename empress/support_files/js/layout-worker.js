@@ -0,0 +1,93 @@
+/**
+ * Web Worker that computes tree layouts off of the page's main thread.
+ *
+ * This is started by LayoutComputer (see layout-computer.js), which also
+ * describes the messages sent to and from this worker. Layouts are computed
+ * using LayoutsUtil.computeLayout(), so they're the same as the layouts
+ * computed on the main thread.
+ *
+ * This file should be in the "js" directory of Empress' support files: the
+ * other files it needs are loaded relative to it.
+ */
+var baseURL = new URL("../", self.location.href).href;
+importScripts(baseURL + "vendor/require-2.1.22.min.js");
+
+requirejs.config({
+    baseUrl: baseURL,
+    paths: {
+        underscore: "./vendor/underscore-min",
+        ByteArray: "./js/byte-array",
+        BPTree: "./js/bp-tree",
+        VectorOps: "./js/vector-ops",
+        LayoutsUtil: "./js/layouts-util",
+    },
+});
+
+/**
+ * Workers can't show toasts (the util module needs the page's DOM), so the
+ * toasts that LayoutsUtil shows are passed on to the main thread instead.
+ */
+define("util", [], function () {
+    function toastMsg() {
+        self.postMessage({
+            type: "toast",
+            args: Array.prototype.slice.call(arguments),
+        });
+    }
+    return { toastMsg: toastMsg };
+});
+
+require(["underscore", "BPTree", "LayoutsUtil"], function (
+    _,
+    BPTree,
+    LayoutsUtil
+) {
+    self.onmessage = function (event) {
+        var request = event.data;
+        var progress = function (message) {
+            self.postMessage({
+                type: "progress",
+                id: request.id,
+                message: message,
+            });
+        };
+        try {
+            progress("Reading tree...");
+            var tree = BPTree.fromPackedBits(
+                request.bits,
+                null,
+                request.lengths
+            );
+            progress("Computing " + request.layout + " layout...");
+            var data = LayoutsUtil.computeLayout(
+                tree,
+                request.layout,
+                request.width,
+                request.height,
+                request.leafSorting,
+                request.branchMethod
+            );
+        } catch (err) {
+            self.postMessage({
+                type: "error",
+                id: request.id,
+                message: String(err),
+            });
+            return;
+        }
+        // Return each array of coordinates as a Float64Array, so that its
+        // buffer can be transferred rather than copied
+        var buffers = [];
+        _.each(data, function (value, key) {
+            if (_.isArray(value)) {
+                data[key] = Float64Array.from(value);
+                buffers.push(data[key].buffer);
+            }
+        });
+        self.postMessage(
+            { type: "done", id: request.id, data: data },
+            buffers
+        );
+    };
+    self.postMessage({ type: "ready" });
+});
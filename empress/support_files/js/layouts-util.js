@@ -884,6 +884,102 @@ define(["underscore", "VectorOps", "util"], function (_, VectorOps, util) {
         return { xCoord: x2Arr, yCoord: y2Arr };
     }
 
+    /**
+     * Lists the properties of the data returned by each layout function
+     * (other than unrootedLayout()'s, which is used for all other layouts).
+     */
+    var LAYOUT_DATA_KEYS = {
+        Rectangular: [
+            "xCoord",
+            "yCoord",
+            "highestChildYr",
+            "lowestChildYr",
+            "yScalingFactor",
+        ],
+        Circular: [
+            "x0",
+            "y0",
+            "x1",
+            "y1",
+            "angle",
+            "arcx0",
+            "arcy0",
+            "arcStartAngle",
+            "arcEndAngle",
+        ],
+        Unrooted: ["xCoord", "yCoord"],
+    };
+
+    /**
+     * Computes a layout of a tree.
+     *
+     * This is what Empress uses to (re)compute its layouts, whether on the
+     * main thread or in a Web Worker (see LayoutComputer).
+     *
+     * @param {BPTree} tree The tree to generate the coordinates for.
+     * @param {String} layout One of "Rectangular", "Circular", or "Unrooted".
+     * @param {Float} width See rectangularLayout().
+     * @param {Float} height See rectangularLayout().
+     * @param {String} leafSorting See the getPostOrderNodes() docs above.
+     *                             (Not used for the unrooted layout.)
+     * @param {String} branchMethod Method for determining branch lengths (see
+     *                              getLengthMethod()).
+     *
+     * @return {Object} The output of rectangularLayout(), circularLayout(),
+     *                  or unrootedLayout() (depending on layout). If the tree
+     *                  only contains its root, then each property of this
+     *                  Object maps to [null, 0] instead.
+     */
+    function computeLayout(
+        tree,
+        layout,
+        width,
+        height,
+        leafSorting,
+        branchMethod
+    ) {
+        var keys = LAYOUT_DATA_KEYS[layout] || LAYOUT_DATA_KEYS.Unrooted;
+        if (tree.size === 1) {
+            var rootCoordData = {};
+            _.each(keys, function (key) {
+                rootCoordData[key] = [null, 0];
+            });
+            return rootCoordData;
+        }
+        var checkLengthsChange = shouldCheckBranchLengthsChanged(branchMethod);
+        var lengthGetter = getLengthMethod(branchMethod, tree);
+        if (layout === "Rectangular") {
+            return rectangularLayout(
+                tree,
+                width,
+                height,
+                leafSorting,
+                undefined,
+                lengthGetter,
+                checkLengthsChange
+            );
+        } else if (layout === "Circular") {
+            return circularLayout(
+                tree,
+                width,
+                height,
+                leafSorting,
+                undefined,
+                lengthGetter,
+                checkLengthsChange
+            );
+        } else {
+            return unrootedLayout(
+                tree,
+                width,
+                height,
+                undefined,
+                lengthGetter,
+                checkLengthsChange
+            );
+        }
+    }
+
     return {
         getLengthMethod: getLengthMethod,
         getPostOrderNodes: getPostOrderNodes,
@@ -893,5 +989,6 @@ define(["underscore", "VectorOps", "util"], function (_, VectorOps, util) {
         rectangularLayout: rectangularLayout,
         circularLayout: circularLayout,
         unrootedLayout: unrootedLayout,
+        computeLayout: computeLayout,
     };
 });
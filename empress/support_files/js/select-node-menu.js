@@ -288,15 +288,14 @@ define(["underscore", "util"], function (_, util) {
     ) {
         if (this.hasFeatureMetadata) {
             this.fmTable.innerHTML = "";
-            var mdObj;
-            if (tipOrInt === "tip") {
-                mdObj = this.empress._tipMetadata;
-            } else if (tipOrInt === "int") {
-                mdObj = this.empress._intMetadata;
-            } else {
+            if (tipOrInt !== "tip" && tipOrInt !== "int") {
                 throw new Error("Invalid tipOrInt value: " + tipOrInt);
             }
-            if (_.has(mdObj, nodeName)) {
+            var fmRow = this.empress._featureMetadata.getRow(
+                nodeName,
+                tipOrInt
+            );
+            if (fmRow !== null) {
                 var headerRow = this.fmTable.insertRow(-1);
                 var featureRow = this.fmTable.insertRow(-1);
                 for (var x = 0; x < this.fmCols.length; x++) {
@@ -304,7 +303,7 @@ define(["underscore", "util"], function (_, util) {
                     var colCell = headerRow.insertCell(-1);
                     colCell.innerHTML = "<strong>" + colName + "</strong>";
                     var dataCell = featureRow.insertCell(-1);
-                    dataCell.innerHTML = mdObj[nodeName][x];
+                    dataCell.innerHTML = fmRow[x];
                 }
                 show(this.fmTable);
                 hide(this.fmNoDataNote);
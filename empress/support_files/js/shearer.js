@@ -229,8 +229,10 @@ define(["underscore", "util", "TreeController"], function (
      * Notifies all observers whenever the model has changed.
      */
     ShearModel.prototype.notify = function () {
-        this.empress.shear(this.shearMap);
-        this.empress.drawTree();
+        var empress = this.empress;
+        empress.shear(this.shearMap, function () {
+            empress.drawTree();
+        });
         _.each(this.observers, function (obs) {
             obs.shearUpdate();
         });
@@ -0,0 +1,130 @@
+define(["underscore"], function (_) {
+    /**
+     * Maps the dtypes used in sidecar manifests to typed array constructors.
+     *
+     * (Sidecar files are written little-endian by the Python code, which is
+     * what essentially every browser uses.)
+     */
+    var DTYPE_TO_ARRAY = {
+        uint8: Uint8Array,
+        uint32: Uint32Array,
+        float64: Float64Array,
+    };
+
+    /**
+     * Returns true if a value in a manifest refers to a sidecar file.
+     *
+     * @param {Object} value
+     *
+     * @return {Boolean}
+     */
+    function isSidecarRef(value) {
+        return _.isObject(value) && _.has(value, "$sidecar");
+    }
+
+    /**
+     * Loads a single sidecar file.
+     *
+     * @param {Object} ref Describes the file: has a "$sidecar" key (the
+     *                     file's name, relative to the manifest) and, for
+     *                     binary files, a "dtype" key.
+     * @param {URL} baseURL URL of the manifest.
+     * @param {Function} fetchFn Used instead of window.fetch().
+     *
+     * @return {Promise} Resolves to a typed array (for binary files) or to
+     *                   the parsed JSON (for JSON files).
+     */
+    function loadSidecar(ref, baseURL, fetchFn) {
+        var url = new URL(ref.$sidecar, baseURL).href;
+        return fetchFn(url).then(function (response) {
+            if (!response.ok) {
+                throw new Error(
+                    'Unable to load "' + url + '": ' + response.status
+                );
+            }
+            if (_.has(ref, "dtype")) {
+                if (!_.has(DTYPE_TO_ARRAY, ref.dtype)) {
+                    throw new Error('Unrecognized dtype "' + ref.dtype + '".');
+                }
+                var ArrayType = DTYPE_TO_ARRAY[ref.dtype];
+                return response.arrayBuffer().then(function (buffer) {
+                    return new ArrayType(buffer);
+                });
+            }
+            return response.json();
+        });
+    }
+
+    /**
+     * Replaces the sidecar references in (part of) a manifest with the
+     * contents of the referenced files.
+     *
+     * @param {Object} value Part of the manifest.
+     * @param {URL} baseURL URL of the manifest.
+     * @param {Function} fetchFn Used instead of window.fetch().
+     *
+     * @return {Promise} Resolves to a copy of value in which every sidecar
+     *                   reference has been replaced with the file's contents.
+     */
+    function resolve(value, baseURL, fetchFn) {
+        if (isSidecarRef(value)) {
+            return loadSidecar(value, baseURL, fetchFn);
+        } else if (_.isArray(value)) {
+            return Promise.all(
+                _.map(value, function (v) {
+                    return resolve(v, baseURL, fetchFn);
+                })
+            );
+        } else if (_.isObject(value)) {
+            var keys = _.keys(value);
+            return Promise.all(
+                _.map(keys, function (k) {
+                    return resolve(value[k], baseURL, fetchFn);
+                })
+            ).then(function (resolved) {
+                return _.object(keys, resolved);
+            });
+        }
+        return Promise.resolve(value);
+    }
+
+    /**
+     * @class SidecarLoader
+     *
+     * Loads the data of a plot that was written as sidecar files (see
+     * Empress.write() in the Python code).
+     *
+     * All of the sidecar files are fetched in parallel. Binary files are
+     * viewed directly as typed arrays (without any parsing), so e.g. node
+     * lengths end up in a Float64Array and the feature table's CSR arrays
+     * end up in Uint32Arrays.
+     */
+    var SidecarLoader = {};
+
+    /**
+     * Loads a plot's data from a manifest and its sidecar files.
+     *
+     * @param {String} manifestURL URL of the manifest (relative URLs are
+     *                             resolved relative to the document). The
+     *                             sidecar files' names are relative to this.
+     * @param {Function} fetchFn Optional; used instead of window.fetch() to
+     *                           retrieve files (mostly useful for testing).
+     *
+     * @return {Promise} Resolves to an Object with the same structure as the
+     *                   data passed to the HTML template by the Python code,
+     *                   except that arrays are typed arrays.
+     */
+    SidecarLoader.load = function (manifestURL, fetchFn) {
+        if (_.isUndefined(fetchFn)) {
+            fetchFn = window.fetch.bind(window);
+        }
+        var baseURL = new URL(manifestURL, document.baseURI);
+        return loadSidecar({ $sidecar: baseURL.href }, baseURL, fetchFn).then(
+            function (manifest) {
+                return resolve(manifest, baseURL, fetchFn);
+            }
+        );
+    };
+
+    return SidecarLoader;
+});
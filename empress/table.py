@@ -0,0 +1,475 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2020, empress development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import copy
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+
+# Maximum number of matrix entries read from a BIOM HDF5 file at once
+BIOM_CHUNK_SIZE = 1 << 22
+
+# When reading some of the rows of a matrix stored in a BIOM HDF5 file, rows
+# whose entries are separated by at most this many entries (belonging to rows
+# that aren't being read) are read together, rather than separately
+BIOM_MAX_READ_GAP = 1 << 12
+
+
+class PresenceTable():
+    def __init__(self, matrix, feature_ids, sample_ids):
+        """A feature table that only records which features are in samples.
+
+        Empress only uses presence / absence information from feature tables,
+        so this is what tables are converted to when they're passed to
+        Empress. Compared to a biom.Table (which stores every nonzero value
+        as a float64), this cuts the memory used by the table by more than
+        half.
+
+        This supports the (small) part of the biom.Table interface that
+        Empress uses: ids(), shape, matrix_data, copy(), and is_empty().
+
+        Parameters
+        ----------
+        matrix : scipy.sparse.spmatrix
+            Features x samples matrix; nonzero entries indicate that a feature
+            is present in a sample.
+        feature_ids : array-like
+            IDs of the features, in the same order as the matrix's rows.
+        sample_ids : array-like
+            IDs of the samples, in the same order as the matrix's columns.
+
+        Attributes
+        ----------
+        matrix_data : scipy.sparse.csr_matrix of bool
+            Features x samples matrix. Only entries for features present in
+            samples are stored; these are all True.
+        shape : (int, int)
+            The number of features and the number of samples in the table.
+        """
+        matrix = csr_matrix(matrix)
+        if matrix.shape != (len(feature_ids), len(sample_ids)):
+            raise ValueError(
+                "Table shape {} doesn't match the number of features ({}) "
+                "and samples ({}).".format(
+                    matrix.shape, len(feature_ids), len(sample_ids)
+                )
+            )
+        if matrix.dtype != bool:
+            matrix = matrix.astype(bool)
+        matrix.eliminate_zeros()
+        self.matrix_data = matrix
+        self._feature_ids = np.asarray(feature_ids, dtype=object)
+        self._sample_ids = np.asarray(sample_ids, dtype=object)
+
+    @classmethod
+    def from_biom(cls, table):
+        """Creates a PresenceTable from a biom.Table.
+
+        Parameters
+        ----------
+        table : biom.Table
+
+        Returns
+        -------
+        PresenceTable
+        """
+        return cls(
+            table.matrix_data, table.ids(axis='observation'), table.ids()
+        )
+
+    @property
+    def shape(self):
+        return self.matrix_data.shape
+
+    def ids(self, axis='sample'):
+        """Returns the sample or feature IDs in the table.
+
+        Parameters
+        ----------
+        axis : str, optional
+            "sample" (the default) or "observation" (i.e. features), as in
+            biom.Table.ids().
+
+        Returns
+        -------
+        np.ndarray of object
+        """
+        if axis == 'sample':
+            return self._sample_ids
+        elif axis == 'observation':
+            return self._feature_ids
+        raise ValueError("Unrecognized axis: {}".format(axis))
+
+    def copy(self):
+        return PresenceTable(
+            self.matrix_data.copy(), self._feature_ids.copy(),
+            self._sample_ids.copy()
+        )
+
+    def subset(self, feature_mask, sample_mask):
+        """Returns a new table containing some of this table's data.
+
+        Parameters
+        ----------
+        feature_mask : np.ndarray of bool
+            True for each feature to keep.
+        sample_mask : np.ndarray of bool
+            True for each sample to keep.
+
+        Returns
+        -------
+        PresenceTable
+        """
+        feature_idx = np.flatnonzero(feature_mask)
+        sample_idx = np.flatnonzero(sample_mask)
+        # (Rows are sliced before columns, since the matrix is in CSR format)
+        return PresenceTable(
+            self.matrix_data[feature_idx][:, sample_idx],
+            self._feature_ids[feature_idx],
+            self._sample_ids[sample_idx]
+        )
+
+    def is_empty(self):
+        return 0 in self.shape
+
+    def __eq__(self, other):
+        if not isinstance(other, PresenceTable):
+            return NotImplemented
+        return (
+            np.array_equal(self._feature_ids, other._feature_ids) and
+            np.array_equal(self._sample_ids, other._sample_ids) and
+            (self.matrix_data != other.matrix_data).nnz == 0
+        )
+
+    def __repr__(self):
+        return "<PresenceTable: {} features x {} samples>".format(*self.shape)
+
+
+class ChunkedTable():
+    def __init__(self, path, chunk_size=BIOM_CHUNK_SIZE):
+        """A feature table that's read from a BIOM file only when needed.
+
+        Only the table's IDs are kept in memory. Its data is read from the
+        file (a BIOM v2, i.e. HDF5, file) one chunk of samples at a time by
+        iter_sample_chunks() -- so tables that don't fit in memory can still
+        be filtered (compression_utils.mask_empty_samples_and_features() and
+        filter_table()) and compressed (compression_utils.compress_table()).
+
+        Like a PresenceTable, this only records which features are present
+        in which samples. It supports the same interface as PresenceTable,
+        except for matrix_data.
+
+        Parameters
+        ----------
+        path : str
+            Path to a BIOM table in HDF5 format.
+        chunk_size : int
+            The maximum number of matrix entries to read from the file at
+            once. (At least one sample's entries are always read at once.)
+        """
+        import h5py
+        self.path = path
+        self.chunk_size = chunk_size
+        with h5py.File(path, 'r') as f:
+            self._feature_ids = _read_biom_ids(f['observation/ids'])
+            self._sample_ids = _read_biom_ids(f['sample/ids'])
+        self._num_file_features = len(self._feature_ids)
+        # Positions of the features / samples in this table in the file
+        self._feature_idx = np.arange(len(self._feature_ids))
+        self._sample_idx = np.arange(len(self._sample_ids))
+
+    @property
+    def shape(self):
+        return (len(self._feature_ids), len(self._sample_ids))
+
+    def ids(self, axis='sample'):
+        """Returns the sample or feature IDs in the table.
+
+        See PresenceTable.ids().
+        """
+        if axis == 'sample':
+            return self._sample_ids
+        elif axis == 'observation':
+            return self._feature_ids
+        raise ValueError("Unrecognized axis: {}".format(axis))
+
+    def copy(self):
+        # The table's data isn't in memory, so only the IDs need copying
+        table = copy.copy(self)
+        table._feature_ids = self._feature_ids.copy()
+        table._sample_ids = self._sample_ids.copy()
+        table._feature_idx = self._feature_idx.copy()
+        table._sample_idx = self._sample_idx.copy()
+        return table
+
+    def subset(self, feature_mask, sample_mask):
+        """Returns a new table containing some of this table's features and
+        samples.
+
+        No data is read from the file.
+
+        Parameters
+        ----------
+        feature_mask : np.ndarray of bool
+            True for each feature to keep.
+        sample_mask : np.ndarray of bool
+            True for each sample to keep.
+
+        Returns
+        -------
+        ChunkedTable
+        """
+        table = copy.copy(self)
+        table._feature_ids = self._feature_ids[feature_mask]
+        table._sample_ids = self._sample_ids[sample_mask]
+        table._feature_idx = self._feature_idx[feature_mask]
+        table._sample_idx = self._sample_idx[sample_mask]
+        return table
+
+    def is_empty(self):
+        return 0 in self.shape
+
+    def iter_sample_chunks(self):
+        """Reads the table's data one chunk of samples at a time.
+
+        Yields
+        ------
+        (first, last, chunk) : (int, int, scipy.sparse.csr_matrix of bool)
+            chunk is a (last - first) x (number of features) matrix that's
+            True where the samples with indices [first, last) contain
+            features. The chunks cover all of the table's samples, in order.
+        """
+        import h5py
+        with h5py.File(self.path, 'r') as f:
+            # The "sample" matrix stores the table in CSC format, i.e. as a
+            # samples x features CSR matrix
+            yield from _iter_csr_submatrix(
+                f['sample/matrix'], self._sample_idx, self._feature_idx,
+                self._num_file_features, self.chunk_size
+            )
+
+    def __repr__(self):
+        return "<ChunkedTable: {} features x {} samples>".format(*self.shape)
+
+
+def load_presence_table(path, feature_ids=None, sample_ids=None,
+                        chunk_size=BIOM_CHUNK_SIZE, chunked=False):
+    """Loads (part of) a BIOM table from a file as a PresenceTable.
+
+    For BIOM v2 (HDF5) files, only the table's IDs are read at first. The
+    matrix is then read a chunk of rows at a time, and only the entries in the
+    requested features and samples are kept -- so loading a small part of a
+    large table doesn't require enough memory to hold the entire table.
+    Tables in other formats are loaded with biom.load_table() and then
+    subset.
+
+    Parameters
+    ----------
+    path : str
+        Path to a BIOM table.
+    feature_ids : collection of str or None
+        If not None, only the features with these IDs are loaded. (IDs that
+        aren't in the table are ignored.)
+    sample_ids : collection of str or None
+        If not None, only the samples with these IDs are loaded. (IDs that
+        aren't in the table are ignored.)
+    chunk_size : int
+        The maximum number of matrix entries to read from an HDF5 file at
+        once. (At least one feature's entries are always read at once.)
+    chunked : bool
+        If True, the table's data isn't read now: a ChunkedTable is returned
+        instead, which reads the data (chunk_size entries at a time) when
+        it's needed. This is only supported for HDF5 files.
+
+    Returns
+    -------
+    table : PresenceTable or ChunkedTable
+        The loaded features and samples, in the same order as in the file.
+    full_shape : (int, int)
+        The number of features and samples in the file's table (i.e. before
+        any features or samples were left out).
+
+    Raises
+    ------
+    ValueError
+        If chunked is True and the file isn't an HDF5 file.
+    """
+    import h5py
+    if chunked:
+        if not h5py.is_hdf5(path):
+            raise ValueError(
+                "Only BIOM tables in HDF5 format can be read in chunks."
+            )
+        table = ChunkedTable(path, chunk_size=chunk_size)
+        return (
+            table.subset(
+                _id_mask(table.ids(axis='observation'), feature_ids),
+                _id_mask(table.ids(), sample_ids)
+            ),
+            table.shape
+        )
+
+    if not h5py.is_hdf5(path):
+        from biom import load_table
+        table = PresenceTable.from_biom(load_table(path))
+        return (
+            table.subset(
+                _id_mask(table.ids(axis='observation'), feature_ids),
+                _id_mask(table.ids(), sample_ids)
+            ),
+            table.shape
+        )
+
+    with h5py.File(path, 'r') as f:
+        all_feature_ids = _read_biom_ids(f['observation/ids'])
+        all_sample_ids = _read_biom_ids(f['sample/ids'])
+        feature_idx = np.flatnonzero(_id_mask(all_feature_ids, feature_ids))
+        sample_idx = np.flatnonzero(_id_mask(all_sample_ids, sample_ids))
+        # The "observation" matrix stores the table in CSR format (one row
+        # per feature), so we can read just the rows we need
+        matrix = _read_csr_submatrix(
+            f['observation/matrix'], feature_idx, sample_idx,
+            len(all_sample_ids), chunk_size
+        )
+    table = PresenceTable(
+        matrix, all_feature_ids[feature_idx], all_sample_ids[sample_idx]
+    )
+    return table, (len(all_feature_ids), len(all_sample_ids))
+
+
+def _id_mask(ids, keep_ids):
+    if keep_ids is None:
+        return np.ones(len(ids), dtype=bool)
+    keep_ids = set(keep_ids)
+    return np.fromiter((i in keep_ids for i in ids), dtype=bool,
+                       count=len(ids))
+
+
+def _read_biom_ids(dataset):
+    # h5py >= 3 returns variable-length strings as bytes unless asked not to
+    if hasattr(dataset, 'asstr'):
+        dataset = dataset.asstr()
+    return np.asarray(dataset[()], dtype=object)
+
+
+def _read_csr_submatrix(group, rows, cols, num_cols, chunk_size,
+                        max_gap=BIOM_MAX_READ_GAP):
+    """Reads some rows and columns of a CSR matrix stored in an HDF5 group.
+
+    Parameters
+    ----------
+    group : h5py.Group
+        Contains the matrix's "data", "indices", and "indptr" datasets.
+    rows : np.ndarray of int
+        Sorted indices of the rows to read.
+    cols : np.ndarray of int
+        Indices of the columns to read.
+    num_cols : int
+        The number of columns in the matrix.
+    chunk_size : int
+        The maximum number of entries to read at once.
+    max_gap : int
+        See _iter_csr_submatrix().
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix of bool
+        len(rows) x len(cols) matrix, which is True where the stored matrix
+        has a nonzero entry.
+    """
+    chunks = [
+        chunk for _, _, chunk in _iter_csr_submatrix(
+            group, rows, cols, num_cols, chunk_size, max_gap=max_gap
+        )
+    ]
+    if not chunks:
+        return csr_matrix((0, len(cols)), dtype=bool)
+    return vstack(chunks, format='csr')
+
+
+def _iter_csr_submatrix(group, rows, cols, num_cols, chunk_size,
+                        max_gap=BIOM_MAX_READ_GAP):
+    """Reads some rows and columns of a CSR matrix stored in an HDF5 group,
+    a chunk of rows at a time.
+
+    Parameters are as in _read_csr_submatrix(), and:
+
+    max_gap : int
+        Runs of rows whose entries are separated by at most max_gap entries
+        are read at once (including the entries between them, which are then
+        discarded); other rows are read separately. This way, reading a few
+        rows spread across a large matrix doesn't read the whole matrix, but
+        reading many nearby rows doesn't take many small reads.
+
+    Yields
+    ------
+    (first, last, chunk) : (int, int, scipy.sparse.csr_matrix of bool)
+        chunk is the (last - first) x len(cols) matrix for rows[first:last].
+    """
+    indptr = group['indptr'][()].astype(np.int64)
+    col_map = np.full(num_cols, -1, dtype=np.int64)
+    col_map[cols] = np.arange(len(cols))
+    starts = indptr[rows]
+    ends = indptr[rows + 1]
+    lengths = ends - starts
+
+    # Each row starts a new run of rows unless it's close enough to the
+    # previous row. The number of entries read for a row is its length, plus
+    # the gap before it if it continues a run.
+    gaps = starts[1:] - ends[:-1]
+    run_starts = np.concatenate(([True], gaps > max_gap))
+    num_read = lengths.copy()
+    num_read[1:] += np.where(run_starts[1:], 0, gaps)
+    cum_read = np.concatenate(([0], np.cumsum(num_read)))
+
+    first = 0
+    while first < len(rows):
+        # Read as many consecutive rows as fit in one chunk. (The gap before
+        # the chunk's first row isn't read, so it doesn't count.)
+        chunk_start = cum_read[first + 1] - lengths[first]
+        last = np.searchsorted(
+            cum_read, chunk_start + chunk_size, side='right'
+        ) - 1
+        last = max(last, first + 1)
+
+        # (A chunk's first row always starts a run, even if it's close to
+        # the previous chunk's last row)
+        is_run_start = run_starts[first:last].copy()
+        is_run_start[0] = True
+        chunk_run_starts = first + np.flatnonzero(is_run_start)
+        run_ends = np.append(chunk_run_starts[1:], last)
+        chunk_indices = []
+        chunk_data = []
+        for run_first, run_last in zip(chunk_run_starts, run_ends):
+            lo = starts[run_first]
+            hi = ends[run_last - 1]
+            indices = group['indices'][lo:hi]
+            data = group['data'][lo:hi]
+
+            # Mark the entries in this span that belong to rows we're reading
+            boundaries = np.zeros(hi - lo + 1, dtype=np.int64)
+            np.add.at(boundaries, starts[run_first:run_last] - lo, 1)
+            np.add.at(boundaries, ends[run_first:run_last] - lo, -1)
+            in_rows = np.cumsum(boundaries[:-1]) > 0
+            chunk_indices.append(indices[in_rows])
+            chunk_data.append(data[in_rows])
+        indices = np.concatenate(chunk_indices)
+        data = np.concatenate(chunk_data)
+
+        entry_rows = np.repeat(np.arange(last - first), lengths[first:last])
+        entry_cols = col_map[indices]
+        keep = (entry_cols >= 0) & (data != 0)
+        chunk = coo_matrix(
+            (
+                np.ones(np.count_nonzero(keep), dtype=bool),
+                (entry_rows[keep], entry_cols[keep])
+            ),
+            shape=(last - first, len(cols))
+        ).tocsr()
+        yield first, last, chunk
+        first = last
@@ -6,9 +6,17 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import re
 import warnings
+
+import numpy as np
 import pandas as pd
 
+# Separates the levels of a taxonomy string (along with any whitespace
+# around the separating semicolons)
+TAXONOMY_SEPARATOR = r'\s*;\s*'
+TAXONOMY_SEPARATOR_RE = re.compile(TAXONOMY_SEPARATOR)
+
 
 class TaxonomyError(Exception):
     pass
@@ -43,7 +51,7 @@ def split_taxonomy(feature_metadata):
         none of the columns in the feature metadata were identified as being
         taxonomy columns, this DataFrame is identical to the input DataFrame.)
         The new "Level" columns will be placed at the start of the returned
-        DataFrame's columns.
+        DataFrame's columns. Each of these is categorical (see Notes).
     tax_columns : list
         If taxonomy splitting is done, this will contain the resulting taxonomy
         column names, in descending order (e.g. ["Level 1", "Level 2",
@@ -56,6 +64,16 @@ def split_taxonomy(feature_metadata):
         in the future, so storing the taxonomy column names here should prevent
         us from having to change both the Python and JS code. Hopefully :P
 
+    Notes
+    -----
+    Large taxonomies repeat the same lineages (and the same lineage prefixes)
+    over and over, so each distinct taxonomy string is only split once, and
+    each level is stored as a pd.Categorical: i.e. as an array of integer
+    codes into that level's distinct values. This is much faster, and uses
+    much less memory, than splitting every string into a DataFrame of
+    strings. If pyarrow is installed, its string kernels are used to do the
+    splitting.
+
     Raises
     ------
     TaxonomyError
@@ -114,15 +132,10 @@ def split_taxonomy(feature_metadata):
 
         # Split the single column of taxonomy strings into n columns, where n
         # is the highest number of taxonomic levels in any string. We have to
-        # account for leading and trailing whitespace (.str.strip()) as well as
-        # for whitespace between delimiters (.str.split()). The regular
-        # expression splits tokens separated by semicolons and any leading or
-        # trailing whitespace. Importantly, using the expand keyword ensures
-        # that all rows are padded to have n tokens. The final step is to
-        # replace those empty values with "Unspecified".
-        tax_levels = feature_metadata[tax_col_name]\
-            .str.strip().str.split(r'\s*;\s*', expand=True)
-        tax_levels.fillna('Unspecified', inplace=True)
+        # account for leading and trailing whitespace as well as for
+        # whitespace between delimiters. Rows with fewer than n levels are
+        # padded with "Unspecified".
+        tax_levels = _split_taxonomy_column(feature_metadata[tax_col_name])
 
         if len(tax_levels.columns) == 1:
             # We allow this in the case of single-rank taxonomies (e.g. just
@@ -138,9 +151,9 @@ def split_taxonomy(feature_metadata):
                 TaxonomyWarning
             )
 
-        # Our use of expand=True means that tax_levels will be a DataFrame with
-        # the same index as feature_metadata but with one column for each
-        # taxonomic level (in order -- Kingdom, Phylum, etc.)
+        # tax_levels is a DataFrame with the same index as feature_metadata
+        # but with one column for each taxonomic level (in order -- Kingdom,
+        # Phylum, etc.)
         new_tax_cols = [
             "Level {}".format(i) for i in range(1, len(tax_levels.columns) + 1)
         ]
@@ -151,3 +164,89 @@ def split_taxonomy(feature_metadata):
     else:
         # No taxonomy column found, so no need to modify the DataFrame
         return feature_metadata, new_tax_cols
+
+
+def _split_taxonomy_column(taxonomy):
+    """Splits a Series of taxonomy strings into one categorical column per
+    taxonomic level.
+
+    Parameters
+    ----------
+    taxonomy : pd.Series
+        Taxonomy strings. Values that aren't strings (e.g. NaNs) are treated
+        as having no levels.
+
+    Returns
+    -------
+    pd.DataFrame
+        Has the same index as taxonomy, and one column (named 0, 1, ...) per
+        level. Each column is a pd.Categorical; rows with fewer levels than
+        there are columns have the value "Unspecified" for their remaining
+        levels.
+    """
+    # Only split each distinct lineage once
+    lineage_codes, lineages = pd.factorize(taxonomy)
+    lineages = np.asarray(lineages, dtype=object)
+    is_str = np.fromiter(
+        (isinstance(lineage, str) for lineage in lineages), dtype=bool,
+        count=len(lineages)
+    )
+    levels, offsets = _split_lineages(lineages[is_str])
+    # Number of levels in each distinct lineage
+    num_levels = np.zeros(len(lineages), dtype=np.int64)
+    num_levels[is_str] = np.diff(offsets)
+    starts = np.zeros(len(lineages), dtype=np.int64)
+    starts[is_str] = offsets[:-1]
+    if (lineage_codes < 0).any():
+        # Rows with missing values have a code of -1: so, add a "lineage"
+        # with no levels for them at the end
+        num_levels = np.append(num_levels, 0)
+        starts = np.append(starts, 0)
+
+    columns = {}
+    for i in range(max(num_levels.max(), 1)):
+        has_level = num_levels > i
+        # Dictionary-encode this level's values among the distinct lineages,
+        # then map every row to its lineage's code
+        level_values = np.full(len(num_levels), 'Unspecified', dtype=object)
+        level_values[has_level] = levels[starts[has_level] + i]
+        level_codes, categories = pd.factorize(level_values)
+        columns[i] = pd.Categorical.from_codes(
+            level_codes[lineage_codes], categories=categories
+        )
+    return pd.DataFrame(columns, index=taxonomy.index)
+
+
+def _split_lineages(lineages):
+    """Splits taxonomy strings into their levels.
+
+    Parameters
+    ----------
+    lineages : np.ndarray of str
+
+    Returns
+    -------
+    (levels, offsets) : (np.ndarray of str, np.ndarray of int)
+        The levels of lineages[i] are levels[offsets[i]:offsets[i + 1]].
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        split = [
+            TAXONOMY_SEPARATOR_RE.split(lineage.strip())
+            for lineage in lineages
+        ]
+        offsets = np.zeros(len(split) + 1, dtype=np.int64)
+        np.cumsum([len(lvls) for lvls in split], out=offsets[1:])
+        levels = np.empty(offsets[-1], dtype=object)
+        levels[:] = [level for lvls in split for level in lvls]
+        return levels, offsets
+
+    split = pc.split_pattern_regex(
+        pc.utf8_trim_whitespace(pa.array(lineages, type=pa.string())),
+        TAXONOMY_SEPARATOR
+    )
+    levels = pc.list_flatten(split).to_numpy(zero_copy_only=False)
+    offsets = split.offsets.to_numpy().astype(np.int64)
+    return np.asarray(levels, dtype=object), offsets
@@ -6,11 +6,16 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import base64
+import json
 import warnings
+import numpy as np
 import pandas as pd
 from empress import taxonomy_utils
-from empress.tree import bp_tree_tips, bp_tree_non_tips
-from itertools import zip_longest
+from empress.compression_utils import (
+    mask_empty_samples_and_features, filter_table
+)
+from empress.tree import TreeIndex
 
 
 class DataMatchingError(Exception):
@@ -21,13 +26,30 @@ class DataMatchingWarning(Warning):
     pass
 
 
-def match_tree_and_feature_metadata(bp_tree, feature_metadata=None):
-    """Processes feature metadata and subsets it to nodes in the tree.
+def warn_dropped_features(dropped_feature_ct):
+    """Warns that features not present as tips in the tree were removed.
+
+    Parameters
+    ----------
+    dropped_feature_ct : int
+        The number of features removed from the table.
+    """
+    warnings.warn(
+        (
+            "{} feature(s) in the table were not present as tips in "
+            "the tree. These feature(s) have been removed from the "
+            "visualization."
+        ).format(
+            dropped_feature_ct
+        ),
+        DataMatchingWarning
+    )
+
 
-    NOTE: This function calls bp_tree_tips() on bp_tree. If this winds up
-    being a bottleneck, we could add an extra optional parameter to this
-    function where match_inputs() could pass the already-computed tip names
-    here to avoid calling this function twice.
+def match_tree_and_feature_metadata(
+    bp_tree, feature_metadata=None, tree_index=None
+):
+    """Processes feature metadata and subsets it to nodes in the tree.
 
     Parameters
     ----------
@@ -37,6 +59,9 @@ def match_tree_and_feature_metadata(bp_tree, feature_metadata=None):
         Feature metadata. If this is passed, the index should describe node
         names in the tree and the columns should describe different feature
         metadata fields' names.
+    tree_index: empress.tree.TreeIndex, optional
+        A TreeIndex already created for bp_tree. If this isn't passed (and
+        feature_metadata is not None), one will be created here.
 
     Returns
     -------
@@ -71,14 +96,15 @@ def match_tree_and_feature_metadata(bp_tree, feature_metadata=None):
             feature_metadata
         )
         fm_ids = ts_feature_metadata.index
+        if tree_index is None:
+            tree_index = TreeIndex(bp_tree)
 
         # Subset tip metadata
-        fm_and_tip_features = fm_ids.intersection(bp_tree_tips(bp_tree))
+        fm_and_tip_features = fm_ids.intersection(tree_index.tip_names)
         tip_metadata = ts_feature_metadata.loc[fm_and_tip_features]
 
         # Subset internal node metadata
-        internal_node_names = set(bp_tree_non_tips(bp_tree))
-        fm_and_int_features = fm_ids.intersection(internal_node_names)
+        fm_and_int_features = fm_ids.intersection(tree_index.internal_names)
         int_metadata = ts_feature_metadata.loc[fm_and_int_features]
 
         if len(tip_metadata.index) == 0 and len(int_metadata.index) == 0:
@@ -98,7 +124,9 @@ def match_inputs(
     ordination=None,
     ignore_missing_samples=False,
     filter_extra_samples=False,
-    filter_missing_features=False
+    filter_missing_features=False,
+    tree_index=None,
+    remove_empty=False
 ):
     """Matches various input sources.
 
@@ -109,7 +137,7 @@ def match_inputs(
     ----------
     bp_tree: bp.BP
         The tree to be visualized.
-    table: biom.Table
+    table: biom.Table or empress.table.PresenceTable
         Representation of the feature table. It's expected that feature IDs in
         the table only describe tips in the tree, not internal nodes.
     sample_metadata: pd.DataFrame
@@ -139,6 +167,15 @@ def match_inputs(
         the tree. If False, raises a DataMatchingError if any such features
         exist. (Note that in either case, features in the tree but not in the
         table are preserved.)
+    tree_index: empress.tree.TreeIndex, optional
+        A TreeIndex already created for bp_tree. If this isn't passed, one
+        will be created here.
+    remove_empty: bool, optional
+        If True, empty samples and features are also removed from the
+        (matched) table and sample metadata, as
+        compression_utils.remove_empty_samples_and_features() would do. This
+        is done in the same pass as the rest of the filtering, so the table
+        is only sliced once.
 
     Returns
     -------
@@ -182,6 +219,9 @@ def match_inputs(
             7. The feature table contains more samples than the ordination, AND
                filter_extra_samples is False.
             8. The ordination contains more samples than the feature table.
+    ValueError
+        If remove_empty is True, and any of the conditions described in
+        compression_utils.remove_empty_samples_and_features() are met.
 
     References
     ----------
@@ -191,11 +231,18 @@ def match_inputs(
     # Match table and tree.
     # (Ignore None-named tips in the tree, which will be replaced later on
     # with "default" names like "EmpressNode0".)
-    tip_names = set(bp_tree_tips(bp_tree))
-    ff_table = table.copy()
+    if tree_index is None:
+        tree_index = TreeIndex(bp_tree)
+    tip_names = tree_index.tip_names
+    # Rather than filtering the table in each of the steps below, we keep
+    # track of which samples and features to keep; the table is only filtered
+    # once, at the end.
+    table_sample_ids = table.ids()
+    table_feature_ids = table.ids(axis='observation')
+    sample_mask = np.ones(len(table_sample_ids), dtype=bool)
 
     if ordination is not None:
-        table_ids = set(ff_table.ids())
+        table_ids = set(table_sample_ids)
         ord_ids = set(ordination.samples.index)
 
         # don't allow for disjoint datasets
@@ -218,7 +265,7 @@ def match_inputs(
                         " the --p-filter-extra-samples flag." %
                         (', '.join(sorted(extra)))
                     )
-                ff_table = ff_table.filter(ord_ids, inplace=False)
+                sample_mask = _isin(table_sample_ids, ord_ids)
                 # We'll remove now-empty features from the table later in
                 # the code
         else:
@@ -226,15 +273,14 @@ def match_inputs(
             raise DataMatchingError(
                 "The ordination has more samples than the feature table."
             )
-    ff_table_features = set(ff_table.ids(axis='observation'))
-    tree_and_table_features = ff_table_features.intersection(tip_names)
-    if len(tree_and_table_features) == 0:
+    feature_mask = _isin(table_feature_ids, tip_names)
+    if not feature_mask.any():
         # Error condition 1
         raise DataMatchingError(
             "No features in the feature table are present as tips in the tree."
         )
 
-    if len(tree_and_table_features) < len(ff_table_features):
+    if not feature_mask.all():
         if filter_missing_features:
             # Filter table to just features that are also present in the tree.
             #
@@ -243,21 +289,9 @@ def match_inputs(
             # (and this is going to be the case in most datasets where the
             # features correspond to tips, since internal nodes aren't
             # explicitly described in the feature table).
-            ff_table = ff_table.filter(tree_and_table_features,
-                                       axis='observation', inplace=False)
-
+            #
             # Report to user about any dropped features from table.
-            dropped_feature_ct = table.shape[0] - ff_table.shape[0]
-            warnings.warn(
-                (
-                    "{} feature(s) in the table were not present as tips in "
-                    "the tree. These feature(s) have been removed from the "
-                    "visualization."
-                ).format(
-                    dropped_feature_ct
-                ),
-                DataMatchingWarning
-            )
+            warn_dropped_features(np.count_nonzero(~feature_mask))
         else:
             # Error condition 2
             raise DataMatchingError(
@@ -270,7 +304,7 @@ def match_inputs(
             )
 
     # Match table (post-feature-filtering, if done) and sample metadata.
-    table_samples = set(ff_table.ids())
+    table_samples = set(table_sample_ids[sample_mask])
     sm_samples = set(sample_metadata.index)
     sm_and_table_samples = sm_samples & table_samples
 
@@ -321,7 +355,7 @@ def match_inputs(
     #
     # All that's left to do is to filter the sample metadata to just the
     # samples that are also present in the table.
-    sf_sample_metadata = sample_metadata.loc[ff_table.ids()]
+    sf_sample_metadata = sample_metadata.loc[table_sample_ids[sample_mask]]
 
     # If desired, we could report here to the user about any dropped samples
     # from the metadata by looking at the difference between
@@ -331,83 +365,175 @@ def match_inputs(
 
     tip_metadata, int_metadata, tax_columns = match_tree_and_feature_metadata(
         bp_tree,
-        feature_metadata
+        feature_metadata,
+        tree_index
     )
 
+    if remove_empty:
+        feature_mask, sample_mask, sf_sample_metadata = (
+            mask_empty_samples_and_features(
+                table, sf_sample_metadata, ordination, feature_mask,
+                sample_mask
+            )
+        )
+    ff_table = filter_table(table, feature_mask, sample_mask)
+
     return (
         ff_table, sf_sample_metadata, tip_metadata, int_metadata, tax_columns
     )
 
 
-def shifting(bitlist, size=51):
-    """Takes a list of 0-1s, splits in size and converts it to a list of int
+def _isin(ids, id_set):
+    """Returns a boolean mask of which IDs are in a set.
 
     Parameters
     ----------
-    bitlist: list of int
-        The input list of 0-1
-    size: int
-        The size of the buffer
+    ids : np.ndarray
+        IDs (e.g. a biom.Table's sample IDs).
+    id_set : set
 
     Returns
     -------
-    list of int
-        Representation of the 0-1s as a list of int
+    np.ndarray of bool
+    """
+    return np.fromiter((i in id_set for i in ids), dtype=bool, count=len(ids))
+
+
+def pack_bits(bitlist, as_base64=True):
+    """Packs a list of 0-1s into a base64-encoded string of bytes.
+
+    The bits are packed eight to a byte with numpy.packbits() (most
+    significant bit first) and then base64-encoded, so that the result can be
+    embedded in the HTML as a plain JSON string. The last byte is padded with
+    zeros if len(bitlist) isn't a multiple of 8.
+
+    Parameters
+    ----------
+    bitlist: list of int or np.ndarray
+        The input list of 0-1s. In practice, this is the B array of a bp.BP
+        tree.
+    as_base64: bool, optional
+        If False, the packed bytes are returned as an np.ndarray of uint8
+        rather than being base64-encoded. (This is used when writing them to
+        a sidecar file; see Empress.write().)
+
+    Returns
+    -------
+    str or np.ndarray
+        Base64 representation of the packed bits. This can be decoded in the
+        JS code using ByteArray.unpackBits().
 
     Raises
     ------
     ValueError
         If any of the list values is different than 0 or 1
 
-    References
-    ----------
-    Borrowed from https://stackoverflow.com/a/12461400
-
     Example
     -------
-    shifting([1, 0, 0, 0, 0, 1], size=3) => [4, 1]
+    pack_bits([1, 1, 1, 0, 1, 0, 0, 1, 0, 0]) => "6QA="
     """
-    if not all(x in [0, 1] for x in bitlist):
+    bits = np.asarray(bitlist)
+    if ((bits != 0) & (bits != 1)).any():
         raise ValueError('Your list has values other than 0-1s')
+    packed = np.packbits(bits.astype(np.uint8, copy=False))
+    if not as_base64:
+        return packed
+    return base64.b64encode(packed.tobytes()).decode('ascii')
 
-    values = [iter(bitlist)] * size
-    ints = []
-    for num in zip_longest(*values):
-        out = 0
-        init_zeros = []
-        seen_one = False
-        for bit in num:
-            if bit is None:
-                continue
-
-            if not seen_one:
-                if bit == 0:
-                    init_zeros.append(0)
-                else:
-                    seen_one = True
-
-            out = (out << 1) | bit
-
-        # if out == 0, everything was zeros so we can simply add init_zeros
-        if out == 0:
-            ints.extend(init_zeros)
-        else:
-            ints.append(out)
 
-    # we need to check init_zeros for the last loop in case the last value
-    # had padded zeros
-    if init_zeros and out != 0:
-        # rm last value
-        ints = ints[:-1]
-        # add zeros
-        ints.extend(init_zeros)
-        # readd last value
-        ints.append(out)
+def encode_uint32(arr, as_base64=True):
+    """Encodes an array of nonnegative integers as a base64 string.
+
+    The integers are stored as little-endian 32-bit unsigned integers, so the
+    JS code can view the decoded bytes directly as a Uint32Array (see
+    ByteArray.decodeUint32Array()) rather than parsing a JSON list.
+
+    Parameters
+    ----------
+    arr: list of int or np.ndarray
+        The integers to encode. In practice, this is one of the arrays of the
+        CSR representation of the feature table produced by compress_table().
+    as_base64: bool, optional
+        If False, the integers are returned as an np.ndarray of little-endian
+        uint32 rather than being base64-encoded.
+
+    Returns
+    -------
+    str or np.ndarray
+        Base64 representation of the integers' bytes.
+
+    Raises
+    ------
+    ValueError
+        If any of the values can't be represented as a 32-bit unsigned
+        integer.
+    """
+    arr = np.asarray(arr)
+    if arr.size > 0 and (arr.min() < 0 or arr.max() > np.iinfo('<u4').max):
+        raise ValueError('Values must fit in a 32-bit unsigned integer')
+    arr = arr.astype('<u4', copy=False)
+    if not as_base64:
+        return arr
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def iter_json(obj, chunk_size=10000):
+    """Encodes an object as HTML-safe JSON, a piece at a time.
+
+    The concatenation of the yielded strings is identical to the output of
+    Jinja's tojson filter (i.e. json.dumps(obj, sort_keys=True) with the
+    characters <, >, &, and ' replaced by Unicode escapes). However, the
+    full JSON string is never built: dicts are encoded one item at a time,
+    and long lists are encoded in slices of chunk_size elements. (Each
+    slice is still encoded using json.dumps(), so this is about as fast as
+    encoding the whole list at once.)
 
-    return ints
+    Parameters
+    ----------
+    obj: object
+        A JSON-serializable object.
+    chunk_size: int, optional
+        The maximum number of list elements to encode at once.
+
+    Yields
+    ------
+    str
+        Consecutive pieces of the encoded JSON.
+    """
+    for chunk in _iter_json(obj, chunk_size):
+        yield (
+            chunk.replace("<", "\\u003c")
+            .replace(">", "\\u003e")
+            .replace("&", "\\u0026")
+            .replace("'", "\\u0027")
+        )
 
 
-def filter_feature_metadata_to_tree(tip_md, int_md, bp_tree):
+def _iter_json(obj, chunk_size):
+    if isinstance(obj, dict) and obj:
+        yield "{"
+        for i, (key, val) in enumerate(sorted(obj.items())):
+            # Encoding a single-item dict handles converting non-str keys
+            # the same way json.dumps() would: we just remove the "{" and
+            # the trailing "0}".
+            prefix = json.dumps({key: 0})[1:-2]
+            yield prefix if i == 0 else ", " + prefix
+            yield from _iter_json(val, chunk_size)
+        yield "}"
+    elif isinstance(obj, (list, tuple)) and len(obj) > chunk_size:
+        yield "["
+        for start in range(0, len(obj), chunk_size):
+            if start > 0:
+                yield ", "
+            yield json.dumps(
+                obj[start:start + chunk_size], sort_keys=True
+            )[1:-1]
+        yield "]"
+    else:
+        yield json.dumps(obj, sort_keys=True)
+
+
+def filter_feature_metadata_to_tree(tip_md, int_md, bp_tree, tree_index=None):
     """Filters feature metadata DataFrames to describe the nodes in a tree.
 
     This is sort of similar to match_tree_and_feature_metadata(), but it
@@ -427,6 +553,9 @@ def filter_feature_metadata_to_tree(tip_md, int_md, bp_tree):
         Internal node metadata, structured analogously to tip_md.
     bp_tree: bp.BP
         Tree to filter the metadata objects to.
+    tree_index: empress.tree.TreeIndex, optional
+        A TreeIndex already created for bp_tree. If this isn't passed, one
+        will be created here.
 
     Returns
     -------
@@ -445,10 +574,10 @@ def filter_feature_metadata_to_tree(tip_md, int_md, bp_tree):
     DataMatchingError
         If f_tip_and_md and f_int_md would both be empty.
     """
-    tree_tip_names = set(bp_tree_tips(bp_tree))
-    tree_int_names = set(bp_tree_non_tips(bp_tree))
-    shared_tip_names = tip_md.index.intersection(tree_tip_names)
-    shared_int_names = int_md.index.intersection(tree_int_names)
+    if tree_index is None:
+        tree_index = TreeIndex(bp_tree)
+    shared_tip_names = tip_md.index.intersection(tree_index.tip_names)
+    shared_int_names = int_md.index.intersection(tree_index.internal_names)
     if len(shared_tip_names) == 0 and len(shared_int_names) == 0:
         raise DataMatchingError(
             "After performing empty feature removal from the table and then "
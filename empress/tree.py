@@ -6,20 +6,134 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import array
+import hashlib
+import os
+import re
+import tempfile
 import warnings
+import zipfile
+import numpy as np
+import pandas as pd
+
+# If set, this environment variable specifies the default directory in which
+# to cache parsed trees (see read_newick()).
+TREE_CACHE_ENV_VAR = 'EMPRESS_TREE_CACHE_DIR'
+# Incremented whenever the format of cached trees (or the way trees are
+# parsed) changes, so that old cache files are ignored
+TREE_CACHE_VERSION = 3
+# Number of characters of a Newick file to read at once
+NEWICK_CHUNK_SIZE = 1 << 20
+# Matches the characters that _parse_newick_file() has to look at: structural
+# characters, and quotes (since structural characters within quoted labels are
+# skipped)
+NEWICK_SPECIAL_CHAR_RE = re.compile(r"[(),;']")
 
 
 class TreeFormatWarning(Warning):
     pass
 
 
-def validate_tree(tree):
+class TreeIndex():
+    def __init__(self, bp_tree):
+        """Precomputes information about the nodes in a tree.
+
+        Building one of these traverses the tree once (using
+        postorder_node_info()). The various steps of matching, filtering,
+        validating, and serializing the data can then all look up what they
+        need here, rather than each scanning the tree themselves.
+
+        Note that a TreeIndex describes the tree it was created from -- if
+        that tree is sheared, a new TreeIndex should be created for the
+        sheared tree.
+
+        Parameters
+        ----------
+        bp_tree : bp.BP
+            Input BP tree
+
+        Attributes
+        ----------
+        tree : bp.BP
+            The tree this index describes.
+        names : np.ndarray of object
+            names[i] is the name of the node with postorder position i + 1,
+            or None if that node is unnamed.
+        lengths : np.ndarray of float
+            lengths[i] is the length of the node with postorder position
+            i + 1.
+        leaf_mask : np.ndarray of bool
+            leaf_mask[i] is True if the node with postorder position i + 1
+            is a leaf, and False otherwise.
+        tip_names : set of str
+            Names of the tips in the tree, ignoring unnamed tips.
+        internal_names : set of str
+            Names of the internal nodes (including the root) in the tree,
+            ignoring unnamed nodes.
+        name_to_postorder : dict
+            Maps each node name in the tree to a list of the postorder
+            positions (starting at 1) of the nodes with that name. (Since
+            internal node names may not be unique, a name can correspond to
+            multiple nodes.)
+        """
+        self.tree = bp_tree
+        self.names, self.lengths, self.leaf_mask = postorder_node_info(
+            bp_tree
+        )
+        named_mask = self.names != None  # noqa: E711
+        self.tip_names = set(self.names[named_mask & self.leaf_mask])
+        self.internal_names = set(self.names[named_mask & ~self.leaf_mask])
+        self.name_to_postorder = {}
+        for i, name in enumerate(self.names.tolist(), 1):
+            if name is not None:
+                self.name_to_postorder.setdefault(name, []).append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def match_names(self, ids):
+        """Finds the nodes in the tree whose names are in a list of IDs.
+
+        This is done as a single batched join (using
+        pd.Index.get_indexer()) between the IDs and the nodes' names, rather
+        than by looking up each node or ID one at a time.
+
+        Parameters
+        ----------
+        ids : list-like
+            Unique node names (e.g. feature IDs in a table, or the names of
+            nodes in feature metadata).
+
+        Returns
+        -------
+        (postorder_positions, id_indices)
+            postorder_positions : np.ndarray of int
+                Postorder positions (starting at 1) of the nodes whose names
+                are in ids, in ascending order.
+            id_indices : np.ndarray of int
+                id_indices[j] is the index in ids of the name of the node at
+                postorder_positions[j]. Since internal node names may not be
+                unique, the same index may occur multiple times here.
+        """
+        all_id_indices = pd.Index(ids).get_indexer(self.names)
+        matched = all_id_indices >= 0
+        return np.flatnonzero(matched) + 1, all_id_indices[matched]
+
+
+def validate_tree(tree, tree_index=None):
     """Checks the validty of the tree.
 
+    All of the checks are done using arrays of the nodes' names, lengths, and
+    leaf statuses (in postorder) extracted by postorder_node_info(), rather
+    than by traversing the tree one node at a time.
+
     Parameters
     ----------
     tree : bp.BP
         The tree to validate
+    tree_index : TreeIndex, optional
+        A TreeIndex already created for tree. If this isn't passed, the
+        tree's node information will be extracted here.
     """
 
     # this is currently untested since we can't actually parse a tree of this
@@ -27,49 +141,44 @@ def validate_tree(tree):
     if len(tree) <= 1:
         raise ValueError("Tree must contain at least 2 nodes.")
 
-    # While traversing the tree, record tip / internal node names
-    # (Nodes without names are ignored, since we'll assign those later
-    # using tools.fill_missing_node_names())
-    tip_names = []
-    internal_node_names = []
-    max_branch_length = 0
-
-    # do not include the root in these checks
-    for i in range(1, len(tree)):
-        node = tree.postorderselect(i)
-        name = tree.name(node)
-        length = tree.length(node)
-
-        if name is not None:
-            if isleaf(tree, node):
-                tip_names.append(name)
-            else:
-                internal_node_names.append(name)
-
-        if length < 0:
-            raise ValueError(
-                "Non-root branches of the tree must have nonnegative "
-                "lengths."
-            )
-        max_branch_length = max(length, max_branch_length)
-
-    # We didn't consider the root node in the above traversal since we
-    # don't care about its length. However, we do care about its name,
-    # so we add the root's name to internal_node_names.
-    internal_node_names.append(tree.name(tree.postorderselect(i + 1)))
-
-    if max_branch_length == 0:
+    if tree_index is None:
+        names, lengths, leaf_mask = postorder_node_info(tree)
+    else:
+        names = tree_index.names
+        lengths = tree_index.lengths
+        leaf_mask = tree_index.leaf_mask
+
+    # The root is the last node in postorder. We don't care about its length,
+    # so it isn't included in the length checks below.
+    nonroot_lengths = lengths[:-1]
+    if (nonroot_lengths < 0).any():
+        raise ValueError(
+            "Non-root branches of the tree must have nonnegative "
+            "lengths."
+        )
+
+    if not (nonroot_lengths > 0).any():
         raise ValueError(
             "At least one non-root branch of the tree must have a "
             "positive length."
         )
 
+    # Record tip / internal node names. Nodes without names are ignored,
+    # since we'll assign those later using tools.fill_missing_node_names().
+    # However, we do always consider the root's name (even if it is None) as
+    # an internal node name.
+    named_mask = names != None  # noqa: E711
+    internal_mask = named_mask & ~leaf_mask
+    internal_mask[-1] = True
+    tip_names = names[named_mask & leaf_mask]
+    internal_node_names = names[internal_mask]
+
     unique_tip_name_set = set(tip_names)
     if len(unique_tip_name_set) != len(tip_names):
         raise ValueError("Tip names in the tree must be unique.")
 
     unique_internal_node_name_set = set(internal_node_names)
-    if len(unique_tip_name_set & unique_internal_node_name_set) > 0:
+    if not unique_tip_name_set.isdisjoint(unique_internal_node_name_set):
         raise ValueError(
             "Tip names in the tree cannot overlap with internal node "
             "names."
@@ -84,6 +193,76 @@ def validate_tree(tree):
     return
 
 
+def postorder_node_info(bp_tree):
+    """Extracts node names, lengths, and leaf statuses in postorder.
+
+    The matching closing parenthesis of every opening parenthesis is found
+    using array operations on bp_tree.B (rather than calling
+    postorderselect() once per node), so the only per-node work left is
+    looking up each node's name and length. (iow doesn't expose its name or
+    length arrays, so we have to call name() and length() for these.)
+
+    Parameters
+    ----------
+    bp_tree : bp.BP
+        Input BP tree
+
+    Returns
+    -------
+    (names, lengths, leaf_mask)
+        names : np.ndarray of object
+            names[i] is the name of the node with postorder position i + 1,
+            or None if that node is unnamed.
+        lengths : np.ndarray of float
+            lengths[i] is the length of the node with postorder position
+            i + 1.
+        leaf_mask : np.ndarray of bool
+            leaf_mask[i] is True if the node with postorder position i + 1
+            is a leaf, and False otherwise.
+    """
+    postorder_opens = postorder_open_positions(bp_tree.B)
+    # (Iterating over a list of Python ints is faster than iterating over
+    # the numpy array directly.)
+    opens = postorder_opens.tolist()
+    names = np.empty(len(opens), dtype=object)
+    names[:] = [bp_tree.name(i) for i in opens]
+    lengths = np.array([bp_tree.length(i) for i in opens], dtype=float)
+    leaf_mask = bp_tree.B[postorder_opens + 1] == 0
+    return names, lengths, leaf_mask
+
+
+def postorder_open_positions(B):
+    """Finds the positions of nodes' opening parentheses in postorder.
+
+    An opening parenthesis at position i, after which the excess is d, is
+    matched by the first closing parenthesis after i before which the excess
+    is also d. So, if we label every parenthesis with this "level" and (stably)
+    sort by it, each level consists of alternating opening and closing
+    parentheses -- and consecutive pairs are matching parentheses.
+
+    Parameters
+    ----------
+    B : np.ndarray
+        Balanced parentheses representation of a tree (e.g. the B attribute of
+        a bp.BP object)
+
+    Returns
+    -------
+    np.ndarray of int
+        The i-th element is the index in B of the opening parenthesis of the
+        node with postorder position i + 1. (This is equivalent to
+        [bp_tree.postorderselect(i) for i in range(1, len(bp_tree) + 1)].)
+    """
+    B = np.asarray(B, dtype=np.int8)
+    excess = np.cumsum(2 * B.astype(np.int64) - 1)
+    level = excess + (1 - B)
+    pairs = np.argsort(level, kind="stable").reshape(-1, 2)
+    open_of = np.empty(len(B), dtype=np.int64)
+    open_of[pairs[:, 1]] = pairs[:, 0]
+    # Postorder positions are assigned in the order of closing parentheses
+    return open_of[np.flatnonzero(B == 0)]
+
+
 def bp_tree_tips(bp_tree):
     """ Extracts tip names in the tree, ignoring unnamed tips.
 
@@ -96,50 +275,305 @@ def bp_tree_tips(bp_tree):
     tips : list of strings
         list of tip names in the tree
     """
-    tips = []
-    # Iterate through all open and closing parentheses and extract tip names
-    for i in range(bp_tree.B.size):
-        pos_name = bp_tree.name(i)
-        # Check if this is a leaf node with a label
-        if isleaf(bp_tree, i) and (pos_name is not None):
-            tips.append(pos_name)
-    return tips
-
-
-def bp_tree_non_tips(bp_tree):
-    """ Extracts internal node names in the tree, ignoring unnamed nodes.
-
-       Parameters
-       ----------
-       bp_tree : bp.BP
-           Input BP tree
-       Returns
-       -------
-       non_tips : list of strings
-           list of internal node names in the tree
+    # A tip is an opening parenthesis immediately followed by a closing one
+    B = np.asarray(bp_tree.B, dtype=bool)
+    tip_positions = np.flatnonzero(B[:-1] & ~B[1:])
+    names = (bp_tree.name(i) for i in tip_positions)
+    return [name for name in names if name is not None]
+
+
+def read_newick(path, cache_dir=None):
+    """Loads a bp.BP tree from a Newick file, using a cache if possible.
+
+    Parsing a large Newick file is slow. So, if a cache directory is
+    available, the parsed tree's structure, names, and lengths are stored
+    there in a .npz file named after a hash of the Newick file's contents;
+    later calls for a file with the same contents just load this .npz file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a Newick file.
+    cache_dir : str or None, optional
+        Directory in which to cache the parsed tree. This is created if it
+        doesn't exist. If None, this defaults to the value of the
+        EMPRESS_TREE_CACHE_DIR environment variable; if that isn't set
+        either, the tree isn't cached.
+
+    Returns
+    -------
+    bp.BP
     """
-    non_tips = []
-    for i in range(bp_tree.B.size):
-        pos_name = bp_tree.name(i)
-        # Check if this is an opening parenthesis, is not a leaf, and
-        # has a node label
-        if bp_tree.B[i] and not isleaf(bp_tree, i) and pos_name is not None:
-            non_tips.append(pos_name)
-    return non_tips
-
-
-def isleaf(bp_tree, i):
-    """ Checks if node at position i belongs to a leaf node or not
-
-       Parameters
-       ----------
-       bp_tree : bp.BP
-           Input BP tree
-        i : int
-           The query node index
-       Returns
-       -------
-       bool
-           True if this is a leaf node, False otherwise
+    if cache_dir is None:
+        cache_dir = os.environ.get(TREE_CACHE_ENV_VAR) or None
+    if cache_dir is None:
+        return _parse_newick_file(path)
+
+    cache_path = os.path.join(cache_dir, 'tree-{}-v{}.npz'.format(
+        _hash_file(path), TREE_CACHE_VERSION
+    ))
+    if os.path.exists(cache_path):
+        try:
+            return _load_cached_tree(cache_path)
+        except (OSError, ValueError, KeyError, EOFError,
+                zipfile.BadZipFile):
+            # The cache file is damaged (e.g. it was truncated), so just
+            # parse the tree again and overwrite it
+            pass
+    tree = _parse_newick_file(path)
+    _save_cached_tree(tree, cache_path)
+    return tree
+
+
+def _parse_newick_file(path, chunk_size=NEWICK_CHUNK_SIZE):
+    """Parses a Newick file into a bp.BP tree (without any caching).
+
+    The file is read in chunks of chunk_size characters, and the tree's
+    balanced parentheses are built up as each chunk is parsed, so (unlike
+    bp.parse_newick()) the whole file never has to be held in memory as one
+    string. Line breaks are ignored, so trees split across multiple lines
+    are fine.
+
+    Parameters
+    ----------
+    path : str
+        Path to a Newick file. Only the first tree in the file is read.
+    chunk_size : int, optional
+        Number of characters to read at once.
+
+    Returns
+    -------
+    bp.BP
+
+    Raises
+    ------
+    ValueError
+        If the file's parentheses are unbalanced, if it isn't terminated by a
+        semicolon, if a quoted label is never closed, or if a node's length
+        can't be parsed.
+
+    Notes
+    -----
+    Labels are parsed like bp.parse_newick() does, except that whitespace
+    around labels is ignored and that (per the Newick standard) quoted labels
+    can include a single quote by doubling it: e.g. 'Bob''s taxon'.
+    """
+    # B is built up one parenthesis at a time; nodes' names and lengths are
+    # stored in preorder, i.e. in the order of their opening parentheses
+    B = bytearray()
+    names = []
+    lengths = array.array('d')
+    # Preorder indices of the internal nodes that haven't been closed yet
+    open_nodes = []
+    # The preorder index of the last node closed, whose label (if any)
+    # follows its closing parenthesis; or None if the last structural
+    # character was an opening parenthesis or a comma, in which case the
+    # next label belongs to a tip
+    last_closed = None
+    done = False
+
+    with open(str(path)) as treefile:
+        # The parts of the current label read so far (a label may continue
+        # into the next chunk), and whether we're within a quoted section of
+        # it. (Doubled quotes, as in 'Bob''s taxon', just close and reopen
+        # the quoted section.)
+        label_parts = []
+        in_quote = False
+        while not done:
+            chunk = treefile.read(chunk_size)
+            if not chunk:
+                if in_quote:
+                    raise ValueError("Newick string has an unterminated quote")
+                raise ValueError("Newick string is not semicolon terminated")
+            label_start = 0
+            for match in NEWICK_SPECIAL_CHAR_RE.finditer(chunk):
+                c = match.group()
+                if c == "'":
+                    in_quote = not in_quote
+                    continue
+                elif in_quote:
+                    continue
+                label_parts.append(chunk[label_start:match.start()])
+                label = ''.join(label_parts)
+                label_parts = []
+                label_start = match.end()
+                if last_closed is None:
+                    if c != '(':
+                        # The label belongs to a tip
+                        name, length = _parse_label(label)
+                        B += b'\x01\x00'
+                        names.append(name)
+                        lengths.append(length)
+                    elif label and not label.isspace():
+                        raise ValueError(
+                            "Unexpected label before opening parenthesis: "
+                            "{!r}".format(label.strip())
+                        )
+                else:
+                    # The label (if any) belongs to the node just closed
+                    if label:
+                        (
+                            names[last_closed], lengths[last_closed]
+                        ) = _parse_label(label)
+                    last_closed = None
+                if c == '(':
+                    open_nodes.append(len(names))
+                    B.append(1)
+                    names.append(None)
+                    lengths.append(0.0)
+                elif c == ')':
+                    if not open_nodes:
+                        raise ValueError(
+                            "Newick string has unbalanced parentheses"
+                        )
+                    last_closed = open_nodes.pop()
+                    B.append(0)
+                elif c == ';':
+                    done = True
+                    break
+            if not done:
+                label_parts.append(chunk[label_start:])
+
+    if open_nodes:
+        raise ValueError("Newick string has unbalanced parentheses")
+    B = np.frombuffer(B, dtype=np.uint8)
+    return _build_bp(B, names, lengths)
+
+
+def _parse_label(label):
+    """Parses a node's label into its name and length.
+
+    Parameters
+    ----------
+    label : str
+        Everything between the node's last parenthesis (or, for tips, the
+        preceding comma or parenthesis) and the next structural character:
+        e.g. "a:1.5", "'node name':2", or "".
+
+    Returns
+    -------
+    (name, length)
+        name : str or None
+            The node's name, or None if it's unnamed.
+        length : float
+            The node's length, or 0 if it doesn't have a length.
+
+    Raises
+    ------
+    ValueError
+        If the node's length can't be parsed.
+    """
+    label = label.strip()
+    if label.startswith("'") and label.count("'") % 2 == 0:
+        end = label.rfind("'")
+        name = label[1:end].replace("''", "'")
+        length = label[end + 1:].lstrip()
+        if length.startswith(':'):
+            length = length[1:]
+    else:
+        name, colon, length = label.rpartition(':')
+        if not colon:
+            name, length = length, ''
+        name = name.rstrip()
+    try:
+        length = float(length) if length else 0.0
+    except ValueError:
+        raise ValueError(
+            "Unable to parse length of node {!r}: {!r}".format(label, length)
+        )
+    return (name or None), length
+
+
+def _hash_file(path):
+    """Returns the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(str(path), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_cached_tree(bp_tree, cache_path):
+    """Writes a tree to a .npz file that _load_cached_tree() can read.
+
+    Names and lengths are only stored for opening parentheses. Names are
+    stored as one UTF-8 string, along with the (character) offsets at which
+    each name starts, since .npz files can't store object arrays without
+    pickling them.
+    """
+    opens = np.flatnonzero(bp_tree.B).tolist()
+    names = [bp_tree.name(i) for i in opens]
+    name_missing = np.array([n is None for n in names], dtype=bool)
+    names = ['' if n is None else n for n in names]
+    name_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(n) for n in names], out=name_offsets[1:])
+    name_chars = np.frombuffer(''.join(names).encode('utf-8'), dtype=np.uint8)
+    lengths = np.array([bp_tree.length(i) for i in opens], dtype=float)
+
+    cache_dir = os.path.dirname(cache_path) or '.'
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file and rename it into place, so that other
+    # processes never see a partially written cache file
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, B=np.asarray(bp_tree.B, dtype=np.uint8),
+                     name_chars=name_chars, name_offsets=name_offsets,
+                     name_missing=name_missing, lengths=lengths)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_cached_tree(cache_path):
+    """Reads a tree written by _save_cached_tree().
+
+    Returns
+    -------
+    bp.BP
+    """
+    with np.load(cache_path, allow_pickle=False) as data:
+        B = data['B']
+        name_chars = data['name_chars'].tobytes().decode('utf-8')
+        name_offsets = data['name_offsets'].tolist()
+        name_missing = data['name_missing']
+        open_lengths = data['lengths']
+
+    open_names = np.empty(len(name_missing), dtype=object)
+    open_names[:] = [
+        name_chars[start:end]
+        for start, end in zip(name_offsets[:-1], name_offsets[1:])
+    ]
+    open_names[name_missing] = None
+    if len(open_names) != len(open_lengths):
+        raise ValueError("Cached tree {} is malformed.".format(cache_path))
+    return _build_bp(B, open_names, open_lengths)
+
+
+def _build_bp(B, open_names, open_lengths):
+    """Creates a bp.BP tree.
+
+    Parameters
+    ----------
+    B : np.ndarray of uint8
+        Balanced parentheses representation of the tree.
+    open_names : sequence
+        The names of the tree's nodes (or None for unnamed nodes), in the
+        order of their opening parentheses in B.
+    open_lengths : sequence of float
+        The lengths of the tree's nodes, in the same order.
+
+    Returns
+    -------
+    bp.BP
     """
-    return bp_tree.B[i] and (not bp_tree.B[i + 1])
+    from bp import BP
+    opens = np.flatnonzero(B)
+    if len(opens) != len(open_names):
+        raise ValueError("Number of nodes and names differ.")
+    names = np.full(len(B), None, dtype=object)
+    names[opens] = open_names
+    lengths = np.zeros(len(B), dtype=float)
+    lengths[opens] = open_lengths
+    return BP(B, names=names, lengths=lengths)
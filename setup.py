@@ -43,7 +43,7 @@ with open('README.md') as f:
 # https://github.com/biocore/empress/pull/555
 base = ["numpy", "scipy", "pandas", "click",
         "jinja2", "scikit-bio", "biom-format", "iow==0.1.3",
-        "emperor>=1.0.2"]
+        "emperor>=1.0.2", 'importlib_metadata; python_version < "3.8"']
 test = ["flake8", "nose"]
 all_deps = base + test
 
@@ -1,9 +1,14 @@
+import json
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from click.testing import CliRunner
 import pandas as pd
 
+import empress as empress_package
 from empress.scripts._cli import empress
 from .util import extract_q2_artifact_to_path
 
@@ -89,6 +94,112 @@ class TestCLI(unittest.TestCase):
         files_present(output_dir)
         assert os.path.isdir(f"{output_dir}/emperor-resources")
 
+    def test_comm_plot_sidecar(cls):
+        output_dir = "comm_plot_sidecar"
+        result = cls.runner.invoke(
+            empress,
+            ["community-plot", "--tree", cls.tree_loc, "--table",
+             cls.table_loc, "--sample-metadata", cls.sm_loc,
+             "--output-dir", output_dir, "--feature-metadata", cls.fm_loc,
+             "--sidecar"]
+        )
+        assert result.exit_code == 0
+        files_present(output_dir)
+        data_files = os.listdir(f"{output_dir}/empress-data")
+        assert "manifest.json" in data_files
+        assert "tree.bin" in data_files
+        assert "compressed_table.indptr.bin" in data_files
+
+    def test_comm_plot_chunked_table(cls):
+        # Reading the table in chunks shouldn't change the plot's data
+        output_dirs = ["comm_plot_unchunked", "comm_plot_chunked"]
+        for output_dir, extra_args in zip(output_dirs,
+                                          [[], ["--chunked-table"]]):
+            result = cls.runner.invoke(
+                empress,
+                ["community-plot", "--tree", cls.tree_loc, "--table",
+                 cls.table_loc, "--sample-metadata", cls.sm_loc,
+                 "--output-dir", output_dir, "--sidecar"] + extra_args
+            )
+            assert result.exit_code == 0
+            files_present(output_dir)
+        for filename in os.listdir(f"{output_dirs[0]}/empress-data"):
+            with open(f"{output_dirs[0]}/empress-data/{filename}", "rb") as f:
+                exp = f.read()
+            with open(f"{output_dirs[1]}/empress-data/{filename}", "rb") as f:
+                assert f.read() == exp
+
+    def test_comm_plot_filter_missing_features(cls):
+        # Only two of the table's features are in this tree, so the rest
+        # aren't loaded
+        from biom import load_table
+        feature_ids = load_table(cls.table_loc).ids(axis="observation")
+        tree_loc = "small_tree.nwk"
+        with open(tree_loc, "w") as f:
+            f.write("(({}:1,{}:2)i:1,x:3)r;".format(*feature_ids[:2]))
+        output_dir = "comm_plot_filter_missing_features"
+        result = cls.runner.invoke(
+            empress,
+            ["community-plot", "--tree", tree_loc, "--table",
+             cls.table_loc, "--sample-metadata", cls.sm_loc,
+             "--output-dir", output_dir, "--filter-missing-features"]
+        )
+        assert result.exit_code == 0
+        files_present(output_dir)
+
+    def test_comm_plot_profile(cls):
+        output_dir = "comm_plot_profile"
+        result = cls.runner.invoke(
+            empress,
+            ["community-plot", "--tree", cls.tree_loc, "--table",
+             cls.table_loc, "--sample-metadata", cls.sm_loc,
+             "--output-dir", output_dir, "--feature-metadata", cls.fm_loc,
+             "--cprofile"]
+        )
+        assert result.exit_code == 0
+        files_present(output_dir)
+        assert os.path.exists(f"{output_dir}/empress-profile.prof")
+        with open(f"{output_dir}/empress-profile.json") as f:
+            stages = [stage["name"] for stage in json.load(f)["stages"]]
+        for stage in ["read_tree", "read_feature_metadata",
+                      "read_sample_metadata", "read_table", "init",
+                      "init/match_inputs", "write", "write/to_dict",
+                      "write/render", "copy_support_files"]:
+            assert stage in stages
+
+    def test_tree_plot_trace_python_allocations(cls):
+        output_dir = "tree_plot_trace_python_allocations"
+        result = cls.runner.invoke(
+            empress,
+            ["tree-plot", "--tree", cls.tree_loc, "--output-dir", output_dir,
+             "--trace-python-allocations"]
+        )
+        assert result.exit_code == 0
+        assert not os.path.exists(f"{output_dir}/empress-profile.prof")
+        with open(f"{output_dir}/empress-profile.json") as f:
+            stages = json.load(f)["stages"]
+        for stage in stages:
+            assert "memory_increase" in stage
+            assert "rss_after" in stage
+
+    def test_comm_plot_shared_support_dir(cls):
+        output_dirs = ["comm_plot_shared_1", "comm_plot_shared_2"]
+        for output_dir in output_dirs:
+            result = cls.runner.invoke(
+                empress,
+                ["community-plot", "--tree", cls.tree_loc, "--table",
+                 cls.table_loc, "--sample-metadata", cls.sm_loc,
+                 "--output-dir", output_dir, "--pcoa", cls.pcoa_loc,
+                 "--filter-extra-samples", "--shared-support-dir", "shared"]
+            )
+            assert result.exit_code == 0
+            assert os.listdir(output_dir) == ["empress.html"]
+        # Both plots should share the same support files
+        shared_copies = sorted(os.listdir("shared"))
+        assert len(shared_copies) == 2
+        assert shared_copies[0].startswith("emperor-")
+        assert shared_copies[1].startswith("empress-")
+
     def test_existing_directory(cls):
         output_dir = "existing_dir"
         os.mkdir("existing_dir")
@@ -113,3 +224,69 @@ class TestCLI(unittest.TestCase):
         )
         assert result.exit_code == 0
         files_present(output_dir)
+
+
+class TestCLIStartup(unittest.TestCase):
+
+    def run_python(self, *args):
+        # The tests may not be run from the root of the repository, so make
+        # sure the subprocess can import empress
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [
+            os.path.dirname(os.path.dirname(empress_package.__file__)),
+            env.get("PYTHONPATH")
+        ]))
+        return subprocess.run(
+            [sys.executable] + list(args), env=env, check=True,
+            stdout=subprocess.PIPE, universal_newlines=True
+        ).stdout
+
+    def imported_modules(self, code, modules):
+        # Runs code in a new interpreter, and returns its output (other than
+        # the last line) and which of modules it imported
+        out = self.run_python(
+            "-c",
+            "import sys\n{}\nprint(','.join(m for m in {} "
+            "if m in sys.modules))".format(code, modules)
+        )
+        out, _, imported = out[:-1].rpartition("\n")
+        return out, [m for m in imported.split(",") if m]
+
+    def test_heavy_dependencies_not_imported(self):
+        heavy = ["numpy", "pandas", "biom", "skbio", "emperor", "jinja2",
+                 "pkg_resources", "bp"]
+        _, imported = self.imported_modules(
+            "import empress, empress.scripts._cli", heavy
+        )
+        assert imported == []
+
+    def test_help_startup(self):
+        heavy = ["pandas", "biom", "skbio", "emperor"]
+        out, imported = self.imported_modules(
+            "from empress.scripts._cli import empress\n"
+            "try:\n"
+            "    empress(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass",
+            heavy
+        )
+        assert "tree-plot" in out
+        assert imported == []
+
+    def test_tree_plot_startup(self):
+        # A tree plot needs pandas and scikit-bio, but not the modules used
+        # only for tables and ordinations
+        heavy = ["biom", "emperor", "pkg_resources"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tree_loc = os.path.join(tmpdir, "tree.nwk")
+            with open(tree_loc, "w") as f:
+                f.write("((a:1,b:2)i:1,c:3)r;")
+            output_dir = os.path.join(tmpdir, "plot")
+            _, imported = self.imported_modules(
+                "from empress.scripts._cli import empress\n"
+                "empress(['tree-plot', '-t', {!r}, '-o', {!r}], "
+                "standalone_mode=False)".format(tree_loc, output_dir),
+                heavy
+            )
+            files_present(output_dir)
+        assert imported == []
@@ -7,19 +7,33 @@
 # ----------------------------------------------------------------------------
 from copy import deepcopy
 import io
+import os
+import tempfile
 import unittest
 import unittest.mock
 import pandas as pd
 import numpy as np
 import skbio
 import biom
+from bp import parse_newick
 from pandas.testing import assert_frame_equal
+from empress.table import ChunkedTable, PresenceTable
+from empress.tree import TreeIndex
 from empress.compression_utils import (
-    remove_empty_samples_and_features, compress_table,
-    compress_sample_metadata, compress_feature_metadata
+    remove_empty_samples_and_features, mask_empty_samples_and_features,
+    filter_table, compress_table, compress_sample_metadata,
+    compress_feature_metadata_columnar,
+    _factorize_as_str
 )
 
 
+def write_hdf5_table(table, dir_path):
+    path = os.path.join(dir_path, "table.biom")
+    with biom.util.biom_open(path, "w") as f:
+        table.to_hdf5(f, "test")
+    return path
+
+
 class TestCompressionUtils(unittest.TestCase):
 
     def setUp(self):
@@ -58,93 +72,6 @@ class TestCompressionUtils(unittest.TestCase):
             index=self.table_ef.ids().copy()
         )
         self.sid2idx = {"Sample1": 0, "Sample2": 1, "Sample3": 2}
-        self.tm = pd.DataFrame(
-            {
-                "Level 1": ["k__Bacteria", "k__Bacteria"],
-                "Level 2": ["p__Bacteroidetes", "p__Bacteroidetes"],
-                "Level 3": ["c__Bacteroidia", "c__Bacteroidia"],
-                "Level 4": ["o__Bacteroidales", "o__Bacteroidales"],
-                "Level 5": ["f__Bacteroidaceae", "f__Bacteroidaceae"],
-                "Level 6": ["g__Bacteroides", "g__Bacteroides"],
-                "Level 7": ["s__", "s__uniformis"],
-                "Confidence": [0.95, 0]
-            },
-            index=["e", "a"]
-        )
-        self.im = pd.DataFrame(
-            {
-                "Level 1": ["k__Bacteria", "k__Archaea"],
-                "Level 2": ["p__Proteobacteria", "Unspecified"],
-                "Level 3": ["c__Gammaproteobacteria", "Unspecified"],
-                "Level 4": ["o__Pasteurellales", "Unspecified"],
-                "Level 5": ["f__Pasteurellaceae", "Unspecified"],
-                "Level 6": ["g__", "Unspecified"],
-                "Level 7": ["s__", "Unspecified"],
-                "Confidence": [0.8, 1]
-            },
-            index=["h", "m"]
-        )
-        self.exp_fm_cols = [
-            "Level 1",
-            "Level 2",
-            "Level 3",
-            "Level 4",
-            "Level 5",
-            "Level 6",
-            "Level 7",
-            "Confidence"
-        ]
-        self.exp_ctm = {
-            "e": [
-                "k__Bacteria",
-                "p__Bacteroidetes",
-                "c__Bacteroidia",
-                "o__Bacteroidales",
-                "f__Bacteroidaceae",
-                "g__Bacteroides",
-                "s__",
-                "0.95"
-            ],
-            # The ".0" in "a"'s Confidence value is due to the 0 being treated
-            # as numeric by Pandas, since this was a numeric column in the DF.
-            # We can *try* to prevent this sort of thing from happening, but I
-            # doubt this will make a difference to anyone -- and also it's kind
-            # of dependent on whatever tool is reading the metadata in the
-            # first place (if it was all read with dtype=str, then this
-            # shouldn't be a problem). So, more of a QIIME 2 problem.
-            "a": [
-                "k__Bacteria",
-                "p__Bacteroidetes",
-                "c__Bacteroidia",
-                "o__Bacteroidales",
-                "f__Bacteroidaceae",
-                "g__Bacteroides",
-                "s__uniformis",
-                "0.0"
-            ]
-        }
-        self.exp_cim = {
-            "h": [
-                "k__Bacteria",
-                "p__Proteobacteria",
-                "c__Gammaproteobacteria",
-                "o__Pasteurellales",
-                "f__Pasteurellaceae",
-                "g__",
-                "s__",
-                "0.8"
-            ],
-            "m": [
-                "k__Archaea",
-                "Unspecified",
-                "Unspecified",
-                "Unspecified",
-                "Unspecified",
-                "Unspecified",
-                "Unspecified",
-                "1.0"
-            ]
-        }
         # Ordination info (for testing inputs to remove_empty...())
         self.eigvals = pd.Series(
             np.array([0.50, 0.25, 0.25]),
@@ -323,6 +250,67 @@ class TestCompressionUtils(unittest.TestCase):
         ):
             remove_empty_samples_and_features(diff_table, self.sm, self.pcoa)
 
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_mask_empty_samples_and_features_with_masks(self, mock_stdout):
+        # Only consider features b, e, d and samples 2, 3, 4: within these,
+        # only feature b and d and sample 2 are non-empty
+        f_mask, s_mask, fsm = mask_empty_samples_and_features(
+            self.table, self.sm.iloc[1:],
+            feature_mask=np.array([False, True, True, True]),
+            sample_mask=np.array([False, True, True, True])
+        )
+        np.testing.assert_array_equal(f_mask, [False, True, False, True])
+        np.testing.assert_array_equal(s_mask, [False, True, False, False])
+        assert_frame_equal(fsm, self.sm.loc[["Sample2"]])
+        self.assertEqual(
+            mock_stdout.getvalue(),
+            "Removed 2 empty sample(s).\nRemoved 1 empty feature(s).\n"
+        )
+
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_mask_empty_samples_and_features_chunked_table(self, mock_stdout):
+        # Reading the table one sample at a time should give the same results
+        # as above
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_hdf5_table(self.table, tmpdir)
+            for chunk_size in (1, 100):
+                f_mask, s_mask, fsm = mask_empty_samples_and_features(
+                    ChunkedTable(path, chunk_size=chunk_size),
+                    self.sm.iloc[1:],
+                    feature_mask=np.array([False, True, True, True]),
+                    sample_mask=np.array([False, True, True, True])
+                )
+                np.testing.assert_array_equal(f_mask,
+                                              [False, True, False, True])
+                np.testing.assert_array_equal(s_mask,
+                                              [False, True, False, False])
+                assert_frame_equal(fsm, self.sm.loc[["Sample2"]])
+        self.assertEqual(
+            mock_stdout.getvalue(),
+            "Removed 2 empty sample(s).\nRemoved 1 empty feature(s).\n" * 2
+        )
+
+    def test_filter_table(self):
+        table = biom.Table(
+            self.table.matrix_data, self.table.ids(axis="observation"),
+            self.table.ids(),
+            observation_metadata=[{"x": i} for i in range(4)],
+            sample_metadata=[{"y": i} for i in range(4)],
+            type="OTU table"
+        )
+        f_mask = np.array([True, False, True, True])
+        s_mask = np.array([True, True, False, True])
+        exp = table.filter(["a", "e", "d"], axis="observation",
+                           inplace=False)
+        exp.filter(["Sample1", "Sample2", "Sample4"], inplace=True)
+        obs = filter_table(table, f_mask, s_mask)
+        self.assertEqual(obs, exp)
+
+        # Nothing filtered: the table is returned as is, without copying it
+        all_f = np.ones(4, dtype=bool)
+        obs = filter_table(table, all_f, all_f)
+        self.assertIs(obs, table)
+
     def test_compress_table_basic(self):
         # Test the "basic" case, just looking at our default data.
         table_copy = self.table_ef.copy()
@@ -359,6 +347,132 @@ class TestCompressionUtils(unittest.TestCase):
             ]
         )
 
+    def test_compress_table_presence_table(self):
+        # Compressing a PresenceTable should give the same result as
+        # compressing the biom.Table it was created from
+        tree_index = TreeIndex(parse_newick("((d:1,a:2)x:1,(c:1,b:3)y:1);"))
+        for ti in (None, tree_index):
+            for csr in (False, True):
+                exp = compress_table(self.table_ef, ti, csr=csr)
+                obs = compress_table(
+                    PresenceTable.from_biom(self.table_ef), ti, csr=csr
+                )
+                self.assertEqual(obs[:4], exp[:4])
+                if csr:
+                    for key in ("indptr", "indices"):
+                        np.testing.assert_array_equal(obs[4][key],
+                                                      exp[4][key])
+                else:
+                    self.assertEqual(obs[4], exp[4])
+
+    def test_compress_table_chunked_table(self):
+        # Compressing a ChunkedTable (even one chunk at a time) should give
+        # the same result as compressing the table in memory
+        tree_index = TreeIndex(parse_newick("((d:1,a:2)x:1,(c:1,b:3)y:1);"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = write_hdf5_table(self.table_ef, tmpdir)
+            for chunk_size in (1, 100):
+                table = ChunkedTable(path, chunk_size=chunk_size)
+                for ti in (None, tree_index):
+                    for csr in (False, True):
+                        exp = compress_table(self.table_ef, ti, csr=csr)
+                        obs = compress_table(table, ti, csr=csr)
+                        self.assertEqual(obs[:4], exp[:4])
+                        if csr:
+                            # The indices are written to a temporary file
+                            self.assertIsInstance(obs[4]["indices"],
+                                                  np.memmap)
+                            for key in ("indptr", "indices"):
+                                np.testing.assert_array_equal(obs[4][key],
+                                                              exp[4][key])
+                                self.assertEqual(obs[4][key].dtype,
+                                                 np.uint32)
+                        else:
+                            self.assertEqual(obs[4], exp[4])
+                        del obs
+
+    def test_factorize_as_str(self):
+        # Categorical columns (with categories in a different order than
+        # their values first appear in, unused categories, and missing
+        # values) should be encoded just like the equivalent object columns
+        cat1 = pd.Series(pd.Categorical(
+            ["b", "a", None, "b", 1], categories=["a", "b", "c", 1]
+        ))
+        cat2 = pd.Series(pd.Categorical(["c", "d", "1"]))
+        obj = pd.Series(["a", "e", 1, None], dtype=object)
+        # Non-categorical columns are factorized before being converted to
+        # strings, so check values that are equal but differ as strings, and
+        # missing values that differ as strings
+        mixed = pd.Series([1, 1.0, True, "1"], dtype=object)
+        strs = pd.Series([np.nan, "a", None, "a"], dtype=object)
+        nums = pd.Series([1.0, np.nan, 2.5, 1.0])
+        for columns in (
+            [cat1, cat2], [cat1, obj, cat2], [obj, obj], [mixed, cat2],
+            [strs, nums, cat1]
+        ):
+            exp_codes, exp_values = pd.factorize(
+                pd.concat([c.astype(str) for c in columns])
+            )
+            values, codes = _factorize_as_str(columns)
+            self.assertEqual(values, list(exp_values))
+            np.testing.assert_array_equal(codes, exp_codes)
+            self.assertEqual(codes.dtype, np.uint32)
+
+    def test_compress_table_tree_index(self):
+        tree_index = TreeIndex(parse_newick("((d:1,a:2)x:1,(c:1,b:3)y:1);"))
+        s_ids, f_ids, sid2idx, fid2idx, tbl = compress_table(
+            self.table_ef, tree_index
+        )
+        self.assertEqual(s_ids, ["Sample1", "Sample2", "Sample3"])
+        # Features are now identified by their postorder positions in the
+        # tree: a is 2, b is 5, d is 1
+        self.assertEqual(f_ids, [2, 5, 1])
+        self.assertEqual(sid2idx, self.sid2idx)
+        self.assertEqual(fid2idx, {2: 0, 5: 1, 1: 2})
+        # The table itself shouldn't be affected, since it still refers to
+        # features' indices in f_ids
+        self.assertEqual(tbl, [[0, 1, 2], [0, 1, 2], [0]])
+
+    def test_compress_table_tree_index_missing_feature(self):
+        tree_index = TreeIndex(parse_newick("((d:1,a:2)x:1,c:1);"))
+        with self.assertRaisesRegex(
+            ValueError,
+            "Some features in the table are not present in the tree."
+        ):
+            compress_table(self.table_ef, tree_index)
+
+    def test_compress_table_csr(self):
+        table_copy = self.table_ef.copy()
+        s_ids, f_ids, sid2idx, fid2idx, tbl = compress_table(
+            table_copy, csr=True
+        )
+        self.assertEqual(table_copy, self.table_ef)
+        self.assertEqual(s_ids, ["Sample1", "Sample2", "Sample3"])
+        self.assertEqual(f_ids, ["a", "b", "d"])
+        self.assertEqual(sid2idx, self.sid2idx)
+        self.assertEqual(fid2idx, {"a": 0, "b": 1, "d": 2})
+        # Same as in test_compress_table_basic(), just flattened:
+        # Sample1 contains a, b, d; Sample2 contains a, b, d; and Sample3
+        # contains a only
+        self.assertEqual(tbl["indptr"].dtype, np.uint32)
+        self.assertEqual(tbl["indices"].dtype, np.uint32)
+        self.assertEqual(list(tbl["indptr"]), [0, 3, 6, 7])
+        self.assertEqual(list(tbl["indices"]), [0, 1, 2, 0, 1, 2, 0])
+
+    def test_compress_table_csr_matches_lists(self):
+        # The CSR and list-of-lists outputs should describe the same table,
+        # even if the table's matrix isn't already stored by sample
+        # (or if a sample has no features)
+        for table in (self.table, self.table.transpose().transpose()):
+            tbl = compress_table(table)[4]
+            csr = compress_table(table, csr=True)[4]
+            indptr, indices = csr["indptr"], csr["indices"]
+            self.assertEqual(len(indptr), len(tbl) + 1)
+            for i, feature_idxs in enumerate(tbl):
+                self.assertEqual(
+                    list(indices[indptr[i]:indptr[i + 1]]), feature_idxs
+                )
+
     def test_compress_table_with_empty_things(self):
         # This should never happen in practice (empty sample/feature removal
         # should be done before compression to save more space), but this
@@ -449,6 +563,43 @@ class TestCompressionUtils(unittest.TestCase):
             ]
         )
 
+    def test_compress_sample_metadata_categorical(self):
+        sm = self.sm_ef.copy()
+        sm["Metadata5"] = ["x", 1.5, "x"]
+        sm_copy = sm.copy()
+        # Scramble the sample indices to check that codes are ordered by them
+        sid2idx = {"Sample1": 2, "Sample2": 0, "Sample3": 1}
+        sm_cols, sm_vals = compress_sample_metadata(
+            sid2idx, sm_copy, categorical=True
+        )
+        assert_frame_equal(sm_copy, sm)
+        self.assertEqual(
+            sm_cols,
+            ["Metadata1", "Metadata2", "Metadata3", "Metadata4", "Metadata5"]
+        )
+        # Samples are now ordered Sample2, Sample3, Sample1. Unique values
+        # are listed in order of first appearance.
+        self.assertEqual(
+            sm_vals["values"],
+            [["0"], ["0"], ["2", "3", "1"], ["def", "ghi", "abc"],
+             ["1.5", "x"]]
+        )
+        exp_codes = [
+            [0, 0, 0], [0, 0, 0], [0, 1, 2], [0, 1, 2], [0, 1, 1]
+        ]
+        self.assertEqual(len(sm_vals["codes"]), len(exp_codes))
+        for obs, exp in zip(sm_vals["codes"], exp_codes):
+            self.assertEqual(obs.dtype, np.uint32)
+            self.assertEqual(list(obs), exp)
+
+        # Decoding the values should give the same result as the default
+        # (row-based) format
+        _, rows = compress_sample_metadata(sid2idx, sm_copy)
+        for c, (vals, codes) in enumerate(
+            zip(sm_vals["values"], sm_vals["codes"])
+        ):
+            self.assertEqual([vals[i] for i in codes], [r[c] for r in rows])
+
     def test_compress_sample_metadata_missing_sample_from_metadata(self):
         # If the metadata is missing samples described in sid2idx, that's bad!
         # ...And also probably impossible, unless someone messes up the code :P
@@ -504,87 +655,149 @@ class TestCompressionUtils(unittest.TestCase):
         diff_sid2idx["Sample3"] = 3
         verify_fails_due_to_sid2idx(diff_sid2idx)
 
-    def test_compress_feature_metadata_tip_and_int_nonstr_vals(self):
-        # Test the "basic" case, just looking at our default data.
-        tm_copy = self.tm.copy()
-        im_copy = self.im.copy()
-        fm_cols, ctm, cim = compress_feature_metadata(tm_copy, im_copy)
-
-        # As with compress_table(), verify that the inputs were left untouched.
-        assert_frame_equal(tm_copy, self.tm)
-        assert_frame_equal(im_copy, self.im)
-
-        # Now, check outputs
-        self.assertEqual(fm_cols, self.exp_fm_cols)
-        self.assertEqual(ctm, self.exp_ctm)
-        self.assertEqual(cim, self.exp_cim)
 
-    def test_compress_feature_metadata_tip_md_empty(self):
-        empty_tm = self.tm.filter(items=[], axis="index")
-        fm_cols, ctm, cim = compress_feature_metadata(empty_tm, self.im)
-
-        # Tip metadata should be an empty dict
-        self.assertEqual(ctm, {})
-        # Int metadata should be handled normally
-        self.assertEqual(cim, self.exp_cim)
+class TestCompressFeatureMetadataColumnar(unittest.TestCase):
 
-    def test_compress_feature_metadata_int_md_empty(self):
-        empty_im = self.im.filter(items=[], axis="index")
-        fm_cols, ctm, cim = compress_feature_metadata(self.tm, empty_im)
+    def setUp(self):
+        # Postorder: a, e, f, b, h, c, d, h, m. (Note that "h" is duplicated.)
+        self.tree_index = TreeIndex(
+            parse_newick('(((a:1,e:2)f:1,b:2)h:1,(c:1,d:3)h:2)m:1;')
+        )
+        self.tm = pd.DataFrame(
+            {
+                "Level 1": ["k__Bacteria", "k__Bacteria"],
+                "Confidence": [0.95, 0]
+            },
+            index=["e", "a"]
+        )
+        self.im = pd.DataFrame(
+            {
+                "Level 1": ["k__Bacteria", "k__Archaea"],
+                "Confidence": [0.8, 1]
+            },
+            index=["h", "m"]
+        )
 
-        # Tip metadata should be handled normally
-        self.assertEqual(ctm, self.exp_ctm)
-        # Int metadata should be an empty dict
-        self.assertEqual(cim, {})
+    def test_basic(self):
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            self.tm, self.im, self.tree_index
+        )
+        self.assertEqual(fm_cols, ["Level 1", "Confidence"])
+        # Both "h" nodes should point to the same row
+        np.testing.assert_array_equal(
+            cfm["row_ptr"], [0, 2, 1, 0, 0, 3, 0, 0, 3, 4]
+        )
+        self.assertEqual(cfm["row_ptr"].dtype, np.uint32)
+        self.assertEqual(cfm["num_tip_rows"], 2)
+        # The ".0"s in the Confidence values are due to this being a numeric
+        # column in the DF
+        self.assertEqual(
+            cfm["values"],
+            [["k__Bacteria", "k__Archaea"], ["0.95", "0.0", "0.8", "1.0"]]
+        )
+        self.assertEqual(len(cfm["codes"]), 2)
+        np.testing.assert_array_equal(cfm["codes"][0], [0, 0, 0, 1])
+        np.testing.assert_array_equal(cfm["codes"][1], [0, 1, 2, 3])
+        for codes in cfm["codes"]:
+            self.assertEqual(codes.dtype, np.uint32)
 
-    def test_compress_feature_metadata_tip_and_int_nonstr_cols(self):
+    def test_inputs_unchanged_and_nonstr_cols(self):
         tm_copy = self.tm.copy()
         im_copy = self.im.copy()
-        tm_copy.columns = im_copy.columns = range(len(tm_copy.columns))
-        fm_cols, ctm, cim = compress_feature_metadata(tm_copy, im_copy)
-
+        tm_copy.columns = im_copy.columns = [1, 2]
+        tm_orig = tm_copy.copy()
+        im_orig = im_copy.copy()
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            tm_copy, im_copy, self.tree_index
+        )
+        assert_frame_equal(tm_copy, tm_orig)
+        assert_frame_equal(im_copy, im_orig)
         # Columns should've been converted to strings
-        self.assertEqual(fm_cols, ["0", "1", "2", "3", "4", "5", "6", "7"])
+        self.assertEqual(fm_cols, ["1", "2"])
+        self.assertEqual(
+            cfm["values"],
+            [["k__Bacteria", "k__Archaea"], ["0.95", "0.0", "0.8", "1.0"]]
+        )
+
+    def test_ignores_nodes_of_other_type(self):
+        # Tip metadata for an internal node (and vice versa) isn't assigned
+        # to that node
+        tm = self.tm.rename(index={"a": "f"})
+        im = self.im.rename(index={"m": "b"})
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            tm, im, self.tree_index
+        )
+        np.testing.assert_array_equal(
+            cfm["row_ptr"], [0, 0, 1, 0, 0, 3, 0, 0, 3, 0]
+        )
+        self.assertEqual(cfm["num_tip_rows"], 2)
+
+    def test_tip_md_empty(self):
+        empty_tm = self.tm.filter(items=[], axis="index")
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            empty_tm, self.im, self.tree_index
+        )
+        np.testing.assert_array_equal(
+            cfm["row_ptr"], [0, 0, 0, 0, 0, 1, 0, 0, 1, 2]
+        )
+        self.assertEqual(cfm["num_tip_rows"], 0)
+        self.assertEqual(
+            cfm["values"], [["k__Bacteria", "k__Archaea"], ["0.8", "1.0"]]
+        )
 
-        # The actual values should be unchanged (fortunately, the nature of
-        # storing values in lists means that no references to the column
-        # names are stored here)
-        self.assertEqual(ctm, self.exp_ctm)
-        self.assertEqual(cim, self.exp_cim)
+    def test_int_md_empty(self):
+        empty_im = self.im.filter(items=[], axis="index")
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            self.tm, empty_im, self.tree_index
+        )
+        np.testing.assert_array_equal(
+            cfm["row_ptr"], [0, 2, 1, 0, 0, 0, 0, 0, 0, 0]
+        )
+        self.assertEqual(cfm["num_tip_rows"], 2)
+        self.assertEqual(
+            cfm["values"], [["k__Bacteria"], ["0.95", "0.0"]]
+        )
 
-    def test_compress_feature_metadata_both_dfs_nones(self):
-        fm_cols, ctm, cim = compress_feature_metadata(None, None)
+    def test_both_dfs_nones(self):
+        fm_cols, cfm = compress_feature_metadata_columnar(
+            None, None, self.tree_index
+        )
         self.assertEqual(fm_cols, [])
-        self.assertEqual(ctm, {})
-        self.assertEqual(cim, {})
+        self.assertEqual(len(cfm["row_ptr"]), 0)
+        self.assertEqual(cfm["num_tip_rows"], 0)
+        self.assertEqual(cfm["values"], [])
+        self.assertEqual(cfm["codes"], [])
 
-    def test_compress_feature_metadata_only_one_df_is_none(self):
+    def test_invalid_dfs(self):
         with self.assertRaisesRegex(
             ValueError,
             "Only one of tip & int. node feature metadata is None."
         ):
-            compress_feature_metadata(self.tm, None)
-
+            compress_feature_metadata_columnar(
+                self.tm, None, self.tree_index
+            )
         with self.assertRaisesRegex(
             ValueError,
             "Only one of tip & int. node feature metadata is None."
         ):
-            compress_feature_metadata(None, self.im)
-
-    def test_compress_feature_metadata_differing_columns(self):
+            compress_feature_metadata_columnar(
+                None, self.im, self.tree_index
+            )
         diff_tm = self.tm.copy()
         diff_tm.columns = range(len(self.tm.columns))
         with self.assertRaisesRegex(
             ValueError,
             "Tip & int. node feature metadata columns differ."
         ):
-            compress_feature_metadata(diff_tm, self.im)
-
-    def test_compress_feature_metadata_both_dfs_empty(self):
+            compress_feature_metadata_columnar(
+                diff_tm, self.im, self.tree_index
+            )
         empty_tm = self.tm.filter(items=[], axis="index")
         empty_im = self.im.filter(items=[], axis="index")
         with self.assertRaisesRegex(
             ValueError,
             "Both tip & int. node feature metadata are empty."
         ):
-            compress_feature_metadata(empty_tm, empty_im)
+            compress_feature_metadata_columnar(
+                empty_tm, empty_im, self.tree_index
+            )
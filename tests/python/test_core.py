@@ -6,8 +6,14 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import base64
 import copy
+import json
+import os
+import sys
+import tempfile
 import unittest
+import unittest.mock
 import pandas as pd
 import numpy as np
 import skbio
@@ -21,7 +27,10 @@ import biom
 from .util import load_mp_data
 from emperor import Emperor
 from empress import tools
+from empress._plot_utils import save_viz
 from empress.core import Empress
+from empress.profiling import Profiler
+from empress.table import PresenceTable
 from bp import parse_newick, from_skbio_treenode
 from six import StringIO
 from skbio.tree import TreeNode
@@ -147,8 +156,8 @@ class TestCore(unittest.TestCase):
             node = viz.tree.postorderselect(i)
             self.assertEqual(viz.tree.name(node), names[i - 1])
 
-        # table should be unchanged and be a different id instance
-        self.assertEqual(self.table, viz.table)
+        # table should have been converted to a presence / absence table
+        self.assertEqual(PresenceTable.from_biom(self.table), viz.table)
         self.assertNotEqual(id(self.table), id(viz.table))
 
         # sample metadata should be unchanged and be a different id instance
@@ -233,8 +242,8 @@ class TestCore(unittest.TestCase):
             node = viz.tree.postorderselect(i)
             self.assertEqual(viz.tree.name(node), names[i - 1])
 
-        # table should be unchanged and be a different id instance
-        self.assertEqual(self.table, viz.table)
+        # table should have been converted to a presence / absence table
+        self.assertEqual(PresenceTable.from_biom(self.table), viz.table)
         self.assertNotEqual(id(self.table), id(viz.table))
 
         # sample metadata should be unchanged and be a different id instance
@@ -305,6 +314,201 @@ class TestCore(unittest.TestCase):
         self.files_to_remove.append(local_path)
         self.files_to_remove.append('./something-else')
 
+    def test_profiler(self):
+        profiler = Profiler()
+        viz = Empress(self.tree, self.table, self.sample_metadata,
+                      feature_metadata=self.feature_metadata,
+                      profiler=profiler)
+        self.assertIs(viz.profiler, profiler)
+        viz.to_dict()
+        self.assertEqual(
+            [stage["name"] for stage in profiler.stages],
+            ["convert_table", "tree_index", "match_inputs", "shear",
+             "tree_index", "filter_feature_metadata", "validate_tree",
+             "to_dict", "to_dict/compress_table",
+             "to_dict/compress_sample_metadata",
+             "to_dict/compress_feature_metadata", "to_dict/compress_tree"]
+        )
+
+    def test_use_shared_support_files(self):
+        shared_dir = tempfile.mkdtemp()
+        self.files_to_remove.append(shared_dir)
+        out_dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.files_to_remove.extend(out_dirs)
+
+        vizs = [
+            Empress(self.tree, self.table, self.sample_metadata,
+                    ordination=self.pcoa, shear_to_table=False)
+            for _ in out_dirs
+        ]
+        vizs[0].use_shared_support_files(shared_dir, out_dirs[0])
+        shared_copies = sorted(os.listdir(shared_dir))
+        self.assertEqual(len(shared_copies), 2)
+        self.assertTrue(shared_copies[0].startswith('emperor-'))
+        self.assertTrue(shared_copies[1].startswith('empress-'))
+        self.assertEqual(
+            vizs[0].base_url,
+            os.path.relpath(os.path.join(shared_dir, shared_copies[1]),
+                            out_dirs[0])
+        )
+        self.assertEqual(
+            vizs[0]._emperor.base_url,
+            os.path.relpath(os.path.join(shared_dir, shared_copies[0]),
+                            out_dirs[0])
+        )
+        self.assertTrue(exists(
+            os.path.join(out_dirs[0], vizs[0].base_url, 'js', 'empress.js')
+        ))
+        # Nothing should be copied to the output directory
+        self.assertEqual(os.listdir(out_dirs[0]), [])
+
+        # The shared support files should be reused
+        marker = os.path.join(shared_dir, shared_copies[1], 'marker')
+        open(marker, 'w').close()
+        vizs[1].use_shared_support_files(shared_dir, out_dirs[1])
+        self.assertEqual(sorted(os.listdir(shared_dir)), shared_copies)
+        self.assertTrue(exists(marker))
+
+        # The shared support files should be used by the rendered plot
+        html = vizs[1].make_empress()
+        self.assertIn("href='{}/css/empress.css'".format(vizs[1].base_url),
+                      html)
+        self.assertIn(vizs[1]._emperor.base_url, html)
+
+    def test_use_shared_support_files_hardlink(self):
+        shared_dir = tempfile.mkdtemp()
+        out_dir = tempfile.mkdtemp()
+        self.files_to_remove.extend([shared_dir, out_dir])
+
+        viz = Empress(self.tree, self.table, self.sample_metadata,
+                      shear_to_table=False)
+        viz.use_shared_support_files(shared_dir, out_dir, hardlink=True)
+        self.assertEqual(viz.base_url, 'support_files')
+        self.assertEqual(os.listdir(out_dir), ['support_files'])
+
+        (shared_copy,) = os.listdir(shared_dir)
+        rel_path = os.path.join('js', 'empress.js')
+        self.assertTrue(os.path.samefile(
+            os.path.join(shared_dir, shared_copy, rel_path),
+            os.path.join(out_dir, 'support_files', rel_path)
+        ))
+
+    def test_save_viz_q2_shared_support_files(self):
+        # QIIME 2 only packages the output directory, so the shared support
+        # files have to be placed in it
+        shared_dir = tempfile.mkdtemp()
+        out_dir = tempfile.mkdtemp()
+        self.files_to_remove.extend([shared_dir, out_dir])
+
+        viz = Empress(self.tree, self.table, self.sample_metadata,
+                      shear_to_table=False)
+        q2templates = unittest.mock.MagicMock()
+        with unittest.mock.patch.dict(sys.modules,
+                                      {'q2templates': q2templates}):
+            save_viz(viz, out_dir, shared_support_dir=shared_dir)
+        q2templates.render.assert_called_once()
+        self.assertEqual(viz.base_url, 'support_files')
+        self.assertCountEqual(os.listdir(out_dir),
+                              ['empress.html', 'support_files'])
+
+    def test_write(self):
+        out_dir = tempfile.mkdtemp()
+        self.files_to_remove.append(out_dir)
+        path = os.path.join(out_dir, 'empress.html')
+        vizs = [
+            Empress(self.tree, self.table, self.sample_metadata,
+                    shear_to_table=False),
+            Empress(self.tree, self.table, self.sample_metadata,
+                    self.feature_metadata, shear_to_table=False),
+            Empress(self.tree, feature_metadata=self.feature_metadata),
+        ]
+        for viz in vizs:
+            # Using a small chunk size makes sure that lists are split up
+            for chunk_size in (1, 10000):
+                viz.write(path, chunk_size=chunk_size)
+                with open(path) as f:
+                    self.assertEqual(f.read(), viz.make_empress())
+
+    def test_write_sidecar(self):
+        out_dir = tempfile.mkdtemp()
+        self.files_to_remove.append(out_dir)
+        path = os.path.join(out_dir, 'empress.html')
+        viz = Empress(self.tree, self.table, self.sample_metadata,
+                      self.feature_metadata, shear_to_table=False)
+        viz.write(path, sidecar=True)
+
+        # The data shouldn't be included in the HTML file
+        with open(path) as f:
+            html = f.read()
+        self.assertIn(
+            'SidecarLoader.load("empress-data/manifest.json")', html
+        )
+        self.assertNotIn(viz.to_dict()['tree'], html)
+
+        data_dir = os.path.join(out_dir, 'empress-data')
+        with open(os.path.join(data_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def read_sidecar(ref):
+            sidecar_path = os.path.join(data_dir, ref['$sidecar'])
+            if 'dtype' in ref:
+                dtype = np.dtype(ref['dtype']).newbyteorder('<')
+                return np.fromfile(sidecar_path, dtype=dtype)
+            with open(sidecar_path) as f:
+                return json.load(f)
+
+        # Check that the sidecar files match the data that would have been
+        # included in the HTML file
+        exp = viz.to_dict()
+        self.assertEqual(
+            manifest['tree'], {'$sidecar': 'tree.bin', 'dtype': 'uint8'}
+        )
+        self.assertEqual(
+            base64.b64encode(read_sidecar(manifest['tree'])).decode('ascii'),
+            exp['tree']
+        )
+        self.assertEqual(
+            read_sidecar(manifest['lengths']).tolist(), exp['lengths']
+        )
+        for field in ('names', 's_ids', 'f_ids'):
+            self.assertEqual(read_sidecar(manifest[field]), exp[field])
+        for field in ('s_ids_to_indices', 'f_ids_to_indices'):
+            # (JSON object keys are always strings)
+            self.assertEqual(
+                read_sidecar(manifest[field]),
+                {str(k): v for k, v in exp[field].items()}
+            )
+        self.assertEqual(
+            manifest['feature_metadata_columns'],
+            exp['feature_metadata_columns']
+        )
+        self.assertEqual(
+            manifest['sample_metadata_columns'],
+            exp['sample_metadata_columns']
+        )
+        for arr in ('indptr', 'indices'):
+            self.assertEqual(
+                tools.encode_uint32(
+                    read_sidecar(manifest['compressed_table'][arr])
+                ),
+                exp['compressed_table'][arr]
+            )
+        for field in ('compressed_sample_metadata',
+                      'compressed_feature_metadata'):
+            self.assertEqual(
+                read_sidecar(manifest[field]['values']), exp[field]['values']
+            )
+            self.assertEqual(
+                [tools.encode_uint32(read_sidecar(c))
+                 for c in manifest[field]['codes']],
+                exp[field]['codes']
+            )
+        row_ptr_ref = manifest['compressed_feature_metadata']['row_ptr']
+        self.assertEqual(
+            tools.encode_uint32(read_sidecar(row_ptr_ref)),
+            exp['compressed_feature_metadata']['row_ptr']
+        )
+
     def test_to_dict(self):
         viz = Empress(self.tree, self.table, self.sample_metadata,
                       shear_to_table=False)
@@ -329,8 +533,7 @@ class TestCore(unittest.TestCase):
         )
         obs = viz.to_dict()
         dict_a_with_fm = copy.deepcopy(DICT_A)
-        dict_a_with_fm["compressed_tip_metadata"] = {1: ["asdf", "qwer"]}
-        dict_a_with_fm["compressed_int_metadata"] = {8: ["ghjk", "tyui"]}
+        dict_a_with_fm["compressed_feature_metadata"] = FM_A
         dict_a_with_fm["feature_metadata_columns"] = ["fmdcol1", "fmdcol2"]
 
         self.assertEqual(obs, dict_a_with_fm)
@@ -348,11 +551,13 @@ class TestCore(unittest.TestCase):
         obs = viz.to_dict()
         dict_a_nan = copy.deepcopy(DICT_A)
 
-        # [1][3] corresponds to Sample2, Metadata4
-        dict_a_nan["compressed_sample_metadata"][1][3] = str(np.nan)
+        # Sample2's Metadata4 value is the second unique value in Metadata4
+        dict_a_nan["compressed_sample_metadata"]["values"][3][1] = str(np.nan)
 
-        dict_a_nan["compressed_tip_metadata"] = {1: ["asdf", str(np.nan)]}
-        dict_a_nan["compressed_int_metadata"] = {8: [str(np.nan), "tyui"]}
+        dict_a_nan["compressed_feature_metadata"] = copy.deepcopy(FM_A)
+        dict_a_nan["compressed_feature_metadata"]["values"] = [
+            ["asdf", str(np.nan)], [str(np.nan), "tyui"]
+        ]
         dict_a_nan["feature_metadata_columns"] = ["fmdcol1", "fmdcol2"]
 
         self.assertEqual(obs, dict_a_nan)
@@ -444,8 +649,7 @@ class TestCore(unittest.TestCase):
         dict_a_cp = copy.deepcopy(DICT_A)
         self._clear_copied_dict_a(dict_a_cp)
         # Copied from test_to_dict_with_feature_metadata() above
-        dict_a_cp["compressed_tip_metadata"] = {1: ["asdf", "qwer"]}
-        dict_a_cp["compressed_int_metadata"] = {8: ["ghjk", "tyui"]}
+        dict_a_cp["compressed_feature_metadata"] = FM_A
         dict_a_cp["feature_metadata_columns"] = ["fmdcol1", "fmdcol2"]
 
         obs = viz.to_dict()
@@ -464,8 +668,9 @@ class TestCore(unittest.TestCase):
             node = viz.tree.postorderselect(i)
             self.assertEqual(viz.tree.name(node), names[i - 1])
 
-        # table should be unchanged and be a different id instance
-        self.assertEqual(self.filtered_table, viz.table)
+        # table should have been converted to a presence / absence table
+        self.assertEqual(PresenceTable.from_biom(self.filtered_table),
+                         viz.table)
         self.assertNotEqual(id(self.filtered_table), id(viz.table))
 
         # sample metadata should be unchanged and be a different id instance
@@ -498,8 +703,9 @@ class TestCore(unittest.TestCase):
         assert_frame_equal(extra_fm.loc[["a"]], viz.tip_md)
         assert_frame_equal(extra_fm.loc[["h"]], viz.int_md)
 
-        # table should be unchanged and be a different id instance
-        self.assertEqual(self.filtered_table, viz.table)
+        # table should have been converted to a presence / absence table
+        self.assertEqual(PresenceTable.from_biom(self.filtered_table),
+                         viz.table)
         self.assertNotEqual(id(self.filtered_table), id(viz.table))
 
         # sample metadata should be unchanged and be a different id instance
@@ -696,8 +902,8 @@ class TestCore(unittest.TestCase):
         viz = Empress(self.tree, self.table, self.sample_metadata,
                       ordination=self.pcoa)
 
-        # table should be unchanged and be a different id instance
-        self.assertEqual(self.table, viz.table)
+        # table should have been converted to a presence / absence table
+        self.assertEqual(PresenceTable.from_biom(self.table), viz.table)
         self.assertNotEqual(id(self.table), id(viz.table))
 
         # sample metadata should be unchanged and be a different id instance
@@ -725,7 +931,7 @@ class TestCore(unittest.TestCase):
 # check that it looks sane, since it'll be used as a reference in these tests.)
 DICT_A = {
     "base_url": "support_files",
-    "tree": [250472],
+    "tree": "9JoA",
     "names": [
         -1,
         "a",
@@ -750,23 +956,47 @@ DICT_A = {
         "Sample4": 3,
     },
     "f_ids_to_indices": {1: 0, 4: 1, 2: 2, 7: 3},
-    "compressed_table": [[0, 1, 3], [0, 1, 3], [0], [2]],
+    # CSR representation of [[0, 1, 3], [0, 1, 3], [0], [2]]: indptr is
+    # [0, 3, 6, 7, 8] and indices is [0, 1, 3, 0, 1, 3, 0, 2]
+    "compressed_table": {
+        "indptr": "AAAAAAMAAAAGAAAABwAAAAgAAAA=",
+        "indices": "AAAAAAEAAAADAAAAAAAAAAEAAAADAAAAAAAAAAIAAAA="
+    },
     "sample_metadata_columns": [
         "Metadata1",
         "Metadata2",
         "Metadata3",
         "Metadata4",
     ],
-    "compressed_sample_metadata": [
-        ["0", "0", "1", "abc"],
-        ["0", "0", "2", "def"],
-        ["0", "0", "3", "ghi"],
-        ["1", "0", "4", "jkl"],
-    ],
+    # Dictionary-encoded version of the sample metadata:
+    # Sample1: ["0", "0", "1", "abc"]
+    # Sample2: ["0", "0", "2", "def"]
+    # Sample3: ["0", "0", "3", "ghi"]
+    # Sample4: ["1", "0", "4", "jkl"]
+    # The codes are, respectively, [0, 0, 0, 1], [0, 0, 0, 0], [0, 1, 2, 3],
+    # and [0, 1, 2, 3].
+    "compressed_sample_metadata": {
+        "values": [
+            ["0", "1"],
+            ["0"],
+            ["1", "2", "3", "4"],
+            ["abc", "def", "ghi", "jkl"],
+        ],
+        "codes": [
+            "AAAAAAAAAAAAAAAAAQAAAA==",
+            "AAAAAAAAAAAAAAAAAAAAAA==",
+            "AAAAAAEAAAACAAAAAwAAAA==",
+            "AAAAAAEAAAACAAAAAwAAAA==",
+        ],
+    },
     "feature_metadata_columns": [],
     "split_taxonomy_columns": [],
-    "compressed_tip_metadata": {},
-    "compressed_int_metadata": {},
+    "compressed_feature_metadata": {
+        "row_ptr": "",
+        "num_tip_rows": 0,
+        "values": [],
+        "codes": []
+    },
     "emperor_div": "",
     "emperor_require_logic": "",
     "emperor_style": "",
@@ -774,5 +1004,16 @@ DICT_A = {
     "emperor_classes": "",
 }
 
+# Feature metadata produced by to_dict() when self.feature_metadata is used:
+# tip "a" (postorder position 1) points to row 0, and internal node "h"
+# (postorder position 8) points to row 1. row_ptr is
+# [0, 1, 0, 0, 0, 0, 0, 0, 2, 0], and the codes for both columns are [0, 1].
+FM_A = {
+    "row_ptr": "AAAAAAEAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACAAAAAAAAAA==",
+    "num_tip_rows": 1,
+    "values": [["asdf", "ghjk"], ["qwer", "tyui"]],
+    "codes": ["AAAAAAEAAAA=", "AAAAAAEAAAA="]
+}
+
 if __name__ == "__main__":
     unittest.main()
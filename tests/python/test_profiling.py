@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2020, empress development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+import pstats
+import tempfile
+import unittest
+import numpy as np
+from empress.profiling import Profiler, profile_stage, _CAN_RESET_PEAK
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_stages(self):
+        profiler = Profiler()
+        with profiler.stage("a"):
+            with profiler.stage("b"):
+                sum(range(1000))
+        with profile_stage(profiler, "c"):
+            pass
+        self.assertEqual([s["name"] for s in profiler.stages],
+                         ["a", "a/b", "c"])
+        for stage in profiler.stages:
+            self.assertGreaterEqual(stage["wall_time"], 0)
+            self.assertGreaterEqual(stage["cpu_time"], 0)
+            self.assertNotIn("memory_increase", stage)
+        report = profiler.report()
+        self.assertEqual(report["stages"], profiler.stages)
+        # Nested stages aren't counted twice in the totals
+        self.assertAlmostEqual(
+            report["total_wall_time"],
+            profiler.stages[0]["wall_time"] + profiler.stages[2]["wall_time"]
+        )
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"),
+                         "needs /proc/self/statm")
+    def test_stage_rss(self):
+        profiler = Profiler()
+        with profiler.stage("a"):
+            # (np.ones() touches every page, so they're all resident)
+            big = np.ones(5 * 10 ** 7, dtype=np.uint8)
+        a = profiler.stages[0]
+        self.assertGreaterEqual(a["rss_after"] - a["rss_before"],
+                                4 * 10 ** 7)
+        self.assertGreaterEqual(a["peak_rss"], a["rss_after"])
+        del big
+
+    @unittest.skipUnless(_CAN_RESET_PEAK, "needs tracemalloc.reset_peak()")
+    def test_stage_python_allocations(self):
+        # Each stage's peak is measured separately, even if an earlier stage
+        # used more memory
+        profiler = Profiler(trace_python_allocations=True)
+        with profiler.stage("a"):
+            big = np.ones(10 ** 7, dtype=np.uint8)
+            with profiler.stage("b"):
+                small = np.ones(10 ** 6, dtype=np.uint8)
+            del big
+        with profiler.stage("c"):
+            temp = np.ones(2 * 10 ** 6, dtype=np.uint8)
+            del temp
+        a, b, c = profiler.stages
+        self.assertGreaterEqual(a["peak_memory_increase"], 1.1 * 10 ** 7)
+        self.assertAlmostEqual(a["memory_increase"], 10 ** 6, delta=10 ** 5)
+        self.assertAlmostEqual(b["peak_memory_increase"], 10 ** 6,
+                               delta=10 ** 5)
+        self.assertAlmostEqual(b["memory_increase"], 10 ** 6, delta=10 ** 5)
+        self.assertAlmostEqual(c["peak_memory_increase"], 2 * 10 ** 6,
+                               delta=10 ** 5)
+        self.assertAlmostEqual(c["memory_increase"], 0, delta=10 ** 5)
+        del small
+        self.assertGreater(profiler.report()["peak_rss"], 0)
+
+    def test_stage_error(self):
+        # A stage that raises an error should still be recorded
+        profiler = Profiler()
+        with self.assertRaises(ValueError):
+            with profiler.stage("a"):
+                raise ValueError("oops")
+        self.assertEqual(profiler.stages[0]["name"], "a")
+        self.assertIn("wall_time", profiler.stages[0])
+        with profiler.stage("b"):
+            pass
+        self.assertEqual(profiler.stages[1]["name"], "b")
+
+    def test_profile_stage_no_profiler(self):
+        with profile_stage(None, "a"):
+            x = 1
+        self.assertEqual(x, 1)
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = Profiler()
+            with profiler.stage("a"):
+                pass
+            profiler.write(output_dir)
+            self.assertEqual(os.listdir(output_dir), ["empress-profile.json"])
+            with open(os.path.join(output_dir, "empress-profile.json")) as f:
+                report = json.load(f)
+            self.assertEqual(report["stages"][0]["name"], "a")
+
+    def test_write_cprofile(self):
+        def profiled_function():
+            return sum(range(1000))
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = Profiler(cprofile=True)
+            with profiler.stage("a"):
+                profiled_function()
+            profiler.write(output_dir)
+            self.assertCountEqual(
+                os.listdir(output_dir),
+                ["empress-profile.json", "empress-profile.prof"]
+            )
+            stats = pstats.Stats(
+                os.path.join(output_dir, "empress-profile.prof")
+            )
+            self.assertIn(
+                "profiled_function",
+                [func[2] for func in stats.stats]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
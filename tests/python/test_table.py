@@ -0,0 +1,327 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2020, empress development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+import biom
+import h5py
+import numpy as np
+from scipy.sparse import csr_matrix
+from empress.table import (
+    ChunkedTable, PresenceTable, load_presence_table, _read_csr_submatrix
+)
+
+
+class TestPresenceTable(unittest.TestCase):
+
+    def setUp(self):
+        self.biom_table = biom.Table(
+            np.array([[1.5, 2, 0, 4],
+                      [8, 7, 0, 5],
+                      [1, 0, 0, 0],
+                      [0, 0, 0, 0]]).T,
+            list('abed'),
+            ['Sample1', 'Sample2', 'Sample3', 'Sample4']
+        )
+        self.table = PresenceTable.from_biom(self.biom_table)
+
+    def test_from_biom(self):
+        self.assertEqual(self.table.shape, (4, 4))
+        np.testing.assert_array_equal(self.table.ids(axis='observation'),
+                                      list('abed'))
+        np.testing.assert_array_equal(
+            self.table.ids(), ['Sample1', 'Sample2', 'Sample3', 'Sample4']
+        )
+        mat = self.table.matrix_data
+        self.assertEqual(mat.dtype, bool)
+        np.testing.assert_array_equal(
+            mat.toarray(), self.biom_table.matrix_data.toarray() > 0
+        )
+        # Values shouldn't be stored
+        self.assertEqual(mat.nnz, 7)
+        self.assertTrue(mat.data.all())
+
+    def test_explicit_zeros_removed(self):
+        mat = csr_matrix(np.array([[1, 0], [0, 2]], dtype=float))
+        mat.data[0] = 0
+        table = PresenceTable(mat, ['f1', 'f2'], ['s1', 's2'])
+        self.assertEqual(table.matrix_data.nnz, 1)
+        np.testing.assert_array_equal(
+            table.matrix_data.toarray(), [[False, False], [False, True]]
+        )
+
+    def test_shape_mismatch(self):
+        with self.assertRaisesRegex(ValueError, "doesn't match"):
+            PresenceTable(csr_matrix((2, 3)), ['f1', 'f2'], ['s1', 's2'])
+
+    def test_ids_bad_axis(self):
+        with self.assertRaisesRegex(ValueError, "Unrecognized axis: asdf"):
+            self.table.ids(axis='asdf')
+
+    def test_subset(self):
+        obs = self.table.subset(np.array([True, False, True, True]),
+                                np.array([False, True, True, True]))
+        exp = self.biom_table.filter(['a', 'e', 'd'], axis='observation',
+                                     inplace=False)
+        exp.filter(['Sample2', 'Sample3', 'Sample4'], inplace=True)
+        self.assertEqual(obs, PresenceTable.from_biom(exp))
+
+    def test_copy_and_eq(self):
+        copy = self.table.copy()
+        self.assertEqual(copy, self.table)
+        self.assertIsNot(copy.matrix_data, self.table.matrix_data)
+        self.assertNotEqual(
+            self.table.subset(np.ones(4, dtype=bool),
+                              np.array([True, True, True, False])),
+            self.table
+        )
+        self.assertNotEqual(self.table, self.biom_table)
+
+    def test_is_empty(self):
+        self.assertFalse(self.table.is_empty())
+        self.assertTrue(
+            self.table.subset(np.ones(4, dtype=bool),
+                              np.zeros(4, dtype=bool)).is_empty()
+        )
+
+
+class HDF5TableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.biom_table = biom.Table(
+            np.array([[1.5, 2, 0, 4, 0],
+                      [8, 7, 0, 5, 1],
+                      [1, 0, 0, 0, 0],
+                      [0, 0, 3, 0, 0],
+                      [0, 0, 0, 0, 0],
+                      [2, 0, 9, 0, 6]]),
+            list('abcdef'),
+            ['Sample1', 'Sample2', 'Sample3', 'Sample4', 'Sample5']
+        )
+        self.hdf5_path = os.path.join(self.tmpdir.name, 'table.biom')
+        with biom.util.biom_open(self.hdf5_path, 'w') as f:
+            self.biom_table.to_hdf5(f, 'test')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def get_expected(self, feature_ids, sample_ids):
+        exp = self.biom_table.filter(feature_ids, axis='observation',
+                                     inplace=False)
+        exp.filter(sample_ids, inplace=True)
+        return PresenceTable.from_biom(exp)
+
+
+class TestLoadPresenceTable(HDF5TableTestCase):
+
+    def test_load_everything(self):
+        table, full_shape = load_presence_table(self.hdf5_path)
+        self.assertEqual(table, PresenceTable.from_biom(self.biom_table))
+        self.assertEqual(full_shape, (6, 5))
+
+    def test_load_subset(self):
+        feature_ids = {'a', 'c', 'f', 'not-in-the-table'}
+        sample_ids = ['Sample5', 'Sample1', 'Sample3']
+        exp = self.get_expected(['a', 'c', 'f'],
+                                ['Sample1', 'Sample3', 'Sample5'])
+        # Check that the result doesn't depend on how much is read at once
+        for chunk_size in (1, 2, 3, 100):
+            table, full_shape = load_presence_table(
+                self.hdf5_path, feature_ids=feature_ids,
+                sample_ids=sample_ids, chunk_size=chunk_size
+            )
+            self.assertEqual(table, exp)
+            self.assertEqual(full_shape, (6, 5))
+
+    def test_load_subset_one_axis(self):
+        table, _ = load_presence_table(self.hdf5_path,
+                                       sample_ids={'Sample2'})
+        self.assertEqual(table, self.get_expected(list('abcdef'),
+                                                  ['Sample2']))
+        table, _ = load_presence_table(self.hdf5_path,
+                                       feature_ids={'e', 'b'})
+        self.assertEqual(table, self.get_expected(
+            ['b', 'e'], ['Sample1', 'Sample2', 'Sample3', 'Sample4',
+                         'Sample5']
+        ))
+
+    def test_load_nothing(self):
+        table, full_shape = load_presence_table(self.hdf5_path,
+                                                feature_ids=set())
+        self.assertEqual(table.shape, (0, 5))
+        self.assertEqual(full_shape, (6, 5))
+
+    def test_load_explicit_zeros(self):
+        # Entries stored in the file with a value of 0 aren't "present"
+        with h5py.File(self.hdf5_path, 'r+') as f:
+            f['observation/matrix/data'][0] = 0
+        table, _ = load_presence_table(self.hdf5_path)
+        self.assertFalse(table.matrix_data[0, 0])
+        self.assertEqual(table.matrix_data.nnz,
+                         self.biom_table.matrix_data.nnz - 1)
+
+    def test_load_chunked(self):
+        table, full_shape = load_presence_table(
+            self.hdf5_path, feature_ids={'a', 'f'},
+            sample_ids={'Sample1', 'Sample3'}, chunked=True
+        )
+        self.assertIsInstance(table, ChunkedTable)
+        self.assertEqual(full_shape, (6, 5))
+        np.testing.assert_array_equal(table.ids(axis='observation'),
+                                      ['a', 'f'])
+        np.testing.assert_array_equal(table.ids(), ['Sample1', 'Sample3'])
+
+    def test_load_chunked_json(self):
+        json_path = os.path.join(self.tmpdir.name, 'table.json')
+        with open(json_path, 'w') as f:
+            f.write(self.biom_table.to_json('test'))
+        with self.assertRaisesRegex(ValueError, 'HDF5'):
+            load_presence_table(json_path, chunked=True)
+
+    def test_load_json(self):
+        json_path = os.path.join(self.tmpdir.name, 'table.json')
+        with open(json_path, 'w') as f:
+            f.write(self.biom_table.to_json('test'))
+        table, full_shape = load_presence_table(
+            json_path, feature_ids={'b', 'd'}, sample_ids={'Sample3'}
+        )
+        self.assertEqual(table, self.get_expected(['b', 'd'], ['Sample3']))
+        self.assertEqual(full_shape, (6, 5))
+
+
+class TestChunkedTable(HDF5TableTestCase):
+
+    def read_chunks(self, table):
+        chunks = list(table.iter_sample_chunks())
+        # The chunks should cover all samples, in order
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], table.shape[1])
+        for (_, last, _), (first, _, _) in zip(chunks[:-1], chunks[1:]):
+            self.assertEqual(last, first)
+        for first, last, chunk in chunks:
+            self.assertEqual(chunk.shape, (last - first, table.shape[0]))
+            self.assertEqual(chunk.dtype, bool)
+        return np.vstack([chunk.toarray() for _, _, chunk in chunks]).T
+
+    def test_init(self):
+        table = ChunkedTable(self.hdf5_path)
+        self.assertEqual(table.shape, (6, 5))
+        np.testing.assert_array_equal(table.ids(axis='observation'),
+                                      list('abcdef'))
+        np.testing.assert_array_equal(table.ids(), self.biom_table.ids())
+        self.assertFalse(table.is_empty())
+        with self.assertRaisesRegex(ValueError, 'Unrecognized axis: x'):
+            table.ids(axis='x')
+
+    def test_iter_sample_chunks(self):
+        exp = self.biom_table.matrix_data.toarray() > 0
+        for chunk_size in (1, 2, 5, 100):
+            table = ChunkedTable(self.hdf5_path, chunk_size=chunk_size)
+            np.testing.assert_array_equal(self.read_chunks(table), exp)
+        # Each chunk should contain at most chunk_size entries, unless a
+        # single sample has more entries than that
+        table = ChunkedTable(self.hdf5_path, chunk_size=3)
+        for first, last, chunk in table.iter_sample_chunks():
+            self.assertTrue(chunk.nnz <= 3 or last - first == 1)
+
+    def test_subset(self):
+        table = ChunkedTable(self.hdf5_path, chunk_size=2)
+        f_mask = np.array([True, False, True, True, False, True])
+        s_mask = np.array([False, True, True, False, True])
+        obs = table.subset(f_mask, s_mask)
+        self.assertEqual(obs.shape, (4, 3))
+        np.testing.assert_array_equal(obs.ids(axis='observation'),
+                                      list('acdf'))
+        np.testing.assert_array_equal(obs.ids(),
+                                      ['Sample2', 'Sample3', 'Sample5'])
+        exp = self.biom_table.matrix_data.toarray()[f_mask][:, s_mask] > 0
+        np.testing.assert_array_equal(self.read_chunks(obs), exp)
+        # The original table shouldn't be affected
+        self.assertEqual(table.shape, (6, 5))
+        self.assertTrue(
+            table.subset(f_mask, np.zeros(5, dtype=bool)).is_empty()
+        )
+
+    def test_copy(self):
+        table = ChunkedTable(self.hdf5_path)
+        copy = table.copy()
+        self.assertIsNot(copy, table)
+        self.assertIsNot(copy.ids(), table.ids())
+        np.testing.assert_array_equal(self.read_chunks(copy),
+                                      self.read_chunks(table))
+
+
+class RecordingDataset():
+    """Wraps an array, recording the slices of it that are read."""
+
+    def __init__(self, array, reads):
+        self.array = array
+        self.reads = reads
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            self.reads.append((key.start, key.stop))
+        return self.array[key]
+
+
+class TestReadCSRSubmatrix(unittest.TestCase):
+
+    def setUp(self):
+        # 100 rows, each with 2 entries
+        dense = np.zeros((100, 8))
+        dense[:, [1, 5]] = 1
+        self.matrix = csr_matrix(dense)
+        self.reads = []
+        self.group = {
+            'indptr': self.matrix.indptr,
+            'indices': RecordingDataset(self.matrix.indices, self.reads),
+            'data': RecordingDataset(self.matrix.data, self.reads)
+        }
+
+    def read(self, rows, cols, chunk_size=100, max_gap=4):
+        del self.reads[:]
+        obs = _read_csr_submatrix(
+            self.group, np.array(rows, dtype=int), np.array(cols), 8,
+            chunk_size, max_gap=max_gap
+        )
+        np.testing.assert_array_equal(
+            obs.toarray(), self.matrix.toarray()[rows][:, cols] > 0
+        )
+        # (Each span is read from both "indices" and "data")
+        return sorted(set(self.reads))
+
+    def test_nearby_rows_read_together(self):
+        # Rows 0-1 and 50-52 are each read at once, without reading the
+        # rows between them
+        self.assertEqual(
+            self.read([0, 1, 50, 52, 99], [1, 5]),
+            [(0, 4), (100, 106), (198, 200)]
+        )
+        self.assertEqual(
+            self.read([0, 1, 50, 52, 99], [5], max_gap=0),
+            [(0, 4), (100, 102), (104, 106), (198, 200)]
+        )
+        self.assertEqual(
+            self.read([0, 1, 50, 52, 99], [1], chunk_size=1000,
+                      max_gap=1000),
+            [(0, 200)]
+        )
+
+    def test_chunks_limit_reads(self):
+        # The entries between rows count towards the chunk size
+        self.assertEqual(
+            self.read([0, 2, 4, 6], [1, 5], chunk_size=6),
+            [(0, 6), (8, 14)]
+        )
+        self.assertEqual(self.read([], [1, 5]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import unittest
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal, assert_series_equal
 import empress.taxonomy_utils as tax_utils
@@ -298,6 +299,36 @@ class TestTaxonomyUtils(unittest.TestCase):
         split_fm, taxcols = tax_utils.split_taxonomy(funky_fm)
         self._check_basic_case_worked(split_fm, taxcols)
 
+    def test_split_taxonomy_levels_are_categorical(self):
+        split_fm, taxcols = tax_utils.split_taxonomy(self.feature_metadata)
+        for col in taxcols:
+            self.assertIsInstance(split_fm[col].dtype, pd.CategoricalDtype)
+        # Each level's categories are its distinct values
+        self.assertCountEqual(
+            split_fm["Level 2"].cat.categories,
+            ["p__Bacteroidetes", "p__Proteobacteria", "p__Firmicutes"]
+        )
+        self.assertCountEqual(
+            split_fm["Level 7"].cat.categories,
+            ["s__", "s__uniformis", "Unspecified"]
+        )
+
+    def test_split_taxonomy_missing_values(self):
+        funky_fm = self.feature_metadata.copy()
+        funky_fm.loc["f2", "Taxonomy"] = np.nan
+        split_fm, taxcols = tax_utils.split_taxonomy(funky_fm)
+        assert_taxcols_ok(taxcols)
+        self.assertEqual(list(split_fm.loc["f2", taxcols]),
+                         ["Unspecified"] * 7)
+        self.assertEqual(split_fm.loc["f4", "Level 3"], "c__Bacilli")
+
+    def test_split_lineages(self):
+        levels, offsets = tax_utils._split_lineages(np.array(
+            ["a; b;c", "  d ;e  ", "f", ""], dtype=object
+        ))
+        self.assertEqual(list(levels), ["a", "b", "c", "d", "e", "f", ""])
+        self.assertEqual(list(offsets), [0, 3, 5, 6, 7])
+
     def test_split_taxonomy_SILVA_annotation(self):
         """Tests that a particular taxonomy annotation that has caused
            errors with QIIME 2 in the past is split properly.
@@ -5,11 +5,15 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import base64
+import io
 import unittest
+import unittest.mock
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import biom
 import numpy as np
+from jinja2.utils import htmlsafe_json_dumps
 from skbio import TreeNode, OrdinationResults
 from empress import tools
 from empress.taxonomy_utils import split_taxonomy
@@ -523,69 +527,110 @@ class TestTools(unittest.TestCase):
         self.assertIsNone(i_md)
         self.assertEqual(taxcols, [])
 
-    def test_shifting(self):
-        # helper test function to count number of bits in the number
-        def _count_bits(n):
-            count = 0
-            while (n):
-                count += 1
-                n >>= 1
-            return count
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_match_inputs_remove_empty(self, mock_stdout):
+        # Same as the test above, but the now-empty feature e is removed
+        table = biom.Table(np.array([[1, 2, 0, 4],
+                                     [8, 7, 0, 5],
+                                     [1, 0, 0, 0],
+                                     [1, 0, 0, 0],
+                                     [1, 0, 4, 0]]).T,
+                           list('abed'),
+                           ['Sample1', 'Sample2', 'Sample3', 'Sample4',
+                            'Sample5'])
+        # The table should only be filtered once, without using
+        # biom.Table.filter() (which copies the whole table)
+        with unittest.mock.patch.object(
+            biom.Table, 'filter', side_effect=AssertionError
+        ):
+            (
+                filtered_table, filtered_sample_md, t_md, i_md, taxcols
+            ) = tools.match_inputs(
+                self.bp_tree, table, self.sample_metadata,
+                ordination=self.ordination, filter_extra_samples=True,
+                remove_empty=True
+            )
 
-        # tests ones and zeros
-        tests = [
-            ([1, 1, 0, 0, 1, 1], [51]),
-            ([1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 1, 1], [4035]),
-            ([1, 1, 0, 0, 0, 0, 1, 1], [195]),
-            ([1, 1, 0, 0, 0, 0, 1, 1, 0, 0, 0], [1560]),
-            ([1, 1, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0], [24960]),
-            ([1], [1]),
-        ]
-        for test, obs in tests:
-            self.assertEqual(tools.shifting(test), obs)
-            self.assertEqual(_count_bits(obs[0]), len(test))
+        exp = table.filter(['Sample1', 'Sample2', 'Sample3', 'Sample4'],
+                           inplace=False)
+        exp.filter(['a', 'b', 'd'], axis='observation', inplace=True)
+        self.assertEqual(filtered_table, exp)
+        assert_frame_equal(filtered_sample_md, self.sample_metadata)
+        self.assertEqual(
+            mock_stdout.getvalue(), "Removed 1 empty feature(s).\n"
+        )
 
-        # test zeros
+    def test_pack_bits(self):
         tests = [
-            ([0, 0, 0, 0], [0, 0, 0, 0]),
-            ([0], [0]),
+            # Shorter than one byte: the last byte is padded with zeros
+            ([1, 1, 0, 0, 1, 1], "zA=="),
+            # Exactly one byte
+            ([1, 1, 0, 0, 0, 0, 1, 1], "ww=="),
+            ([1, 1, 1, 0, 1, 0, 0, 1, 0, 0], "6QA="),
+            ([0, 0, 0, 0], "AA=="),
+            ([], ""),
         ]
-        for test, obs in tests:
-            self.assertEqual(tools.shifting(test), obs)
-            self.assertEqual(len(test), len(obs))
+        for test, exp in tests:
+            self.assertEqual(tools.pack_bits(test), exp)
 
-        # some odd cases
-        tests = [
-            ([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1,
-              # up to here is a 5
-              0, 0, 0, 0], [5, 0, 0, 0, 0]),
-            ([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1,
-              # up to here is a 5
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              # up to here is a 0
-              0, 0, 0, 0], [
-              5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-
-            ([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-              0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1,
-              # up to here is a 5
-              0, 0, 0, 0, 1, 1, 1], [5, 0, 0, 0, 0, 7]),
-        ]
-        for test, obs in tests:
-            self.assertEqual(tools.shifting(test), obs)
+        # Should work on the B array of a bp.BP tree, too
+        self.assertEqual(tools.pack_bits(self.bp_tree.B), "9JoA")
+
+        # Round trip through the unpacked bits
+        bits = np.random.RandomState(0).randint(0, 2, size=1001)
+        packed = base64.b64decode(tools.pack_bits(bits))
+        unpacked = np.unpackbits(np.frombuffer(packed, dtype=np.uint8))
+        np.testing.assert_array_equal(unpacked[:1001], bits)
+
+        # The unencoded bytes should be the same as the base64-encoded ones
+        raw = tools.pack_bits(bits, as_base64=False)
+        self.assertEqual(raw.dtype, np.uint8)
+        self.assertEqual(raw.tobytes(), packed)
 
         with self.assertRaisesRegex(ValueError, "Your list has values other "
                                     "than 0-1s"):
-            tools.shifting([10])
+            tools.pack_bits([1, 0, 10])
+
+    def test_encode_uint32(self):
+        self.assertEqual(
+            tools.encode_uint32([0, 3, 6, 7, 8]),
+            "AAAAAAMAAAAGAAAABwAAAAgAAAA="
+        )
+        self.assertEqual(tools.encode_uint32([]), "")
+
+        # Round trip (the bytes should be little-endian regardless of the
+        # input array's dtype)
+        arr = np.array([0, 1, 255, 256, 2**32 - 1], dtype=np.int64)
+        decoded = np.frombuffer(
+            base64.b64decode(tools.encode_uint32(arr)), dtype="<u4"
+        )
+        np.testing.assert_array_equal(decoded, arr)
+        raw = tools.encode_uint32(arr, as_base64=False)
+        self.assertEqual(raw.dtype, np.dtype("<u4"))
+        np.testing.assert_array_equal(raw, arr)
+
+        for bad in ([-1], [2**32]):
+            with self.assertRaisesRegex(
+                ValueError, "Values must fit in a 32-bit unsigned integer"
+            ):
+                tools.encode_uint32(bad)
+
+    def test_iter_json(self):
+        objs = [
+            None, True, 3, -1.5, "a<b>&'c'",
+            [], {}, [1, 2, 3, 4, 5], list(range(25)),
+            ["</script>", None, 2.5, [1, [2, 3]], {"b": 1, "a": [1, 2]}],
+            {"z": list(range(7)), "a": {"y": [1, 2], "x": "'"}, "m": []},
+            {3: "three", 1: "one", 10: [1, 2, 3]},
+        ]
+        for obj in objs:
+            exp = htmlsafe_json_dumps(obj, sort_keys=True)
+            for chunk_size in (1, 2, 3, 10000):
+                obs = "".join(tools.iter_json(obj, chunk_size))
+                self.assertEqual(obs, exp)
+
+        # Long lists should be split into multiple chunks
+        self.assertGreater(len(list(tools.iter_json(list(range(25)), 3))), 9)
 
     def test_filter_feature_metadata_to_tree_1_tip_filtered(self):
         ft, fi = tools.filter_feature_metadata_to_tree(
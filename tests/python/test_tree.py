@@ -6,9 +6,17 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
 import unittest
+import unittest.mock
+import numpy as np
 from bp import parse_newick
-from empress.tree import TreeFormatWarning, validate_tree
+from empress.tree import (
+    TreeFormatWarning, TreeIndex, validate_tree, postorder_node_info,
+    postorder_open_positions, read_newick, _parse_newick_file
+)
 
 
 class TestTree(unittest.TestCase):
@@ -96,6 +104,247 @@ class TestTree(unittest.TestCase):
             ):
                 validate_tree(st)
 
+    def test_postorder_open_positions(self):
+        exp = [
+            self.tree.postorderselect(i)
+            for i in range(1, len(self.tree) + 1)
+        ]
+        obs = postorder_open_positions(self.tree.B)
+        self.assertEqual(list(obs), exp)
+
+        # Make sure that this works for a more deeply nested tree, too
+        t = parse_newick('((((a,b)c,(d)e)f,g)h,(i,(j,k,l)m)n)o;')
+        exp = [t.postorderselect(i) for i in range(1, len(t) + 1)]
+        self.assertEqual(list(postorder_open_positions(t.B)), exp)
+
+    def test_postorder_node_info(self):
+        names, lengths, leaf_mask = postorder_node_info(self.tree)
+        self.assertEqual(
+            list(names), ['a', 'e', 'f', 'b', 'g', 'c', 'd', 'h', 'i']
+        )
+        np.testing.assert_array_equal(
+            lengths, [1, 2, 1, 2, 1, 1, 3, 2, 1]
+        )
+        np.testing.assert_array_equal(
+            leaf_mask,
+            [True, True, False, True, False, True, True, False, False]
+        )
+
+    def test_postorder_node_info_unnamed_nodes(self):
+        t = parse_newick('((a:1,:2):3,b:4);')
+        names, lengths, leaf_mask = postorder_node_info(t)
+        self.assertEqual(list(names), ['a', None, None, 'b', None])
+        np.testing.assert_array_equal(lengths, [1, 2, 3, 4, 0])
+        np.testing.assert_array_equal(
+            leaf_mask, [True, True, False, True, False]
+        )
+
+    def test_tree_index(self):
+        ti = TreeIndex(self.tree)
+        self.assertIs(ti.tree, self.tree)
+        self.assertEqual(len(ti), 9)
+        self.assertEqual(
+            list(ti.names), ['a', 'e', 'f', 'b', 'g', 'c', 'd', 'h', 'i']
+        )
+        np.testing.assert_array_equal(
+            ti.lengths, [1, 2, 1, 2, 1, 1, 3, 2, 1]
+        )
+        np.testing.assert_array_equal(
+            ti.leaf_mask,
+            [True, True, False, True, False, True, True, False, False]
+        )
+        self.assertEqual(ti.tip_names, {'a', 'e', 'b', 'c', 'd'})
+        self.assertEqual(ti.internal_names, {'f', 'g', 'h', 'i'})
+        self.assertEqual(
+            ti.name_to_postorder,
+            {
+                'a': [1], 'e': [2], 'f': [3], 'b': [4], 'g': [5], 'c': [6],
+                'd': [7], 'h': [8], 'i': [9]
+            }
+        )
+
+    def test_tree_index_unnamed_and_duplicate_nodes(self):
+        t = parse_newick('(((a:1,:2)x:3,b:4)x:1,:2);')
+        ti = TreeIndex(t)
+        self.assertEqual(ti.tip_names, {'a', 'b'})
+        self.assertEqual(ti.internal_names, {'x'})
+        self.assertEqual(
+            ti.name_to_postorder, {'a': [1], 'x': [3, 5], 'b': [4]}
+        )
+
+    def test_tree_index_match_names(self):
+        ti = TreeIndex(self.tree)
+        positions, idxs = ti.match_names(['d', 'z', 'a', 'g'])
+        np.testing.assert_array_equal(positions, [1, 5, 7])
+        np.testing.assert_array_equal(idxs, [2, 3, 0])
+
+        # Duplicate internal node names should all be matched
+        t = parse_newick('(((a:1,:2)x:3,b:4)x:1,:2);')
+        positions, idxs = TreeIndex(t).match_names(['x', 'b'])
+        np.testing.assert_array_equal(positions, [3, 4, 5])
+        np.testing.assert_array_equal(idxs, [0, 1, 0])
+
+        # No matches
+        positions, idxs = ti.match_names(['z'])
+        self.assertEqual(len(positions), 0)
+        self.assertEqual(len(idxs), 0)
+
+
+class TestReadNewick(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        # Includes unnamed nodes and non-ASCII names
+        self.nwk = '(((a:1,:2)fé:1,bß:2.5)g:1,(c:1,d:3):2);'
+        self.tree = parse_newick(self.nwk)
+        self.path = os.path.join(self.tmp_dir, 'tree.nwk')
+        with open(self.path, 'w') as f:
+            f.write(self.nwk + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_trees_equal(self, obs, exp):
+        np.testing.assert_array_equal(obs.B, exp.B)
+        for i in range(len(exp.B)):
+            self.assertEqual(obs.name(i), exp.name(i))
+            self.assertEqual(obs.length(i), exp.length(i))
+
+    def test_read_newick_no_cache(self):
+        with unittest.mock.patch.dict(os.environ):
+            os.environ.pop('EMPRESS_TREE_CACHE_DIR', None)
+            self.assert_trees_equal(read_newick(self.path), self.tree)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_read_newick_cache(self):
+        self.assert_trees_equal(
+            read_newick(self.path, cache_dir=self.cache_dir), self.tree
+        )
+        (cache_file,) = os.listdir(self.cache_dir)
+        self.assertTrue(cache_file.endswith('.npz'))
+
+        # A copy of the same tree should be loaded from the cache, without
+        # parsing it
+        copy_path = os.path.join(self.tmp_dir, 'copy.nwk')
+        shutil.copy(self.path, copy_path)
+        with unittest.mock.patch(
+            'empress.tree._parse_newick_file'
+        ) as parse:
+            obs = read_newick(copy_path, cache_dir=self.cache_dir)
+        parse.assert_not_called()
+        self.assert_trees_equal(obs, self.tree)
+
+        # A different tree shouldn't be
+        other_nwk = '((a:1,b:2)c:3);'
+        with open(copy_path, 'w') as f:
+            f.write(other_nwk)
+        self.assert_trees_equal(
+            read_newick(copy_path, cache_dir=self.cache_dir),
+            parse_newick(other_nwk)
+        )
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_read_newick_cache_env_var(self):
+        with unittest.mock.patch.dict(
+            os.environ, {'EMPRESS_TREE_CACHE_DIR': self.cache_dir}
+        ):
+            self.assert_trees_equal(read_newick(self.path), self.tree)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_read_newick_damaged_cache(self):
+        read_newick(self.path, cache_dir=self.cache_dir)
+        (cache_file,) = os.listdir(self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, cache_file)
+        with open(cache_path, 'r+b') as f:
+            f.truncate(100)
+        self.assert_trees_equal(
+            read_newick(self.path, cache_dir=self.cache_dir), self.tree
+        )
+        # The cache file should have been rewritten
+        self.assertEqual(os.listdir(self.cache_dir), [cache_file])
+        self.assertGreater(os.path.getsize(cache_path), 100)
+
+    def write_newick(self, nwk):
+        path = os.path.join(self.tmp_dir, 'test.nwk')
+        with open(path, 'w') as f:
+            f.write(nwk)
+        return path
+
+    def test_parse_newick_file(self):
+        for nwk in [
+            self.nwk,
+            '(((a:1,e:2)f:1,b:2)g:1,(c:1,d:3)h:2)i:1;',
+            '((a,b),c);',
+            '((a)x)y;',
+            "('a,b':1,'c (d);':2e-3)'x y':0.5;",
+        ]:
+            path = self.write_newick(nwk)
+            exp = parse_newick(nwk)
+            # Small chunk sizes make sure that labels split across chunks
+            # are handled properly
+            for chunk_size in (1, 2, 3, 1000):
+                self.assert_trees_equal(
+                    _parse_newick_file(path, chunk_size=chunk_size), exp
+                )
+
+    def test_parse_newick_file_multiple_lines(self):
+        path = self.write_newick(
+            '(((a:1,\n:2)fé:1,\nbß:2.5)g:1,\n(c:1,d:3):2);\n'
+        )
+        for chunk_size in (1, 1000):
+            self.assert_trees_equal(
+                _parse_newick_file(path, chunk_size=chunk_size), self.tree
+            )
+
+    def test_parse_newick_file_escaped_quote(self):
+        path = self.write_newick("('Bob''s taxon':1,b:2)r;")
+        tree = _parse_newick_file(path, chunk_size=3)
+        self.assertEqual(tree.name(1), "Bob's taxon")
+        self.assertEqual(tree.length(1), 1)
+
+    def test_parse_newick_file_quote_across_chunks(self):
+        # A quoted label (containing structural characters) that spans many
+        # chunk boundaries
+        nwk = "(('a,(b);' 'c':1,d:2)'e)''f':3)r;"
+        path = self.write_newick(nwk)
+        for chunk_size in range(1, len(nwk) + 1):
+            tree = _parse_newick_file(path, chunk_size=chunk_size)
+            self.assertEqual(tree.name(2), "a,(b);' 'c")
+            self.assertEqual(tree.length(2), 1)
+            self.assertEqual(tree.name(1), "e)'f")
+            self.assertEqual(tree.length(1), 3)
+
+    def test_parse_newick_file_stray_quote(self):
+        # (The label is long enough that the parser would take forever if it
+        # backtracked over it)
+        long_label = "a{}'b".format("x" * 1000)
+        for nwk in ["(Bob's_taxon:1,b:2);", "({}:1,c:2);".format(long_label)]:
+            path = self.write_newick(nwk)
+            for chunk_size in (3, 1000):
+                with self.assertRaisesRegex(
+                    ValueError, "unterminated quote"
+                ):
+                    _parse_newick_file(path, chunk_size=chunk_size)
+
+    def test_parse_newick_file_only_reads_first_tree(self):
+        path = self.write_newick('((a:1,b:2)c:3)d;\n(e,f)g;\n')
+        self.assert_trees_equal(
+            _parse_newick_file(path), parse_newick('((a:1,b:2)c:3)d;')
+        )
+
+    def test_parse_newick_file_errors(self):
+        for nwk, msg in [
+            ('((a:1,b:2)c:3)d', 'not semicolon terminated'),
+            ('((a:1,b:2)c:3;', 'unbalanced parentheses'),
+            ('(a:1,b:2)):3;', 'unbalanced parentheses'),
+            ('(a:1,b:x)r;', "Unable to parse length of node 'b:x'"),
+            ('(a:1,b x(c,d))r;', 'Unexpected label before opening'),
+        ]:
+            path = self.write_newick(nwk)
+            with self.assertRaisesRegex(ValueError, msg):
+                _parse_newick_file(path)
+
 
 if __name__ == "__main__":
     unittest.main()
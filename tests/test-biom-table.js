@@ -244,6 +244,158 @@ require(["jquery", "underscore", "BiomTable"], function ($, _, BiomTable) {
             );
         });
 
+        test("Test constructor with a CSR table", function () {
+            // These strings were generated using tools.encode_uint32() in
+            // the Python code, and describe the same table as this._tbl
+            var encodedTable = {
+                indptr: "AAAAAAYAAAAMAAAADwAAABEAAAATAAAA",
+                indices:
+                    "AAAAAAEAAAADAAAABAAAAAYAAAAJAAAAAAAAAAIAAAAEAAAABQAAAAYA" +
+                    "AAAIAAAAAQAAAAIAAAAFAAAAAwAAAAcAAAAEAAAABwAAAA==",
+            };
+            var typedTable = {
+                indptr: new Uint32Array([0, 6, 12, 15, 17, 19]),
+                indices: new Uint32Array([
+                    0, 1, 3, 4, 6, 9, 0, 2, 4, 5, 6, 8, 1, 2, 5, 3, 7, 4, 7,
+                ]),
+            };
+            var scope = this;
+            _.each([encodedTable, typedTable], function (tbl) {
+                var csrBiomTable = new BiomTable(
+                    scope._sIDs,
+                    scope._fIDs,
+                    scope._sID2Idx,
+                    scope._fID2Idx,
+                    tbl,
+                    scope._smCols,
+                    scope._sm
+                );
+                deepEqual(csrBiomTable._indptr, typedTable.indptr);
+                deepEqual(csrBiomTable._indices, typedTable.indices);
+                deepEqual(
+                    csrBiomTable.getObsBy("f1"),
+                    scope.biomTable.getObsBy("f1")
+                );
+                deepEqual(
+                    csrBiomTable.getFrequencyMap("f3"),
+                    scope.biomTable.getFrequencyMap("f3")
+                );
+            });
+            // The array-based table should have been converted to the same
+            // CSR representation
+            deepEqual(this.biomTable._indptr, typedTable.indptr);
+            deepEqual(this.biomTable._indices, typedTable.indices);
+
+            throws(
+                function () {
+                    new BiomTable(
+                        ["s1", "s2"],
+                        ["o1", "o2"],
+                        { s1: 0, s2: 1 },
+                        { o1: 0, o2: 1 },
+                        {
+                            indptr: new Uint32Array([0, 2, 2]),
+                            indices: new Uint32Array([0, 1]),
+                        },
+                        ["f1"],
+                        [["x"], ["y"]]
+                    );
+                },
+                /Sample at index "1" has no features./,
+                "Empty sample in CSR table"
+            );
+        });
+
+        test("Test constructor with categorical sample metadata", function () {
+            // The codes were generated using tools.encode_uint32() in the
+            // Python code, and (along with the values) describe the same
+            // sample metadata as this._sm
+            var encodedSM = {
+                values: [
+                    ["a", "c", "b"],
+                    ["d", "e", "f"],
+                    ["i", "j", "h"],
+                    ["4", "3", "1", "2", "5"],
+                ],
+                codes: [
+                    "AAAAAAAAAAABAAAAAgAAAAIAAAA=",
+                    "AAAAAAAAAAAAAAAAAQAAAAIAAAA=",
+                    "AAAAAAEAAAABAAAAAQAAAAIAAAA=",
+                    "AAAAAAEAAAACAAAAAwAAAAQAAAA=",
+                ],
+            };
+            var expCodes = [
+                new Uint32Array([0, 0, 1, 2, 2]),
+                new Uint32Array([0, 0, 0, 1, 2]),
+                new Uint32Array([0, 1, 1, 1, 2]),
+                new Uint32Array([0, 1, 2, 3, 4]),
+            ];
+            var typedSM = { values: encodedSM.values, codes: expCodes };
+            var scope = this;
+            _.each([encodedSM, typedSM], function (sm) {
+                var catBiomTable = new BiomTable(
+                    scope._sIDs,
+                    scope._fIDs,
+                    scope._sID2Idx,
+                    scope._fID2Idx,
+                    scope._tbl,
+                    scope._smCols,
+                    sm
+                );
+                deepEqual(catBiomTable._smValues, encodedSM.values);
+                deepEqual(catBiomTable._smCodes, expCodes);
+                _.each(scope._smCols, function (col) {
+                    deepEqual(
+                        catBiomTable.getObsBy(col),
+                        scope.biomTable.getObsBy(col)
+                    );
+                    deepEqual(
+                        catBiomTable.getUniqueSampleValues(col),
+                        scope.biomTable.getUniqueSampleValues(col)
+                    );
+                    deepEqual(
+                        catBiomTable.getSampleValuesCount(scope._sIDs, col),
+                        scope.biomTable.getSampleValuesCount(scope._sIDs, col)
+                    );
+                });
+            });
+            // The array-based metadata should have been converted to the
+            // same format
+            deepEqual(this.biomTable._smValues, encodedSM.values);
+            deepEqual(this.biomTable._smCodes, expCodes);
+
+            throws(
+                function () {
+                    new BiomTable(
+                        ["s1"],
+                        ["o1"],
+                        { s1: 0 },
+                        { o1: 0 },
+                        [[0]],
+                        ["f1"],
+                        { values: [["x"]], codes: [new Uint32Array([0, 0])] }
+                    );
+                },
+                /Sample IDs and metadata are uneven lengths./,
+                "Number of samples in categorical metadata differs from " +
+                    "number of sample IDs"
+            );
+        });
+
+        test("Test _sampleHasFeature", function () {
+            var scope = this;
+            _.each(this._tbl, function (featureIndices, sIdx) {
+                _.each(scope._fIDs, function (fID, fIdx) {
+                    equal(
+                        scope.biomTable._sampleHasFeature(sIdx, fIdx),
+                        _.contains(featureIndices, fIdx),
+                        "Sample " + sIdx + ", feature " + fIdx
+                    );
+                });
+            });
+            notOk(this.biomTable._sampleHasFeature(0, 100));
+        });
+
         test("Test _featureIndexSetToIDArray", function () {
             var observedArray = this.biomTable._featureIndexSetToIDArray(
                 new Set([0, 2, 4, 3])
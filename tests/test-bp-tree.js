@@ -1,5 +1,77 @@
 require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
     $(document).ready(function () {
+        /**
+         * Returns the balanced parentheses of a random tree.
+         *
+         * @param {Number} numNodes The number of nodes in the tree
+         * @param {Number} pOpen The probability of adding a child to the
+         *                       current node, rather than closing it (so
+         *                       higher values give deeper trees)
+         *
+         * @return {Array} The balanced parentheses, as 0s and 1s
+         */
+        var randomBPArray = function (numNodes, pOpen) {
+            // (A seeded pseudorandom number generator, so that the tests
+            // are reproducible)
+            var seed = 42;
+            var random = function () {
+                seed = (seed * 16807) % 2147483647;
+                return seed / 2147483647;
+            };
+            var bits = [1];
+            var depth = 1;
+            var numOpen = 1;
+            while (depth > 0) {
+                if (numOpen < numNodes && (depth === 1 || random() < pOpen)) {
+                    bits.push(1);
+                    depth++;
+                    numOpen++;
+                } else {
+                    bits.push(0);
+                    depth--;
+                }
+            }
+            return bits;
+        };
+
+        /**
+         * Returns an array whose ith index is the number of times val appears
+         * up to the ith index of arr (i.e. the expected rank(val, i)).
+         *
+         * @param {Array} arr
+         * @param {Number} val
+         *
+         * @return {Uint32Array}
+         */
+        var rankArray = function (arr, val) {
+            var ranks = new Uint32Array(arr.length);
+            var total = 0;
+            for (var i = 0; i < arr.length; i++) {
+                total = arr[i] === val ? total + 1 : total;
+                ranks[i] = total;
+            }
+            return ranks;
+        };
+
+        /**
+         * Returns an array whose kth index is the index of the first element
+         * of ranks that equals k + 1 (i.e. the expected select(val, k + 1),
+         * if ranks was produced by rankArray(arr, val)).
+         *
+         * @param {Uint32Array} ranks
+         *
+         * @return {Uint32Array}
+         */
+        var selectArray = function (ranks) {
+            var indices = [];
+            for (var i = 0; i < ranks.length; i++) {
+                if (ranks[i] === indices.length + 1) {
+                    indices.push(i);
+                }
+            }
+            return new Uint32Array(indices);
+        };
+
         // Setup test variables
         // Note: This is ran for each test() so tests can modify bpArray without
         // effecting other test
@@ -37,12 +109,12 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
                 );
 
                 // rank caches
-                this.r0 = ByteArray.sumVal(this.bpArray, Uint32Array, 0);
-                this.r1 = ByteArray.sumVal(this.bpArray, Uint32Array, 1);
+                this.r0 = rankArray(this.bpArray, 0);
+                this.r1 = rankArray(this.bpArray, 1);
 
                 // select caches
-                this.s0 = ByteArray.seqUniqueIndx(this.r0, Uint32Array);
-                this.s1 = ByteArray.seqUniqueIndx(this.r1, Uint32Array);
+                this.s0 = selectArray(this.r0);
+                this.s1 = selectArray(this.r1);
             },
 
             teardown: function () {
@@ -52,17 +124,47 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
 
         // tests the constructor of bp tree
         test("Test BP Constructor", function () {
-            // Test if rank 0 cache was initialized correctly
-            deepEqual(this.bpObj.r0Cache_, this.r0, "Test: rank 0 cache");
-
-            // Test if rank 1 cache was initialized correctly
-            deepEqual(this.bpObj.r1Cache_, this.r1, "Test: rank 1 cache");
+            deepEqual(
+                this.bpObj.toArray(),
+                Array.from(this.bpArray),
+                "Test: parentheses"
+            );
+            equal(this.bpObj.size, 11, "Test: size");
+            for (var i = 0; i < this.bpArray.length; i++) {
+                equal(this.bpObj.bit(i), this.bpArray[i], `Bit: ${i}`);
+            }
+        });
 
-            // Test if select 0 cache was initialized correctly
-            deepEqual(this.bpObj.s0Cache_, this.s0, "Test: select 0 cache");
+        test("Test rank and select on a large tree", function () {
+            // Build a random tree large enough to span many blocks of the
+            // rank and select directories
+            var bits = randomBPArray(5000, 0.5);
+            var bpObj = new BPTree(bits, null, null, null);
+            var r0 = rankArray(bits, 0);
+            var r1 = rankArray(bits, 1);
+            var s0 = selectArray(r0);
+            var s1 = selectArray(r1);
+            var i, k;
+            var allMatch = true;
+            for (i = 0; i < bits.length; i++) {
+                allMatch =
+                    allMatch &&
+                    bpObj.rank(0, i) === r0[i] &&
+                    bpObj.rank(1, i) === r1[i];
+            }
+            ok(allMatch, "Test: rank");
+            allMatch = true;
+            for (k = 0; k < s0.length; k++) {
+                allMatch = allMatch && bpObj.select(0, k + 1) === s0[k];
+            }
+            for (k = 0; k < s1.length; k++) {
+                allMatch = allMatch && bpObj.select(1, k + 1) === s1[k];
+            }
+            ok(allMatch, "Test: select");
 
-            // Test if select 1 cached was initialized correctly
-            deepEqual(this.bpObj.s1Cache_, this.s1, "Test: select 1 cache");
+            // The same tree, loaded from packed bits
+            var packed = BPTree.fromPackedBits(ByteArray.packBits(bits));
+            deepEqual(packed.toArray(), bits, "Test: packed bits");
         });
 
         test("Test rank", function () {
@@ -555,12 +657,12 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
             // zeros test
             var exp = [0, 0, 0, 0, 0, 0];
             obj = new BPTree(exp);
-            equal(obj.b_.length, exp.length);
+            equal(obj.toArray().length, exp.length);
 
             // odds test
             exp = [5, 0, 0, 0];
             obj = new BPTree(exp);
-            equal(obj.b_.length, 50 + 4);
+            equal(obj.toArray().length, 50 + 4);
 
             exp = [
                 5,
@@ -621,7 +723,34 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
                 0,
             ];
             obj = new BPTree(exp);
-            equal(obj.b_.length, 51 + 51 + 4);
+            equal(obj.toArray().length, 51 + 51 + 4);
+
+            // packed bits test (generated by tools.pack_bits() in the Python
+            // code on this.bpArray)
+            obj = new BPTree("6xdA");
+            deepEqual(obj.toArray(), Array.from(this.bpArray));
+            equal(obj.size, 11);
+
+            // BPTree.fromPackedBits() accepts base64 or the bytes themselves
+            // (e.g. loaded from a sidecar file)
+            var packedInputs = ["6xdA", new Uint8Array([0xeb, 0x17, 0x40])];
+            var lengths = new Float64Array(12).fill(1);
+            for (var p = 0; p < packedInputs.length; p++) {
+                obj = BPTree.fromPackedBits(packedInputs[p], null, lengths);
+                deepEqual(obj.toArray(), Array.from(this.bpArray));
+                equal(obj.size, 11);
+                equal(obj.length(obj.postorderselect(3)), 1);
+            }
+        });
+
+        test("Test toPackedBits", function () {
+            var packed = this.bpObj.toPackedBits();
+            deepEqual(packed, new Uint8Array([0xeb, 0x17, 0x40]));
+            // The tree's own bits aren't affected by changes to the copy
+            packed.fill(0);
+            deepEqual(this.bpObj.toArray(), Array.from(this.bpArray));
+            var copy = BPTree.fromPackedBits(this.bpObj.toPackedBits());
+            deepEqual(copy.toArray(), Array.from(this.bpArray));
         });
 
         test("Test inOrderNodes", function () {
@@ -957,7 +1086,7 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
                 [11, 10],
             ]);
             var result = preShearBPTree.shear(remove);
-            deepEqual(result.tree.b_, [
+            deepEqual(result.tree.toArray(), [
                 1,
                 1,
                 1,
@@ -1026,7 +1155,10 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
                 [11, 6],
             ]);
             result = preShearBPTree.shear(remove);
-            deepEqual(result.tree.b_, [1, 1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0]);
+            deepEqual(
+                result.tree.toArray(),
+                [1, 1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0]
+            );
             deepEqual(result.tree.names_, [
                 null,
                 "7",
@@ -1044,7 +1176,7 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
             shearedToFull = new Map([[1, 11]]);
             fullToSheared = new Map([[11, 1]]);
             result = preShearBPTree.shear(remove);
-            deepEqual(result.tree.b_, [1, 0]);
+            deepEqual(result.tree.toArray(), [1, 0]);
             deepEqual(result.tree.names_, [null, "r"]);
             deepEqual(result.tree.lengths_, [null, 11]);
             deepEqual(result.shearedToFull, shearedToFull);
@@ -1054,5 +1186,72 @@ require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
             result = preShearBPTree.shear(remove);
             deepEqual(result.tree.names_, [null, "3", "4", "2", "r"]);
         });
+
+        module("Succinct Tree (large trees)");
+
+        test("Test fwdsearch and bwdsearch vs. naive searches", function () {
+            // Trees of different shapes (the deeper ones have longer
+            // searches), spanning many blocks of the range min-max tree
+            var pOpens = [0.3, 0.5, 0.7, 0.9];
+            for (var p = 0; p < pOpens.length; p++) {
+                var bits = randomBPArray(2000, pOpens[p]);
+                var bpObj = new BPTree(bits, null, null, null);
+                var mismatches = 0;
+                for (var i = 0; i < bits.length; i++) {
+                    for (var d = -2; d <= 2; d++) {
+                        if (
+                            bpObj.fwdsearch(i, d) !==
+                                bpObj.fwdsearchNaive(i, d) ||
+                            bpObj.bwdsearch(i, d) !== bpObj.bwdsearchNaive(i, d)
+                        ) {
+                            mismatches++;
+                        }
+                    }
+                }
+                equal(mismatches, 0, `Tree with pOpen = ${pOpens[p]}`);
+            }
+        });
+
+        test("Benchmark navigation on a 1M-node tree", function () {
+            var bits = randomBPArray(1000000, 0.5);
+            var start = performance.now();
+            var bpObj = new BPTree(bits, null, null, null);
+            var constructTime = performance.now() - start;
+
+            // Look up the parent and the closing parenthesis of random nodes
+            var numQueries = 2000;
+            var nodes = [];
+            var step = Math.floor(bpObj.size / numQueries);
+            for (var k = 1; k <= bpObj.size; k += step) {
+                nodes.push(bpObj.preorderselect(k));
+            }
+
+            var i, naiveResults, results;
+            start = performance.now();
+            naiveResults = [];
+            for (i = 0; i < nodes.length; i++) {
+                naiveResults.push(bpObj.bwdsearchNaive(nodes[i], -2) + 1);
+                naiveResults.push(bpObj.fwdsearchNaive(nodes[i], -1));
+            }
+            var naiveTime = performance.now() - start;
+
+            start = performance.now();
+            results = [];
+            for (i = 0; i < nodes.length; i++) {
+                results.push(bpObj.enclose(nodes[i]));
+                results.push(bpObj.close(nodes[i]));
+            }
+            var rmmTime = performance.now() - start;
+
+            deepEqual(results, naiveResults, "Test: same results as naive");
+            // (The timings aren't checked, since they depend on the machine
+            // running the tests)
+            console.log(
+                `Range min-max tree: ${rmmTime.toFixed(1)} ms vs. ` +
+                    `${naiveTime.toFixed(1)} ms (naive) for ` +
+                    `${nodes.length} enclose() + close() calls; ` +
+                    `constructing the tree took ${constructTime.toFixed(1)} ms`
+            );
+        });
     });
 });
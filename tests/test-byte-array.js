@@ -1,45 +1,51 @@
 require(["jquery", "ByteArray", "BPTree"], function ($, ByteArray, BPTree) {
     $(document).ready(function () {
-        // Note: for some of the tests, set the first n elements of array
-        //       equal to 1-n
-        module("Byte Array", {
-            setup: function () {
-                this.array = new Uint8Array([1, 2, 3, 1, 1, 2, 1, 3]);
-            },
+        module("Byte Array");
 
-            teardown: function () {
-                this.array = null;
-            },
-        });
-
-        // tests the static function sumVal() of ByteArray
-        test("Test ByteArray.sumVal()", function () {
-            var sum0 = ByteArray.sumVal(this.array, Uint8Array, 0);
-            var expSum0 = new Uint8Array(this.array.length);
-            deepEqual(sum0, expSum0, "Test: sumVal() for 0");
-
-            var sum1 = ByteArray.sumVal(this.array, Uint8Array, 1);
-            var val = 1;
-            var total = 0;
-            var expSum1 = new Uint8Array(
-                this.array.reduce(function (r, a) {
-                    total = a === val ? total + 1 : total;
-                    r.push(total);
-                    return r;
-                }, [])
+        test("Test ByteArray.unpackBits()", function () {
+            // These strings were generated using tools.pack_bits() in the
+            // Python code
+            deepEqual(
+                ByteArray.unpackBits("6QA="),
+                [1, 1, 1, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+                "Test: unpackBits() decodes every bit by default"
+            );
+            deepEqual(
+                ByteArray.unpackBits("6QA=", 10),
+                [1, 1, 1, 0, 1, 0, 0, 1, 0, 0],
+                "Test: unpackBits() with numBits specified"
+            );
+            deepEqual(
+                ByteArray.unpackBits("ww=="),
+                [1, 1, 0, 0, 0, 0, 1, 1],
+                "Test: unpackBits() on exactly one byte"
+            );
+            deepEqual(ByteArray.unpackBits(""), [], "Test: empty string");
+            deepEqual(
+                ByteArray.unpackBits(new Uint8Array([0xe9, 0x00]), 10),
+                [1, 1, 1, 0, 1, 0, 0, 1, 0, 0],
+                "Test: unpackBits() on a Uint8Array"
             );
-
-            deepEqual(sum1, expSum1, "Test: sumVal() for 1");
         });
 
-        test("Test ByteArray.seqUnique()", function () {
-            var seqArr = ByteArray.seqUniqueIndx(this.array, Uint8Array);
-            var expArr = [];
-            for (var i = 0; i < 3; i++) {
-                expArr.push(i);
-            }
-            expArr = new Uint8Array(expArr);
-            deepEqual(seqArr, expArr, "Test: seqUnique()");
+        test("Test ByteArray.decodeUint32Array()", function () {
+            // These strings were generated using tools.encode_uint32() in the
+            // Python code
+            deepEqual(
+                ByteArray.decodeUint32Array("AAAAAAMAAAAGAAAABwAAAAgAAAA="),
+                new Uint32Array([0, 3, 6, 7, 8]),
+                "Test: small values"
+            );
+            deepEqual(
+                ByteArray.decodeUint32Array("AQAAAAABAAD/////"),
+                new Uint32Array([1, 256, 4294967295]),
+                "Test: values spanning multiple bytes"
+            );
+            deepEqual(
+                ByteArray.decodeUint32Array(""),
+                new Uint32Array([]),
+                "Test: empty string"
+            );
         });
     });
 });
@@ -1,9 +1,10 @@
-require(["jquery", "BPTree", "BiomTable", "Empress"], function (
-    $,
-    BPTree,
-    BiomTable,
-    Empress
-) {
+require([
+    "jquery",
+    "BPTree",
+    "BiomTable",
+    "Empress",
+    "UtilitiesForTesting",
+], function ($, BPTree, BiomTable, Empress, UtilitiesForTesting) {
     $(document).ready(function () {
         // Setup test variables
         // Note: This is ran for each test() so tests can modify bpArray without
@@ -190,11 +191,10 @@ require(["jquery", "BPTree", "BiomTable", "Empress"], function (
                 this.empress._drawer.VERTEX_SIZE = 5;
 
                 // Since layouts are now computed on client-side which means
-                // _treeData and _tdToInd are created on client-side. The test were
+                // _treeData is created on client-side. The test were
                 // originally written when coordinates were calculated on python
                 // side. Thus we need to set them back.
-                this.empress._treeData = treeData;
-                this.empress._tdToInd = tdToInd;
+                UtilitiesForTesting.setTreeData(this.empress, tdToInd, treeData);
                 this.empress._currentLayout = "Circular";
             },
 
@@ -223,15 +223,17 @@ require(["jquery", "BPTree", "BiomTable", "Empress"], function (
             equal(coords[(node - 1) * 4 + 3], -1); // end y position
 
             // For the arc for node 3 start at (2,0) and ends at (-2, 0)
-            // check if arc for node 3 is correct
-            ok(Math.abs(coords[12] - 2) < 1.0e-15); // start x arc position
-            ok(Math.abs(coords[13]) < 1.0e-15); //start y arc position
+            // check if arc for node 3 is correct (angles are stored as 32-bit
+            // floats, so allow for rounding)
+            var approxDeepEqual = UtilitiesForTesting.approxDeepEqual;
+            approxDeepEqual(coords[12], 2, "start x arc position");
+            approxDeepEqual(coords[13], 0, "start y arc position");
             // the arc for node 3 spans PI radians thus, the number of lines to
             // approximate arc are 60*((radians spanned by arc) / PI) = 60
             // the above calculation can be found at
             // Empress._numSampToApproximate()
-            ok(Math.abs(coords[250] + 2) < 1.0e-15); // end arc x
-            ok(Math.abs(coords[251]) < 1.0e-15); //end arc y
+            approxDeepEqual(coords[250], -2, "end arc x");
+            approxDeepEqual(coords[251], 0, "end arc y");
         });
     });
 });
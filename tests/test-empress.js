@@ -16,15 +16,16 @@ require([
                 this.empress._drawer.initialize();
 
                 // Since layouts are now computed client-side which means
-                // _treeData and _tdToInd are created on client-side. The test were
+                // _treeData is created on client-side. The test were
                 // originally written when coordinates were calculated on python
                 // side. Thus we need to set them back.
-                this.empress._treeData = UtilitiesForTesting.getTestData(
-                    false
-                ).treeData;
-                this.empress._tdToInd = UtilitiesForTesting.getTestData(
-                    false
-                ).tdToInd;
+                var testData = UtilitiesForTesting.getTestData(false);
+                this.tdToInd = testData.tdToInd;
+                UtilitiesForTesting.setTreeData(
+                    this.empress,
+                    this.tdToInd,
+                    testData.treeData
+                );
             },
 
             teardown: function () {
@@ -488,40 +489,28 @@ require([
                 g2: g2Nodes,
                 g3: g3Nodes,
             };
+            // Colors are stored as RGB numbers (see Colorer.getMapRGB())
             var cm = {
-                g1: [1, 0, 0],
-                g2: [0, 1, 0],
-                g3: [0, 0, 1],
+                g1: 0xff0000,
+                g2: 0x00ff00,
+                g3: 0x0000ff,
             };
             this.empress._colorTree(obs, cm);
             for (var node = 1; node <= 7; node++) {
                 if (g1Nodes.has(node)) {
-                    deepEqual(this.empress.getNodeInfo(node, "color"), [
-                        1,
-                        0,
-                        0,
-                    ]);
+                    equal(this.empress.getNodeInfo(node, "color"), 0xff0000);
                 } else if (g2Nodes.has(node)) {
-                    deepEqual(this.empress.getNodeInfo(node, "color"), [
-                        0,
-                        1,
-                        0,
-                    ]);
+                    equal(this.empress.getNodeInfo(node, "color"), 0x00ff00);
                 } else {
-                    deepEqual(this.empress.getNodeInfo(node, "color"), [
-                        0,
-                        0,
-                        1,
-                    ]);
+                    equal(this.empress.getNodeInfo(node, "color"), 0x0000ff);
                 }
             }
         });
 
         test("Test resetTree", function () {
             var e = this.empress; // used to shorten function calls
-            var keys = Object.keys(e._treeData);
             e.resetTree();
-            for (var node = 1; node < keys.length; node++) {
+            for (var node = 1; node <= e._tree.size; node++) {
                 deepEqual(e.getNodeInfo(node, "color"), e.DEFAULT_COLOR);
                 equal(e.getNodeInfo(node, "isColored"), false);
                 equal(e.getNodeInfo(node, "visible"), true);
@@ -529,6 +518,72 @@ require([
             deepEqual(e._group, new Array(e._tree.size + 1).fill(-1));
         });
 
+        test("Test node data columns", function () {
+            var e = this.empress;
+            e.setNodeInfoForNodes([2, 5], "color", 255);
+            e.setNodeInfoForNodes(new Set([3]), "visible", false);
+            var colors = e.getNodeInfoColumn("color");
+            var visible = e.getNodeInfoColumn("visible");
+            equal(colors.length, e._tree.size + 1);
+            for (var node = 1; node <= e._tree.size; node++) {
+                if (node === 2 || node === 5) {
+                    equal(colors[node], 255);
+                } else {
+                    // (the color given to all nodes in the test data)
+                    equal(colors[node], 3289650);
+                }
+                equal(visible[node], node === 3 ? 0 : 1);
+                equal(e.getNodeInfo(node, "visible"), node !== 3);
+            }
+
+            e.fillNodeInfo("isColored", true);
+            deepEqual(
+                e.getNodeInfoColumn("isColored"),
+                new Uint8Array(e._tree.size + 1).fill(1)
+            );
+
+            // Coordinates of the current layout
+            e._currentLayout = "Rectangular";
+            var coords = e.getCoordColumns();
+            equal(coords.x[1], 1);
+            equal(coords.y[1], 2);
+            e._currentLayout = "Circular";
+            coords = e.getCoordColumns();
+            equal(coords.x[7], 27);
+            equal(coords.y[7], 28);
+
+            // Attributes that haven't been set are undefined (NaN in columns)
+            equal(e.getNodeInfo(1, "arcx0"), undefined);
+            ok(isNaN(e.getNodeInfoColumn("arcx0")[1]));
+            throws(function () {
+                e.getNodeInfoColumn("notAnAttribute");
+            }, /Unrecognized node attribute: notAnAttribute/);
+        });
+
+        test("Test drawing doesn't create other layouts' columns", function () {
+            var e = this.empress;
+            var circularAttrs = [
+                "xc0",
+                "yc0",
+                "arcx0",
+                "arcy0",
+                "arcstartangle",
+                "arcendangle",
+            ];
+            // Only the rectangular layout has been computed
+            for (var i = 0; i < circularAttrs.length; i++) {
+                delete e._treeData[circularAttrs[i]];
+            }
+            e._currentLayout = "Rectangular";
+            e.fillNodeInfo("isColored", true);
+            e.getTreeCoords();
+            e.getTreeColor();
+            e.thickenColoredNodes(1);
+            for (i = 0; i < circularAttrs.length; i++) {
+                ok(!e._treeData.hasOwnProperty(circularAttrs[i]));
+            }
+        });
+
         test("Test getSampleCategories", function () {
             var categories = ["f1", "grad", "traj"];
             var result = this.empress.getSampleCategories();
@@ -570,6 +625,45 @@ require([
             });
         });
 
+        test("Test getLayoutInfo reuses cached layouts", function () {
+            var e = this.empress;
+            e.updateLayout("Circular");
+            var circularX = e.getNodeInfoColumn("xc1");
+            e.updateLayout("Rectangular");
+            equal(e.getNodeInfo(1, "xc1"), undefined);
+            e.updateLayout("Circular");
+            strictEqual(e.getNodeInfoColumn("xc1"), circularX);
+
+            // Changing the branch length method (or leaf sorting) changes the
+            // layout...
+            e.branchMethod = "ignore";
+            e.reLayout();
+            notStrictEqual(e.getNodeInfoColumn("xc1"), circularX);
+            // ...but changing it back reuses the cached layout
+            e.branchMethod = "normal";
+            e.reLayout();
+            strictEqual(e.getNodeInfoColumn("xc1"), circularX);
+            e.leafSorting = "ascending";
+            e.reLayout();
+            notStrictEqual(e.getNodeInfoColumn("xc1"), circularX);
+
+            // The unrooted layout doesn't use leaf sorting
+            e.updateLayout("Unrooted");
+            var unrootedX = e.getNodeInfoColumn("x2");
+            e.leafSorting = "none";
+            e.reLayout();
+            strictEqual(e.getNodeInfoColumn("x2"), unrootedX);
+
+            // Shearing the tree changes the layout, but unshearing it reuses
+            // the unsheared tree's layout
+            e.shear(new Map([["f1", ["1"]]]));
+            notStrictEqual(e.getNodeInfoColumn("x2"), unrootedX);
+            e.shear(new Map([["f1", []]]));
+            strictEqual(e.getNodeInfoColumn("x2"), unrootedX);
+
+            deepEqual(e._layoutCache.keys().length, 6);
+        });
+
         test("Test getDefaultLayout", function () {
             deepEqual(this.empress.getDefaultLayout(), "Unrooted");
         });
@@ -750,7 +844,7 @@ require([
             };
 
             // manual set coorindate of nodes to make testing easier
-            this.empress._treeData[1] = [
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 1, [
                 255,
                 false,
                 true,
@@ -763,8 +857,8 @@ require([
                 0,
                 0,
                 0,
-            ];
-            this.empress._treeData[2] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 2, [
                 255,
                 false,
                 true,
@@ -777,8 +871,8 @@ require([
                 0,
                 0,
                 Math.PI / 4,
-            ];
-            this.empress._treeData[3] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 3, [
                 255,
                 false,
                 true,
@@ -791,8 +885,8 @@ require([
                 0,
                 0,
                 (3 * Math.PI) / 4,
-            ];
-            this.empress._treeData[4] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 4, [
                 255,
                 false,
                 true,
@@ -805,7 +899,7 @@ require([
                 0,
                 0,
                 0,
-            ];
+            ]);
 
             // check unrooted layout shape
             this.empress.createCollapsedCladeShape(1);
@@ -843,9 +937,10 @@ require([
             this.empress._currentLayout = "Circular";
             exp = [];
             this.empress.createCollapsedCladeShape(1);
+            // (Angles are stored as 32-bit floats)
             var dangle = 0;
-            var langle = Math.PI / 4;
-            var rangle = (3 * Math.PI) / 4;
+            var langle = Math.fround(Math.PI / 4);
+            var rangle = Math.fround((3 * Math.PI) / 4);
             var totalAngle, cos, sin, sX, sY;
 
             // This block finds (sX, sY) start point and total angle of the
@@ -932,7 +1027,7 @@ require([
             };
 
             // manual set coorindate of nodes to make testing easier
-            this.empress._treeData[1] = [
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 1, [
                 [1, 1, 1],
                 false,
                 true,
@@ -945,8 +1040,8 @@ require([
                 0,
                 0,
                 Math.PI / 2,
-            ];
-            this.empress._treeData[2] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 2, [
                 [1, 1, 1],
                 false,
                 true,
@@ -959,8 +1054,8 @@ require([
                 0,
                 0,
                 Math.PI / 4,
-            ];
-            this.empress._treeData[3] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 3, [
                 [1, 1, 1],
                 false,
                 true,
@@ -973,8 +1068,8 @@ require([
                 0,
                 0,
                 (3 * Math.PI) / 4,
-            ];
-            this.empress._treeData[4] = [
+            ]);
+            UtilitiesForTesting.setNodeData(this.empress, this.tdToInd, 4, [
                 [1, 1, 1],
                 false,
                 true,
@@ -987,7 +1082,7 @@ require([
                 0,
                 0,
                 Math.PI / 2,
-            ];
+            ]);
 
             // check unrooted layout shape
             ok(this.empress._isPointInClade(1, [0, 2]));
@@ -0,0 +1,140 @@
+require(["jquery", "underscore", "FeatureMetadata"], function (
+    $,
+    _,
+    FeatureMetadata
+) {
+    $(document).ready(function () {
+        module("Feature Metadata", {
+            setup: function () {
+                // Nodes 1 and 3 are tips with feature metadata; node 5 is an
+                // internal node with feature metadata. Nodes 1 and 5 share a
+                // value for the first column.
+                this.fm = new FeatureMetadata(
+                    new Uint32Array([0, 2, 0, 1, 0, 3, 0, 0]),
+                    2,
+                    [
+                        ["a", "b"],
+                        ["x", "y"],
+                    ],
+                    [new Uint32Array([0, 1, 1]), new Uint32Array([0, 0, 1])]
+                );
+            },
+
+            teardown: function () {
+                this.fm = null;
+            },
+        });
+
+        test("Test constructor: values and codes must be even", function () {
+            throws(function () {
+                new FeatureMetadata(
+                    new Uint32Array([0, 1]),
+                    1,
+                    [["a"]],
+                    []
+                );
+            }, /Feature metadata values and codes are uneven./);
+        });
+
+        test("Test fromCompressed()", function () {
+            // These strings were generated using tools.encode_uint32() in the
+            // Python code
+            var fm = FeatureMetadata.fromCompressed({
+                row_ptr: "AAAAAAIAAAAAAAAAAQAAAAAAAAADAAAAAAAAAAAAAAA=",
+                num_tip_rows: 2,
+                values: [
+                    ["a", "b"],
+                    ["x", "y"],
+                ],
+                codes: ["AAAAAAEAAAABAAAA", "AAAAAAAAAAABAAAA"],
+            });
+            deepEqual(fm, this.fm);
+        });
+
+        test("Test fromObjects()", function () {
+            var fm = FeatureMetadata.fromObjects(
+                { 1: ["b", "x"], 3: ["a", "x"] },
+                { 5: ["b", "y"] },
+                2
+            );
+            deepEqual(fm.getRow(1, "tip"), ["b", "x"]);
+            deepEqual(fm.getRow(3, "tip"), ["a", "x"]);
+            deepEqual(fm.getRow(5, "int"), ["b", "y"]);
+            equal(fm.getRow(2, "all"), null);
+            equal(fm.getRow(5, "tip"), null);
+            // Values should be stored once per column
+            deepEqual(fm._values, [
+                ["b", "a"],
+                ["x", "y"],
+            ]);
+
+            // No feature metadata
+            var emptyFM = FeatureMetadata.fromObjects({}, {}, 0);
+            equal(emptyFM.getRow(1, "all"), null);
+            deepEqual(emptyFM.groupNodesByValue([], null, false), {});
+        });
+
+        test("Test getRowIndex()", function () {
+            equal(this.fm.getRowIndex(3, "tip"), 0);
+            equal(this.fm.getRowIndex(1, "tip"), 1);
+            equal(this.fm.getRowIndex(5, "tip"), -1);
+            equal(this.fm.getRowIndex(5, "int"), 2);
+            equal(this.fm.getRowIndex(1, "int"), -1);
+            equal(this.fm.getRowIndex(1, "all"), 1);
+            equal(this.fm.getRowIndex(5, "all"), 2);
+            // Nodes without feature metadata, including nodes past the end
+            // of the row pointer array
+            equal(this.fm.getRowIndex(2, "all"), -1);
+            equal(this.fm.getRowIndex(100, "all"), -1);
+            var fm = this.fm;
+            throws(function () {
+                fm.getRowIndex(1, "asdf");
+            }, /Invalid tipOrInt value: asdf/);
+        });
+
+        test("Test getRow()", function () {
+            deepEqual(this.fm.getRow(3, "tip"), ["a", "x"]);
+            deepEqual(this.fm.getRow(1, "tip"), ["b", "x"]);
+            deepEqual(this.fm.getRow(5, "int"), ["b", "y"]);
+            equal(this.fm.getRow(5, "tip"), null);
+            equal(this.fm.getRow(6, "all"), null);
+        });
+
+        test("Test groupNodesByValue(): single column", function () {
+            deepEqual(this.fm.groupNodesByValue([0], null, true), {
+                a: [3],
+                b: [1],
+            });
+            deepEqual(this.fm.groupNodesByValue([0], null, false), {
+                a: [3],
+                b: [1, 5],
+            });
+            deepEqual(this.fm.groupNodesByValue([1], null, true), {
+                x: [1, 3],
+            });
+        });
+
+        test("Test groupNodesByValue(): multiple columns", function () {
+            var numCalls = 0;
+            var combine = function (vals) {
+                numCalls++;
+                return vals.join("; ");
+            };
+            deepEqual(this.fm.groupNodesByValue([0, 1], combine, false), {
+                "a; x": [3],
+                "b; x": [1],
+                "b; y": [5],
+            });
+            equal(numCalls, 3);
+
+            // Different combinations mapping to the same value are merged
+            var first = function (vals) {
+                return vals[1];
+            };
+            deepEqual(this.fm.groupNodesByValue([0, 1], first, false), {
+                x: [1, 3],
+                y: [5],
+            });
+        });
+    });
+});
@@ -0,0 +1,53 @@
+require(["jquery", "LayoutCache"], function ($, LayoutCache) {
+    $(document).ready(function () {
+        module("Layout Cache");
+
+        test("Test get and set", function () {
+            var cache = new LayoutCache(100);
+            equal(cache.get("a"), undefined);
+            var layout = { xr: new Float32Array(5) };
+            cache.set("a", layout, 20);
+            // The layout itself is stored, not a copy
+            equal(cache.get("a"), layout);
+            equal(cache.numBytes, 20);
+
+            // Replacing a layout doesn't count its old size
+            cache.set("a", "newLayout", 30);
+            equal(cache.get("a"), "newLayout");
+            equal(cache.numBytes, 30);
+
+            cache.delete("a");
+            equal(cache.get("a"), undefined);
+            equal(cache.numBytes, 0);
+            // (Deleting a key that isn't stored does nothing)
+            cache.delete("a");
+            equal(cache.numBytes, 0);
+        });
+
+        test("Test least recently used layouts are evicted", function () {
+            var cache = new LayoutCache(100);
+            cache.set("a", "A", 40);
+            cache.set("b", "B", 40);
+            deepEqual(cache.keys(), ["a", "b"]);
+            // Using "a" makes "b" the least recently used layout
+            equal(cache.get("a"), "A");
+            deepEqual(cache.keys(), ["b", "a"]);
+
+            cache.set("c", "C", 40);
+            deepEqual(cache.keys(), ["a", "c"]);
+            equal(cache.get("b"), undefined);
+            equal(cache.numBytes, 80);
+
+            // Evicts as many layouts as needed
+            cache.set("d", "D", 90);
+            deepEqual(cache.keys(), ["d"]);
+            equal(cache.numBytes, 90);
+
+            // Layouts larger than the cache aren't stored
+            cache.set("e", "E", 101);
+            deepEqual(cache.keys(), ["d"]);
+            equal(cache.get("e"), undefined);
+            equal(cache.numBytes, 90);
+        });
+    });
+});
@@ -0,0 +1,135 @@
+require([
+    "jquery",
+    "underscore",
+    "BPTree",
+    "LayoutsUtil",
+    "LayoutComputer",
+    "UtilitiesForTesting",
+], function ($, _, BPTree, LayoutsUtil, LayoutComputer, UtilitiesForTesting) {
+    $(document).ready(function () {
+        module("Layout Computer", {
+            setup: function () {
+                // In Newick format: "(((a:1,e:2)f:1,b:2)g:1,(c:1,d:3)h:2)i:1;"
+                this.bpArray = [
+                    1,
+                    1,
+                    1,
+                    1,
+                    0,
+                    1,
+                    0,
+                    0,
+                    1,
+                    0,
+                    0,
+                    1,
+                    1,
+                    0,
+                    1,
+                    0,
+                    0,
+                    0,
+                ];
+                this.tree = new BPTree(
+                    this.bpArray,
+                    null,
+                    [null, 1.0, 2.0, 1.0, 2.0, 1.0, 1.0, 3.0, 2.0, 1.0],
+                    null
+                );
+                this.params = {
+                    width: 100,
+                    height: 200,
+                    leafSorting: "ascending",
+                    branchMethod: "normal",
+                };
+                this.workerURL = "../empress/support_files/js/layout-worker.js";
+            },
+
+            teardown: function () {
+                this.bpArray = null;
+                this.tree = null;
+            },
+        });
+
+        test("Test compute (on the main thread)", function () {
+            var computer = new LayoutComputer();
+            notOk(computer.usesWorker());
+            var data = null;
+            var callback = function (layout) {
+                data = layout;
+            };
+            computer.compute(this.tree, "Rectangular", this.params, callback);
+            // The callback is called before compute() returns
+            deepEqual(
+                data,
+                LayoutsUtil.computeLayout(
+                    this.tree,
+                    "Rectangular",
+                    100,
+                    200,
+                    "ascending",
+                    "normal"
+                )
+            );
+        });
+
+        test("Test compute (in a worker)", function (assert) {
+            var done = assert.async();
+            var tree = this.tree;
+            var bpArray = this.bpArray;
+            var params = this.params;
+            // (If this browser can't start the worker, the layout is
+            // computed on the main thread instead -- the result should be the
+            // same either way.)
+            var computer = new LayoutComputer(this.workerURL);
+            var progress = [];
+            var onProgress = function (message) {
+                progress.push(message);
+            };
+            // If the layouts are computed in a worker, the first request is
+            // superseded by the second one, so its callback shouldn't be
+            // called. (Otherwise, each callback is called before compute()
+            // returns, so the first request can't be superseded.)
+            var usesWorker = computer.usesWorker();
+            var firstCalled = false;
+            var first = function () {
+                firstCalled = true;
+            };
+            computer.compute(tree, "Unrooted", params, first, onProgress);
+            computer.compute(
+                tree,
+                "Circular",
+                params,
+                function (data) {
+                    var expected = LayoutsUtil.computeLayout(
+                        tree,
+                        "Circular",
+                        100,
+                        200,
+                        "ascending",
+                        "normal"
+                    );
+                    deepEqual(_.keys(data), _.keys(expected));
+                    _.each(expected, function (values, key) {
+                        UtilitiesForTesting.approxDeepEqualMulti(
+                            Array.from(data[key]).slice(1),
+                            values.slice(1),
+                            key
+                        );
+                    });
+                    equal(firstCalled, !usesWorker);
+                    if (computer.usesWorker()) {
+                        deepEqual(progress, [
+                            "Reading tree...",
+                            "Computing Circular layout...",
+                        ]);
+                    }
+                    // The tree's own buffers weren't transferred to the worker
+                    deepEqual(tree.toArray(), bpArray);
+                    done();
+                },
+                onProgress
+            );
+        });
+    });
+});
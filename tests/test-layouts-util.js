@@ -702,5 +702,108 @@ require([
                 );
             }, /dx and dy are < epsilon; can't scale this layout./);
         });
+        test("Test computeLayout", function () {
+            var tree = this.tree;
+            _.each(["normal", "ignore", "ultrametric"], function (bm) {
+                var lengthGetter = LayoutsUtil.getLengthMethod(bm, tree);
+                var check = LayoutsUtil.shouldCheckBranchLengthsChanged(bm);
+                deepEqual(
+                    LayoutsUtil.computeLayout(
+                        tree,
+                        "Rectangular",
+                        100,
+                        200,
+                        "ascending",
+                        bm
+                    ),
+                    LayoutsUtil.rectangularLayout(
+                        tree,
+                        100,
+                        200,
+                        "ascending",
+                        undefined,
+                        lengthGetter,
+                        check
+                    ),
+                    "Rectangular, " + bm
+                );
+                deepEqual(
+                    LayoutsUtil.computeLayout(
+                        tree,
+                        "Circular",
+                        100,
+                        200,
+                        "none",
+                        bm
+                    ),
+                    LayoutsUtil.circularLayout(
+                        tree,
+                        100,
+                        200,
+                        "none",
+                        undefined,
+                        lengthGetter,
+                        check
+                    ),
+                    "Circular, " + bm
+                );
+                deepEqual(
+                    LayoutsUtil.computeLayout(
+                        tree,
+                        "Unrooted",
+                        100,
+                        200,
+                        "none",
+                        bm
+                    ),
+                    LayoutsUtil.unrootedLayout(
+                        tree,
+                        100,
+                        200,
+                        undefined,
+                        lengthGetter,
+                        check
+                    ),
+                    "Unrooted, " + bm
+                );
+            });
+        });
+
+        test("Test computeLayout (tree is just the root)", function () {
+            var tree = new BPTree(new Uint8Array([1, 0]), null, null, null);
+            deepEqual(
+                LayoutsUtil.computeLayout(
+                    tree,
+                    "Unrooted",
+                    1,
+                    1,
+                    "none",
+                    "normal"
+                ),
+                { xCoord: [null, 0], yCoord: [null, 0] }
+            );
+            var data = LayoutsUtil.computeLayout(
+                tree,
+                "Circular",
+                1,
+                1,
+                "none",
+                "normal"
+            );
+            deepEqual(_.keys(data), [
+                "x0",
+                "y0",
+                "x1",
+                "y1",
+                "angle",
+                "arcx0",
+                "arcy0",
+                "arcStartAngle",
+                "arcEndAngle",
+            ]);
+            _.each(data, function (values) {
+                deepEqual(values, [null, 0]);
+            });
+        });
     });
 });
@@ -0,0 +1,122 @@
+require(["jquery", "underscore", "SidecarLoader"], function (
+    $,
+    _,
+    SidecarLoader
+) {
+    $(document).ready(function () {
+        /**
+         * Returns a function that mimics window.fetch() for the given files.
+         *
+         * @param {Object} files Maps file URLs to their contents: either
+         *                       typed arrays (for binary files) or Objects
+         *                       (for JSON files).
+         * @param {Array} fetched URLs of fetched files are appended to this.
+         */
+        function mockFetch(files, fetched) {
+            return function (url) {
+                fetched.push(url);
+                if (!_.has(files, url)) {
+                    return Promise.resolve({ ok: false, status: 404 });
+                }
+                var contents = files[url];
+                return Promise.resolve({
+                    ok: true,
+                    arrayBuffer: function () {
+                        return Promise.resolve(contents.buffer);
+                    },
+                    json: function () {
+                        return Promise.resolve(contents);
+                    },
+                });
+            };
+        }
+
+        module("Sidecar Loader", {
+            setup: function () {
+                this.base = "http://localhost/plot/empress-data/";
+                this.files = {};
+                this.files[this.base + "manifest.json"] = {
+                    tree: { $sidecar: "tree.bin", dtype: "uint8" },
+                    names: { $sidecar: "names.json" },
+                    lengths: { $sidecar: "lengths.bin", dtype: "float64" },
+                    compressed_table: {
+                        indptr: { $sidecar: "indptr.bin", dtype: "uint32" },
+                        indices: { $sidecar: "indices.bin", dtype: "uint32" },
+                    },
+                    feature_metadata_columns: ["a", "b"],
+                    compressed_sample_metadata: null,
+                    compressed_feature_metadata: {
+                        num_tip_rows: 1,
+                        codes: [{ $sidecar: "codes.0.bin", dtype: "uint32" }],
+                    },
+                };
+                this.files[this.base + "tree.bin"] = new Uint8Array([235]);
+                this.files[this.base + "names.json"] = [-1, "a", null];
+                this.files[this.base + "lengths.bin"] = new Float64Array([
+                    -1,
+                    0.5,
+                    2,
+                ]);
+                this.files[this.base + "indptr.bin"] = new Uint32Array([0, 2]);
+                this.files[this.base + "indices.bin"] = new Uint32Array([1, 2]);
+                this.files[this.base + "codes.0.bin"] = new Uint32Array([0]);
+            },
+
+            teardown: function () {
+                this.files = null;
+            },
+        });
+
+        test("Test load()", function (assert) {
+            var done = assert.async();
+            var fetched = [];
+            SidecarLoader.load(
+                this.base + "manifest.json",
+                mockFetch(this.files, fetched)
+            ).then(function (data) {
+                deepEqual(data.tree, new Uint8Array([235]));
+                deepEqual(data.names, [-1, "a", null]);
+                ok(data.lengths instanceof Float64Array);
+                deepEqual(Array.from(data.lengths), [-1, 0.5, 2]);
+                ok(data.compressed_table.indptr instanceof Uint32Array);
+                deepEqual(
+                    data.compressed_table.indices,
+                    new Uint32Array([1, 2])
+                );
+                deepEqual(data.feature_metadata_columns, ["a", "b"]);
+                equal(data.compressed_sample_metadata, null);
+                equal(data.compressed_feature_metadata.num_tip_rows, 1);
+                deepEqual(data.compressed_feature_metadata.codes, [
+                    new Uint32Array([0]),
+                ]);
+                // The manifest and each sidecar file are fetched once
+                equal(fetched.length, 7);
+                done();
+            });
+        });
+
+        test("Test load(): missing file", function (assert) {
+            var done = assert.async();
+            delete this.files[this.base + "lengths.bin"];
+            SidecarLoader.load(
+                this.base + "manifest.json",
+                mockFetch(this.files, [])
+            ).catch(function (err) {
+                ok(/Unable to load ".*lengths.bin": 404/.test(err.message));
+                done();
+            });
+        });
+
+        test("Test load(): unrecognized dtype", function (assert) {
+            var done = assert.async();
+            this.files[this.base + "manifest.json"].lengths.dtype = "int7";
+            SidecarLoader.load(
+                this.base + "manifest.json",
+                mockFetch(this.files, [])
+            ).catch(function (err) {
+                equal(err.message, 'Unrecognized dtype "int7".');
+                done();
+            });
+        });
+    });
+});
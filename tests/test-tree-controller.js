@@ -38,7 +38,7 @@ require(["jquery", "UtilitiesForTesting", "util", "TreeController"], function (
 
             // checks to make sure structre of tree is correct
             var shearTree = [1, 1, 1, 0, 0, 1, 0, 0];
-            var resultTree = this.treeController.model.shearedTree.b_;
+            var resultTree = this.treeController.model.shearedTree.toArray();
             deepEqual(resultTree, shearTree);
 
             // checks to make sure the mappings from orignal tree to shear tree
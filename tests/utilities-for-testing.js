@@ -224,12 +224,64 @@ define(["Empress", "BPTree", "BiomTable"], function (
             [3289650, false, true, 3, 4, 3, 4],
             [3289650, false, true, 5, 6, 5, 6],
         ];
-        empress._treeData = treeData;
+        var tdToInd = {
+            color: 0,
+            isColored: 1,
+            visible: 2,
+            x2: 3,
+            y2: 4,
+            xr: 3,
+            yr: 4,
+            xc0: 3,
+            yc0: 4,
+            xc1: 5,
+            yc1: 6,
+            highestchildyr: 5,
+            lowestchildyr: 6,
+        };
+        setTreeData(empress, tdToInd, treeData);
         return {
             empress: empress,
         };
     }
 
+    /**
+     * Sets the data of a node in an Empress object.
+     *
+     * Empress stores each attribute of its nodes' data in a separate column,
+     * but it's easier to write out test data one node at a time: this sets
+     * the node's attributes from an array of their values.
+     *
+     * @param {Empress} empress
+     * @param {Object} tdToInd Maps attributes (e.g. "color") to their index
+     *                         in data. Attributes that Empress doesn't store
+     *                         (e.g. "name") are ignored.
+     * @param {Number} node Postorder position of the node
+     * @param {Array} data Values of the node's attributes
+     */
+    function setNodeData(empress, tdToInd, node, data) {
+        for (var attr in tdToInd) {
+            if (attr !== "name" && data[tdToInd[attr]] !== undefined) {
+                empress.setNodeInfo(node, attr, data[tdToInd[attr]]);
+            }
+        }
+    }
+
+    /**
+     * Sets the data of all nodes in an Empress object.
+     *
+     * @param {Empress} empress
+     * @param {Object} tdToInd See setNodeData()
+     * @param {Array} treeData Maps nodes' postorder positions to arrays of
+     *                         their attributes' values (see setNodeData()).
+     *                         Entry 0 is ignored.
+     */
+    function setTreeData(empress, tdToInd, treeData) {
+        for (var node = 1; node < treeData.length; node++) {
+            setNodeData(empress, tdToInd, node, treeData[node]);
+        }
+    }
+
     /**
      * Returns reference SVGs for the unique values [0, 1, 2, 3, 4] and the
      * color map "Viridis".
@@ -428,5 +480,7 @@ define(["Empress", "BPTree", "BiomTable"], function (
         approxDeepEqualMulti: approxDeepEqualMulti,
         getReferenceSVGs: getReferenceSVGs,
         getTestDataSingleDescendant: getTestDataSingleDescendant,
+        setNodeData: setNodeData,
+        setTreeData: setTreeData,
     };
 });